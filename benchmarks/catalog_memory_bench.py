@@ -0,0 +1,136 @@
+"""
+ذاكرة الكتالوج مع عدة جلسات: نسخ لكل جلسة (السابق) مقابل snapshot مشترك.
+
+يعمل على البديل المحلي بدون Firebase:
+    python benchmarks/catalog_memory_bench.py
+    python benchmarks/catalog_memory_bench.py --sessions 50 --products 800 --customers 1500 --json
+
+السابق: كل جلسة تحمل orders_products_once + products_cache_for_customer_prices
++ products_cache_for_sales + orders_customers_once (كل واحدة نسخة كاملة).
+الحالي: كل جلسة تحمل رقم نسخة فقط، والسجلات مشتركة.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+os.environ["BAWADI_BACKEND"] = "local"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firebase_config import db  # noqa: E402
+from services.catalog import session_catalog, refresh_catalog  # noqa: E402
+from services.firestore_queries import col_to_list  # noqa: E402
+
+
+def seed(n_products: int, n_customers: int):
+    db.reset()
+    batch = db.batch()
+    ops = 0
+    for i in range(n_products):
+        batch.set(db.collection("products").document(f"p{i:05d}"), {
+            "name": f"منتج رقم {i}",
+            "price": 0.25 + (i % 40) * 0.05,
+            "qty_on_hand": float(100 + i % 500),
+            "sale_unit": "pcs",
+            "active": True,
+            "created_at": "2026-01-01T08:00:00+03:00",
+            "updated_at": "2026-01-01T08:00:00+03:00",
+        })
+        ops += 1
+        if ops >= 450:
+            batch.commit()
+            batch, ops = db.batch(), 0
+    for i in range(n_customers):
+        batch.set(db.collection("customers").document(f"c{i:05d}"), {
+            "name": f"عميل رقم {i}",
+            "phone": f"07{i:08d}",
+            "area": f"منطقة {i % 25}",
+            "balance": float(i % 300),
+            "opening_balance": 0.0,
+            "active": True,
+            "created_at": "2026-01-01T08:00:00+03:00",
+        })
+        ops += 1
+        if ops >= 450:
+            batch.commit()
+            batch, ops = db.batch(), 0
+    batch.commit()
+
+
+def _measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    keep = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del keep
+    return used
+
+
+def per_session_copies(n_sessions: int):
+    sessions = []
+    for _ in range(n_sessions):
+        sessions.append({
+            "orders_products_once": col_to_list("products", where_active=True),
+            "products_cache_for_customer_prices": col_to_list("products", where_active=True),
+            "products_cache_for_sales": col_to_list("products", where_active=True),
+            "orders_customers_once": col_to_list("customers", where_active=True),
+        })
+    return sessions
+
+
+def shared_snapshot(n_sessions: int):
+    refresh_catalog("products")
+    refresh_catalog("customers")
+    sessions = []
+    for _ in range(n_sessions):
+        state = {}
+        # نفس الاستخدامات الأربعة: ثلاث صفحات للمنتجات + العملاء
+        for _page in range(3):
+            session_catalog(state, "products")
+        session_catalog(state, "customers")
+        sessions.append(state)
+    # المرجع المشترك نفسه ضمن القياس (النسخة الحالية)
+    return sessions, session_catalog({}, "products"), session_catalog({}, "customers")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, default=50)
+    ap.add_argument("--products", type=int, default=800)
+    ap.add_argument("--customers", type=int, default=1500)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    seed(args.products, args.customers)
+
+    old = _measure(lambda: per_session_copies(args.sessions))
+    new = _measure(lambda: shared_snapshot(args.sessions))
+
+    result = {
+        "sessions": args.sessions,
+        "products": args.products,
+        "customers": args.customers,
+        "per_session_copies_bytes": old,
+        "shared_snapshot_bytes": new,
+        "per_session_copies_mb": round(old / 1e6, 2),
+        "shared_snapshot_mb": round(new / 1e6, 2),
+        "reduction_x": round(old / new, 1) if new else None,
+    }
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(f"{args.sessions} sessions, {args.products} products, {args.customers} customers")
+        print(f"  per-session copies : {result['per_session_copies_mb']:>8.2f} MB")
+        print(f"  shared snapshot    : {result['shared_snapshot_mb']:>8.2f} MB")
+        print(f"  reduction          : {result['reduction_x']}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
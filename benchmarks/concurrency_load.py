@@ -0,0 +1,310 @@
+"""
+حمل متزامن: عدة موزعين يحضّرون ويسلّمون ويسجلون حركات صناديق في نفس اللحظة
+(ذروة السادسة صباحاً) على البديل المحلي بنفس سلوك إعادة محاولة الـ transaction.
+
+    python benchmarks/concurrency_load.py
+    python benchmarks/concurrency_load.py --workers 20 --ops 50 --latency-ms 30 --json
+    python benchmarks/concurrency_load.py --mix prepare=0.6,deliver=0.3,crate=0.1 --out load.json
+
+المسارات:
+  prepare  services.orders_service.prepare_order   (tx_prepare_group)
+  deliver  services.orders_service.deliver_sale    (tx_deliver)
+  crate    services.distributors_service.apply_move (tx_apply_move)
+
+--latency-ms يضيف زمن شبكة لكل قراءة و commit (db.set_latency) حتى تتداخل
+المعاملات كما على Firestore؛ بدونه تنتهي كل معاملة تقريباً قبل أن تبدأ التالية.
+
+الناتج لكل (مسار × سخونة المنتج): throughput، المحاولات الإضافية (retries)،
+نسبة الإلغاء بعد استنفاد المحاولات (abort)، و p50/p95/p99 للزمن.
+سخونة العملية = أسخن منتج تلمسه: hot (أعلى HOT_N)، warm (أعلى WARM_N)، cold.
+في النهاية يتحقق أن مخزون كل منتج = البداية − المخصوم في العمليات الناجحة.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+os.environ["BAWADI_BACKEND"] = "local"
+os.environ["BAWADI_METRICS_LOG"] = "off"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firebase_config import db  # noqa: E402
+from benchmarks.datagen import PROFILES, _Zipf, generate  # noqa: E402
+from services.distributors_service import apply_move  # noqa: E402
+from services.firestore_metrics import begin_rerun, end_rerun  # noqa: E402
+from services.firestore_queries import col_to_list  # noqa: E402
+from services.idempotency_service import new_idempotency_key  # noqa: E402
+from services.local_backend import LocalContention  # noqa: E402
+from services.orders_service import deliver_sale, prepare_order  # noqa: E402
+
+HOT_N = 5
+WARM_N = 50
+KINDS = ("prepare", "deliver", "crate")
+HOTNESS = ("hot", "warm", "cold")
+
+
+def _percentile(samples, q: float) -> float:
+    s = sorted(samples)
+    if not s:
+        return 0.0
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+
+def _hotness(rank: int) -> str:
+    if rank < HOT_N:
+        return "hot"
+    if rank < WARM_N:
+        return "warm"
+    return "cold"
+
+
+def _parse_mix(text: str) -> dict:
+    mix = {}
+    for part in (text or "").split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            if k.strip() in KINDS:
+                mix[k.strip()] = float(v)
+    total = sum(mix.values()) or 1.0
+    return {k: mix.get(k, 0.0) / total for k in KINDS}
+
+
+class Worker(threading.Thread):
+    def __init__(self, idx: int, ctx: dict, ops: int, mix: dict, seed: int, start_evt: threading.Barrier):
+        super().__init__(name=f"worker-{idx}", daemon=True)
+        self.idx = idx
+        self.ctx = ctx
+        self.ops = ops
+        self.mix = mix
+        self.rng = random.Random(seed * 1000 + idx)
+        self.start_evt = start_evt
+        self.user = {"username": ctx["distributors"][idx], "role": "distributor"}
+        self.queue = list(ctx["prepared"][idx])  # فواتير prepared لهذا الموزع
+        self.sale_hot = dict(ctx["sale_hot"])
+        self.samples = []   # (kind, hotness, status, ms, attempts, retries)
+        self.stock_delta = {}  # pid -> units خُصمت فعلاً (عمليات ناجحة)
+
+    # ---- operations ----
+    def _pick_products(self, n: int):
+        ranks = sorted({self.ctx["zipf"].pick(self.rng) for _ in range(n)})
+        return [(r, self.ctx["products"][r]) for r in ranks]
+
+    def op_prepare(self, k: int):
+        picks = self._pick_products(self.rng.randint(3, 8))
+        items = []
+        for _, p in picks:
+            qty = self.rng.randint(1, 30)
+            price = int(p.get("price_fils") or 0)
+            items.append({"product_id": p["id"], "product_name": p.get("name", ""), "qty": qty,
+                          "consume_stock": True, "price": price / 1000, "price_fils": price,
+                          "total": price * qty / 1000, "total_fils": price * qty})
+        sid = f"load_{self.idx}_{k}"
+        order = {
+            "key": sid, "sale_id": sid, "invoice_no": f"INV-LOAD-{self.idx}-{k}",
+            "customer_id": f"c{self.rng.randrange(self.ctx['customers']):06d}", "customer_name": "",
+            "distributor_id": self.user["username"], "distributor_name": self.user["username"],
+            "discount": 0.0, "items": items, "units": {},
+            "idempotency_key": new_idempotency_key("prepare"),
+        }
+        hot = _hotness(picks[0][0])
+
+        def run():
+            prepare_order(order, self.user)
+            self.queue.append(sid)
+            self.sale_hot[sid] = hot
+            for it in items:
+                self.stock_delta[it["product_id"]] = self.stock_delta.get(it["product_id"], 0) + it["qty"]
+        return hot, run
+
+    def op_deliver(self, k: int):
+        sid = self.queue.pop(0)
+        pay = "cash" if self.rng.random() < 0.6 else "credit"
+        hot = self.sale_hot.get(sid, "cold")
+
+        def run():
+            deliver_sale(sid, pay, 5.0 if pay == "cash" else 0.0, 0.0, self.user,
+                         idempotency_key=new_idempotency_key("deliver"))
+        return hot, run
+
+    def op_crate(self, k: int):
+        rank, p = self._pick_products(1)[0]
+        typ = "out" if self.rng.random() < 0.7 else "in"
+        boxes = self.rng.randint(1, 10)
+        units = boxes * 20
+        payload = {
+            "distributor_id": self.user["username"], "type": typ, "boxes_qty": boxes,
+            "delta_boxes": boxes if typ == "out" else -boxes, "product_id": p["id"],
+            "units_per_box": 20, "total_units": units, "active": True, "created_by": "load",
+        }
+        move_id = f"load_cm_{self.idx}_{k}"
+
+        def run():
+            apply_move(self.user["username"], move_id, dict(payload))
+            self.stock_delta[p["id"]] = self.stock_delta.get(p["id"], 0) + (units if typ == "out" else -units)
+        return _hotness(rank), run
+
+    # ---- loop ----
+    def run(self):
+        self.start_evt.wait()
+        for k in range(self.ops):
+            r = self.rng.random()
+            kind = "prepare" if r < self.mix["prepare"] else ("deliver" if r < self.mix["prepare"] + self.mix["deliver"] else "crate")
+            if kind == "deliver" and not self.queue:
+                kind = "prepare"
+            hot, fn = getattr(self, f"op_{kind}")(k)
+
+            m = begin_rerun(f"load:{kind}")
+            t0 = time.perf_counter()
+            try:
+                fn()
+                status = "ok"
+            except LocalContention:
+                status = "abort"
+            except ValueError:
+                # مخزون غير كافٍ / رصيد صناديق: رفض منطقي وليس تعارضاً
+                status = "rejected"
+            ms = (time.perf_counter() - t0) * 1000.0
+            rec = end_rerun(m, log=False)
+            self.samples.append((kind, hot, status, ms, rec["tx_attempts"], rec["tx_retries"]))
+
+
+def summarize(workers: list, wall_s: float) -> dict:
+    groups = {}
+    for w in workers:
+        for kind, hot, status, ms, attempts, retries in w.samples:
+            for key in ((kind, hot), (kind, "all")):
+                g = groups.setdefault(key, {"ms": [], "ok": 0, "abort": 0, "rejected": 0, "retries": 0, "attempts": 0})
+                g["ms"].append(ms)
+                g[status] += 1
+                g["retries"] += retries
+                g["attempts"] += attempts
+
+    out = {}
+    for (kind, hot), g in sorted(groups.items()):
+        n = len(g["ms"])
+        out.setdefault(kind, {})[hot] = {
+            "ops": n,
+            "ok": g["ok"],
+            "rejected": g["rejected"],
+            "aborts": g["abort"],
+            "abort_rate": round(g["abort"] / n, 4) if n else 0.0,
+            "retries": g["retries"],
+            "retries_per_op": round(g["retries"] / n, 3) if n else 0.0,
+            "throughput_ops_s": round(g["ok"] / wall_s, 2) if wall_s else 0.0,
+            "ms_p50": round(_percentile(g["ms"], 0.50), 2),
+            "ms_p95": round(_percentile(g["ms"], 0.95), 2),
+            "ms_p99": round(_percentile(g["ms"], 0.99), 2),
+            "ms_max": round(max(g["ms"]), 2) if g["ms"] else 0.0,
+        }
+    return out
+
+
+def check_stock(before: dict, workers: list) -> list[str]:
+    after = {p["id"]: float(p.get("qty_on_hand", 0) or 0) for p in col_to_list("products")}
+    delta = {}
+    for w in workers:
+        for pid, n in w.stock_delta.items():
+            delta[pid] = delta.get(pid, 0) + n
+    bad = []
+    for pid, q0 in before.items():
+        expect = q0 - delta.get(pid, 0)
+        if abs(after.get(pid, 0.0) - expect) > 1e-6:
+            bad.append(f"{pid}: expected {expect} got {after.get(pid)}")
+        if after.get(pid, 0.0) < 0:
+            bad.append(f"{pid}: negative stock {after.get(pid)}")
+    return bad
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=15)
+    ap.add_argument("--ops", type=int, default=40, help="عمليات لكل موزع")
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--mix", default="prepare=0.45,deliver=0.35,crate=0.2")
+    ap.add_argument("--profile", choices=list(PROFILES), default="small")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", default="")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    n_workers = max(1, args.workers)
+    cfg = PROFILES[args.profile]
+    info = generate(db, args.profile, args.seed, distributors=max(cfg["distributors"], n_workers))
+
+    products = sorted(col_to_list("products", where_active=True), key=lambda p: p["id"])
+    dists = [f"d{i:02d}" for i in range(1, n_workers + 1)]
+    rank = {p["id"]: r for r, p in enumerate(products)}
+    prepared = {i: [] for i in range(n_workers)}
+    sale_hot = {}
+    for sid in info["prepared_sale_ids"]:
+        sale = db.collection("sales").document(sid).get().to_dict() or {}
+        d = sale.get("distributor_id", "")
+        if d in dists:
+            prepared[dists.index(d)].append(sid)
+            sale_hot[sid] = _hotness(min(rank.get(it.get("product_id"), WARM_N) for it in sale.get("items") or [{}]))
+
+    ctx = {
+        "products": products,  # الترتيب = ترتيب Zipf في datagen (p00000 الأسخن)
+        "zipf": _Zipf(len(products)),
+        "customers": info["config"]["customers"],
+        "distributors": dists,
+        "prepared": prepared,
+        "sale_hot": sale_hot,
+    }
+    before = {p["id"]: float(p.get("qty_on_hand", 0) or 0) for p in products}
+
+    db.set_latency(args.latency_ms)
+    stats0 = dict(db.stats)
+    barrier = threading.Barrier(n_workers + 1)
+    workers = [Worker(i, ctx, args.ops, _parse_mix(args.mix), args.seed, barrier) for i in range(n_workers)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    for w in workers:
+        w.join()
+    wall_s = time.perf_counter() - t0
+    db.set_latency(0)
+
+    report = {
+        "config": {"workers": n_workers, "ops_per_worker": args.ops, "latency_ms": args.latency_ms,
+                   "mix": _parse_mix(args.mix), "profile": args.profile, "seed": args.seed,
+                   "hot_n": HOT_N, "warm_n": WARM_N},
+        "wall_s": round(wall_s, 3),
+        "throughput_ops_s": round(sum(len(w.samples) for w in workers) / wall_s, 2) if wall_s else 0.0,
+        "backend_aborts": db.stats["aborts"] - stats0["aborts"],
+        "backend_commits": db.stats["commits"] - stats0["commits"],
+        "paths": summarize(workers, wall_s),
+        "stock_violations": check_stock(before, workers),
+    }
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"{n_workers} workers × {args.ops} ops, latency {args.latency_ms} ms: "
+              f"{report['wall_s']}s, {report['throughput_ops_s']} ops/s, "
+              f"{report['backend_aborts']} conflicting commits")
+        print(f"  {'path':<9}{'hot':<6}{'ops':>6}{'ok':>6}{'rej':>5}{'abort%':>8}{'retry/op':>10}"
+              f"{'ok/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+        for kind, by_hot in report["paths"].items():
+            for hot in (*HOTNESS, "all"):
+                r = by_hot.get(hot)
+                if not r:
+                    continue
+                print(f"  {kind:<9}{hot:<6}{r['ops']:>6}{r['ok']:>6}{r['rejected']:>5}"
+                      f"{r['abort_rate'] * 100:>7.1f}%{r['retries_per_op']:>10.2f}{r['throughput_ops_s']:>8.1f}"
+                      f"{r['ms_p50']:>9.1f}{r['ms_p95']:>9.1f}{r['ms_p99']:>9.1f}")
+        v = report["stock_violations"]
+        print("stock: consistent" if not v else f"stock: {len(v)} violation(s), e.g. {v[0]}")
+    return 1 if report["stock_violations"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""
+مولّد بيانات مخبز واقعية (ثابتة لنفس seed) للقياس على البديل المحلي.
+
+    from benchmarks.datagen import generate
+    info = generate(db, profile="medium", seed=7)
+
+    python benchmarks/datagen.py --profile small
+    python benchmarks/datagen.py --profile large --seed 3 --json
+
+الشكل قريب من الإنتاج:
+  - المنتجات والعملاء بتوزيع Zipf: قلة من المنتجات / العملاء تأخذ أغلب الفواتير
+  - أسعار خاصة (customer_prices) لجزء من العملاء، ووصفات (boms) لأغلب المنتجات
+  - فواتير على مدى DAYS يوم: أغلبها done (نقدي / ذمم)، وآخر يوم prepared
+  - تحصيلات للعملاء الآجلين، حركات صناديق للموزعين، وحركات مخزون لكل صنف مباع
+كل المبالغ بالصيغتين (float + _fils) كما يكتبها الكود الحالي.
+
+الحجم الكبير (large) يحتاج ~3GB ذاكرة على البديل المحلي، ولذلك يكتب حركات
+المخزون لربع الفواتير فقط (stock_move_ratio).
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+if __name__ == "__main__":
+    os.environ["BAWADI_BACKEND"] = "local"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.money import money_fields  # noqa: E402
+
+PROFILES = {
+    "small": {"customers": 300, "products": 150, "materials": 40, "distributors": 6, "sales": 10_000, "days": 60},
+    "medium": {"customers": 2_000, "products": 500, "materials": 120, "distributors": 15, "sales": 60_000, "days": 180},
+    "large": {"customers": 5_000, "products": 1_200, "materials": 250, "distributors": 20, "sales": 250_000, "days": 365,
+              "stock_move_ratio": 0.25},
+}
+
+TZ = timezone(timedelta(hours=3))
+START = datetime(2026, 1, 1, 5, 0, tzinfo=TZ)
+BATCH_OPS = 450
+
+_UNITS = ("kg", "g", "L", "pcs")
+_PRODUCT_WORDS = ("خبز", "كعك", "صمون", "معجنات", "بسكويت", "كرواسون", "توست", "فطائر", "حلويات", "كيك")
+_AREAS = ("الجبيهة", "صويلح", "ماركا", "الهاشمي", "طبربور", "خلدا", "الزرقاء", "الرصيفة")
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat(timespec="seconds")
+
+
+class _Zipf:
+    """
+    اختيار index بتوزيع Zipf (s ≈ 1.1) عبر bisect على التوزيع التراكمي.
+    """
+    def __init__(self, n: int, s: float = 1.1):
+        weights = [1.0 / (k ** s) for k in range(1, n + 1)]
+        self.cum = list(itertools.accumulate(weights))
+        self.total = self.cum[-1]
+
+    def pick(self, rng: random.Random) -> int:
+        return bisect.bisect_left(self.cum, rng.random() * self.total)
+
+
+class _Writer:
+    def __init__(self, db):
+        self.db = db
+        self.batch = db.batch()
+        self.ops = 0
+        self.counts = {}
+
+    def put(self, col: str, doc_id: str, data: dict):
+        self.batch.set(self.db.collection(col).document(doc_id), data)
+        self.counts[col] = self.counts.get(col, 0) + 1
+        self.ops += 1
+        if self.ops >= BATCH_OPS:
+            self.flush()
+
+    def flush(self):
+        if self.ops:
+            self.batch.commit()
+        self.batch = self.db.batch()
+        self.ops = 0
+
+
+def generate(db, profile: str = "small", seed: int = 42, **overrides) -> dict:
+    """
+    يملأ db (البديل المحلي) ويرجع ملخصاً: الأعداد + معرّفات مفيدة للقياس
+    (أكثر عميل فواتير، أكثر موزع حركات، نطاق التواريخ، فواتير prepared).
+    """
+    cfg = dict(PROFILES[profile], **overrides)
+    rng = random.Random(seed)
+    w = _Writer(db)
+    t0 = time.perf_counter()
+
+    # ---- materials ----
+    materials = []
+    for i in range(cfg["materials"]):
+        mid = f"m{i:04d}"
+        unit = _UNITS[i % len(_UNITS)]
+        m = {"name": f"مادة {i}", "unit": unit, "qty_on_hand": round(rng.uniform(50, 5000), 2),
+             "min_qty": round(rng.uniform(5, 100), 2), "last_cost": round(rng.uniform(0.2, 8), 3), "active": True}
+        materials.append((mid, m))
+        w.put("materials", mid, m)
+
+    # ---- products + boms ----
+    products = []
+    for i in range(cfg["products"]):
+        pid = f"p{i:05d}"
+        price_fils = rng.randrange(100, 5000, 5)
+        p = {"name": f"{_PRODUCT_WORDS[i % len(_PRODUCT_WORDS)]} {i}", "sale_unit": "pcs",
+             "qty_on_hand": float(rng.randrange(500, 50_000)), "active": True, **money_fields(price=price_fils)}
+        products.append((pid, p))
+        w.put("products", pid, p)
+        if rng.random() < 0.7:
+            picks = rng.sample(materials, k=min(len(materials), rng.randint(3, 8)))
+            w.put("boms", pid, {
+                "product_id": pid,
+                "product_name": p["name"],
+                "items": [
+                    {"material_id": mid, "material_name": m["name"], "unit": m["unit"],
+                     "qty_per_unit": round(rng.uniform(0.005, 0.2), 4)}
+                    for mid, m in picks
+                ],
+                "active": True,
+            })
+
+    # ---- distributors ----
+    distributors = [f"d{i:02d}" for i in range(1, cfg["distributors"] + 1)]
+    for i, did in enumerate(distributors, 1):
+        w.put("distributors", did, {"name": f"موزع {i}", "username": did, "crates_balance": 0, "active": True,
+                                    **money_fields(money_balance=0)})
+
+    # ---- customers + customer_prices ----
+    customers = []
+    for i in range(cfg["customers"]):
+        cid = f"c{i:06d}"
+        credit = rng.random() < 0.45
+        c = {
+            "name": f"عميل {i}", "phone": f"07{rng.randrange(10**7, 10**8)}", "area": rng.choice(_AREAS),
+            "distributor_id": distributors[i % len(distributors)], "credit": credit, "active": True,
+            "created_at": _iso(START - timedelta(days=rng.randint(1, 400))),
+        }
+        customers.append([cid, c, 0])  # [id, data, balance_fils]
+    prod_zipf = _Zipf(len(products))
+    cust_zipf = _Zipf(len(customers), s=0.9)
+    special = {}
+    for cid, _, _ in customers:
+        if rng.random() < 0.25:
+            for _ in range(rng.randint(2, 15)):
+                pid, p = products[prod_zipf.pick(rng)]
+                fils = max(5, int(p["price_fils"] * rng.uniform(0.8, 0.97)) // 5 * 5)
+                special[(cid, pid)] = fils
+    for (cid, pid), fils in special.items():
+        w.put("customer_prices", f"{cid}_{pid}", {"customer_id": cid, "product_id": pid, "active": True,
+                                                  **money_fields(price=fils)})
+
+    # ---- sales + stock_moves + collections ----
+    n_sales, days = cfg["sales"], cfg["days"]
+    per_day = max(1, n_sales // days)
+    move_ratio = float(cfg.get("stock_move_ratio", 1.0))
+    sale_counts = {}
+    prepared_ids = []
+    sm_i = col_i = 0
+    for i in range(n_sales):
+        day = min(days - 1, i // per_day)
+        last_day = day == days - 1
+        ts = START + timedelta(days=day, minutes=rng.randint(0, 8 * 60))
+        ci = cust_zipf.pick(rng)
+        cid, c, bal = customers[ci]
+        did = c["distributor_id"]
+        sid = f"s{i:07d}"
+
+        items, total = [], 0
+        for _ in range(rng.randint(2, 10)):
+            pid, p = products[prod_zipf.pick(rng)]
+            qty = rng.randint(1, 40)
+            price = special.get((cid, pid), p["price_fils"])
+            items.append({"product_id": pid, "product_name": p["name"], "qty": qty, "consume_stock": True,
+                          **money_fields(price=price, total=price * qty)})
+            total += price * qty
+        discount = (total // 50) // 5 * 5 if rng.random() < 0.1 else 0
+        net = total - discount
+
+        sale = {
+            "invoice_no": f"INV-{ts.year}-{i + 1:07d}", "ref": f"INV-{ts.year}-{i + 1:07d}",
+            "customer_id": cid, "customer_name": c["name"],
+            "distributor_id": did, "distributor_name": did, "seller_username": did,
+            "items": items, "active": True, "stock_deducted": True,
+            "created_at": _iso(ts), "updated_at": _iso(ts),
+            **money_fields(total=total, discount=discount, net=net),
+        }
+        if last_day and rng.random() < 0.5:
+            sale.update({"status": "prepared", "payment_type": None, "balance_applied": False,
+                         **money_fields(amount_paid=0, unpaid_debt=0, extra_credit=0)})
+            prepared_ids.append(sid)
+        else:
+            delivered = ts + timedelta(hours=rng.randint(1, 5))
+            if c["credit"]:
+                paid, unpaid = 0, 0
+                pay = "credit"
+                bal += net
+            else:
+                pay = "cash"
+                paid = net if rng.random() < 0.85 else net - rng.randrange(0, net + 1, 5)
+                unpaid = net - paid
+                bal += unpaid
+            sale.update({"status": "done", "payment_type": pay, "balance_applied": True,
+                         "delivered_at": _iso(delivered),
+                         **money_fields(amount_paid=paid, unpaid_debt=unpaid, extra_credit=0)})
+        w.put("sales", sid, sale)
+        sale_counts[cid] = sale_counts.get(cid, 0) + 1
+
+        for it in items if rng.random() < move_ratio else ():
+            w.put("stock_moves", f"sm{sm_i:08d}", {
+                "type": "sale", "ref_type": "sale_prepared", "ref_id": sid, "item_type": "product",
+                "item_id": it["product_id"], "item_name": it["product_name"], "qty_delta": -float(it["qty"]),
+                "unit": "pcs", "created_by": did, "created_at": _iso(ts), "active": True,
+            })
+            sm_i += 1
+
+        # تحصيل دوري للعملاء الآجلين
+        if c["credit"] and bal > 0 and rng.random() < 0.3:
+            amount = min(bal, rng.randrange(5_000, 100_000, 5))
+            w.put("collections", f"col{col_i:07d}", {
+                "customer_id": cid, "customer_name": c["name"], "status": "posted", "active": True,
+                "created_at": _iso(ts + timedelta(hours=6)), "created_by": did, **money_fields(amount=amount),
+            })
+            col_i += 1
+            bal -= amount
+        customers[ci][2] = bal
+
+    # ---- crate_moves (نفس شكل tx_apply_move: out صباحاً و in مرتجع بعد الظهر) ----
+    cm_i = 0
+    dist_bal = {}  # did -> [crates_balance, money_balance_fils]
+    for day in range(days):
+        for did in distributors:
+            ts = START + timedelta(days=day)
+            pid, p = products[prod_zipf.pick(rng)]
+            out_boxes = rng.randint(20, 120)
+            back = rng.randint(max(0, out_boxes - 15), out_boxes)
+            for typ, boxes, hour in (("out", out_boxes, 5), ("in", back, 14)):
+                if boxes <= 0:
+                    continue
+                units = boxes * 20
+                amount = units * p["price_fils"]
+                delta = boxes if typ == "out" else -boxes
+                w.put("crate_moves", f"cm{cm_i:08d}", {
+                    "distributor_id": did, "type": typ, "boxes_qty": boxes, "delta_boxes": delta,
+                    "product_id": pid, "product_name": p["name"], "units_per_box": 20, "total_units": units,
+                    **money_fields(unit_price=p["price_fils"], amount=amount),
+                    "created_at": _iso(ts + timedelta(hours=hour)), "created_by": "admin", "active": True,
+                })
+                cm_i += 1
+                b = dist_bal.setdefault(did, [0, 0])
+                b[0] += delta
+                b[1] += amount if typ == "out" else -amount
+
+    # ---- customers (الرصيد النهائي بعد الفواتير والتحصيلات) ----
+    for cid, c, bal in customers:
+        w.put("customers", cid, {**c, **money_fields(balance=bal, opening_balance=0)})
+    for did, (boxes, money) in dist_bal.items():
+        w.batch.update(db.collection("distributors").document(did),
+                       {"crates_balance": boxes, **money_fields(money_balance=money)})
+        w.ops += 1
+    w.flush()
+
+    top_customer = max(sale_counts, key=sale_counts.get) if sale_counts else ""
+    return {
+        "profile": profile,
+        "seed": seed,
+        "config": cfg,
+        "counts": dict(sorted(w.counts.items())),
+        "top_customer": top_customer,
+        "top_customer_sales": sale_counts.get(top_customer, 0),
+        "median_customer": sorted(sale_counts, key=sale_counts.get)[len(sale_counts) // 2] if sale_counts else "",
+        "distributor": distributors[0],
+        "prepared_sale_ids": prepared_ids,
+        "first_day": _iso(START)[:10],
+        "last_day": _iso(START + timedelta(days=days - 1))[:10],
+        "generate_s": round(time.perf_counter() - t0, 2),
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--profile", choices=list(PROFILES), default="small")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    from firebase_config import db
+
+    info = generate(db, args.profile, args.seed)
+    info.pop("prepared_sale_ids")
+    if args.json:
+        print(json.dumps(info, ensure_ascii=False, indent=2))
+    else:
+        print(f"profile {info['profile']} seed {info['seed']} in {info['generate_s']}s")
+        for col, n in info["counts"].items():
+            print(f"  {col:<18} {n:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
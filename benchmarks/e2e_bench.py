@@ -0,0 +1,259 @@
+"""
+قياس شامل على بيانات benchmarks/datagen.py (البديل المحلي، بدون Firebase).
+
+    python benchmarks/e2e_bench.py --profile small
+    python benchmarks/e2e_bench.py --profile medium --repeat 10 --out bench-$(git rev-parse --short HEAD).json
+    python benchmarks/e2e_bench.py --profile medium --compare bench-old.json
+
+الحالات:
+  statement_top / statement_median  كشف حساب أكثر عميل فواتير / عميل متوسط
+  statement_filter                  فلتر/بحث/مجاميع على كشف أكثر عميل (الكشف محفوظ؛ يحتاج pandas)
+  archive_day / archive_month       إحصائيات الأرشيف ليوم / لشهر
+  prepare_order / prepare_batch     تحضير طلب 8 أصناف / دفعة 20 طلب
+  deliver                           تسليم طلب مُحضّر (نقدي)
+  inventory_count_post              ترحيل جرد المنتجات (بعد تعبئة المعدود)
+  projection                        توقع الإنتاج لمنتج (مواد + وصفة)
+
+لكل حالة: p50/p95/mean بالـ ms وقراءات/كتابات Firestore لكل تنفيذ. الناتج JSON
+(--out / --json) يحمل commit والإعدادات حتى تُقارن النتائج بين commits.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+os.environ["BAWADI_BACKEND"] = "local"
+os.environ["BAWADI_METRICS_LOG"] = "off"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from firebase_config import db  # noqa: E402
+from benchmarks.datagen import PROFILES, generate  # noqa: E402
+from services.archive_service import archive_stats  # noqa: E402
+from services.cache_bus import clear_all_caches  # noqa: E402
+from services.firestore_metrics import begin_rerun, end_rerun  # noqa: E402
+from services.firestore_queries import col_to_list, doc_get  # noqa: E402
+from services.idempotency_service import new_idempotency_key  # noqa: E402
+from services.inventory_service import (  # noqa: E402
+    get_count_lines,
+    new_count_header,
+    post_inventory_count,
+    production_projection,
+    save_counted_lines,
+    upsert_count_lines_from_system,
+)
+from services.orders_service import deliver_sale, prepare_order, prepare_orders_batch  # noqa: E402
+from services.statement_service import STATEMENT_KINDS, build_statement, load_statement  # noqa: E402
+
+USER = {"username": "bench", "role": "admin"}
+
+
+def _percentile(samples, q: float) -> float:
+    s = sorted(samples)
+    if not s:
+        return 0.0
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10)
+        return out.stdout.strip()
+    except Exception:
+        return ""
+
+
+def run_case(fn, repeat: int, setup=None) -> dict:
+    """
+    setup(i) خارج القياس (تجهيز طلب / جرد جديد لكل تكرار) ثم fn(arg).
+    """
+    ms, reads, writes = [], [], []
+    for i in range(repeat):
+        arg = setup(i) if setup else None
+        clear_all_caches()
+        m = begin_rerun("bench")
+        t0 = time.perf_counter()
+        try:
+            fn(arg)
+        finally:
+            ms.append((time.perf_counter() - t0) * 1000.0)
+            rec = end_rerun(m, log=False)
+        reads.append(rec["reads"])
+        writes.append(rec["writes"])
+    return {
+        "runs": repeat,
+        "ms_p50": round(_percentile(ms, 0.50), 3),
+        "ms_p95": round(_percentile(ms, 0.95), 3),
+        "ms_mean": round(sum(ms) / len(ms), 3),
+        "reads": round(sum(reads) / len(reads), 1),
+        "writes": round(sum(writes) / len(writes), 1),
+    }
+
+
+def _customer(cid: str) -> dict:
+    c = db.collection("customers").document(cid).get().to_dict() or {}
+    return {"id": cid, **c}
+
+
+def _new_order(key: str, customer_id: str, products: list, n_items: int, offset: int) -> dict:
+    items = []
+    for k in range(n_items):
+        p = products[(offset + k) % len(products)]
+        price = int(p.get("price_fils") or 0)
+        items.append({"product_id": p["id"], "product_name": p.get("name", ""), "qty": 2, "consume_stock": True,
+                      "price": price / 1000, "price_fils": price, "total": price * 2 / 1000, "total_fils": price * 2})
+    return {
+        "key": key, "sale_id": f"bench_{key}", "invoice_no": f"INV-BENCH-{key}",
+        "customer_id": customer_id, "customer_name": "", "distributor_id": "d01", "distributor_name": "d01",
+        "discount": 0.0, "items": items, "units": {}, "idempotency_key": new_idempotency_key("prepare"),
+    }
+
+
+def run_all(info: dict, repeat: int, only=None) -> dict:
+    products = col_to_list("products", where_active=True)
+    top, median = _customer(info["top_customer"]), _customer(info["median_customer"])
+    last_day = info["last_day"]
+    month_start = (date.fromisoformat(last_day) - timedelta(days=30)).isoformat()
+    prepared = list(info["prepared_sale_ids"])
+
+    def count_setup(_):
+        cid = new_count_header("products", USER, "bench")
+        upsert_count_lines_from_system(cid, "products")
+        lines = get_count_lines(cid)
+        save_counted_lines([{"doc_id": ln["doc_id"], "counted_qty": ln["system_qty"] + (i % 3)}
+                            for i, ln in enumerate(lines)])
+        return cid
+
+    boms = [b for b in col_to_list("boms") if b.get("items")]
+
+    def projection(i):
+        materials = col_to_list("materials", where_active=True)
+        bom = doc_get("boms", boms[i % len(boms)]["id"])
+        return production_projection(bom["items"], {m["id"]: m for m in materials}, target=500)
+
+    stmt_kinds = ["", *STATEMENT_KINDS]
+
+    def statement_filter_setup(i):
+        # الكشف وإطاره جاهزان (كما في الجلسة بعد أول فتح)؛ يُقاس تغيير الفلتر فقط
+        stmt = load_statement(top)
+        stmt.frame
+        return i, stmt
+
+    def statement_filter(arg):
+        # بحث مختلف في كل تنفيذ فلا يصيب كاش النتائج
+        i, stmt = arg
+        return stmt.view(kind=stmt_kinds[i % len(stmt_kinds)], query=str(i), newest_first=bool(i % 2), limit=50)
+
+    cases = {
+        "statement_top": (lambda _: build_statement(top), None),
+        "statement_filter": (statement_filter, statement_filter_setup),
+        "statement_median": (lambda _: build_statement(median), None),
+        "archive_day": (lambda _: archive_stats(f"{last_day}T00:00:00+03:00", f"{last_day}T23:59:59+03:00"), None),
+        "archive_month": (lambda _: archive_stats(f"{month_start}T00:00:00+03:00", f"{last_day}T23:59:59+03:00"), None),
+        "prepare_order": (
+            lambda o: prepare_order(o, USER),
+            lambda i: _new_order(f"one{i}", info["median_customer"], products, 8, i * 8),
+        ),
+        "prepare_batch": (
+            lambda orders: prepare_orders_batch(orders, USER),
+            lambda i: [_new_order(f"b{i}_{k}", info["median_customer"], products, 6, i * 120 + k * 6) for k in range(20)],
+        ),
+        "deliver": (
+            lambda sid: deliver_sale(sid, "cash", 5.0, 0.0, USER, idempotency_key=new_idempotency_key("deliver")),
+            lambda i: prepared[i % len(prepared)],
+        ),
+        "inventory_count_post": (lambda cid: post_inventory_count(cid, USER), count_setup),
+        "projection": (lambda i: projection(i), lambda i: i),
+    }
+
+    try:
+        import pandas  # noqa: F401
+    except ImportError:
+        cases.pop("statement_filter")
+
+    results = {}
+    for name, (fn, setup) in cases.items():
+        if only and name not in only:
+            continue
+        n = repeat
+        if name == "deliver":
+            n = min(repeat, len(prepared))
+        elif name == "inventory_count_post":
+            n = max(1, min(repeat, 3))
+        if n <= 0:
+            continue
+        results[name] = run_case(fn, n, setup)
+    return results
+
+
+def compare(old: dict, new: dict) -> list[str]:
+    lines = []
+    for name, r in new.get("results", {}).items():
+        o = old.get("results", {}).get(name)
+        if not o:
+            lines.append(f"  {name:<22} (جديد)")
+            continue
+        d_ms = (r["ms_p50"] - o["ms_p50"]) / o["ms_p50"] * 100.0 if o["ms_p50"] else 0.0
+        lines.append(
+            f"  {name:<22} p50 {o['ms_p50']:>9.2f} → {r['ms_p50']:>9.2f} ms ({d_ms:+6.1f}%)  "
+            f"reads {o['reads']:>7.1f} → {r['reads']:>7.1f}  writes {o['writes']:>6.1f} → {r['writes']:>6.1f}"
+        )
+    return lines
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--profile", choices=list(PROFILES), default="small")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--only", nargs="*", default=None, help="أسماء حالات محددة")
+    ap.add_argument("--out", default="", help="حفظ النتيجة JSON في ملف")
+    ap.add_argument("--compare", default="", help="ملف JSON سابق للمقارنة")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    info = generate(db, args.profile, args.seed)
+    results = run_all(info, max(1, args.repeat), args.only)
+
+    info.pop("prepared_sale_ids")
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "ts": round(time.time(), 3),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+        },
+        "data": info,
+        "results": results,
+    }
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"profile {args.profile} seed {args.seed} commit {report['meta']['commit'] or '-'} "
+              f"(data generated in {info['generate_s']}s)")
+        print(f"  {'case':<22}{'p50 ms':>10}{'p95 ms':>10}{'reads':>9}{'writes':>8}")
+        for name, r in results.items():
+            print(f"  {name:<22}{r['ms_p50']:>10.2f}{r['ms_p95']:>10.2f}{r['reads']:>9.1f}{r['writes']:>8.1f}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        print()
+        print(f"compare with {old.get('meta', {}).get('commit') or args.compare}")
+        for line in compare(old, report):
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
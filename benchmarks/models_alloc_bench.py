@@ -0,0 +1,230 @@
+"""
+تخصيص الذاكرة لبناء كشف الحساب وإحصائيات الأرشيف: dict خام (السابق) مقابل سجلات Sale.
+
+يعمل على البديل المحلي بدون Firebase:
+    python benchmarks/models_alloc_bench.py
+    python benchmarks/models_alloc_bench.py --sales 300 --archive 1000 --repeat 20 --json
+
+السابق: {"id": d.id, **x} لكل فاتورة + float(to_float(s.get(...))) في كل حلقة،
+واستعلام الفواتير مرتين (ذمم / نقدي) والأرشيف يجلب المستند كاملاً مع items.
+الحالي: services.statement_service.build_statement و services.archive_service.archive_stats.
+
+ملاحظة: peak يشمل نسخ البديل المحلي للمجموعة كاملة عند كل استعلام، فالفرق
+الحقيقي يظهر في retained والزمن.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ["BAWADI_BACKEND"] = "local"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firebase_config import db  # noqa: E402
+from utils.helpers import to_float  # noqa: E402
+from services.archive_service import archive_stats  # noqa: E402
+from services.statement_service import build_statement  # noqa: E402
+
+CUSTOMER = {"id": "c00001", "name": "عميل", "opening_balance": 12.5, "created_at": "2026-01-01T08:00:00+03:00"}
+START, END = "2026-01-01", "2027-01-01"
+
+
+def seed(n_sales: int, n_archive: int, n_items: int):
+    db.reset()
+    batch, ops = db.batch(), 0
+
+    def put(col, doc_id, data):
+        nonlocal batch, ops
+        batch.set(db.collection(col).document(doc_id), data)
+        ops += 1
+        if ops >= 450:
+            batch.commit()
+            batch, ops = db.batch(), 0
+
+    db.collection("customers").document(CUSTOMER["id"]).set(dict(CUSTOMER, active=True))
+    for i in range(n_archive):
+        cid = CUSTOMER["id"] if i < n_sales else f"c{i % 200:05d}"
+        total = 5.0 + (i % 37) * 0.75
+        cash = i % 3 != 0
+        paid = total - (i % 4) if cash else 0.0
+        put("sales", f"s{i:06d}", {
+            "invoice_no": f"INV-{i:06d}",
+            "customer_id": cid,
+            "customer_name": "عميل",
+            "status": "done",
+            "active": True,
+            "payment_type": "cash" if cash else "credit",
+            "total": total,
+            "discount": 0.0,
+            "net": total,
+            "amount_paid": paid,
+            "unpaid_debt": max(0.0, total - paid) if cash else 0.0,
+            "extra_credit": 0.0,
+            "seller_username": "seller",
+            "delivered_at": f"2026-03-{1 + i % 28:02d}T10:{i % 60:02d}:00+03:00",
+            "created_at": f"2026-03-{1 + i % 28:02d}T09:{i % 60:02d}:00+03:00",
+            "items": [
+                {"product_id": f"p{k}", "product_name": f"منتج {k}", "qty": 2, "price": 0.5, "total": 1.0}
+                for k in range(n_items)
+            ],
+        })
+    for i in range(n_sales // 3):
+        put("collections", f"col{i:05d}", {
+            "customer_id": CUSTOMER["id"], "amount": 3.0, "status": "posted", "active": True,
+            "created_at": f"2026-03-{1 + i % 28:02d}T12:00:00+03:00",
+        })
+    batch.commit()
+
+
+# ---- السابق (نسخة من الكود قبل التغيير) ----
+def _legacy_sales(customer_id, ptype, limit=300):
+    out = []
+    for d in db.collection("sales").where("customer_id", "==", customer_id).limit(limit).stream():
+        x = d.to_dict() or {}
+        if x.get("active") is not True or x.get("status") not in ["posted", "done"]:
+            continue
+        if x.get("payment_type") != ptype:
+            continue
+        out.append({"id": d.id, **x})
+    return out
+
+
+def _legacy_cols(customer_id, limit=300):
+    out = []
+    for d in db.collection("collections").where("customer_id", "==", customer_id).limit(limit).stream():
+        x = d.to_dict() or {}
+        if x.get("active") is not True or x.get("status") not in ["posted", "done"]:
+            continue
+        out.append({"id": d.id, **x})
+    return out
+
+
+def legacy_statement(customer):
+    opening = to_float(customer.get("opening_balance", 0))
+    sales_credit = _legacy_sales(customer["id"], "credit")
+    sales_cash = _legacy_sales(customer["id"], "cash")
+    cols = _legacy_cols(customer["id"])
+    moves = [{"created_at": customer.get("created_at", ""), "ref": "opening_balance", "delta": float(opening),
+              "net": float(opening), "paid": 0.0, "unpaid": 0.0, "extra": 0.0, "note": "opening"}]
+    for s in sales_credit:
+        net = float(to_float(s.get("net", s.get("total", 0))))
+        moves.append({"created_at": s.get("created_at") or "", "ref": f"SALE:{s.get('id','')}", "delta": +net,
+                      "net": net, "paid": 0.0, "unpaid": net, "extra": 0.0, "note": "credit"})
+    for s in sales_cash:
+        net = float(to_float(s.get("net", s.get("total", 0))))
+        paid = float(to_float(s.get("amount_paid", 0)))
+        unpaid = float(to_float(s.get("unpaid_debt", 0)))
+        extra = float(to_float(s.get("extra_credit", 0)))
+        moves.append({"created_at": s.get("created_at") or "", "ref": f"SALE:{s.get('id','')}",
+                      "delta": float(unpaid) - float(extra), "net": net, "paid": paid, "unpaid": unpaid,
+                      "extra": extra, "note": "cash"})
+    for c in cols:
+        amt = float(to_float(c.get("amount", 0)))
+        moves.append({"created_at": c.get("created_at") or "", "ref": f"COL:{c.get('id','')}", "delta": -amt,
+                      "net": 0.0, "paid": amt, "unpaid": 0.0, "extra": 0.0, "note": "collection"})
+    moves.sort(key=lambda m: m.get("created_at") or "")
+    running = 0.0
+    rows = []
+    for m in moves:
+        running += float(to_float(m.get("delta", 0.0)))
+        rows.append({
+            "date": (m.get("created_at", "") or "")[:19].replace("T", " "),
+            "type": m.get("note", ""),
+            "ref": m.get("ref", ""),
+            "net": round(float(to_float(m.get("net", 0.0))), 3),
+            "paid": round(float(to_float(m.get("paid", 0.0))), 3),
+            "unpaid": round(float(to_float(m.get("unpaid", 0.0))), 3),
+            "extra": round(float(to_float(m.get("extra", 0.0))), 3),
+            "delta": round(float(to_float(m.get("delta", 0.0))), 3),
+            "running": round(float(running), 3),
+        })
+    return rows, running, sales_credit, sales_cash, cols, []
+
+
+def legacy_archive(start_iso, end_iso):
+    q = (
+        db.collection("sales").where("active", "==", True).where("status", "==", "done")
+        .where("delivered_at", ">=", start_iso).where("delivered_at", "<", end_iso)
+        .order_by("delivered_at", direction="DESCENDING").limit(1000)
+    )
+    cnt = 0
+    total = disc = net = paid = unpaid = extra = 0.0
+    for d in q.stream():
+        cnt += 1
+        x = d.to_dict() or {}
+        total += to_float(x.get("total", 0))
+        disc += to_float(x.get("discount", 0))
+        net += to_float(x.get("net", 0))
+        paid += to_float(x.get("amount_paid", 0))
+        unpaid += to_float(x.get("unpaid_debt", 0))
+        extra += to_float(x.get("extra_credit", 0))
+    return {"cnt": cnt, "total": total, "net": net, "paid": paid, "unpaid": unpaid, "extra": extra}
+
+
+def _measure(fn, repeat: int) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    keep = fn()
+    retained = tracemalloc.get_traced_memory()[0] - base
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    del keep
+
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    ms = (time.perf_counter() - t0) * 1000.0 / max(1, repeat)
+    return {"retained_kb": round(retained / 1024, 1), "peak_kb": round(peak / 1024, 1), "ms": round(ms, 2)}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sales", type=int, default=300, help="فواتير العميل في كشف الحساب")
+    ap.add_argument("--archive", type=int, default=1000, help="فواتير الأرشيف في الفترة")
+    ap.add_argument("--items", type=int, default=8, help="أصناف لكل فاتورة")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    seed(args.sales, args.archive, args.items)
+
+    # نفس النتائج قبل القياس
+    old_rows, old_bal, *_ = legacy_statement(CUSTOMER)
+    new_rows, new_bal, *_ = build_statement(CUSTOMER)
+    assert len(old_rows) == len(new_rows) and abs(old_bal - new_bal) < 1e-9
+    old_a, new_a = legacy_archive(START, END), archive_stats(START, END)
+    assert old_a["cnt"] == new_a["cnt"] and abs(old_a["net"] - new_a["net"]) < 1e-6
+
+    result = {"sales": args.sales, "archive": args.archive, "items": args.items}
+    for name, old_fn, new_fn in (
+        ("statement", lambda: legacy_statement(CUSTOMER), lambda: build_statement(CUSTOMER)),
+        ("archive", lambda: legacy_archive(START, END), lambda: archive_stats(START, END)),
+    ):
+        old = _measure(old_fn, args.repeat)
+        new = _measure(new_fn, args.repeat)
+        result[name] = {
+            "dict": old,
+            "model": new,
+            "retained_reduction_x": round(old["retained_kb"] / new["retained_kb"], 1) if new["retained_kb"] else None,
+            "peak_reduction_x": round(old["peak_kb"] / new["peak_kb"], 1) if new["peak_kb"] else None,
+        }
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(f"{args.sales} statement sales, {args.archive} archive sales, {args.items} items each")
+        for name in ("statement", "archive"):
+            r = result[name]
+            print(f"  {name:<10} dict : retained {r['dict']['retained_kb']:>9.1f} KB  peak {r['dict']['peak_kb']:>9.1f} KB  {r['dict']['ms']:>7.2f} ms")
+            print(f"  {name:<10} model: retained {r['model']['retained_kb']:>9.1f} KB  peak {r['model']['peak_kb']:>9.1f} KB  {r['model']['ms']:>7.2f} ms")
+            print(f"  {name:<10} reduction: retained {r['retained_reduction_x']}x  peak {r['peak_reduction_x']}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
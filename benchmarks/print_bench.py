@@ -0,0 +1,191 @@
+"""
+زمن بناء HTML الطباعة لكل فاتورة: بدون cache للأصول (السابق) مقابل print_assets،
+وزمن عرض الصفوف في القوالب المُجمّعة حسب طول الكشف.
+
+    python benchmarks/print_bench.py
+    python benchmarks/print_bench.py --route 80 --repeat 5 --json
+    python benchmarks/print_bench.py --only rows --rows 10 500 5000
+
+السابق: كل build_*_html يقرأ assets/logo.png من القرص ويحوّله base64 ويعيد
+بناء الـ CSS. "cold" يفرّغ الـ cache قبل كل بناء فيعيد نفس العمل بالضبط؛
+"cached" هو المسار الحالي. route = طباعة خط توزيع كامل (N فاتورة متتالية).
+
+rows: كشف/فاتورة/ورقة تحميل بعدد صفوف 10 و500 و5000؛ us/row يجب أن يبقى ثابتاً
+تقريباً مع زيادة الصفوف (عرض خطي). كشوف الصفحات (عميل كامل/موزّع) تُقاس فقط إذا
+كان streamlit مثبتاً لأن الصفحات تستورده.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.printing import (  # noqa: E402
+    build_customer_statement_html,
+    build_debt_only_invoice_html,
+    build_debt_payment_receipt_html,
+    build_invoice_html,
+    build_receipt_html,
+    build_loading_sheet_html,
+    clear_print_assets,
+)
+
+CUSTOMER = {"id": "c1", "name": "بقالة الأمل", "phone": "0790000000", "balance": 42.5}
+
+
+def _sale(i: int, n_items: int = 8) -> dict:
+    items = [
+        {"product_id": f"p{k}", "product_name": f"خبز عربي {k}", "qty": 3 + k, "price": 0.35, "total": 0.35 * (3 + k)}
+        for k in range(n_items)
+    ]
+    total = sum(it["total"] for it in items)
+    return {
+        "id": f"s{i}", "invoice_no": f"INV-2026-{i:06d}", "customer_id": "c1", "customer_name": CUSTOMER["name"],
+        "payment_type": "cash", "status": "done", "active": True,
+        "total": total, "discount": 0.0, "net": total, "amount_paid": total - 1.0, "unpaid_debt": 1.0,
+        "created_at": "2026-03-01T08:00:00+03:00", "delivered_at": f"2026-03-01T09:{i % 60:02d}:00+03:00",
+        "items": items,
+    }
+
+
+BUILDERS = {
+    "invoice": lambda i, paper: build_invoice_html(_SALES[i % len(_SALES)], CUSTOMER, paper=paper),
+    "receipt": lambda i, paper: build_receipt_html(_SALES[i % len(_SALES)], CUSTOMER, paper=paper),
+    "debt_only": lambda i, paper: build_debt_only_invoice_html(CUSTOMER, paper=paper),
+    "statement": lambda i, paper: build_customer_statement_html(CUSTOMER, _SALES, paper=paper),
+    "debt_receipt": lambda i, paper: build_debt_payment_receipt_html(CUSTOMER, 10.0, 32.5, paper=paper),
+}
+_SALES = [_sale(i) for i in range(30)]
+
+
+def _statement_rows(n: int) -> list:
+    return [
+        {"التاريخ": f"2026-03-{1 + i % 28:02d} 09:00:00", "النوع": "فاتورة ذمم", "المرجع": f"INV-2026-{i:06d}",
+         "الصافي": 12.5, "المدفوع": 0.0, "متبقي ذمم": 12.5, "زيادة كرصد": 0.0, "أثر على الرصيد": 12.5,
+         "الرصيد بعد العملية": 12.5 * (i + 1)}
+        for i in range(n)
+    ]
+
+
+def _crate_rows(n: int) -> list:
+    return [
+        {"التاريخ": f"2026-03-{1 + i % 28:02d} 09:00:00", "النوع": "تسليم صناديق", "الكمية": 4, "أثر": 4,
+         "الرصيد": 4 * (i + 1), "المبلغ": 28.0}
+        for i in range(n)
+    ]
+
+
+def _row_builders() -> dict:
+    """
+    name -> (setup(n) خارج القياس, build(data, paper)).
+    """
+    builders = {
+        "statement": (
+            lambda n: [_sale(i, 1) for i in range(n)],
+            lambda sales, paper: build_customer_statement_html(CUSTOMER, sales, paper=paper, max_rows=len(sales)),
+        ),
+        "invoice_items": (
+            lambda n: _sale(0, n),
+            lambda sale, paper: build_invoice_html(sale, CUSTOMER, paper=paper),
+        ),
+        "loading_sheet": (
+            lambda n: {"distributor_name": "موزّع 1", "date": "2026-03-01", "orders_count": n, "total_qty": 5 * n,
+                       "rows": [{"product_name": f"خبز عربي {i}", "qty": 5, "crate_units": 5, "diff": 0, "status": "مطابق"}
+                                for i in range(n)]},
+            lambda sheet, paper: build_loading_sheet_html(sheet, paper=paper),
+        ),
+    }
+    try:
+        from pages.customers_page import build_customer_full_statement_html
+        from pages.distributors_page import build_distributor_statement_html
+    except ImportError:
+        return builders
+    builders["customer_full_statement"] = (
+        _statement_rows,
+        lambda rows, paper: build_customer_full_statement_html(CUSTOMER, rows, 42.5, paper=paper, max_rows=len(rows)),
+    )
+    builders["distributor_statement"] = (
+        _crate_rows,
+        lambda rows, paper: build_distributor_statement_html({"id": "d1", "name": "موزّع 1"}, rows, 4 * len(rows),
+                                                             paper=paper, max_rows=len(rows)),
+    )
+    return builders
+
+
+def _time_rows(setup, build, n: int, paper: str, repeat: int) -> float:
+    data = setup(n)
+    build(data, paper)
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        build(data, paper)
+        ms = (time.perf_counter() - t0) * 1000.0
+        best = ms if best is None else min(best, ms)
+    return best
+
+
+def _time_route(builder, n: int, paper: str, cold: bool) -> float:
+    clear_print_assets()
+    t0 = time.perf_counter()
+    for i in range(n):
+        if cold:
+            clear_print_assets()
+        builder(i, paper)
+    return (time.perf_counter() - t0) * 1000.0 / n
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--route", type=int, default=60, help="عدد الفواتير في الخط")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--rows", type=int, nargs="*", default=[10, 500, 5000], help="أطوال الكشوف")
+    ap.add_argument("--only", choices=["route", "rows"], default=None)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    result = {"route": args.route, "repeat": args.repeat, "builders": {}, "rows": {}}
+    for name, builder in BUILDERS.items():
+        if args.only == "rows":
+            break
+        for paper in ("80mm", "a4"):
+            cold = min(_time_route(builder, args.route, paper, True) for _ in range(args.repeat))
+            warm = min(_time_route(builder, args.route, paper, False) for _ in range(args.repeat))
+            result["builders"][f"{name}/{paper}"] = {
+                "cold_ms_per_doc": round(cold, 4),
+                "cached_ms_per_doc": round(warm, 4),
+                "speedup_x": round(cold / warm, 1) if warm else None,
+            }
+
+    if args.only != "route":
+        for name, (setup, build) in _row_builders().items():
+            for paper in ("80mm", "a4"):
+                per_size = {}
+                for n in args.rows:
+                    ms = _time_rows(setup, build, n, paper, args.repeat)
+                    per_size[str(n)] = {"ms": round(ms, 3), "us_per_row": round(ms * 1000.0 / max(1, n), 2)}
+                result["rows"][f"{name}/{paper}"] = per_size
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+
+    if result["builders"]:
+        print(f"route of {args.route} documents, best of {args.repeat}")
+        print(f"  {'builder':<20}{'cold ms/doc':>13}{'cached ms/doc':>15}{'speedup':>9}")
+        for name, r in result["builders"].items():
+            print(f"  {name:<20}{r['cold_ms_per_doc']:>13.4f}{r['cached_ms_per_doc']:>15.4f}{r['speedup_x']:>8}x")
+    if result["rows"]:
+        if result["builders"]:
+            print()
+        print(f"rows per document, best of {args.repeat} (ms / us per row)")
+        print(f"  {'builder':<34}" + "".join(f"{n:>22}" for n in args.rows))
+        for name, per_size in result["rows"].items():
+            cells = "".join(f"{r['ms']:>12.3f} /{r['us_per_row']:>8.2f}" for r in per_size.values())
+            print(f"  {name:<34}{cells}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+زمن البحث في العملاء: المسح الخطي (السابق) مقابل فهرس services.search_index.
+
+    python benchmarks/search_bench.py
+    python benchmarks/search_bench.py --customers 10000 --repeat 2000 --json
+
+السابق: كل rerun يمر على كل العملاء بـ `q in name.lower()` (ولا يجد "اسامه" في
+"أسامة"). الحالي: trigram/prefix postings مبنية مرة لكل نسخة كتالوج.
+"found" = عدد النتائج (حتى limit)؛ المسح الخطي لا يطابق اختلاف الإملاء.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.search_index import SearchIndex, KIND_FIELDS  # noqa: E402
+
+FIRST = ["أسامة", "إبراهيم", "عائشة", "مصطفى", "هدى", "يحيى", "سلمى", "مؤمن", "آمنة", "عبدالله", "محمد", "أحمد"]
+LAST = ["الخطيب", "المصري", "النجار", "الحسيني", "العلي", "بقالة الأمل", "سوبرماركت النور"]
+QUERIES = ["اسامه", "أسامة الخط", "0791234567", "+962 79 123 4567", "منطقه 3 هدي", "ع", "مو", "الخطيب 12", "xyz"]
+
+
+def customers(n: int) -> list:
+    rnd = random.Random(1)
+    rows = [
+        {"id": f"c{i:05d}", "name": f"{rnd.choice(FIRST)} {rnd.choice(LAST)} {i}",
+         "phone": f"07{rnd.randint(70000000, 99999999)}", "area": f"منطقة {i % 25}"}
+        for i in range(n)
+    ]
+    rows[5].update({"name": "أُسَامَةُ الخطيب", "phone": "0791234567"})
+    return rows
+
+
+def linear(rows: list, q: str, limit: int) -> list:
+    qq = q.strip().lower()
+    out = []
+    for c in rows:
+        if qq in (c.get("name", "") + " " + c.get("phone", "") + " " + c.get("area", "")).lower():
+            out.append(c["id"])
+            if len(out) >= limit:
+                break
+    return out
+
+
+def _us(fn, repeat: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) * 1e6 / repeat
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--customers", type=int, default=10000)
+    ap.add_argument("--repeat", type=int, default=500)
+    ap.add_argument("--limit", type=int, default=50)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    rows = customers(args.customers)
+    t0 = time.perf_counter()
+    idx = SearchIndex(rows, KIND_FIELDS["customers"])
+    build_ms = (time.perf_counter() - t0) * 1000.0
+
+    result = {"customers": args.customers, "build_ms": round(build_ms, 1), "queries": {}}
+    for q in QUERIES:
+        result["queries"][q] = {
+            "linear_us": round(_us(lambda: linear(rows, q, args.limit), max(1, args.repeat // 20)), 1),
+            "index_us": round(_us(lambda: idx.search(q, args.limit), args.repeat), 1),
+            "linear_found": len(linear(rows, q, args.limit)),
+            "index_found": len(idx.search(q, args.limit)),
+        }
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"{args.customers} customers, index build {build_ms:.0f} ms, limit {args.limit}")
+    print(f"  {'query':<20}{'linear us':>12}{'index us':>11}{'found lin/idx':>16}")
+    for q, r in result["queries"].items():
+        found = f"{r['linear_found']}/{r['index_found']}"
+        print(f"  {q:<20}{r['linear_us']:>12.1f}{r['index_us']:>11.1f}{found:>16}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+قياس زمن أول ظهور لشاشة الدخول (cold start).
+
+كل تشغيل في عملية Python جديدة حتى تكون الاستيرادات باردة فعلاً:
+    python benchmarks/startup_bench.py --runs 5
+    python benchmarks/startup_bench.py --runs 5 --json
+
+يقيس:
+  - import_ms : استيراد app.py وما يحتاجه (بدون تشغيل)
+  - paint_ms  : AppTest.run() حتى يظهر عنوان "تسجيل الدخول"
+ويتحقق أن firebase_admin و pandas لم تُستورد قبل شاشة الدخول.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t_lib = time.perf_counter()
+
+at = AppTest.from_file("app.py", default_timeout=60)
+at.run()
+t_paint = time.perf_counter()
+
+titles = [t.value for t in at.title]
+print(json.dumps({
+    "streamlit_import_ms": (t_lib - t0) * 1000.0,
+    "paint_ms": (t_paint - t_lib) * 1000.0,
+    "login_rendered": "تسجيل الدخول" in titles,
+    "exception": [str(e.value) for e in at.exception],
+    "firebase_admin_loaded": "firebase_admin" in sys.modules,
+    "pandas_loaded": "pandas" in sys.modules,
+    "pages_loaded": sorted(m for m in sys.modules if m.startswith("pages.")),
+}))
+"""
+
+
+def _run_once(env) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--json", action="store_true", help="اطبع النتيجة JSON فقط")
+    args = ap.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault("PYTHONDONTWRITEBYTECODE", "1")
+
+    runs = [_run_once(env) for _ in range(max(1, args.runs))]
+    paint = [r["paint_ms"] for r in runs]
+
+    result = {
+        "runs": len(runs),
+        "paint_ms_median": statistics.median(paint),
+        "paint_ms_min": min(paint),
+        "paint_ms_max": max(paint),
+        "streamlit_import_ms_median": statistics.median(r["streamlit_import_ms"] for r in runs),
+        "login_rendered": all(r["login_rendered"] for r in runs),
+        "firebase_admin_loaded_before_login": any(r["firebase_admin_loaded"] for r in runs),
+        "pandas_loaded_before_login": any(r["pandas_loaded"] for r in runs),
+        "pages_loaded": runs[-1]["pages_loaded"],
+        "exceptions": runs[-1]["exception"],
+    }
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(f"login first paint: median {result['paint_ms_median']:.0f} ms "
+              f"(min {result['paint_ms_min']:.0f} / max {result['paint_ms_max']:.0f}) over {result['runs']} runs")
+        print(f"streamlit import:  median {result['streamlit_import_ms_median']:.0f} ms")
+        print(f"login rendered: {result['login_rendered']}")
+        print(f"firebase_admin loaded before login: {result['firebase_admin_loaded_before_login']}")
+        print(f"pandas loaded before login: {result['pandas_loaded_before_login']}")
+        print(f"page modules loaded: {', '.join(result['pages_loaded']) or '-'}")
+        if result["exceptions"]:
+            print(f"exceptions: {result['exceptions']}")
+
+    ok = result["login_rendered"] and not result["firebase_admin_loaded_before_login"]
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+import streamlit as st
+
+from services.firestore_metrics import background_metrics
+
+
+def render_firestore_debug_panel(record: dict):
+    """
+    لوحة المدير: تكلفة هذا الـ rerun على Firestore (قراءات / كتابات / زمن) لكل موضع استعلام.
+    """
+    if not record:
+        return
+
+    with st.expander(
+        f"🛠️ Firestore: {record['reads']} قراءة · {record['writes']} كتابة · {record['firestore_ms']:.0f} ms",
+        expanded=False,
+    ):
+        c1, c2, c3, c4, c5 = st.columns(5)
+        c1.metric("قراءات", record["reads"])
+        c2.metric("كتابات", record["writes"])
+        c3.metric("استعلامات", record["queries"])
+        c4.metric("إعادة transaction", record["tx_retries"])
+        c5.metric("زمن Firestore", f"{record['firestore_ms']:.0f} ms")
+        st.caption(f"زمن الصفحة كاملة: {record['wall_ms']:.0f} ms — استعلام بدون نتائج يُحسب قراءة واحدة")
+
+        sites = record.get("sites") or {}
+        if sites:
+            st.dataframe(
+                [
+                    {
+                        "الموضع": site,
+                        "مرات": x["calls"],
+                        "قراءات": x["reads"],
+                        "كتابات": x["writes"],
+                        "ms": x["ms"],
+                    }
+                    for site, x in sites.items()
+                ],
+                use_container_width=True,
+                hide_index=True,
+            )
+
+        bg = background_metrics()
+        if bg.reads or bg.writes:
+            st.caption(f"بالخلفية (تحديث الكاش) منذ تشغيل السيرفر: {bg.reads} قراءة · {bg.writes} كتابة")
@@ -0,0 +1,623 @@
+"""
+طباعة حرارية مباشرة (ESC/POS) بدون المتصفح و window.print().
+
+نفس بيانات الطباعة في components/printing (invoice_model / receipt_model /
+statement_model) تتحول إلى bytes جاهزة للطابعة:
+
+    data = render_invoice_escpos(sale, customer)                 # نص بصفحة الترميز 864
+    data = render_invoice_escpos(sale, customer, mode="raster")  # صورة نقطية (طابعة بدون عربي)
+    send_to_printer(data, "192.168.1.50")                        # منفذ 9100 (RAW)
+
+- text: الحروف العربية تُشكَّل (أشكال العرض FExx) وتُرتَّب للعرض من اليمين ثم
+  تُرمَّز بـ cp864 — أسرع وأصغر، لكن يحتاج طابعة تدعم صفحة الترميز العربية.
+- raster: نفس السطور المشكَّلة تُرسم بخط TTF (Pillow) وتُرسل GS v 0؛ الخط من
+  BAWADI_ESCPOS_FONT أو خطوط النظام المعروفة.
+- الشعار يُحوَّل نقطياً مرة واحدة لكل نسخة ملف وعرض ورق (مثل print_assets).
+- الناتج حتمي لنفس البيانات (وقت الطباعة يُمرَّر صراحة) فيُقارن بملفات golden
+  (tools/escpos_golden.py).
+"""
+import os
+import re
+import socket
+import threading
+import unicodedata
+from functools import lru_cache
+
+from components.printing import _LOGO_PATH, _logo_mtime, invoice_model, receipt_model, statement_model
+
+ESC = b"\x1b"
+GS = b"\x1d"
+
+_INIT = ESC + b"@"
+_ALIGN = {"left": ESC + b"a\x00", "center": ESC + b"a\x01", "right": ESC + b"a\x02"}
+_BOLD = {False: ESC + b"E\x00", True: ESC + b"E\x01"}
+_SIZE = {"normal": GS + b"!\x00", "bold": GS + b"!\x00", "grand": GS + b"!\x01", "title": GS + b"!\x11"}
+_CUT = GS + b"V\x42\x03"  # تغذية 3 أسطر ثم قص جزئي
+
+# عدد الأحرف (Font A) وعرض النقاط لكل مقاس ورق
+PAPER_COLS = {"80mm": 48, "58mm": 32}
+PAPER_DOTS = {"80mm": 576, "58mm": 384}
+
+# ESC t n لصفحة PC864 (Epson وأغلب الطابعات المتوافقة)؛ يختلف في بعض الموديلات
+DEFAULT_CODEPAGE = int(os.environ.get("BAWADI_ESCPOS_CODEPAGE") or 37)
+DEFAULT_PORT = 9100
+
+_FONT_CANDIDATES = (
+    "/usr/share/fonts/truetype/noto/NotoSansArabic-Regular.ttf",
+    "/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/system/fonts/NotoNaskhArabic-Regular.ttf",
+    "/system/fonts/NotoSansArabic-Regular.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+)
+
+
+# ---------------------------
+# Arabic shaping + RTL
+# ---------------------------
+# أشكال العرض (معزول، نهائي، ابتدائي، وسطي) متتالية من U+FE80 بترتيب الحروف؛
+# الحروف التي لا تتصل بما بعدها لها شكلان فقط، والهمزة شكل واحد.
+_LETTERS = "ءآأؤإئابةتثجحخدذرزسشصضطظعغفقكلمنهوىي"
+_FORM_COUNTS = (1, 2, 2, 2, 2, 4, 2, 4, 2, 4, 4, 4, 4, 4, 2, 2, 2, 2, 4, 4, 4, 4, 4, 4, 4, 4,
+                4, 4, 4, 4, 4, 4, 4, 2, 2, 4)
+
+_FORMS = {}
+_cp = 0xFE80
+for _ch, _n in zip(_LETTERS, _FORM_COUNTS):
+    _FORMS[_ch] = tuple(chr(_cp + k) for k in range(_n)) + (None,) * (4 - _n)
+    _cp += _n
+_FORMS["ـ"] = ("ـ",) * 4  # التطويل يتصل من الجهتين
+
+# لام + ألف -> رباط واحد (معزول، نهائي)
+_LAM_ALEF = {"آ": ("ﻵ", "ﻶ"), "أ": ("ﻷ", "ﻸ"), "إ": ("ﻹ", "ﻺ"), "ا": ("ﻻ", "ﻼ")}
+
+_DROP_CATEGORIES = ("Mn", "Me", "Cf", "So", "Cs", "Co")
+
+
+def _joins_back(forms) -> bool:
+    return forms is not None and forms[1] is not None
+
+
+def _joins_forward(forms) -> bool:
+    return forms is not None and forms[2] is not None
+
+
+def shape_arabic(text: str) -> str:
+    """
+    حروف عربية منطقية -> أشكال العرض المتصلة (بدون تشكيل/رموز تعبيرية).
+    """
+    chars = [c for c in str(text or "") if unicodedata.category(c) not in _DROP_CATEGORIES]
+    units = []
+    i = 0
+    while i < len(chars):
+        c = chars[i]
+        if c == "ل" and i + 1 < len(chars) and chars[i + 1] in _LAM_ALEF:
+            iso, fin = _LAM_ALEF[chars[i + 1]]
+            units.append((iso, (iso, fin, None, None)))
+            i += 2
+            continue
+        units.append((c, _FORMS.get(c)))
+        i += 1
+
+    out = []
+    for i, (c, forms) in enumerate(units):
+        if forms is None:
+            out.append(c)
+            continue
+        prev = i > 0 and _joins_forward(units[i - 1][1]) and _joins_back(forms)
+        nxt = i + 1 < len(units) and _joins_forward(forms) and _joins_back(units[i + 1][1])
+        if prev and nxt:
+            out.append(forms[3])
+        elif prev:
+            out.append(forms[1])
+        elif nxt:
+            out.append(forms[2])
+        else:
+            out.append(forms[0])
+    return "".join(out)
+
+
+_LTR_RUN = re.compile(r"-?[0-9٠-٩A-Za-z](?:[0-9٠-٩A-Za-z.,:/_%+\-]*[0-9٠-٩A-Za-z%])?")
+_MIRROR = str.maketrans("()[]{}<>", ")(][}{><")
+
+
+def _is_rtl(c: str) -> bool:
+    return "\u0600" <= c <= "\u06ff" or "\ufb50" <= c <= "\ufeff"
+
+
+def visual(text: str) -> str:
+    """
+    سطر منطقي -> ترتيب العرض من اليسار لليمين (الطابعة لا تعرف RTL).
+    الأرقام والنص اللاتيني يبقيان بترتيبهما داخل السطر العربي.
+    """
+    shaped = shape_arabic(text)
+    if not any(_is_rtl(c) for c in shaped):
+        return shaped
+    runs = []
+    pos = 0
+    for m in _LTR_RUN.finditer(shaped):
+        if m.start() > pos:
+            runs.append(shaped[pos:m.start()][::-1].translate(_MIRROR))
+        runs.append(m.group())
+        pos = m.end()
+    if pos < len(shaped):
+        runs.append(shaped[pos:][::-1].translate(_MIRROR))
+    return "".join(reversed(runs))
+
+
+# ---------------------------
+# Code page 864
+# ---------------------------
+# cp864 لا يحوي كل الأشكال: النهائي -> المعزول، الوسطي -> الابتدائي -> المعزول
+_FALLBACK = {}
+for _forms in list(_FORMS.values()) + [(a, b, None, None) for a, b in _LAM_ALEF.values()]:
+    iso, fin, ini, med = _forms
+    if fin:
+        _FALLBACK[fin] = (iso,)
+    if ini:
+        _FALLBACK[ini] = (iso,)
+    if med:
+        _FALLBACK[med] = (ini, iso)
+_FALLBACK["ﻹ"] = ("ﻻ",)
+_FALLBACK["ﻺ"] = ("ﻼ", "ﻻ")
+# حروف بلا أي شكل في cp864: أقرب حرف مقروء
+_FALLBACK["ﺇ"] = _FALLBACK["ﺈ"] = ("ﺍ",)
+_FALLBACK["ﺉ"] = _FALLBACK["ﺊ"] = ("ﻯ",)
+# ترقيم خارج cp864
+_FALLBACK.update({"—": ("-",), "–": ("-",), "…": ("...",), "•": ("*",), "%": ("٪",)})
+
+
+@lru_cache(maxsize=4096)
+def _encode_char(c: str) -> bytes:
+    for cand in (c,) + _FALLBACK.get(c, ()):
+        try:
+            return cand.encode("cp864")
+        except UnicodeEncodeError:
+            continue
+    return b"?"
+
+
+def encode_cp864(line: str) -> bytes:
+    return b"".join(_encode_char(c) for c in line)
+
+
+# ---------------------------
+# Layout (ops)
+# ---------------------------
+# ops مشتركة بين text و raster:
+#   ("logo",) / ("rule",) / ("feed", n)
+#   ("text", text, align, style)          align: center/right
+#   ("row", label, value, style)          label يمين، value يسار
+#   ("table", header, rows, widths)       الخلية الأولى في أقصى اليمين؛ header بخط عريض
+# style: normal / bold / grand / title
+_ITEM_WIDTHS = (0.44, 0.12, 0.2, 0.24)
+_STATEMENT_WIDTHS = (0.22, 0.3, 0.12, 0.18, 0.18)
+
+
+def _style(bold: bool, grand: bool) -> str:
+    return "grand" if grand else ("bold" if bold else "normal")
+
+
+def _header_ops(company_name: str, badge: str, logo: bool) -> list:
+    ops = [("logo",)] if logo else []
+    ops += [("text", company_name, "center", "title"), ("text", badge, "center", "bold"), ("rule",)]
+    return ops
+
+
+def _line_ops(lines) -> list:
+    return [("row", label, str(value), _style(bold, grand)) for label, value, bold, grand in lines]
+
+
+def _invoice_ops(m: dict, company_name: str, logo: bool) -> list:
+    ops = _header_ops(company_name, m["badge"], logo)
+    ops += _line_ops(m["info"])
+    ops.append(("rule",))
+    rows = [(r["name"], str(r["qty"]), r["price"], r["total"]) for r in m["items"]]
+    ops.append(("table", ("الصنف", "كمية", "سعر", "الإجمالي"), rows, _ITEM_WIDTHS))
+    ops.append(("rule",))
+    ops += _line_ops(m["totals"])
+    ops += _line_ops(m["payments"])
+    ops += [("rule",), ("text", m["footer"], "center", "normal")]
+    return ops
+
+
+def _receipt_ops(m: dict, company_name: str, logo: bool) -> list:
+    ops = _header_ops(company_name, m["badge"], logo)
+    ops += _line_ops(m["info"])
+    ops.append(("rule",))
+    ops += _line_ops(m["amounts"])
+    ops += [("rule",), ("text", m["footer"], "center", "normal")]
+    return ops
+
+
+def _statement_ops(m: dict, company_name: str, logo: bool) -> list:
+    ops = _header_ops(company_name, m["badge"], logo)
+    ops += _line_ops(m["info"])
+    ops.append(("rule",))
+    rows = [(r["dt"][:10], r["inv"], r["ptype"], r["net"], r["delta"]) for r in m["rows"]]
+    ops.append(("table", ("تاريخ", "رقم", "نوع", "الصافي", "أثر"), rows, _STATEMENT_WIDTHS))
+    if not rows:
+        ops.append(("text", "لا توجد حركات لعرضها.", "center", "normal"))
+    ops += [("rule",), ("text", m["note"], "right", "normal")]
+    return ops
+
+
+# ---------------------------
+# Text encoder (code page)
+# ---------------------------
+def _fit(text: str, width: int) -> str:
+    """
+    قص منطقي (من نهاية النص) ثم ترتيب العرض؛ لا يُقص منتصف كلمة مشكّلة بشكل خاطئ.
+    """
+    v = visual(text)
+    t = str(text or "")
+    while len(v) > width and t:
+        t = t[:-1]
+        v = visual(t)
+    return v
+
+
+def _wrap(text: str, width: int) -> list:
+    """
+    التفاف على الكلمات (منطقياً) ثم ترتيب العرض لكل سطر.
+    """
+    lines, cur = [], ""
+    for word in str(text or "").split():
+        cand = f"{cur} {word}" if cur else word
+        if cur and len(visual(cand)) > width:
+            lines.append(cur)
+            cur = word
+        else:
+            cur = cand
+    if cur or not lines:
+        lines.append(cur)
+    return [_fit(ln, width) for ln in lines]
+
+
+def _table_sizes(header, rows, widths, cols: int) -> list:
+    """
+    عرض كل عمود بالأحرف لكل الجدول (نفس المحاذاة لكل الصفوف): الأعمدة الأخرى
+    تأخذ حصتها أو أطول قيمة فيها (التاريخ والأرقام لا تُقص)، وعمود النص
+    الأعرض يأخذ الباقي ويُقص هو فقط.
+    """
+    text_col = widths.index(max(widths))
+    sizes = []
+    for i, w in enumerate(widths):
+        if i == text_col:
+            sizes.append(0)
+            continue
+        longest = max(len(visual(r[i])) for r in (header, *rows))
+        sizes.append(max(int(cols * w), longest + 1))
+    sizes[text_col] = max(1, cols - sum(sizes))
+    return sizes
+
+
+def _cols_line(cells, sizes) -> str:
+    parts = []
+    for cell, size in zip(cells, sizes):
+        v = _fit(cell, size - 1)
+        parts.append(" " * (size - len(v)) + v)
+    # الخلية الأولى (المنطقية) في أقصى اليمين
+    return "".join(reversed(parts))
+
+
+def _text_lines(op, cols: int) -> list:
+    kind = op[0]
+    if kind == "rule":
+        return ["-" * cols]
+    if kind == "text":
+        _, text, align, style = op
+        width = cols // 2 if style == "title" else cols
+        return [v if align == "center" else " " * (width - len(v)) + v for v in _wrap(text, width)]
+    if kind == "row":
+        _, label, value, style = op
+        vl, vv = visual(label), visual(value)
+        if len(vl) + len(vv) + 1 <= cols:
+            return [vv + " " * (cols - len(vl) - len(vv)) + vl]
+        vv = _fit(value, cols)
+        return [" " * (cols - len(vl)) + vl if len(vl) <= cols else _fit(label, cols), " " * (cols - len(vv)) + vv]
+    if kind == "table":
+        _, header, rows, widths = op
+        sizes = _table_sizes(header, rows, widths, cols)
+        return [_cols_line(header, sizes)] + [_cols_line(r, sizes) for r in rows]
+    return []
+
+
+def _encode_text(ops, paper: str, codepage: int, logo_bytes: bytes) -> bytes:
+    cols = PAPER_COLS.get(paper, PAPER_COLS["80mm"])
+    out = [_INIT, ESC + b"t" + bytes([codepage & 0xFF])]
+    for op in ops:
+        kind = op[0]
+        if kind == "logo":
+            if logo_bytes:
+                out += [_ALIGN["left"], logo_bytes]
+            continue
+        if kind == "feed":
+            out.append(ESC + b"d" + bytes([op[1] & 0xFF]))
+            continue
+        if kind == "table":
+            lines = _text_lines(op, cols)
+            out += [_ALIGN["left"], _SIZE["normal"], _BOLD[True], encode_cp864(lines[0]), b"\n", _BOLD[False]]
+            for line in lines[1:]:
+                out += [encode_cp864(line), b"\n"]
+            continue
+        style = op[-1] if kind in ("text", "row") else "normal"
+        align = "center" if kind == "text" and op[2] == "center" else "left"
+        out += [_ALIGN[align], _SIZE[style], _BOLD[style != "normal"]]
+        for line in _text_lines(op, cols):
+            out += [encode_cp864(line), b"\n"]
+    out += [_SIZE["normal"], _BOLD[False], _ALIGN["left"]]
+    return b"".join(out)
+
+
+# ---------------------------
+# Raster (Pillow)
+# ---------------------------
+_INVERT = bytes(255 - i for i in range(256))
+_BAND_ROWS = 256
+
+
+def _pil():
+    try:
+        from PIL import Image, ImageDraw, ImageFont
+    except ImportError:
+        return None
+    return Image, ImageDraw, ImageFont
+
+
+def _font_path() -> str:
+    env = (os.environ.get("BAWADI_ESCPOS_FONT") or "").strip()
+    if env:
+        return env if os.path.exists(env) else ""
+    for p in _FONT_CANDIDATES:
+        if os.path.exists(p):
+            return p
+    return ""
+
+
+@lru_cache(maxsize=16)
+def _font(path: str, size: int):
+    _, _, ImageFont = _pil()
+    # BASIC: النص مشكّل ومرتّب مسبقاً؛ raqm كان سيعيد ترتيبه
+    basic = ImageFont.Layout.BASIC if hasattr(ImageFont, "Layout") else ImageFont.LAYOUT_BASIC
+    return ImageFont.truetype(path, size, layout_engine=basic)
+
+
+def raster_available() -> bool:
+    return _pil() is not None and bool(_font_path())
+
+
+def _gs_v0(img) -> bytes:
+    """
+    صورة mode "1" -> أوامر GS v 0 على شرائح (بعض الطابعات تحدّ ارتفاع الأمر الواحد).
+    """
+    width_bytes = (img.width + 7) // 8
+    out = []
+    for top in range(0, img.height, _BAND_ROWS):
+        band = img.crop((0, top, width_bytes * 8, min(img.height, top + _BAND_ROWS)))
+        data = band.tobytes().translate(_INVERT)  # في PIL: 1 = أبيض؛ في ESC/POS: 1 = نقطة سوداء
+        h = band.height
+        out.append(GS + b"v0\x00" + bytes([width_bytes & 0xFF, width_bytes >> 8, h & 0xFF, h >> 8]) + data)
+    return b"".join(out)
+
+
+def _expand_tables(ops):
+    """
+    في raster تُقاس الأعمدة بالنقاط حسب النسب، فيُرسم الجدول سطراً سطراً.
+    """
+    for op in ops:
+        if op[0] != "table":
+            yield op
+            continue
+        _, header, rows, widths = op
+        yield ("cols", header, widths, "bold")
+        for r in rows:
+            yield ("cols", r, widths, "normal")
+
+
+def _raster_ops(ops, dots: int, logo_bytes: bytes) -> bytes:
+    Image, ImageDraw, _ = _pil()
+    path = _font_path()
+    scale = dots / 576.0
+    sizes = {"normal": int(22 * scale), "bold": int(22 * scale), "grand": int(28 * scale), "title": int(36 * scale)}
+    pad = max(2, int(6 * scale))
+
+    out = [_INIT]
+    pending = []  # صور سطور لم تُرسل بعد
+
+    def flush():
+        if not pending:
+            return
+        height = sum(im.height for im in pending)
+        page = Image.new("1", (dots, height), 1)
+        y = 0
+        for im in pending:
+            page.paste(im, (0, y))
+            y += im.height
+        out.append(_gs_v0(page))
+        pending.clear()
+
+    def text_width(draw, text, font):
+        return int(draw.textlength(text, font=font))
+
+    for op in _expand_tables(ops):
+        kind = op[0]
+        if kind == "logo":
+            flush()
+            if logo_bytes:
+                out.append(logo_bytes)
+            continue
+        if kind == "feed":
+            pending.append(Image.new("1", (dots, sizes["normal"] * op[1]), 1))
+            continue
+        if kind == "rule":
+            im = Image.new("1", (dots, pad * 2 + 1), 1)
+            d = ImageDraw.Draw(im)
+            for x in range(0, dots, 12):
+                d.line((x, pad, x + 6, pad), fill=0)
+            pending.append(im)
+            continue
+
+        style = op[-1]
+        font = _font(path, sizes[style])
+        stroke = 1 if style != "normal" else 0
+        im = Image.new("1", (dots, sizes[style] + pad * 2), 1)
+        d = ImageDraw.Draw(im)
+
+        def draw_at(x, text):
+            d.text((x, pad // 2), text, font=font, fill=0, stroke_width=stroke, stroke_fill=0)
+
+        if kind == "text":
+            v = visual(op[1])
+            w = text_width(d, v, font)
+            draw_at((dots - w) // 2 if op[2] == "center" else dots - w, v)
+        elif kind == "row":
+            vl, vv = visual(op[1]), visual(op[2])
+            draw_at(dots - text_width(d, vl, font), vl)
+            draw_at(0, vv)
+        elif kind == "cols":
+            right = dots
+            for cell, frac in zip(op[1], op[2]):
+                box = int(dots * frac)
+                t = str(cell or "")
+                v = visual(t)
+                while t and text_width(d, v, font) > box - pad:
+                    t = t[:-1]
+                    v = visual(t)
+                draw_at(right - text_width(d, v, font), v)
+                right -= box
+        pending.append(im)
+
+    flush()
+    return b"".join(out)
+
+
+# ---------------------------
+# Logo raster cache
+# ---------------------------
+_logo_lock = threading.Lock()
+_logo_raster_cache = {}  # (mtime_ns, dots) -> GS v 0 bytes
+
+
+def logo_raster(paper="80mm") -> bytes:
+    """
+    الشعار كصورة نقطية في منتصف عرض الورق؛ يُحسب مرة لكل نسخة ملف ومقاس.
+    بدون Pillow أو ملف الشعار: b"" (الطباعة تكمل بدون شعار).
+    """
+    dots = PAPER_DOTS.get(paper, PAPER_DOTS["80mm"])
+    key = (_logo_mtime(), dots)
+    cached = _logo_raster_cache.get(key)
+    if cached is not None:
+        return cached
+
+    data = b""
+    pil = _pil()
+    if pil is not None and key[0]:
+        Image = pil[0]
+        try:
+            with Image.open(_LOGO_PATH) as src:
+                src = src.convert("RGBA")
+                bg = Image.new("RGBA", src.size, (255, 255, 255, 255))
+                gray = Image.alpha_composite(bg, src).convert("L")
+            max_w = dots // 3
+            if gray.width > max_w:
+                gray = gray.resize((max_w, max(1, gray.height * max_w // gray.width)))
+            canvas = Image.new("L", (dots, gray.height), 255)
+            canvas.paste(gray, ((dots - gray.width) // 2, 0))
+            data = _gs_v0(canvas.convert("1"))
+        except OSError:
+            data = b""
+
+    with _logo_lock:
+        _logo_raster_cache.clear()
+        _logo_raster_cache[key] = data
+    return data
+
+
+def clear_logo_raster():
+    with _logo_lock:
+        _logo_raster_cache.clear()
+
+
+# ---------------------------
+# Public renderers
+# ---------------------------
+def _render(ops, paper="80mm", mode="text", codepage=None, logo=True, cut=True) -> bytes:
+    logo_bytes = logo_raster(paper) if logo else b""
+    ops = list(ops) + [("feed", 2)]
+    if mode == "raster":
+        if not raster_available():
+            raise ValueError("الطباعة النقطية تحتاج Pillow وخط TTF عربي (BAWADI_ESCPOS_FONT)")
+        body = _raster_ops(ops, PAPER_DOTS.get(paper, PAPER_DOTS["80mm"]), logo_bytes)
+    else:
+        body = _encode_text(ops, paper, DEFAULT_CODEPAGE if codepage is None else int(codepage), logo_bytes)
+    return body + (_CUT if cut else b"")
+
+
+def render_invoice_escpos(sale: dict, customer: dict = None, company_name="مخابز البوادي", paper="80mm",
+                          mode="text", codepage=None, logo=True, cut=True) -> bytes:
+    ops = _invoice_ops(invoice_model(sale, customer), company_name, logo)
+    return _render(ops, paper, mode, codepage, logo, cut)
+
+
+def render_receipt_escpos(sale: dict, customer: dict = None, company_name="مخابز البوادي", paper="80mm",
+                          mode="text", codepage=None, logo=True, cut=True) -> bytes:
+    ops = _receipt_ops(receipt_model(sale, customer), company_name, logo)
+    return _render(ops, paper, mode, codepage, logo, cut)
+
+
+def render_statement_escpos(customer: dict, sales: list, company_name="مخابز البوادي", paper="80mm",
+                            max_rows=30, printed_at=None, mode="text", codepage=None, logo=True,
+                            cut=True) -> bytes:
+    m = statement_model(customer, sales, max_rows=max_rows, printed_at=printed_at)
+    return _render(_statement_ops(m, company_name, logo), paper, mode, codepage, logo, cut)
+
+
+# ---------------------------
+# Delivery
+# ---------------------------
+def printer_address():
+    """
+    BAWADI_ESCPOS_PRINTER = "host" أو "host:port" -> (host, port)، أو None إذا غير مضبوط.
+    """
+    raw = (os.environ.get("BAWADI_ESCPOS_PRINTER") or "").strip()
+    if not raw:
+        return None
+    host, _, port = raw.partition(":")
+    return host, int(port or DEFAULT_PORT)
+
+
+def send_to_printer(data: bytes, host: str, port: int = DEFAULT_PORT, timeout: float = 5.0):
+    """
+    إرسال RAW إلى طابعة شبكة (منفذ 9100). يرفع OSError عند فشل الاتصال.
+    """
+    with socket.create_connection((host, int(port)), timeout=timeout) as sock:
+        sock.sendall(data)
+
+
+def show_escpos_actions(data: bytes, file_name: str, key: str):
+    """
+    زر تحميل ملف .bin (تطبيقات الطباعة الحرارية على الجهاز) + إرسال مباشر إن
+    كانت طابعة الشبكة مضبوطة.
+    """
+    import streamlit as st
+
+    addr = printer_address()
+    c1, c2 = st.columns(2)
+    with c1:
+        st.download_button(
+            "⬇️ ملف طابعة حرارية",
+            data=data,
+            file_name=file_name,
+            mime="application/octet-stream",
+            use_container_width=True,
+            key=f"{key}_escpos_dl",
+        )
+    with c2:
+        if addr and st.button("🧾 إرسال للطابعة", use_container_width=True, key=f"{key}_escpos_send"):
+            try:
+                send_to_printer(data, *addr)
+                st.success("تم الإرسال للطابعة")
+            except OSError as e:
+                st.error(f"تعذر الاتصال بالطابعة {addr[0]}:{addr[1]} — {e}")
@@ -0,0 +1,491 @@
+"""
+PDF من الخادم للكشوف والتقارير الطويلة (بدل تخطيط iframe ضخم على الهاتف).
+
+    chunks = iter_table_pdf("كشف حساب عميل", columns, rows, info=[("العميل:", name)])
+    data = pdf_bytes(("customer_statement", cid, rows_checkpoint(rows), (max_rows,)), lambda: chunks)
+
+- النص العربي يُشكَّل ويُرتَّب للعرض بنفس دوال الطباعة الحرارية (escpos.visual)
+  ثم يُكتب كـ glyph ids لخط TTF مُضمَّن (Type0 / Identity-H): نص متجه قابل
+  للنسخ والبحث، بدون reportlab أو مكتبات تشكيل.
+- الخط من BAWADI_PDF_FONT أو نفس خطوط الطباعة الحرارية؛ جداول الخط (cmap/hmtx)
+  تُقرأ وملف الخط يُضغط مرة واحدة لكل نسخة ملف.
+- iter_table_pdf مولّد: كل صفحة تُكتب وتُسلَّم فور اكتمالها، والخط والفهرس (xref)
+  في النهاية، فلا يُبنى المستند كاملاً في الذاكرة قبل أول byte.
+- cached_pdf / pdf_bytes: PDF كامل لكل مفتاح (نوع، معرّف، checkpoint، نطاق)؛
+  إعادة تحميل كشف لم يتغير لا تعيد البناء. الـ checkpoint بصمة الصفوف نفسها
+  (rows_checkpoint) فأي حركة جديدة أو معدّلة تعطي مفتاحاً جديداً.
+"""
+import hashlib
+import os
+import struct
+import threading
+import unicodedata
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+from components.escpos import _font_path as _escpos_font_path, visual
+
+# A4 بالنقاط (1/72 بوصة)
+PAGE_W, PAGE_H = 595.28, 841.89
+_MARGIN = 36.0
+_FONT_SIZE = 9.0
+_ROW_H = 15.0
+_TITLE_SIZE = 15.0
+
+PDF_CACHE_MAX_BYTES = int(float(os.environ.get("BAWADI_PDF_CACHE_MB") or 64) * 1024 * 1024)
+
+
+# ---------------------------
+# TrueType (cmap / hmtx فقط)
+# ---------------------------
+class _TrueType:
+    """
+    ما يلزم لتضمين خط TTF كاملاً: خريطة الحروف، عروض الـ glyphs، مقاييس الواصف،
+    وملف الخط مضغوطاً (FontFile2).
+    """
+    __slots__ = ("path", "units", "ascent", "descent", "bbox", "cmap", "advances", "font_file", "length1")
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] not in (b"\x00\x01\x00\x00", b"true"):
+            raise ValueError(f"الخط ليس TrueType (glyf): {path}")
+        num_tables = struct.unpack(">H", data[4:6])[0]
+        tables = {}
+        for i in range(num_tables):
+            tag, _, off, length = struct.unpack(">4sIII", data[12 + 16 * i: 28 + 16 * i])
+            tables[tag.decode("latin-1")] = (off, length)
+        for need in ("head", "hhea", "hmtx", "maxp", "cmap", "glyf"):
+            if need not in tables:
+                raise ValueError(f"جدول {need} غير موجود في الخط: {path}")
+
+        head = tables["head"][0]
+        self.units = struct.unpack(">H", data[head + 18: head + 20])[0]
+        self.bbox = struct.unpack(">hhhh", data[head + 36: head + 44])
+        hhea = tables["hhea"][0]
+        self.ascent, self.descent = struct.unpack(">hh", data[hhea + 4: hhea + 8])
+        n_metrics = struct.unpack(">H", data[hhea + 34: hhea + 36])[0]
+        n_glyphs = struct.unpack(">H", data[tables["maxp"][0] + 4: tables["maxp"][0] + 6])[0]
+
+        hmtx = tables["hmtx"][0]
+        adv = list(struct.unpack(f">{n_metrics * 2}H", data[hmtx: hmtx + 4 * n_metrics])[::2])
+        adv += [adv[-1]] * max(0, n_glyphs - n_metrics)
+        self.advances = adv
+        self.cmap = _read_cmap(data, tables["cmap"][0])
+        self.path = path
+        self.length1 = len(data)
+        self.font_file = zlib.compress(data, 6)
+
+
+def _read_cmap(data: bytes, base: int) -> dict:
+    n = struct.unpack(">H", data[base + 2: base + 4])[0]
+    subtables = {}
+    for i in range(n):
+        pid, eid, off = struct.unpack(">HHI", data[base + 4 + 8 * i: base + 12 + 8 * i])
+        subtables[(pid, eid)] = base + off
+    for key in ((3, 10), (0, 4), (3, 1), (0, 3)):
+        off = subtables.get(key)
+        if off is None:
+            continue
+        fmt = struct.unpack(">H", data[off: off + 2])[0]
+        if fmt == 12:
+            return _cmap_12(data, off)
+        if fmt == 4:
+            return _cmap_4(data, off)
+    raise ValueError("الخط لا يحوي جدول cmap بترميز Unicode")
+
+
+def _cmap_4(data: bytes, off: int) -> dict:
+    seg2 = struct.unpack(">H", data[off + 6: off + 8])[0]
+    seg = seg2 // 2
+    ends = struct.unpack(f">{seg}H", data[off + 14: off + 14 + seg2])
+    starts = struct.unpack(f">{seg}H", data[off + 16 + seg2: off + 16 + 2 * seg2])
+    deltas = struct.unpack(f">{seg}h", data[off + 16 + 2 * seg2: off + 16 + 3 * seg2])
+    ro_base = off + 16 + 3 * seg2
+    ranges = struct.unpack(f">{seg}H", data[ro_base: ro_base + seg2])
+    out = {}
+    for i in range(seg):
+        for c in range(starts[i], ends[i] + 1):
+            if c == 0xFFFF:
+                continue
+            if ranges[i] == 0:
+                gid = (c + deltas[i]) & 0xFFFF
+            else:
+                p = ro_base + 2 * i + ranges[i] + 2 * (c - starts[i])
+                gid = struct.unpack(">H", data[p: p + 2])[0]
+                if gid:
+                    gid = (gid + deltas[i]) & 0xFFFF
+            if gid:
+                out[c] = gid
+    return out
+
+
+def _cmap_12(data: bytes, off: int) -> dict:
+    n = struct.unpack(">I", data[off + 12: off + 16])[0]
+    out = {}
+    for i in range(n):
+        start, end, gid = struct.unpack(">III", data[off + 16 + 12 * i: off + 28 + 12 * i])
+        for c in range(start, end + 1):
+            out[c] = gid + c - start
+    return out
+
+
+def _font_path() -> str:
+    env = (os.environ.get("BAWADI_PDF_FONT") or "").strip()
+    if env:
+        return env if os.path.exists(env) else ""
+    return _escpos_font_path()
+
+
+_font_lock = threading.Lock()
+_font_cache = {}  # (path, mtime_ns) -> _TrueType
+
+
+def pdf_font() -> _TrueType:
+    path = _font_path()
+    if not path:
+        raise ValueError("لا يوجد خط عربي TTF لإنشاء PDF (BAWADI_PDF_FONT)")
+    key = (path, os.stat(path).st_mtime_ns)
+    font = _font_cache.get(key)
+    if font is None:
+        with _font_lock:
+            font = _font_cache.get(key)
+            if font is None:
+                font = _TrueType(path)
+                _font_cache.clear()
+                _font_cache[key] = font
+    return font
+
+
+def pdf_available() -> bool:
+    try:
+        pdf_font()
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+@lru_cache(maxsize=8192)
+def _glyph_run(font: _TrueType, text: str):
+    """
+    نص منطقي -> (glyph ids بترتيب العرض، العرض بوحدات الخط).
+    شكل عرض غير موجود في الخط -> الحرف الأساسي (NFKC) بدل مربع فارغ.
+    """
+    cmap, adv = font.cmap, font.advances
+    gids = []
+    for c in visual(text):
+        gid = cmap.get(ord(c))
+        if gid is None:
+            gids += [cmap.get(ord(b), 0) for b in unicodedata.normalize("NFKC", c)]
+        else:
+            gids.append(gid)
+    return tuple(gids), sum(adv[g] if g < len(adv) else 0 for g in gids)
+
+
+# ---------------------------
+# Page layout
+# ---------------------------
+class _Page:
+    """
+    أوامر content stream لصفحة واحدة؛ الإحداثيات من أعلى الصفحة (y للأسفل).
+    """
+    __slots__ = ("font", "ops", "used")
+
+    def __init__(self, font: _TrueType, used: set):
+        self.font = font
+        self.ops = []
+        self.used = used
+
+    def width(self, text: str, size: float) -> float:
+        return _glyph_run(self.font, str(text or ""))[1] * size / self.font.units
+
+    def fit(self, text: str, size: float, width: float) -> str:
+        t = str(text or "")
+        while t and self.width(t, size) > width:
+            t = t[:-1]
+        return t
+
+    def text(self, x: float, y: float, text: str, size: float = _FONT_SIZE, align: str = "right", bold=False):
+        """
+        x: الحافة اليمنى (right) أو المنتصف (center) أو اليسرى (left).
+        """
+        gids, w = _glyph_run(self.font, str(text or ""))
+        if not gids:
+            return
+        self.used.update(gids)
+        w = w * size / self.font.units
+        if align == "right":
+            x -= w
+        elif align == "center":
+            x -= w / 2
+        mode = b"2 Tr 0.3 w " if bold else b""
+        hexs = "".join(f"{g:04X}" for g in gids).encode("ascii")
+        self.ops.append(b"BT %s/F1 %.2f Tf %.2f %.2f Td <%s> Tj ET" % (mode, size, x, PAGE_H - y, hexs) + (b" 0 Tr" if bold else b""))
+
+    def line(self, x1: float, y: float, x2: float, gray: float = 0.6):
+        self.ops.append(b"%.2f G 0.5 w %.2f %.2f m %.2f %.2f l S 0 G" % (gray, x1, PAGE_H - y, x2, PAGE_H - y))
+
+    def band(self, y: float, h: float, gray: float = 0.94):
+        self.ops.append(b"%.2f g %.2f %.2f %.2f %.2f re f 0 g" % (gray, _MARGIN, PAGE_H - y - h, PAGE_W - 2 * _MARGIN, h))
+
+    def content(self) -> bytes:
+        return b"\n".join(self.ops)
+
+
+def _column_edges(columns) -> list:
+    """
+    (يمين، عرض) لكل عمود؛ العمود الأول في أقصى اليمين.
+    """
+    total = PAGE_W - 2 * _MARGIN
+    right = PAGE_W - _MARGIN
+    out = []
+    for _, frac in columns:
+        w = total * frac
+        out.append((right, w))
+        right -= w
+    return out
+
+
+def _iter_pages(font, title, columns, rows, info, note, company_name, printed_at, used):
+    edges = _column_edges(columns)
+    bottom = PAGE_H - _MARGIN - _ROW_H * 2
+    page_no = 0
+    page = y = None
+
+    def header_row(p, top):
+        p.band(top, _ROW_H, gray=0.86)
+        for (right, w), (head, _) in zip(edges, columns):
+            p.text(right - 3, top + _ROW_H - 4, p.fit(head, _FONT_SIZE, w - 6), bold=True)
+        return top + _ROW_H
+
+    def new_page():
+        nonlocal page_no
+        page_no += 1
+        p = _Page(font, used)
+        top = _MARGIN
+        if page_no == 1:
+            p.text(PAGE_W / 2, top + _TITLE_SIZE, company_name, size=_TITLE_SIZE, align="center", bold=True)
+            top += _TITLE_SIZE + 8
+            p.text(PAGE_W / 2, top + 12, title, size=12, align="center", bold=True)
+            top += 22
+            for label, value in info:
+                p.text(PAGE_W - _MARGIN, top + 11, label, size=10, bold=True)
+                p.text(PAGE_W - _MARGIN - p.width(label, 10) - 8, top + 11, value, size=10)
+                top += 15
+            p.line(_MARGIN, top + 4, PAGE_W - _MARGIN)
+            top += 10
+        else:
+            p.text(PAGE_W - _MARGIN, top + 10, f"{title} — {company_name}", size=9)
+            top += 16
+        return p, header_row(p, top)
+
+    def finish(p):
+        footer = f"صفحة {page_no}" + (f" — {printed_at}" if printed_at else "")
+        p.text(PAGE_W / 2, PAGE_H - _MARGIN / 2, footer, size=8, align="center")
+        return p
+
+    page, y = new_page()
+    n = 0
+    for row in rows:
+        if y + _ROW_H > bottom:
+            yield finish(page)
+            page, y = new_page()
+        if n % 2:
+            page.band(y, _ROW_H)
+        for (right, w), cell in zip(edges, row):
+            page.text(right - 3, y + _ROW_H - 4, page.fit(cell, _FONT_SIZE, w - 6))
+        y += _ROW_H
+        n += 1
+
+    if not n:
+        page.text(PAGE_W / 2, y + _ROW_H, "لا توجد حركات.", align="center")
+        y += _ROW_H * 2
+    page.line(_MARGIN, y + 2, PAGE_W - _MARGIN)
+    if note:
+        if y + _ROW_H * 2 > bottom:
+            yield finish(page)
+            page, y = new_page()
+        page.text(PAGE_W - _MARGIN, y + _ROW_H + 2, note, size=9)
+    yield finish(page)
+
+
+# ---------------------------
+# PDF writer (streaming)
+# ---------------------------
+# أرقام كائنات ثابتة؛ الصفحات تبدأ بعدها
+_CATALOG, _PAGES, _TYPE0, _CIDFONT, _DESCRIPTOR, _FONTFILE, _TOUNICODE = range(1, 8)
+
+
+class _Writer:
+    __slots__ = ("pos", "offsets")
+
+    def __init__(self):
+        self.pos = 0
+        self.offsets = {}
+
+    def emit(self, data: bytes) -> bytes:
+        self.pos += len(data)
+        return data
+
+    def obj(self, num: int, body: bytes) -> bytes:
+        self.offsets[num] = self.pos
+        return self.emit(b"%d 0 obj\n%s\nendobj\n" % (num, body))
+
+    def stream(self, num: int, data: bytes, extra: bytes = b"", compress=True) -> bytes:
+        if compress:
+            data = zlib.compress(data, 6)
+            extra += b" /Filter /FlateDecode"
+        return self.obj(num, b"<< /Length %d%s >>\nstream\n%s\nendstream" % (len(data), extra, data))
+
+
+def _widths(font: _TrueType, used) -> bytes:
+    scale = 1000.0 / font.units
+    parts = [b"%d [%d]" % (g, round(font.advances[g] * scale)) for g in sorted(used) if g < len(font.advances)]
+    return b"[" + b" ".join(parts) + b"]"
+
+
+def _to_unicode(font: _TrueType, used) -> bytes:
+    """
+    glyph -> نص Unicode للنسخ والبحث: أشكال العرض (U+FExx من escpos.visual) تُرجع
+    للحرف الأساسي بـ NFKC (ﻓ -> ف، ﻻ -> لا)، ويُفضّل رمز أساسي إن شاركه نفس الـ glyph.
+    """
+    reverse = {}
+    for cp, gid in font.cmap.items():
+        if not gid or gid not in used:
+            continue  # .notdef لا يقابل أي نص
+        text = unicodedata.normalize("NFKC", chr(cp))
+        rank = (text != chr(cp), cp)
+        if gid not in reverse or rank < reverse[gid][0]:
+            reverse[gid] = (rank, text)
+    entries = sorted((gid, text) for gid, (_, text) in reverse.items())
+    body = [b"/CIDInit /ProcSet findresource begin 12 dict begin begincmap",
+            b"/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+            b"/CMapName /Adobe-Identity-UCS def /CMapType 2 def",
+            b"1 begincodespacerange <0000> <FFFF> endcodespacerange"]
+    for i in range(0, len(entries), 100):
+        chunk = entries[i: i + 100]
+        body.append(b"%d beginbfchar" % len(chunk))
+        for gid, text in chunk:
+            u = text.encode("utf-16-be").hex().upper().encode("ascii")
+            body.append(b"<%04X> <%s>" % (gid, u))
+        body.append(b"endbfchar")
+    body.append(b"endcmap CMapName currentdict /CMap defineresource pop end end")
+    return b"\n".join(body)
+
+
+def iter_table_pdf(title: str, columns, rows, info=(), note="", company_name="مخابز البوادي", printed_at=None):
+    """
+    جدول (كشف/تقرير) -> PDF A4 على دفعات bytes: الرأس، ثم كل صفحة فور امتلائها،
+    ثم الخط والفهرس.
+
+    columns: ((العنوان، نسبة العرض)...) الأول في أقصى اليمين.
+    rows: أي iterable من tuples نصية منسّقة مسبقاً (قد يكون مولّداً).
+    """
+    font = pdf_font()
+    used = set()
+    w = _Writer()
+    yield w.emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    kids = []
+    num = _TOUNICODE + 1
+    resources = b"<< /Font << /F1 %d 0 R >> >>" % _TYPE0
+    for page in _iter_pages(font, title, columns, rows, info, note, company_name, printed_at, used):
+        content_num, page_num = num, num + 1
+        num += 2
+        out = w.stream(content_num, page.content())
+        out += w.obj(page_num, b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] /Resources %s /Contents %d 0 R >>"
+                     % (_PAGES, PAGE_W, PAGE_H, resources, content_num))
+        kids.append(page_num)
+        yield out
+
+    name = b"/" + (bytes(c for c in os.path.basename(font.path).rsplit(".", 1)[0].encode("ascii", "ignore")
+                         if 0x21 < c < 0x7F and c not in b"()<>[]{}/%#") or b"Font")
+    scale = 1000.0 / font.units
+    bbox = b" ".join(b"%d" % round(v * scale) for v in font.bbox)
+    out = w.obj(_CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % _PAGES)
+    out += w.obj(_PAGES, b"<< /Type /Pages /Kids [%s] /Count %d >>"
+                 % (b" ".join(b"%d 0 R" % k for k in kids), len(kids)))
+    out += w.obj(_TYPE0, b"<< /Type /Font /Subtype /Type0 /BaseFont %s /Encoding /Identity-H "
+                         b"/DescendantFonts [%d 0 R] /ToUnicode %d 0 R >>" % (name, _CIDFONT, _TOUNICODE))
+    out += w.obj(_CIDFONT, b"<< /Type /Font /Subtype /CIDFontType2 /BaseFont %s "
+                           b"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+                           b"/FontDescriptor %d 0 R /CIDToGIDMap /Identity /DW 1000 /W %s >>"
+                 % (name, _DESCRIPTOR, _widths(font, used)))
+    out += w.obj(_DESCRIPTOR, b"<< /Type /FontDescriptor /FontName %s /Flags 32 /FontBBox [%s] /ItalicAngle 0 "
+                              b"/Ascent %d /Descent %d /CapHeight %d /StemV 80 /FontFile2 %d 0 R >>"
+                 % (name, bbox, round(font.ascent * scale), round(font.descent * scale),
+                    round(font.ascent * scale), _FONTFILE))
+    out += w.stream(_FONTFILE, font.font_file, b" /Filter /FlateDecode /Length1 %d" % font.length1, compress=False)
+    out += w.stream(_TOUNICODE, _to_unicode(font, used))
+    yield out
+
+    xref_at = w.pos
+    lines = [b"xref", b"0 %d" % num, b"0000000000 65535 f "]
+    lines += [b"%010d 00000 n " % w.offsets[i] for i in range(1, num)]
+    lines += [b"trailer", b"<< /Size %d /Root %d 0 R >>" % (num, _CATALOG), b"startxref", b"%d" % xref_at, b"%%EOF\n"]
+    yield w.emit(b"\n".join(lines))
+
+
+# ---------------------------
+# Cache per (kind, id, checkpoint, range)
+# ---------------------------
+_pdf_lock = threading.Lock()
+_pdf_cache = OrderedDict()  # key -> bytes (LRU)
+_pdf_cache_bytes = 0
+
+
+def rows_checkpoint(rows) -> str:
+    """
+    بصمة الصفوف كما ستُطبع: تتغير مع أي حركة جديدة أو معدّلة أو محذوفة.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for r in rows or ():
+        h.update(repr(sorted(r.items()) if isinstance(r, dict) else r).encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+def _store(key, data: bytes):
+    global _pdf_cache_bytes
+    if len(data) > PDF_CACHE_MAX_BYTES:
+        return
+    with _pdf_lock:
+        old = _pdf_cache.pop(key, None)
+        if old is not None:
+            _pdf_cache_bytes -= len(old)
+        _pdf_cache[key] = data
+        _pdf_cache_bytes += len(data)
+        while _pdf_cache_bytes > PDF_CACHE_MAX_BYTES and _pdf_cache:
+            _, dropped = _pdf_cache.popitem(last=False)
+            _pdf_cache_bytes -= len(dropped)
+
+
+def cached_pdf(key, make_chunks):
+    """
+    مولّد bytes: من الـ cache مباشرة، أو من make_chunks() مع حفظ الناتج عند اكتماله.
+    مستند لم يُستهلك حتى النهاية لا يُحفظ.
+    """
+    with _pdf_lock:
+        data = _pdf_cache.get(key)
+        if data is not None:
+            _pdf_cache.move_to_end(key)
+    if data is not None:
+        yield data
+        return
+    parts = []
+    for chunk in make_chunks():
+        parts.append(chunk)
+        yield chunk
+    _store(key, b"".join(parts))
+
+
+def pdf_bytes(key, make_chunks) -> bytes:
+    return b"".join(cached_pdf(key, make_chunks))
+
+
+def clear_pdf_cache():
+    global _pdf_cache_bytes
+    with _pdf_lock:
+        _pdf_cache.clear()
+        _pdf_cache_bytes = 0
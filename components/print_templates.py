@@ -0,0 +1,80 @@
+"""
+قوالب HTML للطباعة: تُجمَّع مرة واحدة عند تحميل الوحدة وتُعرض بدون إعادة تحليل.
+
+    _ROW = Template('<tr><td class="name">{name}</td><td>{qty}</td></tr>')
+    rows_html = _ROW.render_many({"name": it["product_name"], "qty": ...} for it in items)
+    html = _DOC.render(title="...", rows=rows_html)
+
+- الحقول بالاسم فقط ({name})، بدون format spec: التنسيق (_money وغيره) يتم في
+  الـ builder قبل العرض. الأقواس الحرفية في CSS/JS تُكتب مضاعفة {{ }} كما في f-string.
+- كل قيمة تُهرَّب تلقائياً (html.escape) إلا إذا كانت Markup: أسماء العملاء
+  والأصناف لا تكسر الصفحة ولا تحقن HTML.
+- الصفوف تُجمع في list ثم "".join مرة واحدة؛ زمن العرض خطي بعدد الصفوف
+  بدل rows_html += ... المتكرر.
+"""
+import html as _html
+from string import Formatter
+
+
+class Markup(str):
+    """
+    نص HTML موثوق (ناتج قالب، CSS، سكربت، شعار) لا يُهرَّب مرة أخرى.
+    """
+    __slots__ = ()
+
+
+_EMPTY = Markup("")
+
+
+def escape(value) -> Markup:
+    if isinstance(value, Markup):
+        return value
+    if value is None:
+        return _EMPTY
+    return Markup(_html.escape(str(value), quote=True))
+
+
+def join(parts) -> Markup:
+    """
+    يضم أجزاء HTML (Markup أو نص يُهرَّب) بعملية join واحدة؛ الفارغ/None يُتجاهل.
+    """
+    return Markup("".join(escape(p) for p in parts if p))
+
+
+class Template:
+    """
+    قالب مُجمَّع: المصدر يُحلَّل مرة واحدة إلى format string + أسماء الحقول.
+    render() = تهريب القيم ثم str.format_map (C) بدون أي تحليل إضافي.
+    """
+    __slots__ = ("source", "names", "_fmt")
+
+    def __init__(self, source: str):
+        names = []
+        for _literal, field, spec, conv in Formatter().parse(source):
+            if field is None:
+                continue
+            if not field or not field.isidentifier():
+                raise ValueError(f"حقل قالب غير صالح: {{{field}}}")
+            if spec or conv:
+                raise ValueError(f"التنسيق يتم قبل العرض وليس داخل القالب: {{{field}}}")
+            if field not in names:
+                names.append(field)
+        self.source = source
+        self.names = tuple(names)
+        self._fmt = source
+
+    def render(self, **ctx) -> Markup:
+        return self.render_map(ctx)
+
+    def render_map(self, ctx: dict) -> Markup:
+        return Markup(self._fmt.format_map({n: escape(ctx[n]) for n in self.names}))
+
+    def render_many(self, rows, empty="") -> Markup:
+        """
+        صفوف (dict لكل صف) -> HTML واحد عبر join. empty: ما يُعرض إذا لا توجد صفوف.
+        """
+        fmt, names = self._fmt, self.names
+        out = [fmt.format_map({n: escape(r[n]) for n in names}) for r in rows]
+        if not out:
+            return escape(empty)
+        return Markup("".join(out))
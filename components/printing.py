@@ -1,8 +1,11 @@
 import base64
+import threading
+from itertools import islice
 from pathlib import Path
-import streamlit.components.v1 as components
 from datetime import datetime, timezone, timedelta
-from utils.helpers import to_float
+from utils.helpers import fmt_qty, to_float
+from services.models import Sale
+from components.print_templates import Markup, Template, join
 
 
 # --------------------------------
@@ -23,18 +26,19 @@ def _now_dt():
     return datetime.now(timezone(timedelta(hours=3))).strftime("%Y-%m-%d %H:%M:%S")
 
 
-def _get_logo_base64():
+_LOGO_PATH = Path(__file__).resolve().parent.parent / "assets" / "logo.png"
+
+
+def _read_logo_base64() -> str:
     try:
-        logo_path = Path(__file__).resolve().parent.parent / "assets" / "logo.png"
-        if not logo_path.exists():
+        if not _LOGO_PATH.exists():
             return ""
-        return base64.b64encode(logo_path.read_bytes()).decode("utf-8")
+        return base64.b64encode(_LOGO_PATH.read_bytes()).decode("utf-8")
     except Exception:
         return ""
 
 
-def _logo_html():
-    logo_b64 = _get_logo_base64()
+def _render_logo_html(logo_b64: str) -> str:
     if not logo_b64:
         return ""
     return f"""
@@ -44,7 +48,58 @@ def _logo_html():
     """
 
 
+# ---------------------------
+# Print assets cache (logo + CSS)
+# ---------------------------
+# الشعار يُقرأ ويُحوّل base64 مرة واحدة لكل نسخة من الملف (mtime)، والـ CSS
+# مرة واحدة لكل مقاس ورق؛ طباعة خط توزيع كامل لا تعيد قراءة القرص.
+_assets_lock = threading.Lock()
+_logo_cache = {}  # mtime_ns -> logo_html
+_css_cache = {}   # paper -> css
+
+
+def _logo_mtime() -> int:
+    try:
+        return _LOGO_PATH.stat().st_mtime_ns
+    except OSError:
+        return 0
+
+
+def print_assets(paper="80mm"):
+    """
+    (logo_html, css) لمقاس الورق؛ تتجدد تلقائياً إذا تغيّر ملف الشعار.
+    """
+    mtime = _logo_mtime()
+    logo = _logo_cache.get(mtime)
+    if logo is None:
+        logo = Markup(_render_logo_html(_read_logo_base64() if mtime else ""))
+        with _assets_lock:
+            _logo_cache.clear()
+            _logo_cache[mtime] = logo
+
+    css = _css_cache.get(paper)
+    if css is None:
+        css = Markup(_render_base_css(paper))
+        with _assets_lock:
+            _css_cache[paper] = css
+    return logo, css
+
+
+def clear_print_assets():
+    with _assets_lock:
+        _logo_cache.clear()
+        _css_cache.clear()
+
+
+def _logo_html():
+    return print_assets()[0]
+
+
 def _base_css(paper="80mm"):
+    return print_assets(paper)[1]
+
+
+def _render_base_css(paper="80mm"):
     if paper == "a4":
         return """
         *{box-sizing:border-box}
@@ -277,8 +332,12 @@ def _base_css(paper="80mm"):
         """
 
 
-def _print_script(auto_print=False):
-    return f"""
+# ---------------------------
+# Compiled templates (shared)
+# ---------------------------
+# كل القوالب تُجمَّع مرة واحدة عند تحميل الوحدة (components/print_templates)؛
+# القيم النصية (اسم العميل، الصنف، رقم الفاتورة...) تُهرَّب تلقائياً.
+_SCRIPT = Template("""
     <script>
       function doPrint() {{
         try {{
@@ -291,24 +350,139 @@ def _print_script(auto_print=False):
         }}
       }}
 
-      {"window.onload = function(){ setTimeout(doPrint, 350); };" if auto_print else ""}
+      {on_load}
     </script>
-    """
+    """)
+
+_PRINT_SCRIPTS = {
+    False: _SCRIPT.render(on_load=""),
+    True: _SCRIPT.render(on_load=Markup("window.onload = function(){ setTimeout(doPrint, 350); };")),
+}
+
+
+def _print_script(auto_print=False):
+    return _PRINT_SCRIPTS[bool(auto_print)]
+
+
+_DOC = Template("""
+<!doctype html>
+<html>
+<head>
+<meta charset="utf-8"/>
+<meta name="viewport" content="width=device-width, initial-scale=1"/>
+<title>{title}</title>
+<style>
+{css}
+</style>
+{script}
+</head>
+<body>{pages}
+</body>
+</html>
+""")
+
+_PAGE = Template("""
+  <div class="{cls}">
+    <div class="center">
+      {logo}
+      <div class="title">{company_name}</div>
+      <div class="badge">{badge}</div>
+    </div>
+
+    <hr/>
+{content}{btnbar}
+  </div>""")
+
+_BTNBAR = Markup("""
+    <div class="btnbar">
+      <button onclick="doPrint()">🖨️ طباعة الآن</button>
+    </div>""")
+
+_SUMROW = Template("""
+    <div class="{cls}"><span>{label}</span><span>{value}</span></div>""")
+_SUMROW_BOLD = Template("""
+    <div class="{cls}"><span>{label}</span><span><b>{value}</b></span></div>""")
+
+
+def _sumrow(label, value, bold=False, grand=False):
+    tpl = _SUMROW_BOLD if bold else _SUMROW
+    return tpl.render(cls="sumrow grand" if grand else "sumrow", label=label, value=value)
+
+
+def _line(label, value, bold=False, grand=False):
+    return (label, value, bold, grand)
+
+
+def _sumrows(lines):
+    return join(_sumrow(*ln) for ln in lines)
+
+
+def _document(title, badge, content, company_name, paper, auto_print):
+    logo_html, css = print_assets(paper)
+    page = _PAGE.render(cls="wrap", logo=logo_html, company_name=company_name, badge=badge,
+                        content=content, btnbar=_BTNBAR)
+    return _DOC.render(title=title, css=css, script=_print_script(auto_print=auto_print), pages=page)
 
 
 # ---------------------------
 # Invoice
 # ---------------------------
-def build_invoice_html(
-    sale: dict,
-    customer: dict = None,
-    company_name="مخابز البوادي",
-    paper="80mm",
-    auto_print=False
-):
+_INVOICE_ROW = Template("""
+        <tr>
+          <td class="name">{name}</td>
+          <td class="qty">{qty}</td>
+          <td class="price">{price}</td>
+          <td class="tot">{total}</td>
+        </tr>""")
+
+_INVOICE_BODY = Template("""
+    {info}
+
+    <hr/>
+
+    <table>
+      <thead>
+        <tr>
+          <th>الصنف</th>
+          <th>كمية</th>
+          <th>سعر</th>
+          <th>الإجمالي</th>
+        </tr>
+      </thead>
+      <tbody>{rows}
+      </tbody>
+    </table>
+
+    <hr/>
+    {totals}
+    {pay_lines}
+
+    <hr/>
+    <div class="center">{footer}</div>
+""")
+
+
+def _invoice_rows(items):
+    for it in items:
+        qty = float(to_float(it.get("qty", 0)))
+        price = float(to_float(it.get("price", 0)))
+        line_total = float(to_float(it.get("total", qty * price)))
+        yield {
+            "name": it.get("product_name") or "-",
+            "qty": int(qty),
+            "price": _money(price),
+            "total": _money(line_total),
+        }
+
+
+def invoice_model(sale: dict, customer: dict = None) -> dict:
+    """
+    بيانات الفاتورة جاهزة للعرض (نصوص منسّقة)، مشتركة بين HTML والطباعة
+    الحرارية (components/escpos): badge, info, items, totals, payments, footer.
+    السطور: (label, value, bold, grand).
+    """
     customer = customer or {}
     items = sale.get("items", []) or []
-    logo_html = _logo_html()
 
     created = _dt_short(sale.get("created_at") or sale.get("updated_at"))
     delivered = _dt_short(sale.get("delivered_at"))
@@ -348,148 +522,88 @@ def build_invoice_html(
     else:
         header_type = "فاتورة"
 
-    rows_html = ""
-    for it in items:
-        pname = it.get("product_name") or "-"
-        qty = float(to_float(it.get("qty", 0)))
-        price = float(to_float(it.get("price", 0)))
-        line_total = float(to_float(it.get("total", qty * price)))
-
-        rows_html += f"""
-        <tr>
-          <td class="name">{pname}</td>
-          <td class="qty">{int(qty)}</td>
-          <td class="price">{_money(price)}</td>
-          <td class="tot">{_money(line_total)}</td>
-        </tr>
-        """
-
-    pay_lines = ""
-
+    pay_lines = []
     if ptype == "cash":
-        pay_lines += f"""
-        <div class="sumrow">
-          <span>المسدّد لهذه الفاتورة:</span>
-          <span><b>{_money(paid)}</b></span>
-        </div>
-        """
+        pay_lines.append(_line("المسدّد لهذه الفاتورة:", _money(paid), bold=True))
         if extra_credit > 0:
-            pay_lines += f"""
-            <div class="sumrow">
-              <span>زيادة كرصد للعميل:</span>
-              <span><b>{_money(extra_credit)}</b></span>
-            </div>
-            """
+            pay_lines.append(_line("زيادة كرصد للعميل:", _money(extra_credit), bold=True))
         if unpaid > 0:
-            pay_lines += f"""
-            <div class="sumrow">
-              <span>متبقي من هذه الفاتورة:</span>
-              <span><b>{_money(unpaid)}</b></span>
-            </div>
-            """
-
+            pay_lines.append(_line("متبقي من هذه الفاتورة:", _money(unpaid), bold=True))
     if old_debt_paid > 0:
-        pay_lines += f"""
-        <div class="sumrow">
-          <span>ذمم سابقة مسددة:</span>
-          <span><b>{_money(old_debt_paid)}</b></span>
-        </div>
-        """
-
+        pay_lines.append(_line("ذمم سابقة مسددة:", _money(old_debt_paid), bold=True))
     if total_collected > 0:
-        pay_lines += f"""
-        <div class="sumrow grand">
-          <span>إجمالي المقبوض:</span>
-          <span><b>{_money(total_collected)}</b></span>
-        </div>
-        """
-
+        pay_lines.append(_line("إجمالي المقبوض:", _money(total_collected), bold=True, grand=True))
     if final_due > 0:
-        pay_lines += f"""
-        <div class="sumrow">
-          <span>إجمالي الذمم المستحقة:</span>
-          <span><b>{_money(final_due)}</b></span>
-        </div>
-        """
-
-    html = f"""
-<!doctype html>
-<html>
-<head>
-<meta charset="utf-8"/>
-<meta name="viewport" content="width=device-width, initial-scale=1"/>
-<style>
-{_base_css(paper)}
-</style>
-{_print_script(auto_print=auto_print)}
-</head>
-<body>
-<div class="wrap">
-
-  <div class="center">
-    {logo_html}
-    <div class="title">{company_name}</div>
-    <div class="badge">{header_type}</div>
-  </div>
-
-  <hr>
-
-  <div class="sumrow"><span>رقم الفاتورة:</span><span>{invoice_no}</span></div>
-  <div class="sumrow"><span>التاريخ:</span><span>{dt}</span></div>
-  <div class="sumrow"><span>العميل:</span><span>{cust_name}</span></div>
-  <div class="sumrow"><span>الموزع:</span><span>{seller_username or '—'}</span></div>
-  {"<div class='sumrow'><span>هاتف:</span><span>"+phone+"</span></div>" if phone else ""}
-
-  <hr>
-
-  <table>
-    <thead>
-      <tr>
-        <th>الصنف</th>
-        <th>كمية</th>
-        <th>سعر</th>
-        <th>الإجمالي</th>
-      </tr>
-    </thead>
-    <tbody>
-      {rows_html}
-    </tbody>
-  </table>
-
-  <hr>
-
-  <div class="sumrow"><span>الإجمالي:</span><span>{_money(total)}</span></div>
-  <div class="sumrow"><span>خصم:</span><span>{_money(discount)}</span></div>
-  <div class="sumrow grand"><span>الصافي:</span><span>{_money(net)}</span></div>
-
-  {pay_lines}
-
-  <hr>
-  <div class="center">شكراً لزيارتكم ❤️</div>
-
-  <div class="btnbar">
-    <button onclick="doPrint()">🖨️ طباعة الآن</button>
-  </div>
-
-</div>
-</body>
-</html>
-"""
-    return html
+        pay_lines.append(_line("إجمالي الذمم المستحقة:", _money(final_due), bold=True))
+
+    info = [
+        _line("رقم الفاتورة:", invoice_no),
+        _line("التاريخ:", dt),
+        _line("العميل:", cust_name),
+        _line("الموزع:", seller_username or "—"),
+    ]
+    if phone:
+        info.append(_line("هاتف:", phone))
+
+    return {
+        "badge": header_type,
+        "info": info,
+        "items": list(_invoice_rows(items)),
+        "totals": [
+            _line("الإجمالي:", _money(total)),
+            _line("خصم:", _money(discount)),
+            _line("الصافي:", _money(net), grand=True),
+        ],
+        "payments": pay_lines,
+        "footer": "شكراً لزيارتكم ❤️",
+    }
+
+
+def _invoice_parts(sale: dict, customer: dict):
+    """
+    (badge, content) لفاتورة واحدة؛ مشتركة بين build_invoice_html والطباعة المجمّعة.
+    """
+    m = invoice_model(sale, customer)
+    content = _INVOICE_BODY.render(
+        info=_sumrows(m["info"]),
+        rows=_INVOICE_ROW.render_many(m["items"]),
+        totals=_sumrows(m["totals"]),
+        pay_lines=_sumrows(m["payments"]),
+        footer=m["footer"],
+    )
+    return m["badge"], content
 
 
-# ---------------------------
-# Receipt
-# ---------------------------
-def build_receipt_html(
+def build_invoice_html(
     sale: dict,
     customer: dict = None,
     company_name="مخابز البوادي",
     paper="80mm",
     auto_print=False
 ):
+    badge, content = _invoice_parts(sale, customer)
+    return _document("Invoice", badge, content, company_name, paper, auto_print)
+
+
+# ---------------------------
+# Receipt
+# ---------------------------
+_RECEIPT_BODY = Template("""
+    {info}
+
+    <hr/>
+    {amounts}
+
+    <hr/>
+    <div class="center muted">{footer}</div>
+""")
+
+
+def receipt_model(sale: dict, customer: dict = None) -> dict:
+    """
+    بيانات إيصال القبض: badge, info, amounts, footer (نفس شكل invoice_model).
+    """
     customer = customer or {}
-    logo_html = _logo_html()
 
     created = _dt_short(sale.get("created_at") or sale.get("updated_at"))
     delivered = _dt_short(sale.get("delivered_at"))
@@ -513,107 +627,64 @@ def build_receipt_html(
 
     total_collected = paid + old_debt_paid
 
-    html = f"""
-<!doctype html>
-<html>
-<head>
-<meta charset="utf-8"/>
-<meta name="viewport" content="width=device-width, initial-scale=1"/>
-<title>Receipt</title>
-<style>
-{_base_css(paper)}
-</style>
-{_print_script(auto_print=auto_print)}
-</head>
-<body>
-  <div class="wrap">
-    <div class="center">
-      {logo_html}
-      <div class="title">{company_name}</div>
-      <div class="badge">إيصال قبض</div>
-    </div>
-
-    <hr/>
-
-    <div class="sumrow"><span>رقم الفاتورة:</span><span><b>{invoice_no}</b></span></div>
-    <div class="sumrow"><span>التاريخ:</span><span>{dt}</span></div>
-    <div class="sumrow"><span>العميل:</span><span>{cust_name}</span></div>
-
-    <hr/>
-
-    <div class="sumrow"><span>صافي الفاتورة:</span><span><b>{_money(net)}</b></span></div>
-    <div class="sumrow"><span>المسدّد لهذه الفاتورة:</span><span><b>{_money(paid)}</b></span></div>
-
-    {f"<div class='sumrow'><span>ذمم سابقة مسددة:</span><span><b>{_money(old_debt_paid)}</b></span></div>" if old_debt_paid > 0 else ""}
-    {f"<div class='sumrow'><span>المتبقي من الذمم السابقة:</span><span><b>{_money(old_debt_remaining)}</b></span></div>" if old_debt_remaining > 0 else ""}
-    {f"<div class='sumrow'><span>إجمالي الذمم بعد الفاتورة:</span><span><b>{_money(final_due)}</b></span></div>" if final_due > 0 else ""}
-    {f"<div class='sumrow grand'><span>إجمالي المقبوض:</span><span><b>{_money(total_collected)}</b></span></div>" if total_collected > 0 else ""}
-    {f"<div class='sumrow'><span>زيادة كرصد للعميل:</span><span><b>{_money(extra_credit)}</b></span></div>" if extra_credit > 0 else ""}
-    {f"<div class='sumrow'><span>متبقي من هذه الفاتورة:</span><span><b>{_money(unpaid)}</b></span></div>" if unpaid > 0 else ""}
-
-    <hr/>
-    <div class="center muted">هذا الإيصال يثبت عملية الدفع/الرصيد.</div>
-
-    <div class="btnbar">
-      <button onclick="doPrint()">🖨️ طباعة الآن</button>
-    </div>
-  </div>
-</body>
-</html>
-"""
-    return html
+    amounts = [
+        _line("صافي الفاتورة:", _money(net), bold=True),
+        _line("المسدّد لهذه الفاتورة:", _money(paid), bold=True),
+    ]
+    if old_debt_paid > 0:
+        amounts.append(_line("ذمم سابقة مسددة:", _money(old_debt_paid), bold=True))
+    if old_debt_remaining > 0:
+        amounts.append(_line("المتبقي من الذمم السابقة:", _money(old_debt_remaining), bold=True))
+    if final_due > 0:
+        amounts.append(_line("إجمالي الذمم بعد الفاتورة:", _money(final_due), bold=True))
+    if total_collected > 0:
+        amounts.append(_line("إجمالي المقبوض:", _money(total_collected), bold=True, grand=True))
+    if extra_credit > 0:
+        amounts.append(_line("زيادة كرصد للعميل:", _money(extra_credit), bold=True))
+    if unpaid > 0:
+        amounts.append(_line("متبقي من هذه الفاتورة:", _money(unpaid), bold=True))
+
+    return {
+        "badge": "إيصال قبض",
+        "info": [
+            _line("رقم الفاتورة:", invoice_no, bold=True),
+            _line("التاريخ:", dt),
+            _line("العميل:", cust_name),
+        ],
+        "amounts": amounts,
+        "footer": "هذا الإيصال يثبت عملية الدفع/الرصيد.",
+    }
+
+
+def _receipt_parts(sale: dict, customer: dict):
+    m = receipt_model(sale, customer)
+    content = _RECEIPT_BODY.render(info=_sumrows(m["info"]), amounts=_sumrows(m["amounts"]), footer=m["footer"])
+    return m["badge"], content
 
 
-# ---------------------------
-# Debt only
-# ---------------------------
-def build_debt_only_invoice_html(
-    customer: dict,
+def build_receipt_html(
+    sale: dict,
+    customer: dict = None,
     company_name="مخابز البوادي",
     paper="80mm",
     auto_print=False
 ):
-    customer = customer or {}
-    logo_html = _logo_html()
-    cust_name = customer.get("name") or "—"
-    phone = customer.get("phone") or ""
-
-    bal = float(to_float(customer.get("balance", 0)))
-    debt = bal if bal > 0 else 0.0
-    dt = _now_dt()
+    badge, content = _receipt_parts(sale, customer)
+    return _document("Receipt", badge, content, company_name, paper, auto_print)
 
-    msg = ""
-    if bal <= 0:
-        if bal < 0:
-            msg = f"للعميل رصيد عندك: {_money(abs(bal))} (ليس ذمم)"
-        else:
-            msg = "لا يوجد ذمم مستحقة على العميل"
 
-    html = f"""
-<!doctype html>
-<html>
-<head>
-<meta charset="utf-8"/>
-<meta name="viewport" content="width=device-width, initial-scale=1"/>
-<title>Debt Only Invoice</title>
-<style>
-{_base_css(paper)}
-</style>
-{_print_script(auto_print=auto_print)}
-</head>
-<body>
-  <div class="wrap">
-    <div class="center">
-      {logo_html}
-      <div class="title">{company_name}</div>
-      <div class="badge">فاتورة ذمم فقط</div>
-    </div>
+def can_print_receipt(sale: dict) -> bool:
+    """
+    إيصال القبض لفاتورة نقدية فيها مبلغ مدفوع فقط (نفس شرط زر القبض في الأرشيف).
+    """
+    return (sale or {}).get("payment_type") == "cash" and float(to_float((sale or {}).get("amount_paid", 0))) > 0
 
-    <hr/>
 
-    <div class="sumrow"><span>التاريخ:</span><span>{dt}</span></div>
-    <div class="sumrow"><span>العميل:</span><span><b>{cust_name}</b></span></div>
-    {("<div class='sumrow'><span>هاتف:</span><span>"+phone+"</span></div>") if phone else ""}
+# ---------------------------
+# Debt only
+# ---------------------------
+_DEBT_ONLY_BODY = Template("""
+    {info}
 
     <hr/>
 
@@ -627,122 +698,85 @@ def build_debt_only_invoice_html(
       <tbody>
         <tr>
           <td><b>ذمم مستحقة على العميل</b></td>
-          <td><b>{_money(debt)}</b></td>
+          <td><b>{debt}</b></td>
         </tr>
       </tbody>
     </table>
+    {note}
+""")
 
-    {f"<hr/><div class='center muted'>{msg}</div>" if msg else ""}
-
-    <div class="btnbar">
-      <button onclick="doPrint()">🖨️ طباعة الآن</button>
-    </div>
-  </div>
-</body>
-</html>
-"""
-    return html
+_MUTED_NOTE = Template("""
+    <hr/><div class="center muted">{msg}</div>""")
 
 
-# ---------------------------
-# Statement
-# ---------------------------
-def _pick_dt_for_sort(s: dict):
-    return (s.get("delivered_at") or s.get("updated_at") or s.get("created_at") or "")
-
-
-def _calc_balance_delta_from_sale(s: dict) -> float:
-    ptype = s.get("payment_type")
-    net = float(to_float(s.get("net", 0)))
-    unpaid = float(to_float(s.get("unpaid_debt", 0)))
-    extra = float(to_float(s.get("extra_credit", 0)))
-
-    if ptype == "credit":
-        return +net
-    if ptype == "cash":
-        return (unpaid - extra)
-    return 0.0
-
-
-def build_customer_statement_html(
+def build_debt_only_invoice_html(
     customer: dict,
-    sales: list,
     company_name="مخابز البوادي",
     paper="80mm",
-    max_rows=30,
     auto_print=False
 ):
     customer = customer or {}
-    logo_html = _logo_html()
     cust_name = customer.get("name") or "—"
     phone = customer.get("phone") or ""
-    balance_now = float(to_float(customer.get("balance", 0)))
 
-    rows = ""
-    shown = 0
+    bal = float(to_float(customer.get("balance", 0)))
+    debt = bal if bal > 0 else 0.0
+    dt = _now_dt()
 
-    for s in (sales or []):
-        if shown >= int(max_rows):
-            break
+    msg = ""
+    if bal <= 0:
+        if bal < 0:
+            msg = f"للعميل رصيد عندك: {_money(abs(bal))} (ليس ذمم)"
+        else:
+            msg = "لا يوجد ذمم مستحقة على العميل"
+
+    content = _DEBT_ONLY_BODY.render(
+        info=join([
+            _sumrow("التاريخ:", dt),
+            _sumrow("العميل:", cust_name, bold=True),
+            _sumrow("هاتف:", phone) if phone else "",
+        ]),
+        debt=_money(debt),
+        note=_MUTED_NOTE.render(msg=msg) if msg else "",
+    )
+    return _document("Debt Only Invoice", "فاتورة ذمم فقط", content, company_name, paper, auto_print)
 
-        inv = s.get("invoice_no") or s.get("ref") or s.get("id") or ""
-        dt = _dt_short(_pick_dt_for_sort(s))
-        status = s.get("status") or ""
-        ptype = s.get("payment_type")
 
-        net = float(to_float(s.get("net", 0)))
-        paid = float(to_float(s.get("amount_paid", 0)))
-        unpaid = float(to_float(s.get("unpaid_debt", 0)))
-        extra = float(to_float(s.get("extra_credit", 0)))
-        delta = float(_calc_balance_delta_from_sale(s))
+# ---------------------------
+# Statement
+# ---------------------------
+def _as_sale(s) -> Sale:
+    if isinstance(s, Sale):
+        return s
+    s = s or {}
+    return Sale.from_dict(s, s.get("id", ""))
 
-        ptxt = "ذمم" if ptype == "credit" else ("نقدي" if ptype == "cash" else "—")
-        stxt = "مُسلّم" if status == "done" else ("مُحضّر" if status == "prepared" else status)
 
-        rows += f"""
+def _pick_dt_for_sort(s):
+    return _as_sale(s).sort_at
+
+
+def _calc_balance_delta_from_sale(s) -> float:
+    return _as_sale(s).balance_delta
+
+
+_STATEMENT_ROW = Template("""
         <tr>
           <td>{dt}</td>
           <td><b>{inv}</b></td>
-          <td>{stxt}</td>
-          <td>{ptxt}</td>
-          <td>{_money(net)}</td>
-          <td>{_money(paid)}</td>
-          <td>{_money(unpaid)}</td>
-          <td>{_money(extra)}</td>
-          <td>{_money(delta)}</td>
-        </tr>
-        """
-        shown += 1
-
-    bal_label = "على العميل" if balance_now > 0 else ("للعميل رصيد" if balance_now < 0 else "الرصيد صفر")
-    bal_value = _money(abs(balance_now))
-
-    html = f"""
-<!doctype html>
-<html>
-<head>
-<meta charset="utf-8"/>
-<meta name="viewport" content="width=device-width, initial-scale=1"/>
-<title>Customer Statement</title>
-<style>
-{_base_css(paper)}
-</style>
-{_print_script(auto_print=auto_print)}
-</head>
-<body>
-  <div class="wrap">
-    <div class="center">
-      {logo_html}
-      <div class="title">{company_name}</div>
-      <div class="badge">كشف حساب عميل (مختصر)</div>
-    </div>
+          <td>{status}</td>
+          <td>{ptype}</td>
+          <td>{net}</td>
+          <td>{paid}</td>
+          <td>{unpaid}</td>
+          <td>{extra}</td>
+          <td>{delta}</td>
+        </tr>""")
 
-    <hr/>
+_STATEMENT_EMPTY = Markup("<tr><td colspan='9' class='muted'>لا توجد حركات لعرضها.</td></tr>")
 
-    <div class="sumrow"><span>العميل:</span><span><b>{cust_name}</b></span></div>
-    {f"<div class='sumrow'><span>هاتف:</span><span>{phone}</span></div>" if phone else ""}
-    <div class="sumrow"><span>الرصيد الحالي:</span><span><b>{bal_label}: {bal_value}</b></span></div>
-    <div class="sumrow"><span>تاريخ الطباعة:</span><span>{_now_dt()}</span></div>
+_STATEMENT_BODY = Template("""
+    {info}
 
     <hr/>
 
@@ -760,29 +794,93 @@ def build_customer_statement_html(
           <th>أثر الرصيد</th>
         </tr>
       </thead>
-      <tbody>
-        {rows if rows else "<tr><td colspan='9' class='muted'>لا توجد حركات لعرضها.</td></tr>"}
+      <tbody>{rows}
       </tbody>
     </table>
 
     <hr/>
     <div class="muted" style="font-size:11px;">
-      * أثر الرصيد: ذمم = +صافي، نقدي = +المتبقي - الزيادة كرصد.
+      {note}
     </div>
+""")
+
+
+def _statement_rows(sales, max_rows):
+    for s in islice(sales or [], max(0, int(max_rows))):
+        s = _as_sale(s)
+        ptype = s.payment_type
+        status = s.status
+        yield {
+            "dt": _dt_short(s.sort_at),
+            "inv": s.invoice_no or s.get("ref") or s.id or "",
+            "status": "مُسلّم" if status == "done" else ("مُحضّر" if status == "prepared" else status),
+            "ptype": "ذمم" if ptype == "credit" else ("نقدي" if ptype == "cash" else "—"),
+            "net": _money(s.net),
+            "paid": _money(s.amount_paid),
+            "unpaid": _money(s.unpaid_debt),
+            "extra": _money(s.extra_credit),
+            "delta": _money(s.balance_delta),
+        }
 
-    <div class="btnbar">
-      <button onclick="doPrint()">🖨️ طباعة الآن</button>
-    </div>
-  </div>
-</body>
-</html>
-"""
-    return html
+
+def statement_model(customer: dict, sales: list, max_rows=30, printed_at=None) -> dict:
+    """
+    بيانات كشف الحساب المختصر: badge, info, rows, note.
+    printed_at: وقت الطباعة (الافتراضي الآن) — ثابت في ملفات المقارنة golden.
+    """
+    customer = customer or {}
+    cust_name = customer.get("name") or "—"
+    phone = customer.get("phone") or ""
+    balance_now = float(to_float(customer.get("balance", 0)))
+
+    bal_label = "على العميل" if balance_now > 0 else ("للعميل رصيد" if balance_now < 0 else "الرصيد صفر")
+    bal_value = _money(abs(balance_now))
+
+    info = [_line("العميل:", cust_name, bold=True)]
+    if phone:
+        info.append(_line("هاتف:", phone))
+    info.append(_line("الرصيد الحالي:", f"{bal_label}: {bal_value}", bold=True))
+    info.append(_line("تاريخ الطباعة:", printed_at or _now_dt()))
+
+    return {
+        "badge": "كشف حساب عميل (مختصر)",
+        "info": info,
+        "rows": list(_statement_rows(sales, max_rows)),
+        "note": "* أثر الرصيد: ذمم = +صافي، نقدي = +المتبقي - الزيادة كرصد.",
+    }
+
+
+def build_customer_statement_html(
+    customer: dict,
+    sales: list,
+    company_name="مخابز البوادي",
+    paper="80mm",
+    max_rows=30,
+    auto_print=False
+):
+    m = statement_model(customer, sales, max_rows=max_rows)
+    content = _STATEMENT_BODY.render(
+        info=_sumrows(m["info"]),
+        rows=_STATEMENT_ROW.render_many(m["rows"], empty=_STATEMENT_EMPTY),
+        note=m["note"],
+    )
+    return _document("Customer Statement", m["badge"], content, company_name, paper, auto_print)
 
 
 # ---------------------------
 # Debt payment receipt
 # ---------------------------
+_DEBT_RECEIPT_BODY = Template("""
+    {info}
+
+    <hr/>
+    {amounts}
+
+    <hr/>
+    <div class="center muted">هذا السند يثبت تسديد ذمم للعميل.</div>
+""")
+
+
 def build_debt_payment_receipt_html(
     customer: dict,
     amount: float,
@@ -792,53 +890,166 @@ def build_debt_payment_receipt_html(
     auto_print=False
 ):
     customer = customer or {}
-    logo_html = _logo_html()
     cust_name = customer.get("name") or "—"
     phone = customer.get("phone") or ""
     dt = _now_dt()
 
-    html = f"""
-<!doctype html>
-<html>
-<head>
-<meta charset="utf-8"/>
-<meta name="viewport" content="width=device-width, initial-scale=1"/>
-<title>Debt Payment Receipt</title>
-<style>
-{_base_css(paper)}
-</style>
-{_print_script(auto_print=auto_print)}
-</head>
-<body>
-  <div class="wrap">
-    <div class="center">
-      {logo_html}
-      <div class="title">{company_name}</div>
-      <div class="badge">سند قبض تسديد ذمم</div>
-    </div>
+    content = _DEBT_RECEIPT_BODY.render(
+        info=join([
+            _sumrow("التاريخ:", dt),
+            _sumrow("العميل:", cust_name, bold=True),
+            _sumrow("هاتف:", phone) if phone else "",
+        ]),
+        amounts=join([
+            _sumrow("المبلغ المقبوض:", _money(amount), bold=True),
+            _sumrow("المتبقي من الذمم:", _money(remaining), bold=True),
+        ]),
+    )
+    return _document("Debt Payment Receipt", "سند قبض تسديد ذمم", content, company_name, paper, auto_print)
 
-    <hr/>
 
-    <div class="sumrow"><span>التاريخ:</span><span>{dt}</span></div>
-    <div class="sumrow"><span>العميل:</span><span><b>{cust_name}</b></span></div>
-    {f"<div class='sumrow'><span>هاتف:</span><span>{phone}</span></div>" if phone else ""}
+# ---------------------------
+# Loading sheet (pick list)
+# ---------------------------
+_LOADING_ROW = Template("""
+        <tr>
+          <td class="name">{name}</td>
+          <td class="qty">{qty}</td>
+          <td class="qty">{crate_units}</td>
+          <td class="qty">{diff}</td>
+          <td>{status}</td>
+        </tr>""")
+
+_LOADING_EMPTY = Markup("<tr><td colspan='5' class='muted'>لا توجد طلبات مُحضّرة.</td></tr>")
+
+_LOADING_BODY = Template("""
+    {info}
 
     <hr/>
 
-    <div class="sumrow"><span>المبلغ المقبوض:</span><span><b>{_money(amount)}</b></span></div>
-    <div class="sumrow"><span>المتبقي من الذمم:</span><span><b>{_money(remaining)}</b></span></div>
+    <table>
+      <thead>
+        <tr>
+          <th>الصنف</th>
+          <th>المطلوب</th>
+          <th>بالصناديق</th>
+          <th>الفرق</th>
+          <th>الحالة</th>
+        </tr>
+      </thead>
+      <tbody>{rows}
+      </tbody>
+    </table>
 
     <hr/>
-    <div class="center muted">هذا السند يثبت تسديد ذمم للعميل.</div>
+    {totals}
+""")
+
+
+def _loading_rows(rows):
+    for r in rows:
+        diff = float(to_float(r.get("diff", 0)))
+        yield {
+            "name": r.get("product_name") or "-",
+            "qty": fmt_qty(r.get("qty", 0)),
+            "crate_units": fmt_qty(r.get("crate_units", 0)),
+            "diff": "" if r.get("status") == "بدون صناديق" else ("+" if diff > 0 else "") + fmt_qty(diff),
+            "status": r.get("status", ""),
+        }
+
 
+def build_loading_sheet_html(
+    sheet: dict,
+    company_name="مخابز البوادي",
+    paper="80mm",
+    auto_print=False
+):
+    sheet = sheet or {}
+
+    content = _LOADING_BODY.render(
+        info=join([
+            _sumrow("الموزّع:", sheet.get("distributor_name") or "—", bold=True),
+            _sumrow("التاريخ:", sheet.get("date") or ""),
+            _sumrow("عدد الطلبات المُحضّرة:", int(sheet.get("orders_count", 0))),
+            _sumrow("تاريخ الطباعة:", _now_dt()),
+        ]),
+        rows=_LOADING_ROW.render_many(_loading_rows(sheet.get("rows", []) or []), empty=_LOADING_EMPTY),
+        totals=join([
+            _sumrow("إجمالي الكمية:", fmt_qty(sheet.get("total_qty", 0)), grand=True),
+            _sumrow("أصناف غير مطابقة:", int(sheet.get("mismatch_count", 0)), bold=True) if sheet.get("mismatch_count") else "",
+        ]),
+    )
+    return _document("Loading Sheet", "ورقة تحميل موزّع", content, company_name, paper, auto_print)
+
+
+# ---------------------------
+# Batch print (route / end of day)
+# ---------------------------
+# مستند واحد لكل الدفعة: CSS وسكربت وشعار مرة واحدة، وكل فاتورة صفحة مستقلة
+# (page-break بعد كل فاتورة: ورقة A4 مستقلة أو قصّ بعد كل فاتورة على رول 80mm).
+_BATCH_CSS = Markup("""
+        .page{
+            page-break-after:always;
+            break-after:page;
+        }
+        .page:last-child{
+            page-break-after:auto;
+            break-after:auto;
+        }
+        .batchbar{
+            margin:0 auto 8px auto;
+        }
+        @media screen{
+            .page + .page{
+                border-top:2px dashed #999;
+                margin-top:6mm;
+            }
+        }
+        @media print{
+            .batchbar{display:none}
+        }
+""")
+
+_BATCH_BAR = Template("""
+  <div class="wrap batchbar">
     <div class="btnbar">
-      <button onclick="doPrint()">🖨️ طباعة الآن</button>
+      <button onclick="doPrint()">🖨️ طباعة الكل ({count})</button>
     </div>
-  </div>
-</body>
-</html>
-"""
-    return html
+  </div>""")
+
+_BATCH_EMPTY = Markup("""
+  <div class="wrap center muted">لا توجد فواتير للطباعة.</div>""")
+
+
+def build_batch_print_html(
+    jobs: list,
+    mode="invoice",
+    company_name="مخابز البوادي",
+    paper="80mm",
+    auto_print=False
+):
+    """
+    jobs: [(sale, customer)] بترتيب الطباعة (services.print_batch_service.load_print_jobs).
+    mode="receipt": إيصال قبض للفواتير المؤهلة فقط (can_print_receipt)، والباقي يُتخطّى.
+    """
+    logo_html, css = print_assets(paper)
+    parts = _receipt_parts if mode == "receipt" else _invoice_parts
+
+    pages = []
+    for sale, customer in (jobs or []):
+        if mode == "receipt" and not can_print_receipt(sale):
+            continue
+        badge, content = parts(sale, customer)
+        pages.append(_PAGE.render(cls="wrap page", logo=logo_html, company_name=company_name, badge=badge,
+                                  content=content, btnbar=""))
+
+    body = join([_BATCH_BAR.render(count=len(pages)), *pages]) if pages else _BATCH_EMPTY
+    return _DOC.render(
+        title="Print Batch",
+        css=Markup(css + _BATCH_CSS),
+        script=_print_script(auto_print=auto_print),
+        pages=body,
+    )
 
 
 # ---------------------------
@@ -880,4 +1091,4 @@ def show_print_html(html: str, height=800):
     </html>
     """
 
-    components.html(full_html, height=height)
\ No newline at end of file
+    components.html(full_html, height=height)
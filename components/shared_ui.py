@@ -0,0 +1,47 @@
+import streamlit as st
+
+from services.search_index import catalog_index
+
+# أقصى عدد خيارات بعد البحث (بدون بحث: كل الكتالوج كما كان)
+PICKER_LIMIT = 200
+
+
+def customer_label(c) -> str:
+    parts = [c.get("name") or c.get("id"), c.get("phone"), c.get("area")]
+    return " · ".join(str(p) for p in parts if p)
+
+
+def catalog_picker(label: str, snap, key: str, disabled: bool = False, format_fn=None) -> str:
+    """
+    selectbox فوق نسخة كتالوج مع حقل بحث يضيّق الخيارات عبر فهرس البحث العربي
+    (أ/ا، ة/ه، ى/ي، التشكيل، الهاتف والمنطقة). يرجع id المختار أو "".
+    """
+    by_id = snap.by_id
+    q = st.text_input(
+        f"🔎 {label}",
+        key=f"{key}__q",
+        placeholder="اسم، هاتف أو منطقة...",
+        disabled=disabled,
+    )
+    if q.strip():
+        ids = catalog_index(snap).search(q, limit=PICKER_LIMIT)
+        if not ids:
+            st.caption("لا نتائج لهذا البحث.")
+    else:
+        ids = [r.id for r in snap.items]
+
+    current = st.session_state.get(key)
+    if current and current not in by_id:
+        st.session_state.pop(key, None)
+    elif current and current not in ids:
+        # الاختيار الحالي يبقى ظاهراً حتى لو لم يطابق البحث الجديد
+        ids = [current] + ids
+
+    fmt = format_fn or (lambda r: r.get("name") or r.id)
+    return st.selectbox(
+        label,
+        options=[""] + ids,
+        format_func=lambda i: fmt(by_id[i]) if i else "",
+        key=key,
+        disabled=disabled,
+    ) or ""
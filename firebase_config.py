@@ -1,10 +1,15 @@
 import os
 import json
-import firebase_admin
-from firebase_admin import credentials, firestore
+import threading
+
+# BAWADI_BACKEND=local يشغّل بديلاً في الذاكرة بدلاً من Firestore (أدوات المحاكاة والاختبار)
+BACKEND = (os.environ.get("BAWADI_BACKEND") or "firestore").strip().lower()
 
 
 def _init_firebase():
+    import firebase_admin
+    from firebase_admin import credentials
+
     # لا تعيد التهيئة إذا كانت موجودة
     if firebase_admin._apps:
         return
@@ -43,5 +48,53 @@ def _init_firebase():
     )
 
 
-_init_firebase()
-db = firestore.client()
+class _LazyClient:
+    """
+    يؤجل تهيئة Firebase وإنشاء عميل gRPC حتى أول استعلام فعلي
+    (شاشة الدخول تظهر بدون انتظار الاتصال).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+
+    def _get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from firebase_admin import firestore
+                    _init_firebase()
+                    self._client = firestore.client()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+def _lazy_transactional(fn):
+    # نفس @firestore.transactional لكن بدون استيراد firebase_admin وقت تحميل الموديول
+    wrapped = None
+
+    def call(transaction, *args, **kwargs):
+        nonlocal wrapped
+        if wrapped is None:
+            from firebase_admin import firestore
+            wrapped = firestore.transactional(fn)
+        return wrapped(transaction, *args, **kwargs)
+
+    call.__name__ = getattr(fn, "__name__", "transactional")
+    return call
+
+
+# نفس الواجهة في الحالتين: from firebase_config import db, transactional
+if BACKEND == "local":
+    from services.local_backend import LocalClient, transactional
+    db = LocalClient()
+else:
+    db = _LazyClient()
+    transactional = _lazy_transactional
+
+# عدّاد القراءات/الكتابات لكل rerun (BAWADI_METRICS=0 يعطّله)
+if (os.environ.get("BAWADI_METRICS") or "1").strip() != "0":
+    from services.firestore_metrics import instrument
+    db = instrument(db)
@@ -5,18 +5,38 @@ from firebase_admin import firestore
 import streamlit.components.v1 as components
 
 from utils.helpers import now_iso, to_float
+from utils.money import from_fils, money_fields, read_fils, to_fils
 from services.firestore_queries import col_to_list, doc_get, doc_set, doc_soft_delete
+from services.cache_bus import publish
+from services.catalog import refresh_catalog, session_catalog, unpin_catalog
+from services.statement_service import STATEMENT_KINDS, load_statement
+from services.aging_service import AGING_BUCKETS, aging_report, run_aging
+from services.customer_prices_service import (
+    adjust_area_prices,
+    copy_customer_prices,
+    load_customer_prices,
+    save_customer_prices,
+)
+from services.idempotency_service import (
+    idem_fingerprint,
+    idem_lookup,
+    idem_store,
+    session_idempotency_key,
+    clear_session_idempotency_key,
+)
+from components.print_templates import Markup, Template
+from components.pdf_render import iter_table_pdf, pdf_bytes, rows_checkpoint
 
 
 # ---------------------------
 # Helpers
 # ---------------------------
    
-def add_collection(customer: dict, amount: float, user: dict, note: str = "", status: str = "posted"):
+def add_collection(customer: dict, amount: float, user: dict, note: str = "", status: str = "posted", idempotency_key: str = ""):
     customer = customer or {}
     cid = customer.get("id") or ""
     cname = customer.get("name") or cid
-    amt = float(to_float(amount, 0.0))
+    amt = to_fils(amount)
 
     if not cid:
         raise ValueError("معرف العميل غير موجود")
@@ -27,6 +47,10 @@ def add_collection(customer: dict, amount: float, user: dict, note: str = "", st
 
     @firestore.transactional
     def tx_add_collection(transaction):
+        idem, prev = idem_lookup(transaction, idempotency_key)
+        if prev is not None:
+            return prev.get("doc_id") or doc_id
+
         cust_ref = db.collection("customers").document(cid)
         cust_snap = cust_ref.get(transaction=transaction)
 
@@ -34,14 +58,13 @@ def add_collection(customer: dict, amount: float, user: dict, note: str = "", st
             raise ValueError("العميل غير موجود")
 
         cust_data = cust_snap.to_dict() or {}
-        cur_balance = float(to_float(cust_data.get("balance", 0.0)))
-        new_balance = cur_balance - amt
+        new_balance = read_fils(cust_data, "balance") - amt
 
         col_ref = db.collection("collections").document(doc_id)
         transaction.set(col_ref, {
             "customer_id": cid,
             "customer_name": cname,
-            "amount": amt,
+            **money_fields(amount=amt),
             "note": (note or "").strip(),
             "status": status,
             "active": True,
@@ -51,214 +74,17 @@ def add_collection(customer: dict, amount: float, user: dict, note: str = "", st
         }, merge=True)
 
         transaction.update(cust_ref, {
-            "balance": new_balance,
+            **money_fields(balance=new_balance),
             "updated_at": now_iso(),
         })
 
-    tx_add_collection(db.transaction())
-    return doc_id
-
-def _safe_created_at(x: dict):
-    return x.get("created_at") or ""
-
-
-# ---------------------------
-# Statement queries (no composite index)
-# ---------------------------
-def _get_customer_credit_sales(customer_id: str, limit=300):
-    docs = db.collection("sales").where("customer_id", "==", customer_id).limit(limit).stream()
-    out = []
-    for d in docs:
-        x = d.to_dict() or {}
-        if x.get("active") is not True:
-            continue
-        if x.get("status") not in ["posted", "done"]:
-            continue
-        if x.get("payment_type") != "credit":
-            continue
-        out.append({"id": d.id, **x})
-    return out
-
-def _get_customer_cash_sales(customer_id: str, limit=300):
-    docs = db.collection("sales").where("customer_id", "==", customer_id).limit(limit).stream()
-    out = []
-    for d in docs:
-        x = d.to_dict() or {}
-        if x.get("active") is not True:
-            continue
-        if x.get("status") not in ["posted", "done"]:
-            continue
-        if x.get("payment_type") != "cash":
-            continue
-        out.append({"id": d.id, **x})
-    return out
-
+        idem_store(transaction, idem, idempotency_key, "collection", {"doc_id": doc_id, "amount": from_fils(amt)}, user)
+        return doc_id
 
-def _get_customer_collections(customer_id: str, limit=300):
-    docs = db.collection("collections").where("customer_id", "==", customer_id).limit(limit).stream()
-    out = []
-    for d in docs:
-        x = d.to_dict() or {}
-        if x.get("active") is not True:
-            continue
-        if x.get("status") not in ["posted", "done"]:
-            continue
-        out.append({"id": d.id, **x})
+    out = tx_add_collection(db.transaction())
+    publish(customer_id=cid)
     return out
 
-def _get_customer_credit_returns(customer_id: str, limit=300):
-    docs = db.collection("returns").where("customer_id", "==", customer_id).limit(limit).stream()
-    out = []
-    for d in docs:
-        x = d.to_dict() or {}
-        if x.get("active") is not True:
-            continue
-        if x.get("status") not in ["posted", "done"]:
-            continue
-        if x.get("settlement") != "credit_note":
-            continue
-        out.append({"id": d.id, **x})
-    return out
-
-def _build_statement(customer: dict):
-    cid = customer["id"]
-    opening = to_float(customer.get("opening_balance", 0))
-    if "opening_balance" not in customer and "balance" in customer:
-        opening = to_float(customer.get("balance", 0))
-
-    sales_credit = _get_customer_credit_sales(cid)
-    sales_cash = _get_customer_cash_sales(cid)
-    cols = _get_customer_collections(cid)
-    rets = _get_customer_credit_returns(cid)
-
-    moves = []
-    moves.append({
-        "created_at": customer.get("created_at", ""),
-        "type": "opening",
-        "ref": "opening_balance",
-        "delta": float(opening),     # أثر على الرصيد
-        "net": float(opening),
-        "paid": 0.0,
-        "unpaid": 0.0,
-        "extra": 0.0,
-        "note": "دين سابق / رصيد افتتاحي",
-    })
-
-    # ✅ مبيعات ذمم (آجل): أثر الرصيد = +net
-    for s in sales_credit:
-        net = float(to_float(s.get("net", s.get("total", 0))))
-        moves.append({
-            "created_at": _safe_created_at(s),
-            "type": "sale_credit",
-            "ref": f"SALE:{s.get('id','')}",
-            "delta": +net,
-            "net": net,
-            "paid": 0.0,
-            "unpaid": net,
-            "extra": 0.0,
-            "note": "فاتورة ذمم (آجل)",
-        })
-
-    # ✅ مبيعات نقدي: تظهر بالحركات + أثر الرصيد = unpaid_debt - extra_credit
-    for s in sales_cash:
-        net = float(to_float(s.get("net", s.get("total", 0))))
-        paid = float(to_float(s.get("amount_paid", 0)))
-        unpaid = float(to_float(s.get("unpaid_debt", 0)))
-        extra = float(to_float(s.get("extra_credit", 0)))
-
-        delta = float(unpaid) - float(extra)  # هذا اللي يأثر على الرصيد
-
-        note = "فاتورة نقدي"
-        if unpaid > 0:
-            note = "فاتورة نقدي (دفع جزئي + ذمم متبقي)"
-        elif extra > 0:
-            note = "فاتورة نقدي (زيادة كرصد للعميل)"
-
-        moves.append({
-            "created_at": _safe_created_at(s),
-            "type": "sale_cash",
-            "ref": f"SALE:{s.get('id','')}",
-            "delta": delta,
-            "net": net,
-            "paid": paid,
-            "unpaid": unpaid,
-            "extra": extra,
-            "note": note,
-        })
-
-    # ✅ التحصيلات: تقلل الرصيد (سداد)
-    for c in cols:
-        amt = float(to_float(c.get("amount", 0)))
-        moves.append({
-            "created_at": _safe_created_at(c),
-            "type": "collection",
-            "ref": f"COL:{c.get('id','')}",
-            "delta": -amt,
-            "net": 0.0,
-            "paid": amt,
-            "unpaid": 0.0,
-            "extra": 0.0,
-            "note": "تحصيل / سند قبض",
-        })
-
-    # ✅ المرتجعات (خصم دين)
-    for r in rets:
-        tot = float(to_float(r.get("total", 0)))
-        moves.append({
-            "created_at": _safe_created_at(r),
-            "type": "return_credit",
-            "ref": f"RET:{r.get('id','')}",
-            "delta": -tot,
-            "net": 0.0,
-            "paid": 0.0,
-            "unpaid": 0.0,
-            "extra": 0.0,
-            "note": "مرتجع (خصم دين)",
-        })
-
-    moves.sort(key=lambda m: m.get("created_at") or "")
-
-    running = 0.0
-    rows = []
-    for m in moves:
-        running += float(to_float(m.get("delta", 0.0)))
-
-        rows.append({
-            "التاريخ": (m.get("created_at", "") or "")[:19].replace("T", " "),
-            "النوع": m.get("note", ""),
-            "المرجع": m.get("ref", ""),
-            "الصافي": round(float(to_float(m.get("net", 0.0))), 3),
-            "المدفوع": round(float(to_float(m.get("paid", 0.0))), 3),
-            "متبقي ذمم": round(float(to_float(m.get("unpaid", 0.0))), 3),
-            "زيادة كرصد": round(float(to_float(m.get("extra", 0.0))), 3),
-            "أثر على الرصيد": round(float(to_float(m.get("delta", 0.0))), 3),
-            "الرصيد بعد العملية": round(float(running), 3),
-        })
-
-    # نرجع نفس المخرجات + نضيف cash_sales بدون ما نكسر شيء
-    return rows, running, sales_credit, sales_cash, cols, rets
-
-# ---------------------------
-# Customer prices (light)
-# ---------------------------
-def _get_customer_prices_map(customer_id: str, limit=300):
-    docs = (
-        db.collection("customer_prices")
-        .where("customer_id", "==", customer_id)
-        .limit(limit)
-        .stream()
-    )
-    out = {}
-    for d in docs:
-        x = d.to_dict() or {}
-        if x.get("active") is not True:
-            continue
-        pid = x.get("product_id")
-        if pid:
-            out[pid] = {"id": d.id, **x}
-    return out
-
-
 
 def _money(x):
     try:
@@ -266,33 +92,39 @@ def _money(x):
     except Exception:
         return "0.00"
 
-def build_customer_full_statement_html(customer: dict, rows: list, final_balance: float, company_name="مخابز البوادي", paper="80mm"):
-    customer = customer or {}
-    cust_name = customer.get("name") or customer.get("id") or "—"
-    phone = customer.get("phone") or ""
-    dt = datetime.now(timezone(timedelta(hours=3))).strftime("%Y-%m-%d %H:%M:%S")
-
-    rows = rows[-80:] if rows else []
-
-    if paper == "80mm":
-        body_rows = ""
-        for r in rows:
-            body_rows += f"""
+_STATEMENT_ROW_80 = Template("""
             <div class="mv">
-              <div class="line"><span>التاريخ</span><span>{r.get("التاريخ","")}</span></div>
-              <div class="line"><span>النوع</span><span>{r.get("النوع","")}</span></div>
-              <div class="line"><span>المرجع</span><span>{r.get("المرجع","")}</span></div>
-              <div class="line"><span>الصافي</span><span>{_money(r.get("الصافي",0))}</span></div>
-              <div class="line"><span>المدفوع</span><span>{_money(r.get("المدفوع",0))}</span></div>
-              <div class="line"><span>متبقي</span><span>{_money(r.get("متبقي ذمم",0))}</span></div>
-              <div class="line"><span>زيادة</span><span>{_money(r.get("زيادة كرصد",0))}</span></div>
-              <div class="line"><span>أثر</span><span>{_money(r.get("أثر على الرصيد",0))}</span></div>
-              <div class="line total"><span>الرصيد</span><span>{_money(r.get("الرصيد بعد العملية",0))}</span></div>
+              <div class="line"><span>التاريخ</span><span>{date}</span></div>
+              <div class="line"><span>النوع</span><span>{kind}</span></div>
+              <div class="line"><span>المرجع</span><span>{ref}</span></div>
+              <div class="line"><span>الصافي</span><span>{net}</span></div>
+              <div class="line"><span>المدفوع</span><span>{paid}</span></div>
+              <div class="line"><span>متبقي</span><span>{remaining}</span></div>
+              <div class="line"><span>زيادة</span><span>{extra}</span></div>
+              <div class="line"><span>أثر</span><span>{effect}</span></div>
+              <div class="line total"><span>الرصيد</span><span>{balance_after}</span></div>
             </div>
-            <hr/>
-            """
+            <hr/>""")
 
-        html = f"""
+_STATEMENT_ROW_A4 = Template("""
+        <tr>
+          <td>{date}</td>
+          <td>{kind}</td>
+          <td>{ref}</td>
+          <td>{net}</td>
+          <td>{paid}</td>
+          <td>{remaining}</td>
+          <td>{extra}</td>
+          <td>{effect}</td>
+          <td><b>{balance_after}</b></td>
+        </tr>""")
+
+_STATEMENT_EMPTY_80 = Markup("<div class='center muted'>لا توجد حركات.</div>")
+_STATEMENT_EMPTY_A4 = Markup("<tr><td colspan='9' class='muted'>لا توجد حركات.</td></tr>")
+_PHONE_ROW_80 = Template("<div class='sumrow'><span>الهاتف:</span><span>{phone}</span></div>")
+_PHONE_ROW_A4 = Template("<div class='sumrow'><span>هاتف:</span><span>{phone}</span></div>")
+
+_STATEMENT_DOC_80 = Template("""
 <!doctype html>
 <html dir="rtl">
 <head>
@@ -427,13 +259,13 @@ def build_customer_full_statement_html(customer: dict, rows: list, final_balance
     <hr/>
 
     <div class="sumrow"><span>العميل:</span><span>{cust_name}</span></div>
-    {f"<div class='sumrow'><span>الهاتف:</span><span>{phone}</span></div>" if phone else ""}
-    <div class="sumrow"><span>الرصيد الحالي:</span><span>{_money(final_balance)}</span></div>
+    {phone_row}
+    <div class="sumrow"><span>الرصيد الحالي:</span><span>{balance}</span></div>
     <div class="sumrow"><span>تاريخ الطباعة:</span><span>{dt}</span></div>
 
     <hr/>
 
-    {body_rows if body_rows else "<div class='center muted'>لا توجد حركات.</div>"}
+    {rows}
 
     <div class="btnbar">
       <button onclick="window.print()">🖨️ طباعة الآن</button>
@@ -441,29 +273,9 @@ def build_customer_full_statement_html(customer: dict, rows: list, final_balance
   </div>
 </body>
 </html>
-"""
-        return html
+""")
 
-    # =========================
-    # A4
-    # =========================
-    body_rows = ""
-    for r in rows:
-        body_rows += f"""
-        <tr>
-          <td>{r.get("التاريخ","")}</td>
-          <td>{r.get("النوع","")}</td>
-          <td>{r.get("المرجع","")}</td>
-          <td>{_money(r.get("الصافي",0))}</td>
-          <td>{_money(r.get("المدفوع",0))}</td>
-          <td>{_money(r.get("متبقي ذمم",0))}</td>
-          <td>{_money(r.get("زيادة كرصد",0))}</td>
-          <td>{_money(r.get("أثر على الرصيد",0))}</td>
-          <td><b>{_money(r.get("الرصيد بعد العملية",0))}</b></td>
-        </tr>
-        """
-
-    html = f"""
+_STATEMENT_DOC_A4 = Template("""
 <!doctype html>
 <html dir="rtl">
 <head>
@@ -562,8 +374,8 @@ def build_customer_full_statement_html(customer: dict, rows: list, final_balance
     <hr/>
 
     <div class="sumrow"><span>العميل:</span><span><b>{cust_name}</b></span></div>
-    {f"<div class='sumrow'><span>هاتف:</span><span>{phone}</span></div>" if phone else ""}
-    <div class="sumrow"><span>الرصيد الحالي:</span><span><b>{_money(final_balance)}</b></span></div>
+    {phone_row}
+    <div class="sumrow"><span>الرصيد الحالي:</span><span><b>{balance}</b></span></div>
     <div class="sumrow"><span>تاريخ الطباعة:</span><span>{dt}</span></div>
 
     <hr/>
@@ -583,7 +395,7 @@ def build_customer_full_statement_html(customer: dict, rows: list, final_balance
         </tr>
       </thead>
       <tbody>
-        {body_rows if body_rows else "<tr><td colspan='9' class='muted'>لا توجد حركات.</td></tr>"}
+        {rows}
       </tbody>
     </table>
 
@@ -593,8 +405,77 @@ def build_customer_full_statement_html(customer: dict, rows: list, final_balance
   </div>
 </body>
 </html>
-"""
-    return html
+""")
+
+
+def _statement_print_rows(rows):
+    for r in rows:
+        yield {
+            "date": r.get("التاريخ", ""),
+            "kind": r.get("النوع", ""),
+            "ref": r.get("المرجع", ""),
+            "net": _money(r.get("الصافي", 0)),
+            "paid": _money(r.get("المدفوع", 0)),
+            "remaining": _money(r.get("متبقي ذمم", 0)),
+            "extra": _money(r.get("زيادة كرصد", 0)),
+            "effect": _money(r.get("أثر على الرصيد", 0)),
+            "balance_after": _money(r.get("الرصيد بعد العملية", 0)),
+        }
+
+
+def build_customer_full_statement_html(customer: dict, rows: list, final_balance: float, company_name="مخابز البوادي", paper="80mm", max_rows=80):
+    customer = customer or {}
+    cust_name = customer.get("name") or customer.get("id") or "—"
+    phone = customer.get("phone") or ""
+    dt = datetime.now(timezone(timedelta(hours=3))).strftime("%Y-%m-%d %H:%M:%S")
+
+    rows = rows[-int(max_rows):] if rows and max_rows else []
+
+    if paper == "80mm":
+        doc, row_tpl, empty, phone_tpl = _STATEMENT_DOC_80, _STATEMENT_ROW_80, _STATEMENT_EMPTY_80, _PHONE_ROW_80
+    else:
+        doc, row_tpl, empty, phone_tpl = _STATEMENT_DOC_A4, _STATEMENT_ROW_A4, _STATEMENT_EMPTY_A4, _PHONE_ROW_A4
+
+    return doc.render(
+        company_name=company_name,
+        cust_name=cust_name,
+        phone_row=phone_tpl.render(phone=phone) if phone else "",
+        balance=_money(final_balance),
+        dt=dt,
+        rows=row_tpl.render_many(_statement_print_rows(rows), empty=empty),
+    )
+
+_STATEMENT_PDF_COLUMNS = (
+    ("التاريخ", 0.17), ("النوع", 0.2), ("المرجع", 0.17), ("الصافي", 0.1),
+    ("المدفوع", 0.1), ("متبقي ذمم", 0.09), ("أثر", 0.08), ("الرصيد بعد", 0.09),
+)
+
+
+def build_customer_statement_pdf(customer: dict, rows: list, final_balance: float, company_name="مخابز البوادي", max_rows=None) -> bytes:
+    """
+    كشف الحساب كاملاً PDF من الخادم؛ نفس الكشف (نفس الصفوف) يُعاد من الـ cache.
+    بدون وقت طباعة داخل الملف: الفترة من الحركات نفسها، فالناتج ثابت لنفس الكشف.
+    """
+    customer = customer or {}
+    rows = rows[-int(max_rows):] if rows and max_rows else list(rows or [])
+    info = [("العميل:", customer.get("name") or customer.get("id") or "—")]
+    if customer.get("phone"):
+        info.append(("هاتف:", customer.get("phone")))
+    info.append(("الرصيد الحالي:", _money(final_balance)))
+    if rows:
+        info.append(("الفترة:", f"من {rows[0].get('التاريخ', '')[:10]} إلى {rows[-1].get('التاريخ', '')[:10]}"))
+    info.append(("عدد الحركات:", str(len(rows))))
+
+    def chunks():
+        body = (
+            (r["date"], r["kind"], r["ref"], r["net"], r["paid"], r["remaining"], r["effect"], r["balance_after"])
+            for r in _statement_print_rows(rows)
+        )
+        return iter_table_pdf("كشف حساب عميل", _STATEMENT_PDF_COLUMNS, body, info=info, company_name=company_name)
+
+    key = ("customer_statement", customer.get("id") or "", rows_checkpoint(rows), (max_rows, _money(final_balance)))
+    return pdf_bytes(key, chunks)
+
 
 def show_print_html(html: str, height=820):
     components.html(html, height=height, scrolling=True)
@@ -602,6 +483,57 @@ def show_print_html(html: str, height=820):
 # ---------------------------
 # Page: Customers
 # ---------------------------
+def _receivables_aging_tab(user):
+    st.subheader("⏳ أعمار الذمم")
+    st.caption("التحصيلات تسدد أقدم الفواتير أولاً (FIFO). التحديث يعيد حساب العملاء الذين تغيّر رصيدهم منذ آخر تحديث فقط.")
+
+    c1, c2, c3 = st.columns([1.2, 1.2, 1.6])
+    with c1:
+        if st.button("🔄 تحديث الأعمار", use_container_width=True, key="aging_run_btn"):
+            with st.spinner("جاري حساب أعمار الذمم..."):
+                summary = run_aging(user)
+            st.success(f"تمت معالجة {summary['customers_processed']} عميل ✅")
+    with c2:
+        if user.get("role") == "admin" and st.button("♻️ إعادة حساب كاملة", use_container_width=True, key="aging_full_btn"):
+            with st.spinner("جاري إعادة حساب كل العملاء..."):
+                summary = run_aging(user, full=True)
+            st.success(f"تمت معالجة {summary['customers_processed']} عميل ✅")
+    with c3:
+        as_of = st.date_input("حتى تاريخ", key="aging_as_of", value=datetime.now(timezone(timedelta(hours=3))).date())
+
+    report = aging_report(as_of.isoformat())
+    run = report["run"]
+    if not run:
+        st.info("لم يتم حساب أعمار الذمم بعد. اضغط \"تحديث الأعمار\".")
+        return
+    st.caption(f"آخر تحديث: {(run.get('finished_at') or '')[:16].replace('T', ' ')} — {run.get('run_by', '')}")
+
+    totals = report["totals"]
+    cols = st.columns(len(AGING_BUCKETS) + 1)
+    cols[0].metric("إجمالي الذمم", f"{totals.get('outstanding', 0.0):.2f}")
+    for col, (key, label, *_) in zip(cols[1:], AGING_BUCKETS):
+        col.metric(label, f"{totals.get(key, 0.0):.2f}")
+
+    rows = report["rows"]
+    if not rows:
+        st.info("لا توجد ذمم مستحقة.")
+        return
+    st.dataframe(
+        [
+            {
+                "العميل": r["customer_name"],
+                "المنطقة": r["area"],
+                "أقدم دين": r["oldest"],
+                "الإجمالي": r["outstanding"],
+                **{label: r[key] for key, label, *_ in AGING_BUCKETS},
+            }
+            for r in rows
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+
 def customers_page(go, user):
     st.markdown("<h2 style='text-align:center;'>👥 العملاء</h2>", unsafe_allow_html=True)
     st.caption("إضافة عميل + تعديل معلوماته + تعديل الأسعار الخاصة + حذف + كشف حساب (خفيف وسريع)")
@@ -612,15 +544,13 @@ def customers_page(go, user):
         if st.button("⬅️ رجوع للوحة التحكم", key="back_to_dashboard_customers"):
             go("dashboard")
 
-    # ✅ كاش المنتجات (مرة واحدة) عشان نستخدمها في أسعار العملاء بدون بطء
-    if "products_cache_for_customer_prices" not in st.session_state:
-        st.session_state.products_cache_for_customer_prices = col_to_list("products", where_active=True)
-
+    # ✅ المنتجات من الكتالوج المشترك (الجلسة تحفظ رقم النسخة فقط) عشان أسعار العملاء بدون بطء
     if st.button("🔄 تحديث المنتجات (أسعار العملاء)", key="refresh_products_cache_for_customer_prices"):
-        st.session_state.pop("products_cache_for_customer_prices", None)
+        refresh_catalog("products")
+        unpin_catalog(st.session_state, "products")
         st.rerun()
 
-    products_cache = st.session_state.get("products_cache_for_customer_prices", []) or []
+    products_cache = session_catalog(st.session_state, "products").items
     products_cache = sorted(products_cache, key=lambda x: (x.get("name") or ""))
 
     # ✅ هذه هي نفس منتجات المستودع (اللي بتنضاف من inventory_page)
@@ -634,7 +564,7 @@ def customers_page(go, user):
         if (p.get("active") is True)
     ]
 
-    tabs = st.tabs(["👥 إدارة العملاء", "📊 كشف حساب العميل"])
+    tabs = st.tabs(["👥 إدارة العملاء", "📊 كشف حساب العميل", "⏳ أعمار الذمم"])
 
     # ---------------------------
     # Tab 1: Manage customers
@@ -712,34 +642,24 @@ def customers_page(go, user):
                         "name": name.strip(),
                         "phone": phone.strip(),
                         "area": area.strip(),
-                        "opening_balance": float(opening),
-                        "balance": float(opening),
+                        **money_fields(opening_balance=to_fils(opening), balance=to_fils(opening)),
                         "active": True,
                         "created_at": now_iso(),
                         "updated_at": now_iso(),
                         "created_by": user.get("username", ""),
                     }, merge=True)
 
-                    # 2) Save special prices (optional)
+                    # 2) Save special prices (optional): عميل جديد = لا أسعار حالية، batch واحد
                     if st.session_state.get("add_cust_enable_special") and add_special_rows:
-                        uniq = {}
-                        for r in add_special_rows:
-                            uniq[r["product_id"]] = r
-
-                        for pid, r in uniq.items():
-                            doc_id = f"{customer_id}__{pid}"
-                            doc_set("customer_prices", doc_id, {
-                                "customer_id": customer_id,
-                                "customer_name": name.strip(),
-                                "product_id": pid,
-                                "product_name": r.get("product_name", ""),
-                                "price": float(to_float(r.get("price", 0.0))),
-                                "active": True,
-                                "created_at": now_iso(),
-                                "updated_at": now_iso(),
-                                "updated_by": user.get("username", ""),
-                            }, merge=True)
-
+                        save_customer_prices(
+                            {"id": customer_id, "name": name.strip()},
+                            {r["product_id"]: r["price"] for r in add_special_rows},
+                            user,
+                            products={r["product_id"]: r["product_name"] for r in add_special_rows},
+                            current={},
+                        )
+
+                    publish(customer_id=customer_id)
                     st.success("تمت إضافة العميل ✅" + (" مع أسعار خاصة ✅" if (st.session_state.get("add_cust_enable_special") and add_special_rows) else ""))
                     st.rerun()
 
@@ -764,7 +684,7 @@ def customers_page(go, user):
                     customer_id = cust_map[sel_name]
                     cust = cust_by_id.get(customer_id, {"id": customer_id})
 
-                    prices_map = _get_customer_prices_map(customer_id)
+                    prices_map = load_customer_prices(customer_id)
 
                     with st.form("edit_customer_info_and_prices_form"):
                         st.markdown("### 🧾 معلومات العميل")
@@ -774,31 +694,33 @@ def customers_page(go, user):
 
                         st.divider()
                         st.markdown("### 💰 الأسعار الخاصة")
-                        st.caption("اترك السعر فارغ = إلغاء السعر الخاص (يرجع للسعر العام).")
+                        st.caption("اترك السعر فارغ = إلغاء السعر الخاص (يرجع للسعر العام). يُحفظ فقط ما تغيّر.")
 
+                        edited_prices = []
                         if not PRODUCTS_FOR_PRICES:
                             st.warning("لا يوجد منتجات. أضف منتجات أولاً من صفحة المستودع.")
                         else:
-                            for i in range(0, len(PRODUCTS_FOR_PRICES), 2):
-                                cols = st.columns(2, gap="large")
-                                pair = PRODUCTS_FOR_PRICES[i:i+2]
-
-                                for j, p in enumerate(pair):
-                                    with cols[j]:
-                                        pid = p["id"]
-                                        st.markdown(f"**🧾 {p['name']}**")
-                                        st.caption(f"السعر العام: **{p['base_price']:.3f}**")
-
-                                        current = prices_map.get(pid, {})
-                                        current_price = current.get("price", None)
-                                        default_txt = "" if current_price is None else str(current_price)
-
-                                        st.text_input(
-                                            "السعر الخاص",
-                                            value=default_txt,
-                                            placeholder="اتركه فارغ = سعر عام",
-                                            key=f"edit_price_txt__{customer_id}__{pid}"
-                                        )
+                            # ✅ السعر نص عشان يقبل النقطة/الفاصلة بكل الأجهزة
+                            price_rows = []
+                            for p in PRODUCTS_FOR_PRICES:
+                                current_price = prices_map.get(p["id"], {}).get("price")
+                                price_rows.append({
+                                    "product_id": p["id"],
+                                    "المنتج": p["name"],
+                                    "السعر العام": f"{p['base_price']:.3f}",
+                                    "السعر الخاص": "" if current_price is None else f"{to_float(current_price):.3f}",
+                                })
+                            edited_prices = st.data_editor(
+                                price_rows,
+                                use_container_width=True,
+                                hide_index=True,
+                                disabled=["product_id", "المنتج", "السعر العام"],
+                                column_config={
+                                    "product_id": None,
+                                    "السعر الخاص": st.column_config.TextColumn("السعر الخاص (فارغ = سعر عام)"),
+                                },
+                                key=f"edit_prices_grid__{customer_id}",
+                            )
 
                         save = st.form_submit_button("💾 حفظ التعديلات")
 
@@ -811,47 +733,98 @@ def customers_page(go, user):
                             "updated_at": now_iso(),
                         }, merge=True)
 
-                        # 2) update prices
-                        if PRODUCTS_FOR_PRICES:
-                            for p in PRODUCTS_FOR_PRICES:
-                                pid = p["id"]
-                                pname = p["name"]
-
-                                txt = (st.session_state.get(f"edit_price_txt__{customer_id}__{pid}") or "").strip()
-                                doc_id = f"{customer_id}__{pid}"
-
-                                if txt == "":
-                                    # deactivate special price
-                                    doc_set("customer_prices", doc_id, {
-                                        "active": False,
-                                        "updated_at": now_iso(),
-                                        "updated_by": user.get("username", ""),
-                                    }, merge=True)
-                                else:
-                                    try:
-                                        price_val = float(txt)
-                                    except Exception:
-                                        price_val = None
-
-                                    if price_val is None:
-                                        st.warning(f"سعر غير صالح للمنتج: {pname} — تم تجاهله")
-                                        continue
-
-                                    doc_set("customer_prices", doc_id, {
-                                        "customer_id": customer_id,
-                                        "customer_name": (new_name or "").strip() or cust.get("name", ""),
-                                        "product_id": pid,
-                                        "product_name": pname,
-                                        "price": float(price_val),
-                                        "active": True,
-                                        "created_at": prices_map.get(pid, {}).get("created_at", now_iso()),
-                                        "updated_at": now_iso(),
-                                        "updated_by": user.get("username", ""),
-                                    }, merge=True)
-
-                        st.success("تم تحديث معلومات العميل والأسعار الخاصة ✅")
+                        # 2) update prices: الفروقات فقط، في batches
+                        stats = save_customer_prices(
+                            {"id": customer_id, "name": (new_name or "").strip() or cust.get("name", "")},
+                            {r["product_id"]: r.get("السعر الخاص") for r in edited_prices},
+                            user,
+                            products={p["id"]: p["name"] for p in PRODUCTS_FOR_PRICES},
+                            current=prices_map,
+                        )
+                        for pid, msg in stats["invalid"].items():
+                            st.warning(f"{msg} — المنتج {pid} تم تجاهله")
+
+                        publish(customer_id=customer_id)
+                        st.success(f"تم تحديث معلومات العميل ✅ — أسعار معدّلة: {stats['set']}، ملغاة: {stats['cleared']}")
                         st.rerun()
 
+        # ===========================
+        # ✅ Area prices (copy / percentage)
+        # ===========================
+        with st.expander("🧮 أسعار منطقة كاملة (نسخ / نسبة)", expanded=False):
+            st.caption("مهمة واحدة لكل عملاء المنطقة: معاينة أولاً ثم تنفيذ. الكتابة في دفعات.")
+            areas = sorted({(c.get("area") or "").strip() for c in customers} - {""})
+            src_map = {c.get("name", c["id"]): c["id"] for c in customers}
+            if not areas:
+                st.info("لا يوجد عملاء بمنطقة محددة.")
+            else:
+                a1, a2 = st.columns([1.2, 1.8])
+                with a1:
+                    price_area = st.selectbox("المنطقة", options=[""] + areas, key="area_prices_area")
+                with a2:
+                    price_action = st.radio("العملية", ["نسبة على الأسعار", "نسخ أسعار عميل"], horizontal=True,
+                                            key="area_prices_action")
+
+                if price_action == "نسبة على الأسعار":
+                    price_base = st.radio("الأساس", ["الأسعار الخاصة الحالية", "السعر العام لكل المنتجات"],
+                                          horizontal=True, key="area_prices_base")
+                    price_pct = st.number_input("النسبة % (سالب = تخفيض)", min_value=-99.0, max_value=500.0,
+                                                value=0.0, step=0.5, key="area_prices_pct")
+                else:
+                    src_name = st.selectbox("العميل المصدر", options=[""] + list(src_map.keys()), key="area_prices_src")
+                    price_replace = st.checkbox("نسخة مطابقة (إلغاء الأسعار غير الموجودة عند المصدر)",
+                                                value=False, key="area_prices_replace")
+
+                def _area_job(dry_run: bool):
+                    if price_action == "نسبة على الأسعار":
+                        base = "special" if price_base == "الأسعار الخاصة الحالية" else "general"
+                        # مفتاح المهمة يتبع النسبة والأساس: تغيير أي منهما = مهمة جديدة وليس استكمالاً
+                        job_id = session_idempotency_key(
+                            st.session_state, f"area_prices_{price_area}", idem_fingerprint(price_pct, base)
+                        )
+                        return adjust_area_prices(
+                            price_area,
+                            price_pct,
+                            user,
+                            job_id=job_id,
+                            base=base,
+                            products={p["id"]: p["name"] for p in PRODUCTS_FOR_PRICES},
+                            base_prices={p["id"]: to_fils(p["base_price"]) for p in PRODUCTS_FOR_PRICES},
+                            dry_run=dry_run,
+                        )
+                    src_id = src_map.get(src_name, "")
+                    if not src_id:
+                        raise ValueError("اختر العميل المصدر")
+                    targets = [c["id"] for c in customers if (c.get("area") or "").strip() == price_area]
+                    return copy_customer_prices(src_id, targets, user, replace=price_replace, dry_run=dry_run)
+
+                b1, b2 = st.columns(2)
+                with b1:
+                    preview = st.button("👁️ معاينة", use_container_width=True, key="area_prices_preview",
+                                        disabled=not price_area)
+                with b2:
+                    run_job = st.button("✅ تنفيذ", use_container_width=True, key="area_prices_run",
+                                        disabled=not price_area)
+
+                if preview or run_job:
+                    try:
+                        stats = _area_job(dry_run=preview)
+                    except ValueError as e:
+                        st.error(str(e))
+                    except Exception as e:
+                        if preview:
+                            st.error(f"تعذّرت المعاينة: {e}")
+                        else:
+                            # الدفعات المنفّذة مختومة بمفتاح المهمة فلا تتكرر عند الإعادة
+                            st.error(f"توقّف التنفيذ في المنتصف ({e}) — اضغط «تنفيذ» مرة أخرى لإكمال باقي الأسعار")
+                    else:
+                        msg = f"عملاء: {stats['customers']} — أسعار تُكتب: {stats['set']} — تُلغى: {stats['cleared']}"
+                        if preview:
+                            st.info("معاينة: " + msg)
+                        else:
+                            clear_session_idempotency_key(st.session_state, f"area_prices_{price_area}")
+                            st.success(f"تم ✅ {msg} (دفعات: {stats['commits']})")
+
         # ===========================
         # ✅ Customers list (edit opening balance + disable)
         # ===========================
@@ -902,15 +875,15 @@ def customers_page(go, user):
             with colA:
                 if st.button("💾 حفظ التعديلات", use_container_width=True, key="cust_save_btn"):
                     for r in edited:
-                        opening_val = float(to_float(r.get("opening_balance")))
+                        opening_val = to_fils(to_float(r.get("opening_balance")))
                         doc_set("customers", r["id"], {
                             "name": (r.get("name") or "").strip(),
                             "phone": (r.get("phone") or "").strip(),
                             "area": (r.get("area") or "").strip(),
-                            "opening_balance": opening_val,
-                            "balance": opening_val,
+                            **money_fields(opening_balance=opening_val, balance=opening_val),
                             "updated_at": now_iso(),
                         }, merge=True)
+                        publish(customer_id=r["id"])
                     st.success("تم حفظ التعديلات ✅")
                     st.rerun()
 
@@ -919,9 +892,16 @@ def customers_page(go, user):
                 if st.button("حذف العميل", use_container_width=True, key="cust_disable_btn"):
                     if del_id:
                         doc_soft_delete("customers", del_id)
+                        publish(customer_id=del_id)
                         st.success("تم حذف العميل ✅")
                         st.rerun()
 
+    # ---------------------------
+    # Tab 3: Receivables aging (قبل تبويب الكشف لأنه ينتهي بـ return)
+    # ---------------------------
+    with tabs[2]:
+        _receivables_aging_tab(user)
+
     # ---------------------------
     # Tab 2: Customer statement
     # ---------------------------
@@ -944,7 +924,9 @@ def customers_page(go, user):
         customer_id = cust_map[cust_name]
         customer = cust_by_id.get(customer_id, {"id": customer_id})
 
-        rows, final_balance, sales_credit, sales_cash, cols, rets = _build_statement(customer)
+        statement = load_statement(customer)
+        rows, final_balance = statement.rows, statement.final_balance
+        sales_credit, sales_cash, cols, rets = statement.sales_credit, statement.sales_cash, statement.cols, statement.rets
 
         st.markdown("### 💰 تحصيل (سداد دين بدون شراء)")
         with st.expander("➕ إضافة سند قبض", expanded=False):
@@ -974,14 +956,22 @@ def customers_page(go, user):
                         st.warning(f"تم تخفيض المبلغ إلى قيمة الدين الحالي: {float(final_balance):.3f}")
                         amt = float(final_balance)
 
-                    add_collection(customer=customer, amount=amt, user=user, note=note, status="posted")
+                    add_collection(
+                        customer=customer,
+                        amount=amt,
+                        user=user,
+                        note=note,
+                        status="posted",
+                        idempotency_key=session_idempotency_key(st.session_state, f"collection_{customer_id}"),
+                    )
+                    clear_session_idempotency_key(st.session_state, f"collection_{customer_id}")
                     st.success("تم تسجيل سند القبض ✅")
                     st.rerun()
 
         st.divider()
 
-        total_credit = sum(to_float(s.get("net", s.get("total", 0))) for s in sales_credit)
-        total_cash_net = sum(to_float(s.get("net", s.get("total", 0))) for s in sales_cash)
+        total_credit = from_fils(sum(s.net_fils for s in sales_credit))
+        total_cash_net = from_fils(sum(s.net_fils for s in sales_cash))
         total_cols = sum(to_float(c.get("amount", 0)) for c in cols)
         total_rets = sum(to_float(r.get("total", 0)) for r in rets)
 
@@ -994,7 +984,7 @@ def customers_page(go, user):
                
         st.divider()
 
-        p1, p2 = st.columns([1.2, 2.8])
+        p1, p2, p3 = st.columns([1.2, 1.8, 1.0])
         with p1:
             paper = st.selectbox("ورق الطباعة", ["80mm", "a4"], index=0, key="stmt_paper")
         with p2:
@@ -1007,6 +997,25 @@ def customers_page(go, user):
                     paper=paper
                 )
                 show_print_html(html, height=820)
+        with p3:
+            if st.button("📄 PDF كامل", use_container_width=True, key="stmt_pdf_btn"):
+                st.session_state["stmt_pdf_for"] = customer_id
+
+        # الكشف الكامل يُبنى على الخادم (لا تخطيط iframe على الهاتف) ويُحفظ لنفس الحركات
+        if st.session_state.get("stmt_pdf_for") == customer_id:
+            try:
+                pdf = build_customer_statement_pdf(customer, rows, final_balance, company_name="مخابز البوادي")
+            except ValueError as e:
+                st.warning(f"تعذر إنشاء PDF: {e}")
+            else:
+                st.download_button(
+                    "⬇️ تحميل كشف الحساب PDF",
+                    data=pdf,
+                    file_name=f"statement_{customer_id}.pdf",
+                    mime="application/pdf",
+                    use_container_width=True,
+                    key="stmt_pdf_dl",
+                )
 
         st.divider()
         st.markdown("### جدول الحركات (كشف الحساب)")
@@ -1017,13 +1026,13 @@ def customers_page(go, user):
                 # ✅ أدوات فرز/فلترة للجدول (بدون تغيير البيانات الأصلية)
         st.markdown("### 🔍 فرز / فلترة الحركات")
 
-        # خيارات فلترة مناسبة (تقدر تزيد لاحقاً)
-        filter_options = ["الكل", "ذمم", "نقدي", "تحصيل", "مرتجع", "افتتاحي"]
+        # الفلتر على عمود type في إطار الكشف (وليس مطابقة نص "النوع")
+        filter_options = {"الكل": "", **{label: code for code, label in STATEMENT_KINDS.items()}}
 
         c1, c2, c3, c4 = st.columns([1.2, 1.2, 1.2, 2.4])
 
         with c1:
-            kind = st.selectbox("عرض", filter_options, index=0, key="stmt_filter_kind")
+            kind = st.selectbox("عرض", list(filter_options), index=0, key="stmt_filter_kind")
 
         with c2:
             sort_dir = st.selectbox("ترتيب", ["الأحدث أولاً", "الأقدم أولاً"], index=0, key="stmt_sort_dir")
@@ -1034,44 +1043,22 @@ def customers_page(go, user):
         with c4:
             q = st.text_input("بحث (مرجع/نوع/تاريخ)", value="", placeholder="مثال: SALE: أو INV أو تاريخ...", key="stmt_q")
 
-        # نسخة للعمل
-        filtered = list(rows or [])
-
-        # فلترة حسب النوع (تعتمد على النص في عمود 'النوع')
-        def _match_kind(row_type: str, target: str) -> bool:
-            t = (row_type or "")
-            if target == "الكل":
-                return True
-            if target == "ذمم":
-                return ("ذمم" in t) or ("آجل" in t)
-            if target == "نقدي":
-                return ("نقدي" in t) or ("دفع" in t and "سند قبض" not in t)
-            if target == "تحصيل":
-                return ("تحصيل" in t) or ("سند قبض" in t) or ("قبض" in t)
-            if target == "مرتجع":
-                return ("مرتجع" in t) or ("خصم دين" in t)
-            if target == "افتتاحي":
-                return ("افتتاحي" in t) or ("دين سابق" in t)
-            return True
-
-        filtered = [r for r in filtered if _match_kind(r.get("النوع", ""), kind)]
-
-        # بحث عام
-        qq = (q or "").strip().lower()
-        if qq:
-            def _row_text(r):
-                return f"{r.get('التاريخ','')} {r.get('النوع','')} {r.get('المرجع','')}".lower()
-            filtered = [r for r in filtered if qq in _row_text(r)]
-
-        # ترتيب حسب التاريخ (نصياً عندك ISO/مقارب)
-        reverse = (sort_dir == "الأحدث أولاً")
-        filtered.sort(key=lambda r: (r.get("التاريخ") or ""), reverse=reverse)
-
-        # حد عدد السطور
-        if max_rows != "الكل":
-            filtered = filtered[:int(max_rows)]
-
-        st.caption(f"النتائج المعروضة: {len(filtered)} / إجمالي الحركات: {len(rows)}")
+        # فلترة + بحث + ترتيب + مجاميع على الإطار، ومحفوظة لنفس الكشف
+        filtered, matched, subtotals = statement.view(
+            kind=filter_options[kind],
+            query=q,
+            newest_first=(sort_dir == "الأحدث أولاً"),
+            limit=None if max_rows == "الكل" else int(max_rows),
+        )
+
+        st.caption(f"النتائج المعروضة: {len(filtered)} من {matched} مطابقة / إجمالي الحركات: {len(rows)}")
+
+        if subtotals:
+            st.dataframe(
+                [{"النوع": STATEMENT_KINDS.get(code, code), **sub} for code, sub in subtotals.items()],
+                use_container_width=True,
+                hide_index=True,
+            )
 
         # عرض الجدول بعد الفلترة
         st.dataframe(filtered, use_container_width=True, hide_index=True)
\ No newline at end of file
@@ -5,10 +5,16 @@ import hashlib
 from datetime import datetime, timezone, timedelta
 
 from firebase_config import db
-from firebase_admin import firestore
 
-from utils.helpers import now_iso, to_int, to_float
+from utils.helpers import fmt_qty, now_iso, to_int, to_float
+from utils.money import money_fields, to_fils
 from services.firestore_queries import col_to_list, doc_set, doc_soft_delete
+from services.distributors_service import apply_move, tx_apply_cash_collection
+from services.loading_sheet_service import build_loading_sheet
+from services.cache_bus import DISTRIBUTORS_TAG, publish_tags
+from components.printing import build_loading_sheet_html
+from components.print_templates import Markup, Template
+from components.pdf_render import iter_table_pdf, pdf_bytes, rows_checkpoint
 
 def hash_password(pw: str) -> str:
     return hashlib.sha256((pw or "").encode("utf-8")).hexdigest()
@@ -138,33 +144,20 @@ def _build_dist_statement(dist: dict, moves: list):
 # ---------------------------
 # Printing HTML
 # ---------------------------
-def build_distributor_statement_html(dist: dict, rows: list, final_balance: int, company_name="مخابز البوادي", paper="80mm"):
-    name = dist.get("name") or dist.get("id") or "—"
-    phone = dist.get("phone") or ""
-    money_bal = to_float(dist.get("money_balance", 0))
-    dt = datetime.now(timezone(timedelta(hours=3))).strftime("%Y-%m-%d %H:%M:%S")
-
-    width_css = "280px" if paper == "80mm" else "820px"
-    font_css = "12px" if paper == "80mm" else "14px"
-
-    rows = rows[-120:] if rows else []
-
-    body = ""
-    for r in rows:
-        amt = r.get("المبلغ", "")
-        amt_show = _money3(amt) if amt != "" else ""
-        body += f"""
+_STATEMENT_ROW = Template("""
         <tr>
-          <td>{r.get("التاريخ","")}</td>
-          <td>{r.get("النوع","")}</td>
-          <td>{_money_int(r.get("الكمية",0))}</td>
-          <td>{_money_int(r.get("أثر",0))}</td>
-          <td><b>{_money_int(r.get("الرصيد",0))}</b></td>
-          <td>{amt_show}</td>
-        </tr>
-        """
-
-    html = f"""
+          <td>{date}</td>
+          <td>{kind}</td>
+          <td>{qty}</td>
+          <td>{effect}</td>
+          <td><b>{balance}</b></td>
+          <td>{amount}</td>
+        </tr>""")
+
+_STATEMENT_EMPTY = Markup("<tr><td colspan='6' class='muted'>لا توجد حركات.</td></tr>")
+_PHONE_ROW = Template("<div class='sumrow'><span>هاتف:</span><span>{phone}</span></div>")
+
+_STATEMENT_DOC = Template("""
 <!doctype html>
 <html>
 <head>
@@ -200,9 +193,9 @@ def build_distributor_statement_html(dist: dict, rows: list, final_balance: int,
     <hr/>
 
     <div class="sumrow"><span>الموزّع:</span><span><b>{name}</b></span></div>
-    {f"<div class='sumrow'><span>هاتف:</span><span>{phone}</span></div>" if phone else ""}
-    <div class="sumrow"><span>رصيد الصناديق:</span><span><b>{_money_int(final_balance)}</b></span></div>
-    <div class="sumrow"><span>الرصيد المالي على الموزّع:</span><span><b>{money_bal:.3f}</b></span></div>
+    {phone_row}
+    <div class="sumrow"><span>رصيد الصناديق:</span><span><b>{boxes_balance}</b></span></div>
+    <div class="sumrow"><span>الرصيد المالي على الموزّع:</span><span><b>{money_balance}</b></span></div>
     <div class="sumrow"><span>تاريخ الطباعة:</span><span>{dt}</span></div>
 
     <hr/>
@@ -219,7 +212,7 @@ def build_distributor_statement_html(dist: dict, rows: list, final_balance: int,
         </tr>
       </thead>
       <tbody>
-        {body if body else "<tr><td colspan='6' class='muted'>لا توجد حركات.</td></tr>"}
+        {rows}
       </tbody>
     </table>
 
@@ -234,147 +227,209 @@ def build_distributor_statement_html(dist: dict, rows: list, final_balance: int,
   </div>
 </body>
 </html>
-"""
-    return html
+""")
 
 
-def show_print_html(html: str, height=820):
-    components.html(html, height=height, scrolling=True)
+def _statement_print_rows(rows):
+    for r in rows:
+        amt = r.get("المبلغ", "")
+        yield {
+            "date": r.get("التاريخ", ""),
+            "kind": r.get("النوع", ""),
+            "qty": _money_int(r.get("الكمية", 0)),
+            "effect": _money_int(r.get("أثر", 0)),
+            "balance": _money_int(r.get("الرصيد", 0)),
+            "amount": _money3(amt) if amt != "" else "",
+        }
 
 
-# ---------------------------
-# Transaction: apply move (crates + stock + money)
-# ---------------------------
-@firestore.transactional
-def _tx_apply_move(transaction, dist_id: str, move_doc_id: str, move_data: dict):
-    """
-    ✅ يحدّث رصيد الصناديق داخل distributors
-    ✅ يخصم/يرجع من مخزون المنتج حسب total_units (عند out/in)
-    ✅ يحدّث الرصيد المالي money_balance حسب price * total_units (عند out/in)
-    ✅ يسجل الحركة داخل crate_moves atomically
-    """
-    dist_ref = db.collection("distributors").document(dist_id)
-    dist_snap = dist_ref.get(transaction=transaction)
-    if not dist_snap.exists:
-        raise ValueError("الموزّع غير موجود")
-
-    dist = dist_snap.to_dict() or {}
-    cur_boxes = to_int(dist.get("crates_balance", 0))
-    cur_money = to_float(dist.get("money_balance", 0))
-
-    typ = move_data.get("type")  # out | in | adjust
-    boxes_qty = to_int(move_data.get("boxes_qty", 0))
-    delta_boxes = 0
-
-    # بيانات المخزن
-    product_id = (move_data.get("product_id") or "").strip()
-    units_per_box = to_int(move_data.get("units_per_box", 0))
-    total_units = to_int(move_data.get("total_units", 0))
-
-    # =========================
-    # 1) أثر الصناديق
-    # =========================
-    if typ == "out":
-        if boxes_qty <= 0:
-            raise ValueError("عدد الصناديق يجب أن يكون أكبر من صفر")
-        delta_boxes = +boxes_qty
-
-    elif typ == "in":
-        if boxes_qty <= 0:
-            raise ValueError("عدد الصناديق يجب أن يكون أكبر من صفر")
-        delta_boxes = -boxes_qty
-        if cur_boxes + delta_boxes < 0:
-            raise ValueError("لا يمكن أن يصبح رصيد الصناديق أقل من صفر")
-
-    else:  # adjust
-        delta_boxes = to_int(move_data.get("delta_boxes", 0))
-        if delta_boxes == 0:
-            raise ValueError("ضع قيمة تعديل للصناديق (موجب/سالب)")
-        if cur_boxes + delta_boxes < 0:
-            raise ValueError("لا يمكن أن يصبح رصيد الصناديق أقل من صفر")
-
-    new_boxes_balance = cur_boxes + delta_boxes
-
-    # =========================
-    # 2) تحديث مخزون المنتج + الرصيد المالي (out/in فقط)
-    # =========================
-    if typ in ["out", "in"]:
-        if not product_id:
-            raise ValueError("اختر المنتج المرتبط بالصناديق")
-        if units_per_box <= 0:
-            raise ValueError("محتوى الصندوق يجب أن يكون أكبر من صفر")
-        if total_units <= 0:
-            raise ValueError("الكمية الإجمالية غير صحيحة")
-
-        prod_ref = db.collection("products").document(product_id)
-        prod_snap = prod_ref.get(transaction=transaction)
-        if not prod_snap.exists:
-            raise ValueError("المنتج غير موجود في المخزن")
-
-        prod = prod_snap.to_dict() or {}
-        cur_stock = to_float(prod.get("qty_on_hand", 0))
-
-        unit_price = to_float(prod.get("price", 0))
-        amount = float(total_units) * float(unit_price)
-
-        # خزّنها داخل الحركة (مفيد للكشف)
-        move_data["unit_price"] = float(unit_price)
-        move_data["amount"] = float(amount)
+def build_distributor_statement_html(dist: dict, rows: list, final_balance: int, company_name="مخابز البوادي", paper="80mm", max_rows=120):
+    name = dist.get("name") or dist.get("id") or "—"
+    phone = dist.get("phone") or ""
+    money_bal = to_float(dist.get("money_balance", 0))
+    dt = datetime.now(timezone(timedelta(hours=3))).strftime("%Y-%m-%d %H:%M:%S")
 
-        if typ == "out":
-            if cur_stock < float(total_units):
-                raise ValueError(f"المخزون غير كافي. المتوفر {cur_stock} والمطلوب {total_units}")
-            transaction.update(prod_ref, {
-                "qty_on_hand": cur_stock - float(total_units),
-                "updated_at": now_iso()
-            })
-            cur_money += float(amount)
-        else:  # in (مرتجع)
-            transaction.update(prod_ref, {
-                "qty_on_hand": cur_stock + float(total_units),
-                "updated_at": now_iso()
-            })
-            cur_money -= float(amount)
-
-    # =========================
-    # 3) تحديث الموزّع + حفظ الحركة
-    # =========================
-    transaction.update(dist_ref, {
-        "crates_balance": new_boxes_balance,
-        "money_balance": float(cur_money),
-        "updated_at": now_iso()
-    })
-
-    mv_ref = db.collection("crate_moves").document(move_doc_id)
-    transaction.set(mv_ref, move_data, merge=True)
-
-    return new_boxes_balance, float(cur_money)
+    width_css = "280px" if paper == "80mm" else "820px"
+    font_css = "12px" if paper == "80mm" else "14px"
 
+    rows = rows[-int(max_rows):] if rows and max_rows else []
 
-# ---------------------------
-# Transaction: cash collection (money only)
-# ---------------------------
-@firestore.transactional
-def _tx_apply_cash_collection(transaction, dist_id: str, move_doc_id: str, payload: dict):
-    dist_ref = db.collection("distributors").document(dist_id)
-    dist_snap = dist_ref.get(transaction=transaction)
-    if not dist_snap.exists:
-        raise ValueError("الموزّع غير موجود")
+    return _STATEMENT_DOC.render(
+        width_css=width_css,
+        font_css=font_css,
+        company_name=company_name,
+        name=name,
+        phone_row=_PHONE_ROW.render(phone=phone) if phone else "",
+        boxes_balance=_money_int(final_balance),
+        money_balance=f"{money_bal:.3f}",
+        dt=dt,
+        rows=_STATEMENT_ROW.render_many(_statement_print_rows(rows), empty=_STATEMENT_EMPTY),
+    )
 
-    dist = dist_snap.to_dict() or {}
-    cur_money = to_float(dist.get("money_balance", 0))
 
-    amount = to_float(payload.get("amount", 0))
-    if amount <= 0:
-        raise ValueError("مبلغ التحصيل يجب أن يكون أكبر من صفر")
+_STATEMENT_PDF_COLUMNS = (
+    ("التاريخ", 0.17), ("النوع", 0.13), ("كمية", 0.07), ("أثر", 0.07),
+    ("الرصيد", 0.08), ("المبلغ", 0.1), ("ملاحظة", 0.38),
+)
 
-    new_money = cur_money - float(amount)
 
-    transaction.update(dist_ref, {"money_balance": float(new_money), "updated_at": now_iso()})
-    mv_ref = db.collection("crate_moves").document(move_doc_id)
-    transaction.set(mv_ref, payload, merge=True)
+def build_distributor_statement_pdf(dist: dict, rows: list, final_balance: int, company_name="مخابز البوادي", max_rows=None) -> bytes:
+    """
+    كشف الموزّع كاملاً PDF من الخادم؛ يُعاد من الـ cache ما دامت الحركات نفسها.
+    """
+    rows = rows[-int(max_rows):] if rows and max_rows else list(rows or [])
+    info = [("الموزّع:", dist.get("name") or dist.get("id") or "—")]
+    if dist.get("phone"):
+        info.append(("هاتف:", dist.get("phone")))
+    info.append(("رصيد الصناديق:", _money_int(final_balance)))
+    info.append(("الرصيد المالي على الموزّع:", f"{to_float(dist.get('money_balance', 0)):.3f}"))
+    if rows:
+        info.append(("الفترة:", f"من {rows[0].get('التاريخ', '')[:10]} إلى {rows[-1].get('التاريخ', '')[:10]}"))
+
+    def chunks():
+        body = (
+            (p["date"], p["kind"], p["qty"], p["effect"], p["balance"], p["amount"], r.get("ملاحظة", ""))
+            for p, r in zip(_statement_print_rows(rows), rows)
+        )
+        return iter_table_pdf("كشف موزّع (صناديق + مبالغ)", _STATEMENT_PDF_COLUMNS, body, info=info, company_name=company_name)
+
+    key = ("distributor_statement", dist.get("id") or "", rows_checkpoint(rows),
+           (max_rows, _money_int(final_balance), f"{to_float(dist.get('money_balance', 0)):.3f}"))
+    return pdf_bytes(key, chunks)
+
 
-    return float(new_money)
+def show_print_html(html: str, height=820):
+    components.html(html, height=height, scrolling=True)
+
+
+def tab_statement():
+    st.subheader("📄 كشف موزّع + طباعة")
+
+    dists = col_to_list("distributors", where_active=True)
+    if not dists:
+        st.info("أضف موزّعين أولًا.")
+        return
+
+    dist_map = {d.get("name", d["id"]): d["id"] for d in dists}
+    dist_by_id = {d["id"]: d for d in dists}
+
+    sel_name = st.selectbox("اختر الموزّع", options=[""] + list(dist_map.keys()), key="stmt_dist_select")
+    if not sel_name:
+        st.info("اختر موزّع لعرض الكشف.")
+        return
+
+    dist_id = dist_map[sel_name]
+    dist = dist_by_id.get(dist_id, {"id": dist_id})
+
+    moves = _get_moves_for_dist(dist_id, limit=800)
+    rows, final_balance = _build_dist_statement(dist, moves)
+
+    s1, s2, s3 = st.columns(3)
+    s1.metric("🧺 رصيد الصناديق", f"{final_balance}")
+    s2.metric("💰 الرصيد المالي", f"{to_float(dist.get('money_balance', 0)):.3f}")
+    s3.metric("عدد الحركات", f"{len(moves)}")
+
+    p1, p2, p3 = st.columns([1.2, 1.8, 1.0])
+    with p1:
+        paper = st.selectbox("ورق الطباعة", ["80mm", "a4"], index=0, key="dist_stmt_paper")
+    with p2:
+        if st.button("🖨️ طباعة الكشف", use_container_width=True, key="dist_stmt_print"):
+            html = build_distributor_statement_html(
+                dist=dist,
+                rows=rows,
+                final_balance=final_balance,
+                company_name="مخابز البوادي",
+                paper=paper
+            )
+            show_print_html(html, height=820)
+    with p3:
+        if st.button("📄 PDF كامل", use_container_width=True, key="dist_stmt_pdf_btn"):
+            st.session_state["dist_stmt_pdf_for"] = dist_id
+
+    if st.session_state.get("dist_stmt_pdf_for") == dist_id:
+        try:
+            pdf = build_distributor_statement_pdf(dist, rows, final_balance, company_name="مخابز البوادي")
+        except ValueError as e:
+            st.warning(f"تعذر إنشاء PDF: {e}")
+        else:
+            st.download_button(
+                "⬇️ تحميل كشف الموزّع PDF",
+                data=pdf,
+                file_name=f"distributor_statement_{dist_id}.pdf",
+                mime="application/pdf",
+                use_container_width=True,
+                key="dist_stmt_pdf_dl",
+            )
+
+    st.divider()
+    st.markdown("### جدول الحركات")
+    st.dataframe(rows[-250:], use_container_width=True, hide_index=True)
+
+
+def tab_loading_sheet():
+    st.subheader("📋 ورقة تحميل الموزّع")
+    st.caption("مجموع كميات كل صنف من الطلبات المُحضّرة للموزّع في اليوم + مقارنة مع الصناديق المسلّمة.")
+
+    dists = col_to_list("distributors", where_active=True)
+    if not dists:
+        st.info("أضف موزّعين أولًا.")
+        return
+
+    dist_map = {d.get("name", d["id"]): d["id"] for d in dists}
+    dist_by_id = {d["id"]: d for d in dists}
+
+    c1, c2 = st.columns([2, 1])
+    with c1:
+        sel_name = st.selectbox("اختر الموزّع", options=[""] + list(dist_map.keys()), key="load_sheet_dist_select")
+    with c2:
+        sheet_day = st.date_input("التاريخ", value=datetime.now(timezone(timedelta(hours=3))).date(), key="load_sheet_day")
+
+    if not sel_name:
+        st.info("اختر موزّع لعرض ورقة التحميل.")
+        return
+
+    dist_id = dist_map[sel_name]
+    dist = dist_by_id.get(dist_id, {"id": dist_id})
+
+    if st.button("📥 تجهيز ورقة التحميل", use_container_width=True, key="load_sheet_build"):
+        try:
+            st.session_state["load_sheet"] = build_loading_sheet(dist, sheet_day)
+        except Exception as e:
+            st.error(f"فشل تجهيز ورقة التحميل: {e}")
+
+    sheet = st.session_state.get("load_sheet")
+    if not sheet or sheet.get("distributor_id") != dist_id or sheet.get("date") != str(sheet_day):
+        return
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("طلبات مُحضّرة", f"{sheet['orders_count']}")
+    m2.metric("إجمالي الكمية", fmt_qty(sheet['total_qty']))
+    m3.metric("أصناف غير مطابقة", f"{sheet['mismatch_count']}")
+
+    if not sheet["rows"]:
+        st.info("لا توجد طلبات مُحضّرة لهذا الموزّع في هذا اليوم.")
+        return
+
+    st.dataframe(
+        [{
+            "الصنف": r["product_name"],
+            "المطلوب": fmt_qty(r["qty"]),
+            "عدد الطلبات": r["orders"],
+            "بالصناديق": fmt_qty(r["crate_units"]),
+            "الفرق": ("+" if to_float(r["diff"]) > 0 else "") + fmt_qty(r["diff"]),
+            "الحالة": r["status"],
+        } for r in sheet["rows"]],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    p1, p2 = st.columns([1.2, 2.8])
+    with p1:
+        paper = st.selectbox("ورق الطباعة", ["80mm", "a4"], index=0, key="load_sheet_paper")
+    with p2:
+        if st.button("🖨️ طباعة ورقة التحميل", use_container_width=True, key="load_sheet_print"):
+            html = build_loading_sheet_html(sheet, company_name="مخابز البوادي", paper=paper)
+            show_print_html(html, height=820)
 
 
 # ---------------------------
@@ -390,7 +445,7 @@ def distributors_page(go, user):
         if st.button("⬅️ رجوع للوحة التحكم", key="back_to_dashboard_distributors"):
             go("dashboard")
 
-    tabs = st.tabs(["👤 إدارة الموزّعين", "📦 حركة + تحصيل", "📄 كشف وطباعة"])
+    tabs = st.tabs(["👤 إدارة الموزّعين", "📦 حركة + تحصيل", "📄 كشف وطباعة", "📋 ورقة التحميل"])
 
     # ---------------------------
     # Tab 1: Manage
@@ -439,7 +494,7 @@ def distributors_page(go, user):
                         "name": name.strip(),
                         "phone": phone.strip(),
                         "crates_balance": 0,
-                        "money_balance": 0.0,
+                        **money_fields(money_balance=0),
                         "active": True,
                         "created_at": now_iso(),
                         "updated_at": now_iso(),
@@ -458,6 +513,7 @@ def distributors_page(go, user):
                         "created_at": now_iso(),
                     })
 
+                    publish_tags([DISTRIBUTORS_TAG])
                     st.success("تمت إضافة الموزّع وإنشاء حساب الدخول ✅")
                     st.rerun()
 
@@ -488,6 +544,7 @@ def distributors_page(go, user):
             if st.button("تعطيل", use_container_width=True, key="dist_del_btn"):
                 if del_id:
                     doc_soft_delete("distributors", del_id)
+                    publish_tags([DISTRIBUTORS_TAG])
                     st.success("تم تعطيل الموزّع ✅")
                     st.rerun()
 
@@ -617,7 +674,7 @@ def distributors_page(go, user):
                             "active": True,
                         }
 
-                        new_boxes, new_money = _tx_apply_move(db.transaction(), dist_id, move_doc_id, payload)
+                        new_boxes, new_money = apply_move(dist_id, move_doc_id, payload)
                         st.success(f"تم حفظ الحركة ✅ | رصيد الصناديق: {new_boxes} | الرصيد المالي: {new_money:.3f}")
                         st.rerun()
 
@@ -648,7 +705,7 @@ def distributors_page(go, user):
                             "distributor_id": dist_id,
                             "distributor_name": dist.get("name", ""),
                             "type": "cash",
-                            "amount": float(cash_amount),
+                            **money_fields(amount=to_fils(cash_amount)),
                             "note": (cash_note or "").strip(),
                             "status": "done",
                             "created_at": now_iso(),
@@ -656,7 +713,7 @@ def distributors_page(go, user):
                             "created_by": user.get("username", ""),
                             "active": True,
                         }
-                        new_money = _tx_apply_cash_collection(db.transaction(), dist_id, move_doc_id, payload)
+                        new_money = tx_apply_cash_collection(db.transaction(), dist_id, move_doc_id, payload)
                         st.success(f"تم تسجيل التحصيل ✅ | الرصيد المالي الجديد: {new_money:.3f}")
                         st.rerun()
                     except Exception as e:
@@ -715,46 +772,10 @@ def distributors_page(go, user):
     # Tab 3: Statement + Print
     # ---------------------------
     with tabs[2]:
-        st.subheader("📄 كشف موزّع + طباعة")
+        tab_statement()
 
-        dists = col_to_list("distributors", where_active=True)
-        if not dists:
-            st.info("أضف موزّعين أولًا.")
-            return
-
-        dist_map = {d.get("name", d["id"]): d["id"] for d in dists}
-        dist_by_id = {d["id"]: d for d in dists}
-
-        sel_name = st.selectbox("اختر الموزّع", options=[""] + list(dist_map.keys()), key="stmt_dist_select")
-        if not sel_name:
-            st.info("اختر موزّع لعرض الكشف.")
-            return
-
-        dist_id = dist_map[sel_name]
-        dist = dist_by_id.get(dist_id, {"id": dist_id})
-
-        moves = _get_moves_for_dist(dist_id, limit=800)
-        rows, final_balance = _build_dist_statement(dist, moves)
-
-        s1, s2, s3 = st.columns(3)
-        s1.metric("🧺 رصيد الصناديق", f"{final_balance}")
-        s2.metric("💰 الرصيد المالي", f"{to_float(dist.get('money_balance', 0)):.3f}")
-        s3.metric("عدد الحركات", f"{len(moves)}")
-
-        p1, p2 = st.columns([1.2, 2.8])
-        with p1:
-            paper = st.selectbox("ورق الطباعة", ["80mm", "a4"], index=0, key="dist_stmt_paper")
-        with p2:
-            if st.button("🖨️ طباعة الكشف", use_container_width=True, key="dist_stmt_print"):
-                html = build_distributor_statement_html(
-                    dist=dist,
-                    rows=rows,
-                    final_balance=final_balance,
-                    company_name="مخابز البوادي",
-                    paper=paper
-                )
-                show_print_html(html, height=820)
-
-        st.divider()
-        st.markdown("### جدول الحركات")
-        st.dataframe(rows[-250:], use_container_width=True, hide_index=True)
\ No newline at end of file
+    # ---------------------------
+    # Tab 4: Loading sheet (pick list)
+    # ---------------------------
+    with tabs[3]:
+        tab_loading_sheet()
@@ -5,16 +5,20 @@ import time
 
 from utils.helpers import now_iso, to_float, to_int
 from services.firestore_queries import col_to_list, doc_get, doc_set, doc_soft_delete
-
-# ---------------------------
-# Helpers
-# ---------------------------
-
-
-def write_stock_move(move: dict):
-    move["created_at"] = now_iso()
-    move["active"] = True
-    db.collection("stock_moves").add(move)
+from services.cache_bus import publish
+from services.price_history_service import record_base_prices
+from services.search_index import search_rows
+from utils.money import money_fields, read_fils, to_fils
+from services.inventory_service import (
+    get_count_lines,
+    list_recent_counts,
+    new_count_header,
+    post_inventory_count,
+    production_projection,
+    save_counted_lines,
+    upsert_count_lines_from_system,
+    write_stock_move,
+)
 
 
 # ---------------------------
@@ -53,8 +57,7 @@ def tab_materials(user):
     q = st.text_input("🔎 بحث", placeholder="اكتب اسم مادة...", key="mat_search")
     materials = col_to_list("materials", where_active=True)
     if q.strip():
-        qq = q.strip().lower()
-        materials = [m for m in materials if qq in (m.get("name", "").lower() + " " + m.get("id", "").lower())]
+        materials = search_rows(materials, q, fields=("name", "id"))
 
     low = [m for m in materials if to_float(m.get("qty_on_hand")) <= to_float(m.get("min_qty")) and to_float(m.get("min_qty")) > 0]
     if low:
@@ -183,11 +186,14 @@ def tab_products(user):
                     "name": name.strip(),
                     "sale_unit": sale_unit,
                     "qty_on_hand": float(qty),
-                    "price": float(price),
+                    **money_fields(price=to_fils(price)),
                     "active": True,
                     "created_at": now_iso(),
                     "updated_at": now_iso(),
                 })
+                # أول نسخة للسعر العام (السعر الساري من الآن)
+                record_base_prices({doc_id: to_fils(price)}, {}, user)
+                publish(product_ids=[doc_id])
                 st.success("تمت إضافة المنتج ✅")
                 st.rerun()
 
@@ -227,12 +233,20 @@ def tab_products(user):
     colA, colB = st.columns(2)
     with colA:
         if st.button("💾 حفظ التعديلات على المنتجات", use_container_width=True, key="prod_save_btn"):
+            before = {p["id"]: p for p in products}
+            price_changes = {
+                r["id"]: to_fils(r["price"]) for r in edited
+                if to_fils(r["price"]) != read_fils(before.get(r["id"]), "price")
+            }
+            # نسخة سعر لكل تغيير قبل الكتابة فوق السعر الحالي (الفواتير القديمة تجد سعر وقتها)
+            record_base_prices(price_changes, before, user)
             for r in edited:
                 doc_set("products", r["id"], {
                     "qty_on_hand": float(r["qty_on_hand"]),
-                    "price": float(r["price"]),
+                    **money_fields(price=to_fils(r["price"])),
                     "updated_at": now_iso(),
                 }, merge=True)
+            publish(product_ids=[r["id"] for r in edited])
             st.success("تم حفظ التعديلات ✅")
             st.rerun()
 
@@ -241,6 +255,7 @@ def tab_products(user):
         if st.button("حذف المنتج", use_container_width=True, key="prod_del_btn"):
             if del_id:
                 doc_soft_delete("products", del_id)
+                publish(product_ids=[del_id])
                 st.success("تم حذف المنتج ✅")
                 st.rerun()
 
@@ -417,6 +432,7 @@ def tab_production_orders(user):
 
         try:
             po_id = tx_create(db.transaction())
+            publish(product_ids=[prod_id])
 
             # حركات مخزون: استهلاك مواد
             for it in bom_items:
@@ -492,211 +508,6 @@ def tab_production_orders(user):
 # Tab 5: Inventory Count (الجرد)
 # ---------------------------
 
-def _new_count_header(scope: str, user: dict, note: str):
-    ref = db.collection("inventory_counts").document()
-    ref.set({
-        "scope": scope,          # materials | products | both
-        "status": "draft",       # draft | posted
-        "note": note.strip(),
-        "created_by": user.get("username", ""),
-        "created_at": now_iso(),
-        "updated_at": now_iso(),
-        "active": True,
-    }, merge=True)
-    return ref.id
-
-def _list_recent_counts(limit=20):
-    try:
-        q = db.collection("inventory_counts") \
-            .order_by("created_at", direction=firestore.Query.DESCENDING) \
-            .limit(limit)
-        docs = q.stream()
-    except Exception:
-        docs = db.collection("inventory_counts").limit(limit).stream()
-
-    rows = []
-    for d in docs:
-        x = d.to_dict() or {}
-        if x.get("active") is not True:
-            continue
-        rows.append({
-            "id": d.id,
-            "scope": x.get("scope", ""),
-            "status": x.get("status", ""),
-            "created_at": x.get("created_at", ""),
-            "created_by": x.get("created_by", ""),
-            "note": x.get("note", ""),
-        })
-    return rows
-
-def _line_doc_id(count_id: str, item_type: str, item_id: str):
-    return f"{count_id}__{item_type}__{item_id}"
-
-def _upsert_count_lines_from_system(count_id: str, scope: str):
-    mats = col_to_list("materials", where_active=True) if scope in ("materials", "both") else []
-    prods = col_to_list("products", where_active=True) if scope in ("products", "both") else []
-
-    batch = db.batch()
-    op = 0
-
-    def commit_if_needed():
-        nonlocal batch, op
-        if op >= 400:
-            batch.commit()
-            batch = db.batch()
-            op = 0
-
-    for m in mats:
-        doc_id = _line_doc_id(count_id, "material", m["id"])
-        ref = db.collection("inventory_count_lines").document(doc_id)
-        batch.set(ref, {
-            "count_id": count_id,
-            "item_type": "material",
-            "item_id": m["id"],
-            "item_name": m.get("name", ""),
-            "unit": m.get("unit", ""),
-            "system_qty": to_float(m.get("qty_on_hand", 0)),
-            "counted_qty": None,
-            "created_at": now_iso(),
-            "updated_at": now_iso(),
-            "active": True,
-        }, merge=True)
-        op += 1
-        commit_if_needed()
-
-    for p in prods:
-        doc_id = _line_doc_id(count_id, "product", p["id"])
-        ref = db.collection("inventory_count_lines").document(doc_id)
-        batch.set(ref, {
-            "count_id": count_id,
-            "item_type": "product",
-            "item_id": p["id"],
-            "item_name": p.get("name", ""),
-            "unit": p.get("sale_unit", "pcs"),
-            "system_qty": to_float(p.get("qty_on_hand", 0)),
-            "counted_qty": None,
-            "created_at": now_iso(),
-            "updated_at": now_iso(),
-            "active": True,
-        }, merge=True)
-        op += 1
-        commit_if_needed()
-
-    if op > 0:
-        batch.commit()
-
-def _get_count_lines(count_id: str):
-    docs = db.collection("inventory_count_lines").where("count_id", "==", count_id).stream()
-
-    rows = []
-    for d in docs:
-        x = d.to_dict() or {}
-        if x.get("active") is not True:
-            continue
-        rows.append({
-            "doc_id": d.id,
-            "item_type": x.get("item_type", ""),
-            "item_id": x.get("item_id", ""),
-            "item_name": x.get("item_name", ""),
-            "unit": x.get("unit", ""),
-            "system_qty": to_float(x.get("system_qty", 0)),
-            "counted_qty": x.get("counted_qty", None),
-        })
-
-    rows.sort(key=lambda r: (r["item_type"], r["item_name"]))
-    return rows
-
-def _save_counted_lines(edited_rows):
-    batch = db.batch()
-    op = 0
-
-    def commit_if_needed():
-        nonlocal batch, op
-        if op >= 400:
-            batch.commit()
-            batch = db.batch()
-            op = 0
-
-    for r in edited_rows:
-        ref = db.collection("inventory_count_lines").document(r["doc_id"])
-        cq = r.get("counted_qty", None)
-        if cq is None or cq == "":
-            cq_val = None
-        else:
-            cq_val = float(cq)
-
-        batch.update(ref, {"counted_qty": cq_val, "updated_at": now_iso()})
-        op += 1
-        commit_if_needed()
-
-    if op > 0:
-        batch.commit()
-
-def _post_inventory_count(count_id: str, user: dict):
-    header_ref = db.collection("inventory_counts").document(count_id)
-    header = header_ref.get().to_dict() or {}
-    if header.get("status") != "draft":
-        raise ValueError("لا يمكن ترحيل جرد غير مسودة.")
-
-    lines = _get_count_lines(count_id)
-    lines_to_post = [l for l in lines if l.get("counted_qty") is not None]
-
-    if not lines_to_post:
-        raise ValueError("لا يوجد كميات معدودة لترحيلها. أدخل counted_qty أولاً.")
-
-    batch = db.batch()
-    op = 0
-
-    def commit_if_needed():
-        nonlocal batch, op
-        if op >= 350:
-            batch.commit()
-            batch = db.batch()
-            op = 0
-
-    for l in lines_to_post:
-        counted = float(l["counted_qty"])
-        if counted < 0:
-            raise ValueError(f"لا يمكن إدخال كمية سالبة: {l['item_name']}")
-
-        system_qty = float(l["system_qty"])
-        delta = counted - system_qty
-        if abs(delta) < 1e-12:
-            continue
-
-        if l["item_type"] == "material":
-            ref = db.collection("materials").document(l["item_id"])
-            batch.update(ref, {"qty_on_hand": counted, "updated_at": now_iso()})
-        else:
-            ref = db.collection("products").document(l["item_id"])
-            batch.update(ref, {"qty_on_hand": counted, "updated_at": now_iso()})
-
-        op += 1
-        commit_if_needed()
-
-        write_stock_move({
-            "type": "count",
-            "ref_type": "inventory_count",
-            "ref_id": count_id,
-            "item_type": l["item_type"],
-            "item_id": l["item_id"],
-            "item_name": l["item_name"],
-            "qty_delta": float(delta),
-            "unit": l.get("unit", ""),
-            "note": "ترحيل جرد",
-            "created_by": user.get("username", ""),
-        })
-
-    header_ref.set({
-        "status": "posted",
-        "posted_at": now_iso(),
-        "posted_by": user.get("username", ""),
-        "updated_at": now_iso(),
-    }, merge=True)
-
-    if op > 0:
-        batch.commit()
-
 def tab_inventory_count(user):
     st.subheader("🧮 الجرد (بسيط للبائع)")
     st.caption("الخطوات: 1) ابدأ جرد  2) حمّل الأصناف  3) أدخل المعدود  4) اعتمد الجرد لتحديث المخزون")
@@ -718,7 +529,7 @@ def tab_inventory_count(user):
 
     with c2:
         if st.button("➕ ابدأ جرد جديد", use_container_width=True, key="ic_new_btn_simple"):
-            cid = _new_count_header(scope, user, note)
+            cid = new_count_header(scope, user, note)
             st.session_state["ic_selected"] = cid
             st.success(f"تم إنشاء جرد جديد ✅ رقم: {cid}")
             st.rerun()
@@ -729,7 +540,7 @@ def tab_inventory_count(user):
     # 2) اختيار جرد (آخر الجردات)
     # =========================
     st.markdown("### 📋 اختر جرد للعمل عليه")
-    counts = _list_recent_counts(limit=20)
+    counts = list_recent_counts(limit=20)
     if not counts:
         st.info("لا يوجد جردات بعد. اضغط (ابدأ جرد جديد).")
         return
@@ -787,7 +598,7 @@ def tab_inventory_count(user):
     st.caption("اضغط مرة واحدة لتحميل الأصناف من النظام (مثل ورقة جرد جاهزة).")
 
     if st.button("📥 تحميل/تحديث قائمة الأصناف", use_container_width=True, key="ic_load_btn_simple"):
-        _upsert_count_lines_from_system(selected, scope_sel)
+        upsert_count_lines_from_system(selected, scope_sel)
         header_ref.set({"updated_at": now_iso()}, merge=True)
         st.success("تم تحميل الأصناف ✅")
         st.rerun()
@@ -800,7 +611,7 @@ def tab_inventory_count(user):
     st.markdown("### 2️⃣ أدخل الكمية المعدودة")
     st.caption("اكتب فقط (الكمية المعدودة). الفرق يظهر تلقائياً.")
 
-    lines = _get_count_lines(selected)
+    lines = get_count_lines(selected)
     if not lines:
         st.info("لا توجد أصناف بعد. اضغط (تحميل/تحديث قائمة الأصناف) أولاً.")
         return
@@ -863,7 +674,7 @@ def tab_inventory_count(user):
     with b1:
         if st.button("💾 حفظ (بدون اعتماد)", use_container_width=True, key="ic_save_btn_simple"):
             to_save = [{"doc_id": r["doc_id"], "counted_qty": r.get("المعدود", None)} for r in edited]
-            _save_counted_lines(to_save)
+            save_counted_lines(to_save)
             header_ref.set({"updated_at": now_iso()}, merge=True)
             st.success("تم الحفظ ✅ (يمكنك المتابعة لاحقاً)")
             st.rerun()
@@ -874,9 +685,9 @@ def tab_inventory_count(user):
             try:
                 # احفظ أولاً قبل الاعتماد
                 to_save = [{"doc_id": r["doc_id"], "counted_qty": r.get("المعدود", None)} for r in edited]
-                _save_counted_lines(to_save)
+                save_counted_lines(to_save)
 
-                _post_inventory_count(selected, user)
+                post_inventory_count(selected, user)
                 st.success("تم اعتماد الجرد وتحديث المخزون ✅ وتم تسجيل حركة (count)")
                 st.rerun()
             except Exception as e:
@@ -978,49 +789,25 @@ def tab_projection():
         return
 
     mat_by_id = {m["id"]: m for m in materials}
-
-    rows = []
-    max_by_each = []
-    bottleneck = None
-    bottleneck_value = None
-
-    for it in bom["items"]:
-        mat_id = it["material_id"]
-        m = mat_by_id.get(mat_id)
-        if not m:
-            continue
-
-        stock = to_float(m.get("qty_on_hand"))
-        per = to_float(it.get("qty_per_unit"))
-        if per <= 0:
-            continue
-
-        possible = stock / per
-        max_by_each.append(possible)
-
-        if bottleneck_value is None or possible < bottleneck_value:
-            bottleneck_value = possible
-            bottleneck = it.get("material_name", "")
-
-        needed_for_target = per * float(target) if target > 0 else 0.0
-        shortage = max(0.0, needed_for_target - stock) if target > 0 else 0.0
-
-        rows.append({
-            "المادة": it.get("material_name", ""),
-            "المتوفر": stock,
-            "الوحدة": m.get("unit", ""),
-            "لكل وحدة منتج": per,
-            "أقصى إنتاج من هذه المادة": round(possible, 2),
-            "المطلوب للهدف": round(needed_for_target, 2) if target > 0 else "",
-            "النقص للهدف": round(shortage, 2) if target > 0 else "",
-        })
+    proj, max_qty, bottleneck = production_projection(bom["items"], mat_by_id, target)
+
+    rows = [
+        {
+            "المادة": r["material_name"],
+            "المتوفر": r["stock"],
+            "الوحدة": r["unit"],
+            "لكل وحدة منتج": r["per_unit"],
+            "أقصى إنتاج من هذه المادة": round(r["possible"], 2),
+            "المطلوب للهدف": round(r["needed"], 2) if target > 0 else "",
+            "النقص للهدف": round(r["shortage"], 2) if target > 0 else "",
+        }
+        for r in proj
+    ]
 
     if not rows:
         st.warning("لا توجد مواد في الوصفة.")
         return
 
-    max_qty = min(max_by_each) if max_by_each else 0.0
-
     col1, col2 = st.columns(2)
     col1.metric("الإنتاج الممكن الآن", f"{max_qty:.2f}")
     col2.metric("المادة المُقيّدة (Bottleneck)", bottleneck or "-")
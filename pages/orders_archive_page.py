@@ -8,8 +8,13 @@ from firebase_admin import firestore
 import pandas as pd
 
 from utils.helpers import to_float as prep_to_float
-from services.firestore_queries import doc_get
+from services.sequence_service import normalize_invoice_query
+from services.cache_bus import CUSTOMERS_TAG, DISTRIBUTORS_TAG, keyed_cache
+from services.archive_service import archive_stats
+from services.print_batch_service import load_print_jobs
+from components.pdf_render import iter_table_pdf, pdf_bytes, rows_checkpoint
 from components.printing import (
+    build_batch_print_html,
     build_invoice_html,
     build_receipt_html,
     show_print_html,
@@ -17,6 +22,9 @@ from components.printing import (
 
 TZ = timezone(timedelta(hours=3))
 
+# أقصى عدد فواتير في طباعة دفعة واحدة (خط توزيع كامل لليوم)
+BATCH_PRINT_LIMIT = 300
+
 
 # =========================
 # Helpers
@@ -58,10 +66,40 @@ def export_archive_excel(df: pd.DataFrame, stats: dict | None, d_from, d_to) ->
     return bio.getvalue()
 
 
+_ARCHIVE_PDF_COLUMNS = (
+    ("رقم", 0.2), ("التاريخ", 0.2), ("العميل", 0.26), ("الموزّع", 0.14), ("الدفع", 0.08), ("الصافي", 0.12),
+)
+
+
+def export_archive_pdf(df: pd.DataFrame, stats: dict | None, d_from, d_to, sig) -> bytes:
+    """
+    نتائج الأرشيف PDF من الخادم؛ نفس الفلتر ونفس النتائج -> نفس الملف من الـ cache.
+    """
+    records = df.to_dict("records")
+    info = [("من:", str(d_from)), ("إلى:", str(d_to))]
+    if stats:
+        info += [
+            ("عدد الفواتير:", str(stats.get("cnt", 0))),
+            ("الصافي:", f"{stats.get('net', 0):.2f}"),
+            ("المدفوع:", f"{stats.get('paid', 0):.2f}"),
+            ("متبقي ذمم:", f"{stats.get('unpaid', 0):.2f}"),
+        ]
+
+    def chunks():
+        body = (
+            (r["رقم"], r["التاريخ"], r["العميل"], r["الموزّع"], r["الدفع"], f"{r['الصافي']:.2f}")
+            for r in records
+        )
+        return iter_table_pdf("أرشيف الفواتير", _ARCHIVE_PDF_COLUMNS, body, info=info, company_name="مخابز البوادي")
+
+    key = ("archive", repr(sig), rows_checkpoint(records), tuple(info))
+    return pdf_bytes(key, chunks)
+
+
 # =========================
 # Cached
 # =========================
-@st.cache_data(ttl=120)
+@keyed_cache(ttl=120, tags=[DISTRIBUTORS_TAG])
 def get_distributors_list(limit=800):
     docs = db.collection("distributors").where("active", "==", True).limit(limit).stream()
     out = []
@@ -75,7 +113,7 @@ def get_distributors_list(limit=800):
     return out
 
 
-@st.cache_data(ttl=120)
+@keyed_cache(ttl=120, tags=[CUSTOMERS_TAG])
 def get_customers_cached(limit=800):
     docs = db.collection("customers").where("active", "==", True).limit(limit).stream()
     out = []
@@ -85,60 +123,9 @@ def get_customers_cached(limit=800):
     return out
 
 
-@st.cache_data(ttl=60)
+@keyed_cache(ttl=60)
 def calc_archive_stats_cached(start_iso, end_iso, customer_id, invoice_search, seller_filter):
-    HARD_CAP = 1000
-
-    q = (
-        db.collection("sales")
-        .where("active", "==", True)
-        .where("status", "==", "done")
-    )
-
-    if invoice_search:
-        q = q.where("invoice_no", "==", invoice_search).limit(HARD_CAP)
-    else:
-        q = q.where("delivered_at", ">=", start_iso).where("delivered_at", "<", end_iso)
-
-        if customer_id:
-            q = q.where("customer_id", "==", customer_id)
-
-        if seller_filter:
-            q = q.where("seller_username", "==", seller_filter)
-
-        q = q.order_by("delivered_at", direction=firestore.Query.DESCENDING).limit(HARD_CAP)
-
-    cnt = 0
-    total = disc = net = paid = unpaid = extra = 0.0
-    cash_cnt = credit_cnt = 0
-
-    for d in q.stream():
-        cnt += 1
-        x = d.to_dict() or {}
-
-        total += prep_to_float(x.get("total", 0))
-        disc += prep_to_float(x.get("discount", 0))
-        net += prep_to_float(x.get("net", 0))
-        paid += prep_to_float(x.get("amount_paid", 0))
-        unpaid += prep_to_float(x.get("unpaid_debt", 0))
-        extra += prep_to_float(x.get("extra_credit", 0))
-
-        if x.get("payment_type") == "cash":
-            cash_cnt += 1
-        elif x.get("payment_type") == "credit":
-            credit_cnt += 1
-
-    return {
-        "cnt": cnt,
-        "total": total,
-        "disc": disc,
-        "net": net,
-        "paid": paid,
-        "unpaid": unpaid,
-        "extra": extra,
-        "cash_cnt": cash_cnt,
-        "credit_cnt": credit_cnt,
-    }
+    return archive_stats(start_iso, end_iso, customer_id, invoice_search, seller_filter)
 
 
 # =========================
@@ -166,6 +153,7 @@ def orders_archive_page(go, user):
     st.session_state.setdefault("arch_show_print_tools", False)
     st.session_state.setdefault("arch_print_sid", None)
     st.session_state.setdefault("arch_print_mode", "invoice")
+    st.session_state.setdefault("arch_print_batch", None)
 
     st.markdown("### 🔎 الفلاتر")
 
@@ -182,7 +170,9 @@ def orders_archive_page(go, user):
         d_to = st.date_input("إلى", key="arch_to")
 
     with c3:
-        invoice_search = st.text_input("بحث برقم الفاتورة", key="arch_invoice_search").strip()
+        invoice_search = normalize_invoice_query(
+            st.text_input("بحث برقم الفاتورة", key="arch_invoice_search", placeholder="مثال: 123 أو INV-2026-000123")
+        )
 
     with c4:
         pick_seller = st.selectbox(
@@ -287,7 +277,7 @@ def orders_archive_page(go, user):
     )
 
     if invoice_search:
-        q = q.where("invoice_no", "==", invoice_search).limit(PAGE_SIZE)
+        q = q.where("invoice_no", "==", invoice_search)
     else:
         q = q.where("delivered_at", ">=", start_iso).where("delivered_at", "<", end_iso)
 
@@ -297,9 +287,9 @@ def orders_archive_page(go, user):
         if seller_filter:
             q = q.where("seller_username", "==", seller_filter)
 
-        q = q.order_by("delivered_at", direction=firestore.Query.DESCENDING).limit(PAGE_SIZE)
+        q = q.order_by("delivered_at", direction=firestore.Query.DESCENDING)
 
-    docs = list(q.stream())
+    docs = list(q.limit(PAGE_SIZE).stream())
 
     rows = []
     for d in docs:
@@ -311,6 +301,8 @@ def orders_archive_page(go, user):
         st.info("لا توجد بيانات")
         return
 
+    rows_by_id = {r["id"]: r for r in rows}
+
     df = pd.DataFrame([{
         "رقم": r.get("invoice_no") or r.get("ref") or r["id"],
         "التاريخ": _dt_short(r.get("delivered_at") or r.get("updated_at") or r.get("created_at")),
@@ -322,7 +314,7 @@ def orders_archive_page(go, user):
 
     st.dataframe(df, use_container_width=True, hide_index=True)
 
-    download_col1, download_col2 = st.columns(2)
+    download_col1, download_col2, download_col3 = st.columns(3)
 
     with download_col1:
         csv_data = df.to_csv(index=False).encode("utf-8-sig")
@@ -347,6 +339,24 @@ def orders_archive_page(go, user):
         except Exception as e:
             st.warning(f"تعذر إنشاء ملف Excel: {e}")
 
+    with download_col3:
+        # الـ PDF يُبنى عند الطلب فقط (وليس في كل rerun للصفحة)
+        if st.button("📄 تجهيز PDF", key="arch_pdf_btn"):
+            st.session_state["arch_pdf_for"] = sig
+        if st.session_state.get("arch_pdf_for") == sig:
+            try:
+                pdf_data = export_archive_pdf(df, stats, d_from, d_to, sig)
+            except ValueError as e:
+                st.caption(f"PDF غير متاح: {e}")
+            else:
+                st.download_button(
+                    label="⬇️ تحميل PDF",
+                    data=pdf_data,
+                    file_name=f"archive_{d_from}_{d_to}.pdf",
+                    mime="application/pdf",
+                    key="arch_download_pdf"
+                )
+
     cprint1, cprint2 = st.columns([1, 3])
     with cprint1:
         if st.button("🖨️ إظهار الطباعة", key="arch_toggle_print_tools", use_container_width=True):
@@ -359,6 +369,33 @@ def orders_archive_page(go, user):
 
     if st.session_state.get("arch_show_print_tools", False):
         st.markdown("### 🖨️ طباعة (آخر النتائج)")
+
+        bp1, bp2, bp3 = st.columns([1.4, 1.2, 1.6])
+        with bp1:
+            st.radio("نوع الدفعة", ["فواتير", "إيصالات قبض"], horizontal=True, key="arch_batch_mode")
+        with bp2:
+            st.radio("الورق", ["80mm", "a4"], horizontal=True, key="arch_batch_paper")
+        with bp3:
+            if st.button("🖨️ طباعة كل فواتير الفلتر", use_container_width=True, key="arch_print_batch_btn"):
+                if len(rows) < PAGE_SIZE:
+                    batch_sales = rows_by_id
+                else:
+                    # الفواتير المقروءة هنا هي نفسها ما يُطبع: لا get_all ثانٍ لها
+                    batch_sales = {}
+                    for d in q.limit(BATCH_PRINT_LIMIT).stream():
+                        batch_sales[d.id] = {**(d.to_dict() or {}), "id": d.id}
+                # ترتيب التسليم (الأقدم أولاً) = ترتيب الخط
+                ids = list(batch_sales)[::-1]
+                # المستندات + العملاء تُحفظ مرة واحدة؛ الـ reruns التالية لا تقرأ شيئاً
+                st.session_state["arch_print_batch"] = {
+                    "jobs": load_print_jobs(ids, sales=batch_sales),
+                    "html": {},
+                }
+                st.session_state["arch_print_sid"] = None
+                st.rerun()
+
+        st.divider()
+
         for r in rows[:10]:
             sid = r["id"]
             inv = r.get("invoice_no") or r.get("ref") or sid
@@ -373,6 +410,7 @@ def orders_archive_page(go, user):
                 if st.button("🖨️ فاتورة", use_container_width=True, key=f"arch_inv_{sid}"):
                     st.session_state["arch_print_sid"] = sid
                     st.session_state["arch_print_mode"] = "invoice"
+                    st.session_state["arch_print_batch"] = None
                     st.rerun()
 
             with b2:
@@ -380,6 +418,7 @@ def orders_archive_page(go, user):
                 if st.button("🧾 قبض", use_container_width=True, key=f"arch_rec_{sid}", disabled=not can_rec):
                     st.session_state["arch_print_sid"] = sid
                     st.session_state["arch_print_mode"] = "receipt"
+                    st.session_state["arch_print_batch"] = None
                     st.rerun()
 
             st.divider()
@@ -388,15 +427,28 @@ def orders_archive_page(go, user):
         sid = st.session_state["arch_print_sid"]
         mode = st.session_state.get("arch_print_mode", "invoice")
 
-        sale = doc_get("sales", sid) or {}
-        sale["id"] = sid
-
-        cust_id = sale.get("customer_id") or ""
-        cust = doc_get("customers", cust_id) or {} if cust_id else {}
+        jobs = load_print_jobs([sid], sales=rows_by_id)
+        if not jobs:
+            st.warning("الفاتورة غير موجودة")
+            return
+        sale, cust = jobs[0]
 
         if mode == "receipt":
             html = build_receipt_html(sale, customer=cust, company_name="مخابز البوادي", paper="80mm")
         else:
             html = build_invoice_html(sale, customer=cust, company_name="مخابز البوادي", paper="80mm")
 
-        show_print_html(html, height=900)
\ No newline at end of file
+        show_print_html(html, height=900)
+
+    if st.session_state.get("arch_show_print_tools", False) and st.session_state.get("arch_print_batch"):
+        batch = st.session_state["arch_print_batch"]
+        jobs = batch["jobs"]
+        mode = "receipt" if st.session_state.get("arch_batch_mode") == "إيصالات قبض" else "invoice"
+        paper = st.session_state.get("arch_batch_paper", "80mm")
+        st.caption(f"دفعة طباعة: {len(jobs)} فاتورة في مستند واحد")
+
+        html = batch["html"].get((mode, paper))
+        if html is None:
+            html = build_batch_print_html(jobs, mode=mode, company_name="مخابز البوادي", paper=paper)
+            batch["html"][(mode, paper)] = html
+        show_print_html(html, height=900)
@@ -1,14 +1,50 @@
 # orders_prep_page.py
 import streamlit as st
 import streamlit.components.v1 as components
-from datetime import datetime, timezone, timedelta
 from firebase_config import db
 from firebase_admin import firestore
 import time
-from utils.helpers import now_iso, to_float, to_int
-from services.firestore_queries import col_to_list, doc_get
-
-from services.orders_service import write_stock_moves_batch, cancel_prepared_sale
+from utils.helpers import to_float, to_int
+from utils.money import money_fields, to_fils
+from services.firestore_queries import doc_get
+
+from services.orders_service import (
+    cancel_prepared_sale,
+    deliver_sale,
+    order_fingerprint,
+    prepare_order,
+    prepare_orders_batch,
+)
+from services.sequence_service import next_invoice_no, next_invoice_nos
+from services.payments_service import pay_customer_debt
+from services.idempotency_service import (
+    new_idempotency_key,
+    session_idempotency_key,
+    clear_session_idempotency_key,
+)
+from services.offline_queue_service import (
+    is_connectivity_error,
+    make_debt_payment_op,
+    make_deliver_op,
+    replay_operations,
+)
+from services.cache_bus import (
+    DISTRIBUTORS_TAG,
+    cache_stats,
+    customer_tag,
+    keyed_cache,
+)
+from services.catalog import refresh_catalog, session_catalog, unpin_catalog
+from services.price_history_service import customer_prices_at
+from services.search_index import catalog_index
+from services.models import Customer, Sale
+from utils.offline_queue import (
+    enqueue_op,
+    get_queue,
+    load_queue_from_browser,
+    remove_ops,
+    sync_queue_to_browser,
+)
 
 from components.printing import (
     build_invoice_html,
@@ -18,13 +54,20 @@ from components.printing import (
     build_debt_payment_receipt_html,
     show_print_html,
 )
+from components.escpos import (
+    render_invoice_escpos,
+    render_receipt_escpos,
+    render_statement_escpos,
+    show_escpos_actions,
+)
+from components.shared_ui import PICKER_LIMIT, catalog_picker, customer_label
 
 
 def _supports_dialog():
     return hasattr(st, "dialog")
 
 
-@st.cache_data(ttl=120)
+@keyed_cache(ttl=120, tags=[DISTRIBUTORS_TAG])
 def get_distributor_name(dist_id: str) -> str:
     if not dist_id:
         return ""
@@ -38,40 +81,21 @@ def get_distributor_name(dist_id: str) -> str:
 # ---------------------------
 # CACHED LOADERS
 # ---------------------------
-@st.cache_data(ttl=300)
-def load_products_cached():
-    return col_to_list("products", where_active=True)
-
+# كاش مفتاحي: الكتابات في services تنشر customer_id / product_ids المتأثرة
+# فيُحذف فقط ما يخص هذا العميل بدلاً من مسح الكاش لكل العملاء.
+def _customer_tags(customer_id: str = "", **_):
+    return [customer_tag(customer_id)]
 
-@st.cache_data(ttl=300)
-def load_customers_cached():
-    return col_to_list("customers", where_active=True)
 
-
-@st.cache_data(ttl=120)
+@keyed_cache(ttl=120, tags=_customer_tags)
 def _get_customer_prices_map_cached(customer_id: str, limit=400):
+    # السعر الخاص الساري الآن (نسخ الأسعار بتاريخ السريان، مخزّنة لكل يوم)
     if not customer_id:
         return {}
-
-    docs = (
-        db.collection("customer_prices")
-        .where("customer_id", "==", customer_id)
-        .limit(limit)
-        .stream()
-    )
-
-    out = {}
-    for d in docs:
-        x = d.to_dict() or {}
-        if x.get("active") is not True:
-            continue
-        pid = x.get("product_id")
-        if pid:
-            out[pid] = float(to_float(x.get("price", 0.0)))
-    return out
+    return customer_prices_at(customer_id)
 
 
-@st.cache_data(ttl=30)
+@keyed_cache(ttl=30, tags=_customer_tags)
 def _get_customer_sales_for_statement(customer_id: str, limit=200):
     if not customer_id:
         return []
@@ -88,17 +112,13 @@ def _get_customer_sales_for_statement(customer_id: str, limit=200):
         x = d.to_dict() or {}
         if x.get("active") is not True:
             continue
-        x["id"] = d.id
-        out.append(x)
+        out.append(Sale.from_dict(x, d.id))
 
-    out.sort(
-        key=lambda x: (x.get("delivered_at") or x.get("updated_at") or x.get("created_at") or ""),
-        reverse=True
-    )
+    out.sort(key=lambda s: s.sort_at, reverse=True)
     return out
 
 
-@st.cache_data(ttl=20)
+@keyed_cache(ttl=20, tags=_customer_tags)
 def _load_prepared_orders_for_customer_cached(customer_id: str):
     if not customer_id:
         return []
@@ -121,7 +141,7 @@ def _load_prepared_orders_for_customer_cached(customer_id: str):
     return prepared
 
 
-@st.cache_data(ttl=20)
+@keyed_cache(ttl=20, tags=_customer_tags)
 def _load_done_orders_for_customer_cached(customer_id: str, limit=3):
     if not customer_id:
         return []
@@ -148,16 +168,13 @@ def _load_done_orders_for_customer_cached(customer_id: str, limit=3):
 # ---------------------------
 # SESSION LOADERS
 # ---------------------------
+# الجلسة تحفظ رقم نسخة الكتالوج المشترك فقط (وليس نسخة من القائمة)
 def _get_products_once():
-    if "orders_products_once" not in st.session_state:
-        st.session_state["orders_products_once"] = load_products_cached()
-    return st.session_state["orders_products_once"]
+    return session_catalog(st.session_state, "products")
 
 
 def _get_customers_once():
-    if "orders_customers_once" not in st.session_state:
-        st.session_state["orders_customers_once"] = load_customers_cached()
-    return st.session_state["orders_customers_once"]
+    return session_catalog(st.session_state, "customers")
 
 
 # ---------------------------
@@ -269,24 +286,38 @@ def _apply_free_qty(pid: str, stock_int: int, prod_by_id: dict, cust_price_map:
 
 def _clear_prep_cart_and_free_qty_keys():
     st.session_state.prep_cart = {}
+    clear_session_idempotency_key(st.session_state, "prep_cart")
     for k in list(st.session_state.keys()):
         if k.startswith("free_qty__") or k.startswith("show_free_qty__"):
             st.session_state.pop(k, None)
 
 
 def _clear_sales_related_caches(clear_products=False, clear_customers=False):
+    # كاش السيرفر يُبطل من services عبر publish(...) — هنا فقط نسخة الكتالوج المثبتة للجلسة
     if clear_products:
-        load_products_cached.clear()
-        st.session_state.pop("orders_products_once", None)
+        unpin_catalog(st.session_state, "products")
 
     if clear_customers:
-        load_customers_cached.clear()
-        st.session_state.pop("orders_customers_once", None)
-
-    _get_customer_prices_map_cached.clear()
-    _get_customer_sales_for_statement.clear()
-    _load_prepared_orders_for_customer_cached.clear()
-    _load_done_orders_for_customer_cached.clear()
+        unpin_catalog(st.session_state, "customers")
+
+
+def _build_prep_order(items, discount, customer_id, customer, prep_kind, user, prod_by_id, invoice_no: str = "") -> dict:
+    inv = invoice_no or next_invoice_no()
+    return {
+        "key": f"{customer_id or 'visitor'}__{inv}",
+        "sale_id": inv.lower().replace(":", "").replace(" ", "_"),
+        "invoice_no": inv,
+        "customer_id": (customer_id or ""),
+        "customer_name": (customer.get("name", "") if prep_kind == "عميل" else "زائر"),
+        "distributor_id": (user.get("username") or ""),
+        "distributor_name": get_distributor_name(user.get("username") or ""),
+        "discount": float(discount),
+        "items": items,
+        "units": {
+            it["product_id"]: (prod_by_id.get(it["product_id"], {}) or {}).get("sale_unit", "pcs")
+            for it in items
+        },
+    }
 
 
 def _acquire_action_lock(lock_name: str) -> bool:
@@ -302,9 +333,147 @@ def _release_action_lock(lock_name: str):
     st.session_state[f"_busy_{lock_name}"] = False
 
 
+# ---------------------------
+# Batch prepare (route loading)
+# ---------------------------
+def _render_prep_batch_panel(user, prod_by_id):
+    batch = st.session_state.get("prep_batch", []) or []
+    results = st.session_state.get("prep_batch_results", []) or []
+
+    if not batch and not results:
+        return
+
+    st.subheader("🚚 دفعة تحضير (خط توزيع كامل)")
+
+    if results:
+        ok_cnt = sum(1 for r in results if r.get("ok"))
+        st.caption(f"نتيجة آخر دفعة: {ok_cnt} ناجح / {len(results) - ok_cnt} فشل")
+        st.dataframe(
+            [{
+                "العميل": r.get("customer_name", ""),
+                "الفاتورة": r.get("sale_id", ""),
+                "الحالة": "✅ تم" if r.get("ok") else "❌ فشل",
+                "السبب": r.get("error", ""),
+            } for r in results],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    if not batch:
+        if st.button("إخفاء النتيجة", key="prep_batch_results_clear"):
+            st.session_state.prep_batch_results = []
+            st.rerun()
+        st.divider()
+        return
+
+    for i, entry in enumerate(batch):
+        c1, c2 = st.columns([4.6, 1.2])
+        with c1:
+            cname = (entry.get("customer") or {}).get("name") or "زائر"
+            st.markdown(f"**{i + 1}. {cname}** — أصناف: {len(entry.get('items', []))} | الصافي: **{float(entry.get('net', 0)):.2f}**")
+        with c2:
+            if st.button("🗑️ إزالة", use_container_width=True, key=f"prep_batch_rm_{i}"):
+                st.session_state.prep_batch.pop(i)
+                st.rerun()
+
+    b1, b2 = st.columns(2)
+    with b1:
+        if st.button(f"💾 تحضير الدفعة ({len(batch)} طلب)", use_container_width=True, key="prep_batch_submit"):
+            if not _acquire_action_lock("prep_batch_submit"):
+                return
+            try:
+                invoice_nos = next_invoice_nos(len(batch))
+                orders = [
+                    _build_prep_order(
+                        e["items"], e["discount"], e["customer_id"], e["customer"],
+                        e["prep_kind"], user, prod_by_id, invoice_no=inv,
+                    )
+                    for e, inv in zip(batch, invoice_nos)
+                ]
+                for o, e in zip(orders, batch):
+                    o["idempotency_key"] = e.get("idempotency_key") or ""
+                res = prepare_orders_batch(orders, user)
+
+                for r, o in zip(res, orders):
+                    r["customer_name"] = o.get("customer_name", "")
+
+                ok_keys = {r["key"] for r in res if r.get("ok")}
+                st.session_state.prep_batch = [
+                    e for e, o in zip(batch, orders) if o["key"] not in ok_keys
+                ]
+                st.session_state.prep_batch_results = res
+
+                if ok_keys:
+                    _clear_sales_related_caches(clear_products=True, clear_customers=False)
+                st.rerun()
+            except Exception as e:
+                st.error(f"فشل تحضير الدفعة: {e}")
+            finally:
+                _release_action_lock("prep_batch_submit")
+
+    with b2:
+        if st.button("🧹 تفريغ الدفعة", use_container_width=True, key="prep_batch_clear"):
+            st.session_state.prep_batch = []
+            st.session_state.prep_batch_results = []
+            st.rerun()
+
+    st.divider()
+
+
 # ---------------------------
 # Main page
 # ---------------------------
+OFFLINE_REPLAY_INTERVAL = 15
+
+
+def _render_offline_queue_panel(user):
+    """
+    عمليات التسليم/التسديد التي فشلت بسبب انقطاع اتصال السيرفر بـ Firestore تُحفظ
+    على الجهاز وتُعاد تلقائياً مع كل تحديث للصفحة حتى تنجح (آمنة بفضل مفاتيح
+    idempotency). عمليات مستخدم آخر على نفس الجهاز لا تُعاد باسم المستخدم الحالي.
+    """
+    load_queue_from_browser()
+
+    ops = get_queue()
+    if ops:
+        manual = False
+        c1, c2 = st.columns([3, 1])
+        with c2:
+            manual = st.button("🔁 إعادة الإرسال الآن", key="offline_replay_now", use_container_width=True)
+
+        # إعادة تلقائية كل OFFLINE_REPLAY_INTERVAL ثانية كحد أقصى (حتى لا ينتظر كل rerun مهلة الشبكة)
+        last = float(st.session_state.get("_offline_last_replay", 0.0))
+        if manual or time.time() - last >= OFFLINE_REPLAY_INTERVAL:
+            st.session_state["_offline_last_replay"] = time.time()
+            results = replay_operations(ops, user, resolve_distributor_name=get_distributor_name)
+
+            done = [r for r in results if r["status"] == "done"]
+            failed = [r for r in results if r["status"] == "failed"]
+            remove_ops([r["key"] for r in done + failed])
+
+            if done:
+                _clear_sales_related_caches(clear_products=False, clear_customers=True)
+                st.success(f"📶 تم إرسال {len(done)} عملية محفوظة ✅")
+            for r in failed:
+                st.error(f"تعذّر تنفيذ عملية محفوظة ({r['key']}): {r['error']}")
+
+        me = user.get("username") or ""
+        pending = [o for o in get_queue() if me and o.get("created_by") == me]
+        foreign = [o for o in get_queue() if not me or o.get("created_by") != me]
+        with c1:
+            if pending:
+                labels = "، ".join(o.get("label") or o["key"] for o in pending[:5])
+                st.warning(f"📶 {len(pending)} عملية محفوظة بانتظار الاتصال: {labels}")
+            if foreign:
+                owners = "، ".join(sorted({o.get("created_by") or "غير معروف" for o in foreign}))
+                st.info(
+                    f"🔒 {len(foreign)} عملية محفوظة على هذا الجهاز أضافها مستخدم آخر ({owners}) "
+                    "— لن تُرسل إلا بعد دخوله"
+                )
+
+    sync_queue_to_browser()
+
+
 def orders_prep_page(go, user):
     st.markdown("<h2 style='text-align:center;'>🧑‍🍳 تحضير + تسليم الطلبات</h2>", unsafe_allow_html=True)
     st.caption("✅ التحضير يخصم المخزون فوراً — الدفع يتحدد عند التسليم — الرصيد: موجب=عليه، سالب=له رصيد")
@@ -326,34 +495,66 @@ def orders_prep_page(go, user):
     st.session_state.setdefault("last_debt_payment_amount", 0.0)
     st.session_state.setdefault("last_debt_payment_remaining", 0.0)
     st.session_state.setdefault("last_debt_payment_discount", 0.0)
+    st.session_state.setdefault("prep_batch", [])
+    st.session_state.setdefault("prep_batch_results", [])
 
     _normalize_prep_cart()
 
+    _render_offline_queue_panel(user)
+
     r1, r2, _ = st.columns([1.2, 1.2, 1.6])
 
     with r1:
         if st.button("🔄 تحديث المنتجات", key="prep_refresh_products"):
-            load_products_cached.clear()
-            st.session_state.pop("orders_products_once", None)
+            refresh_catalog("products")
+            unpin_catalog(st.session_state, "products")
             _load_prepared_orders_for_customer_cached.clear()
             _load_done_orders_for_customer_cached.clear()
             st.rerun()
 
     with r2:
         if st.button("🔄 تحديث العملاء", key="prep_refresh_customers"):
-            load_customers_cached.clear()
-            st.session_state.pop("orders_customers_once", None)
+            refresh_catalog("customers")
+            unpin_catalog(st.session_state, "customers")
             _get_customer_prices_map_cached.clear()
             _load_prepared_orders_for_customer_cached.clear()
             _load_done_orders_for_customer_cached.clear()
             st.rerun()
 
-    products = _get_products_once()
-    customers = _get_customers_once()
+    if user.get("role") == "admin":
+        with st.expander("📊 كاش السيرفر (hit / miss / eviction / تحديث بالخلفية)", expanded=False):
+            st.caption("stale = مرات عرض قيمة منتهية أثناء تحديثها بالخلفية — زمن التحميل/التحديث بالمللي ثانية لضبط TTL")
+            st.dataframe(
+                [
+                    {
+                        "الكاش": x["name"].rsplit(".", 1)[-1],
+                        "TTL": int(x["ttl"]),
+                        "مدخلات": x["size"],
+                        "hits": x["hits"],
+                        "misses": x["misses"],
+                        "hit %": round(100 * x["hit_rate"], 1),
+                        "evictions": x["evictions"],
+                        "expired": x["expirations"],
+                        "stale": x["stale_served"],
+                        "refreshes": x["refreshes"],
+                        "refresh errors": x["refresh_errors"],
+                        "refresh p50": round(x["refresh_p50_ms"], 1),
+                        "refresh p95": round(x["refresh_p95_ms"], 1),
+                        "load p50": round(x["load_p50_ms"], 1),
+                        "load p95": round(x["load_p95_ms"], 1),
+                    }
+                    for x in cache_stats()
+                ],
+                use_container_width=True,
+                hide_index=True,
+            )
+
+    products_snap = _get_products_once()
+    customers_snap = _get_customers_once()
+    products = products_snap.items
 
-    prod_by_id = {p["id"]: p for p in products}
-    cust_by_id = {c["id"]: c for c in customers}
-    cust_map = {c.get("name", c["id"]): c["id"] for c in customers}
+    prod_by_id = products_snap.by_id
+    cust_by_id = customers_snap.by_id
 
     # ---------------------------
     # Debt payment dialog
@@ -426,53 +627,18 @@ def orders_prep_page(go, user):
                     if not _acquire_action_lock(f"save_debt_payment_{cid}"):
                         return
                     try:
-                        if total_effect <= 0:
-                            raise ValueError("أدخل مبلغ تسديد أو خصم أكبر من صفر")
-
-                        @firestore.transactional
-                        def tx_pay_debt(transaction):
-                            ts = now_iso()
-                            cust_ref = db.collection("customers").document(cid)
-                            cust_snap = cust_ref.get(transaction=transaction)
-
-                            if not cust_snap.exists:
-                                raise ValueError("العميل غير موجود")
-
-                            cust_data = cust_snap.to_dict() or {}
-                            bal = float(to_float(cust_data.get("balance", 0)))
-
-                            if bal <= 0:
-                                raise ValueError("لا يوجد ذمم مستحقة على هذا العميل")
-
-                            if total_effect > bal:
-                                raise ValueError("مجموع التسديد والخصم أكبر من الذمم المستحقة")
-
-                            new_bal = bal - total_effect
-
-                            transaction.update(cust_ref, {
-                                "balance": new_bal,
-                                "updated_at": ts,
-                            })
-
-                        tx_pay_debt(db.transaction())
-
-                        db.collection("customer_balance_moves").add({
-                            "customer_id": cid,
-                            "customer_name": customer.get("name") or "",
-                            "sale_id": "",
-                            "invoice_no": "",
-                            "type": "debt_payment_only",
-                            "amount": float(amount),
-                            "discount_amount": float(discount_amount),
-                            "active": True,
-                            "created_at": now_iso(),
-                            "created_by": user.get("username", ""),
-                            "note": "تسديد ذمم من شاشة تحضير الطلبات"
-                        })
+                        res = pay_customer_debt(
+                            cid,
+                            amount=amount,
+                            discount_amount=discount_amount,
+                            user=user,
+                            idempotency_key=session_idempotency_key(st.session_state, f"debt_payment_{cid}"),
+                        )
+                        clear_session_idempotency_key(st.session_state, f"debt_payment_{cid}")
 
                         _clear_sales_related_caches(clear_products=False, clear_customers=True)
 
-                        new_remaining = max(0.0, float(cur_bal) - float(total_effect))
+                        new_remaining = max(0.0, float(to_float(res.get("balance_after", 0.0))))
                         st.session_state.last_debt_payment_amount = float(amount)
                         st.session_state.last_debt_payment_discount = float(discount_amount)
                         st.session_state.last_debt_payment_remaining = float(new_remaining)
@@ -487,7 +653,20 @@ def orders_prep_page(go, user):
                         st.rerun()
 
                     except Exception as e:
-                        st.error(f"فشل تسديد الذمم: {e}")
+                        if is_connectivity_error(e):
+                            enqueue_op(make_debt_payment_op(
+                                cid,
+                                amount=amount,
+                                discount_amount=discount_amount,
+                                idempotency_key=session_idempotency_key(st.session_state, f"debt_payment_{cid}"),
+                                label=f"تسديد {customer.get('name') or cid}",
+                                user=user,
+                            ))
+                            clear_session_idempotency_key(st.session_state, f"debt_payment_{cid}")
+                            st.session_state.active_dialog = None
+                            st.warning("📶 لا يوجد اتصال — تم حفظ التسديد وسيُرسل تلقائياً عند عودة الاتصال")
+                        else:
+                            st.error(f"فشل تسديد الذمم: {e}")
                     finally:
                         _release_action_lock(f"save_debt_payment_{cid}")
 
@@ -497,6 +676,7 @@ def orders_prep_page(go, user):
                     st.session_state.pop(disc_key, None)
                     st.session_state.pop(f"debt_payment_input_{cid}", None)
                     st.session_state.pop(f"debt_payment_discount_input_{cid}", None)
+                    clear_session_idempotency_key(st.session_state, f"debt_payment_{cid}")
                     st.session_state.active_dialog = None
                     st.rerun()
 
@@ -510,13 +690,12 @@ def orders_prep_page(go, user):
         if not sid or st.session_state.get("active_dialog") != "deliver":
             return
 
-        sale = doc_get("sales", sid) or {}
-        sale["id"] = sid
+        sale = doc_get("sales", sid, model=Sale) or Sale.from_dict({}, sid)
 
-        cust_id = sale.get("customer_id") or ""
-        customer = doc_get("customers", cust_id) if cust_id else {}
-        cur_bal = float(to_float((customer or {}).get("balance", 0)))
-        net_show = float(to_float(sale.get("net", 0)))
+        cust_id = sale.customer_id
+        customer = doc_get("customers", cust_id, model=Customer) if cust_id else None
+        cur_bal = customer.balance if customer is not None else 0.0
+        net_show = sale.net
 
         @st.dialog("✅ تسليم الطلب (تحديد الدفع) — ثم اطبع من قائمة المُسلّم")
         def _dlg():
@@ -606,116 +785,18 @@ def orders_prep_page(go, user):
                     if not _acquire_action_lock(f"confirm_deliver_{sid}"):
                         return
                     try:
-                        @firestore.transactional
-                        def tx_deliver(transaction):
-                            ts = now_iso()
-                            sale_ref = db.collection("sales").document(sid)
-                            sale_snap = sale_ref.get(transaction=transaction)
-                            if not sale_snap.exists:
-                                raise ValueError("الفاتورة غير موجودة")
-
-                            sd = sale_snap.to_dict() or {}
-                            if sd.get("status") == "done":
-                                return
-
-                            net_local = float(to_float(sd.get("net", 0)))
-                            cust_id_local = sd.get("customer_id") or ""
-
-                            paid = 0.0
-                            extra = 0.0
-                            unpaid = 0.0
-                            old_debt_paid_local = float(to_float(old_debt_paid, 0.0))
-
-                            cust_ref = None
-                            cur_bal_local = 0.0
-
-                            if cust_id_local:
-                                cust_ref = db.collection("customers").document(cust_id_local)
-                                cust_snap = cust_ref.get(transaction=transaction)
-
-                                if not cust_snap.exists:
-                                    raise ValueError("العميل غير موجود")
-
-                                cust_data = cust_snap.to_dict() or {}
-                                cur_bal_local = float(to_float(cust_data.get("balance", 0)))
-
-                            if old_debt_paid_local < 0:
-                                raise ValueError("مبلغ تسديد الذمم السابقة غير صالح")
-
-                            if old_debt_paid_local > max(0.0, cur_bal_local):
-                                raise ValueError("مبلغ تسديد الذمم السابقة أكبر من الذمم المستحقة على العميل")
-
-                            if pay == "cash":
-                                paid = float(to_float(paid_amount, 0.0))
-                                extra = max(0.0, paid - net_local)
-                                unpaid = max(0.0, net_local - paid)
-
-                            invoice_effect = 0.0
-                            if pay == "credit":
-                                invoice_effect = +net_local
-                            else:
-                                if unpaid > 0:
-                                    invoice_effect += unpaid
-                                if extra > 0:
-                                    invoice_effect -= extra
-
-                            balance_delta = invoice_effect - old_debt_paid_local
-                            old_debt_remaining_local = max(0.0, cur_bal_local - old_debt_paid_local)
-                            final_due_local = max(0.0, cur_bal_local + balance_delta)
-
-                            updates = {
-                                "status": "done",
-                                "payment_type": pay,
-                                "delivered_at": ts,
-                                "delivered_by": user.get("username", ""),
-                                "updated_at": ts,
-                                "amount_paid": float(paid) if pay == "cash" else 0.0,
-                                "extra_credit": float(extra) if pay == "cash" and extra > 0 else 0.0,
-                                "unpaid_debt": float(unpaid) if pay == "cash" and unpaid > 0 else 0.0,
-                                "old_debt_paid": float(old_debt_paid_local) if old_debt_paid_local > 0 else 0.0,
-                                "old_debt_remaining": float(old_debt_remaining_local),
-                                "final_due": float(final_due_local),
-                                "balance_applied": False,
-                                "distributor_id": (sd.get("distributor_id") or sd.get("seller_username") or user.get("username", "")),
-                                "distributor_name": (
-                                    sd.get("distributor_name")
-                                    or get_distributor_name(
-                                        sd.get("distributor_id")
-                                        or sd.get("seller_username")
-                                        or user.get("username", "")
-                                    )
-                                ),
-                            }
-
-                            if abs(balance_delta) > 1e-12 and cust_ref is not None:
-                                new_bal = cur_bal_local + balance_delta
-                                transaction.update(cust_ref, {
-                                    "balance": new_bal,
-                                    "updated_at": ts
-                                })
-                                updates["balance_applied"] = True
-
-                            transaction.update(sale_ref, updates)
-
-                        tx_deliver(db.transaction())
+                        deliver_sale(
+                            sid,
+                            pay=pay,
+                            paid_amount=paid_amount,
+                            old_debt_paid=old_debt_paid,
+                            user=user,
+                            idempotency_key=f"deliver:{sid}",
+                            resolve_distributor_name=get_distributor_name,
+                        )
 
                         _clear_sales_related_caches(clear_products=False, clear_customers=True)
 
-                        old_paid_after = float(to_float(st.session_state.get(f"deliver_old_debt_paid_state_{sid}", 0.0), 0.0))
-                        if old_paid_after > 0:
-                            db.collection("customer_balance_moves").add({
-                                "customer_id": sale.get("customer_id") or "",
-                                "customer_name": sale.get("customer_name") or "",
-                                "sale_id": sid,
-                                "invoice_no": sale.get("invoice_no") or sid,
-                                "type": "debt_payment",
-                                "amount": float(old_paid_after),
-                                "active": True,
-                                "created_at": now_iso(),
-                                "created_by": user.get("username", ""),
-                                "note": "تسديد ذمم سابقة أثناء تسليم فاتورة"
-                            })
-
                         st.session_state.pop(f"deliver_paid_amount_{sid}", None)
                         st.session_state.pop(f"deliver_old_debt_paid_state_{sid}", None)
                         st.session_state.pop(f"deliver_old_debt_paid_input_{sid}", None)
@@ -731,7 +812,20 @@ def orders_prep_page(go, user):
                         st.rerun()
 
                     except Exception as e:
-                        st.error(f"فشل التسليم: {e}")
+                        if is_connectivity_error(e):
+                            enqueue_op(make_deliver_op(
+                                sid,
+                                pay=pay,
+                                paid_amount=paid_amount,
+                                old_debt_paid=old_debt_paid,
+                                label=f"تسليم {sale.get('invoice_no') or sid}",
+                                user=user,
+                            ))
+                            st.session_state.active_dialog = None
+                            st.session_state.deliver_target_id = None
+                            st.warning("📶 لا يوجد اتصال — تم حفظ التسليم وسيُرسل تلقائياً عند عودة الاتصال")
+                        else:
+                            st.error(f"فشل التسليم: {e}")
                     finally:
                         _release_action_lock(f"confirm_deliver_{sid}")
 
@@ -784,6 +878,9 @@ def orders_prep_page(go, user):
                 sales = _get_customer_sales_for_statement(cid, limit=200) if cid else []
                 html = build_customer_statement_html(cust or {}, sales, company_name="مخابز البوادي", paper=paper, max_rows=30)
                 show_print_html(html, height=820)
+                if paper == "80mm":
+                    data = render_statement_escpos(cust or {}, sales, company_name="مخابز البوادي", paper=paper, max_rows=30)
+                    show_escpos_actions(data, f"statement_{cid}.bin", key="print_statement")
 
                 return
 
@@ -817,6 +914,10 @@ def orders_prep_page(go, user):
                 html = build_invoice_html(sale, customer=customer or {}, company_name="مخابز البوادي", paper=paper)
 
             show_print_html(html, height=820)
+            if paper == "80mm":
+                render = render_receipt_escpos if mode == "receipt" else render_invoice_escpos
+                data = render(sale, customer=customer or {}, company_name="مخابز البوادي", paper=paper)
+                show_escpos_actions(data, f"{mode}_{sale.get('invoice_no') or sid}.bin", key=f"print_{mode}")
         _dlg()
 
     if _supports_dialog():
@@ -827,9 +928,12 @@ def orders_prep_page(go, user):
         elif st.session_state.get("active_dialog") == "print":
             _render_print_dialog_if_needed()
 
+    if user.get("role") == "admin":
+        _render_prep_batch_panel(user, prod_by_id)
+
     st.subheader("➕ تحضير طلب جديد (خصم مخزون فوراً)")
 
-    if not customers:
+    if not customers_snap.items:
         st.error("لا يوجد عملاء. أضف عملاء أولاً من صفحة العملاء.")
         return
 
@@ -854,11 +958,12 @@ def orders_prep_page(go, user):
         )
 
     with colC:
-        cust_name = st.selectbox(
+        picked_customer_id = catalog_picker(
             "اختر العميل",
-            options=[""] + list(cust_map.keys()),
+            customers_snap,
             key="prep_customer_select",
             disabled=(prep_kind == "زائر"),
+            format_fn=customer_label,
         )
 
     with colD:
@@ -872,12 +977,12 @@ def orders_prep_page(go, user):
         )
         discount = float(to_float(discount, 0.0))
 
-    if prep_kind == "عميل" and not cust_name:
+    if prep_kind == "عميل" and not picked_customer_id:
         st.info("اختر عميل لبدء التحضير.")
         return
 
     if prep_kind == "عميل":
-        customer_id = cust_map[cust_name]
+        customer_id = picked_customer_id
         customer = cust_by_id.get(customer_id, {}) or {}
         cur_balance = float(to_float(customer.get("balance", 0)))
 
@@ -964,9 +1069,17 @@ div[data-testid="stForm"] button:hover {
             if nm in product_name_options
         ]
 
+    # البحث يضيّق الخيارات فقط؛ الأصناف المختارة تبقى ظاهرة دائماً
+    prod_q = st.text_input("🔎 بحث في الأصناف", key="prep_load_search", placeholder="اسم الصنف أو رمزه...")
+    visible_options = product_name_options
+    if prod_q.strip():
+        chosen_now = st.session_state["prep_load_choose"]
+        hits = [prod_by_id[pid].get("name", pid) for pid in catalog_index(products_snap).search(prod_q, limit=PICKER_LIMIT)]
+        visible_options = chosen_now + [nm for nm in hits if nm in name_to_id and nm not in chosen_now]
+
     chosen = st.multiselect(
         "اختر الأصناف",
-        options=product_name_options,
+        options=visible_options,
         key="prep_load_choose",
         placeholder="اختر الأصناف من هنا",
         on_change=_sync_cart_when_multiselect_changes,
@@ -1051,8 +1164,7 @@ div[data-testid="stForm"] button:hover {
                 "product_id": pid,
                 "product_name": pname,
                 "qty": int(qty),
-                "price": float(used_price),
-                "total": float(line_total),
+                **money_fields(price=to_fils(used_price), total=to_fils(line_total)),
                 "consume_stock": consume_stock,
             })
 
@@ -1070,7 +1182,7 @@ div[data-testid="stForm"] button:hover {
         m3.metric("الصافي", f"{net:.2f}")
 
         if user.get("role") == "admin":
-            colA, colB, colC = st.columns(3)
+            colA, colQ, colB, colC = st.columns(4)
         else:
             colB, colC = st.columns(2)
 
@@ -1080,90 +1192,12 @@ div[data-testid="stForm"] button:hover {
                     if not _acquire_action_lock("prep_save"):
                         return
 
-                    inv = f"INV-{datetime.now(timezone(timedelta(hours=3))).strftime('%Y%m%d-%H%M%S-%f')}"
-                    sale_id = inv.lower().replace(":", "").replace(" ", "_")
-
-                    @firestore.transactional
-                    def tx_prepare_and_deduct(transaction):
-                        ts = now_iso()
-                        tx_items = []
-
-                        for it in items:
-                            if not bool(it.get("consume_stock", True)):
-                                tx_items.append((it, None, None))
-                                continue
-
-                            ref = db.collection("products").document(it["product_id"])
-                            snap = ref.get(transaction=transaction)
-                            if not snap.exists:
-                                raise ValueError(f"منتج غير موجود: {it.get('product_name', '')}")
-                            tx_items.append((it, ref, snap))
-
-                        for it, ref, snap in tx_items:
-                            if not bool(it.get("consume_stock", True)):
-                                continue
-                            cur = float(to_float((snap.to_dict() or {}).get("qty_on_hand", 0)))
-                            req = float(it["qty"])
-                            if cur < req:
-                                raise ValueError(
-                                    f"المخزون غير كافي للمنتج: {it['product_name']} (المطلوب {req}, المتوفر {cur})"
-                                )
-
-                        for it, ref, snap in tx_items:
-                            if not bool(it.get("consume_stock", True)):
-                                continue
-                            cur = float(to_float((snap.to_dict() or {}).get("qty_on_hand", 0)))
-                            req = float(it["qty"])
-                            transaction.update(ref, {"qty_on_hand": cur - req, "updated_at": ts})
-
-                        sale_ref = db.collection("sales").document(sale_id)
-                        transaction.set(sale_ref, {
-                            "invoice_no": inv,
-                            "ref": inv,
-                            "customer_id": (customer_id or ""),
-                            "customer_name": (customer.get("name", "") if prep_kind == "عميل" else "زائر"),
-                            "seller_username": user.get("username"),
-                            "distributor_id": (user.get("username") or ""),
-                            "distributor_name": get_distributor_name(user.get("username") or ""),
-                            "payment_type": None,
-                            "discount": float(discount),
-                            "total": float(total),
-                            "net": float(net),
-                            "items": items,
-                            "status": "prepared",
-                            "stock_deducted": True,
-                            "balance_applied": False,
-                            "amount_paid": 0.0,
-                            "extra_credit": 0.0,
-                            "unpaid_debt": 0.0,
-                            "active": True,
-                            "created_at": ts,
-                            "updated_at": ts,
-                            "created_by": user.get("username", ""),
-                        }, merge=True)
+                    order = _build_prep_order(items, discount, customer_id, customer, prep_kind, user, prod_by_id)
+                    # المفتاح يتبع محتوى السلة والعميل: أي تعديل = مفتاح جديد
+                    order["idempotency_key"] = session_idempotency_key(st.session_state, "prep_cart", order_fingerprint(order))
 
                     try:
-                        tx_prepare_and_deduct(db.transaction())
-
-                        moves = []
-                        for it in items:
-                            if not bool(it.get("consume_stock", True)):
-                                continue
-                            moves.append({
-                                "type": "sale",
-                                "ref_type": "sale_prepared",
-                                "ref_id": sale_id,
-                                "item_type": "product",
-                                "item_id": it["product_id"],
-                                "item_name": it.get("product_name", ""),
-                                "qty_delta": -float(it["qty"]),
-                                "unit": (prod_by_id.get(it["product_id"], {}) or {}).get("sale_unit", "pcs"),
-                                "note": "خصم أثناء تحضير الطلب (قبل التسليم)",
-                                "created_by": user.get("username", ""),
-                            })
-
-                        if moves:
-                            write_stock_moves_batch(moves)
+                        prepare_order(order, user)
 
                         _clear_sales_related_caches(clear_products=True, clear_customers=False)
                         _clear_prep_cart_and_free_qty_keys()
@@ -1175,7 +1209,21 @@ div[data-testid="stForm"] button:hover {
                     finally:
                         _release_action_lock("prep_save")
 
-        
+            with colQ:
+                if st.button("➕ إضافة للدفعة (تحضير لاحقاً)", use_container_width=True, key="prep_batch_add"):
+                    st.session_state.prep_batch.append({
+                        "idempotency_key": new_idempotency_key("prepare"),
+                        "customer_id": customer_id,
+                        "customer": {"name": customer.get("name", "")},
+                        "prep_kind": prep_kind,
+                        "discount": float(discount),
+                        "items": items,
+                        "net": float(net),
+                    })
+                    _clear_prep_cart_and_free_qty_keys()
+                    st.success("تمت إضافة الطلب للدفعة ✅")
+                    st.rerun()
+
         with colB:
             if st.button("🚚 تسليم مباشر (خصم + تسليم الآن)", use_container_width=True, key="prep_direct_deliver"):
                 if user.get("role") == "distributor" and prep_kind == "زائر":
@@ -1185,90 +1233,16 @@ div[data-testid="stForm"] button:hover {
                 if not _acquire_action_lock("prep_direct_deliver"):
                     return
 
-                inv = f"INV-{datetime.now(timezone(timedelta(hours=3))).strftime('%Y%m%d-%H%M%S-%f')}"
-                sale_id = inv.lower().replace(":", "").replace(" ", "_")
+                order = _build_prep_order(items, discount, customer_id, customer, prep_kind, user, prod_by_id)
+                order["idempotency_key"] = session_idempotency_key(st.session_state, "prep_cart", order_fingerprint(order))
 
                 try:
-                    @firestore.transactional
-                    def tx_direct_deliver(transaction):
-                        ts = now_iso()
-                        tx_items = []
-
-                        for it in items:
-                            if not bool(it.get("consume_stock", True)):
-                                tx_items.append((it, None, None))
-                                continue
-
-                            ref = db.collection("products").document(it["product_id"])
-                            snap = ref.get(transaction=transaction)
-                            if not snap.exists:
-                                raise ValueError(f"منتج غير موجود: {it.get('product_name', '')}")
-                            tx_items.append((it, ref, snap))
-
-                        for it, ref, snap in tx_items:
-                            if not bool(it.get("consume_stock", True)):
-                                continue
-                            cur = float(to_float((snap.to_dict() or {}).get("qty_on_hand", 0)))
-                            req = float(it["qty"])
-                            if cur < req:
-                                raise ValueError(
-                                    f"المخزون غير كافي للمنتج: {it['product_name']} (المطلوب {req}, المتوفر {cur})"
-                                )
-
-                        for it, ref, snap in tx_items:
-                            if not bool(it.get("consume_stock", True)):
-                                continue
-                            cur = float(to_float((snap.to_dict() or {}).get("qty_on_hand", 0)))
-                            req = float(it["qty"])
-                            transaction.update(ref, {"qty_on_hand": cur - req, "updated_at": ts})
-
-                        sale_ref = db.collection("sales").document(sale_id)
-                        transaction.set(sale_ref, {
-                            "invoice_no": inv,
-                            "ref": inv,
-                            "customer_id": (customer_id or ""),
-                            "customer_name": (customer.get("name", "") if prep_kind == "عميل" else "زائر"),
-                            "seller_username": user.get("username"),
-                            "distributor_id": (user.get("username") or ""),
-                            "distributor_name": get_distributor_name(user.get("username") or ""),
-                            "payment_type": None,
-                            "discount": float(discount),
-                            "total": float(total),
-                            "net": float(net),
-                            "items": items,
-                            "status": "prepared",
-                            "stock_deducted": True,
-                            "balance_applied": False,
-                            "amount_paid": 0.0,
-                            "extra_credit": 0.0,
-                            "unpaid_debt": 0.0,
-                            "active": True,
-                            "created_at": ts,
-                            "updated_at": ts,
-                            "created_by": user.get("username", ""),
-                        }, merge=True)
-
-                    tx_direct_deliver(db.transaction())
-
-                    moves = []
-                    for it in items:
-                        if not bool(it.get("consume_stock", True)):
-                            continue
-                        moves.append({
-                            "type": "sale",
-                            "ref_type": "sale_direct",
-                            "ref_id": sale_id,
-                            "item_type": "product",
-                            "item_id": it["product_id"],
-                            "item_name": it.get("product_name", ""),
-                            "qty_delta": -float(it["qty"]),
-                            "unit": (prod_by_id.get(it["product_id"], {}) or {}).get("sale_unit", "pcs"),
-                            "note": "خصم أثناء تسليم مباشر",
-                            "created_by": user.get("username", ""),
-                        })
-
-                    if moves:
-                        write_stock_moves_batch(moves)
+                    sale_id = prepare_order(
+                        order,
+                        user,
+                        ref_type="sale_direct",
+                        note="خصم أثناء تسليم مباشر",
+                    )
 
                     _clear_sales_related_caches(clear_products=True, clear_customers=False)
                     _clear_prep_cart_and_free_qty_keys()
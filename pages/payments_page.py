@@ -1,16 +1,30 @@
 import streamlit as st
 from datetime import datetime
-from firebase_config import db
+from firebase_config import db, transactional
 from firebase_admin import firestore
 
 from utils.helpers import now_iso, to_float
-from services.firestore_queries import col_to_list
-
-
-def write_stock_move(move: dict):
+from utils.money import from_fils, money_fields, read_fils, to_fils
+from services.cache_bus import publish
+from services.catalog import current_catalog
+from services.idempotency_service import (
+    idem_fingerprint,
+    idem_lookup,
+    idem_store,
+    session_idempotency_key,
+    clear_session_idempotency_key,
+)
+from components.shared_ui import catalog_picker, customer_label
+
+
+def write_stock_move(move: dict, doc_id: str = ""):
     move["created_at"] = now_iso()
     move["active"] = True
-    db.collection("stock_moves").add(move)
+    if doc_id:
+        # معرف ثابت: إعادة المحاولة بنفس العملية تكتب فوق نفس المستند
+        db.collection("stock_moves").document(doc_id).set(move)
+    else:
+        db.collection("stock_moves").add(move)
 
 
 # ---------------------------
@@ -26,27 +40,27 @@ def payments_page(go, user):
         if st.button("⬅️ رجوع للوحة التحكم", key="back_to_dashboard_payments"):
             go("dashboard")
 
-    customers = col_to_list("customers", where_active=True)
-    if not customers:
+    # العملاء من الكتالوج المشترك؛ publish بعد كل تحصيل يحدّث الرصيد
+    customers_snap = current_catalog("customers")
+    if not customers_snap.items:
         st.warning("لا يوجد عملاء. أضف عميل أولًا من صفحة العملاء 👥.")
         return
 
-    cust_map = {c.get("name", c["id"]): c["id"] for c in customers if c.get("name") or c.get("id")}
-    cust_by_id = {c["id"]: c for c in customers}
+    cust_by_id = customers_snap.by_id
 
     st.subheader("🧾 تسجيل تحصيل")
     c1, c2 = st.columns([2, 1])
     with c1:
-        cust_name = st.selectbox("اختر العميل", options=[""] + list(cust_map.keys()), key="pay_customer_select")
+        customer_id = catalog_picker("اختر العميل", customers_snap, key="pay_customer_select", format_fn=customer_label)
     with c2:
         pay_date = st.date_input("التاريخ", key="pay_date", value=datetime.utcnow().date())
 
-    if not cust_name:
+    if not customer_id:
         st.info("اختر عميل للمتابعة.")
         return
 
-    customer_id = cust_map[cust_name]
     customer = cust_by_id.get(customer_id, {})
+    cust_name = customer.get("name", customer_id)
     current_balance = to_float(customer.get("balance", 0.0))
     st.caption(f"الرصيد الحالي على العميل: **{current_balance:.2f}**")
 
@@ -60,6 +74,8 @@ def payments_page(go, user):
             st.error("أدخل مبلغ أكبر من صفر")
             return
 
+        action = f"payment_{customer_id}"
+        fingerprint = idem_fingerprint(customer_id, to_fils(amount), str(pay_date), note.strip())
         try:
             pay_id, before_bal, after_bal, created_at = _commit_payment_transaction(
                 customer_id=customer_id,
@@ -68,9 +84,18 @@ def payments_page(go, user):
                 pay_date=str(pay_date),
                 note=note.strip(),
                 created_by=(user.get("username") or ""),
-                prevent_negative=prevent_negative
+                prevent_negative=prevent_negative,
+                idempotency_key=session_idempotency_key(st.session_state, action, fingerprint),
+                fingerprint=fingerprint,
             )
+        except Exception as e:
+            st.error(f"فشل تسجيل التحصيل: {e}")
+            return
 
+        # التحصيل محفوظ: ما بعده لا يظهر كفشل، والمفتاح يبقى حتى تنجح كل الخطوات
+        # (إعادة الحفظ ترجع نفس التحصيل وتكمل سجل الحركة بمعرّفه الثابت)
+        try:
+            publish(customer_id=customer_id)
             write_stock_move({
                 "type": "collection",
                 "ref_type": "payment",
@@ -88,13 +113,14 @@ def payments_page(go, user):
                 "balance_before": float(before_bal),
                 "balance_after": float(after_bal),
                 "created_at": created_at,
-            })
-
-            st.success(f"تم تسجيل التحصيل ✅ (ID: {pay_id}) | الرصيد الآن: {after_bal:.2f}")
-            st.rerun()
-
+            }, doc_id=f"sm__payment__{pay_id}")
         except Exception as e:
-            st.error(f"فشل تسجيل التحصيل: {e}")
+            st.warning(f"تم تسجيل التحصيل ✅ (ID: {pay_id}) لكن تعذر حفظ سجل الحركة: {e} — اضغط حفظ مرة أخرى لإكماله")
+            return
+
+        clear_session_idempotency_key(st.session_state, action)
+        st.success(f"تم تسجيل التحصيل ✅ (ID: {pay_id}) | الرصيد الآن: {after_bal:.2f}")
+        st.rerun()
 
     st.divider()
     st.subheader("📜 سجل التحصيل (آخر 30)")
@@ -134,24 +160,29 @@ def payments_page(go, user):
 # ---------------------------
 # Transaction
 # ---------------------------
-def _commit_payment_transaction(customer_id, customer_name, amount, pay_date, note, created_by, prevent_negative=True):
+def _commit_payment_transaction(customer_id, customer_name, amount, pay_date, note, created_by, prevent_negative=True, idempotency_key="",
+                                fingerprint=""):
     created_at = now_iso()
 
-    @firestore.transactional
+    @transactional
     def tx_do(transaction):
+        idem, prev = idem_lookup(transaction, idempotency_key, op="payment", fingerprint=fingerprint)
+        if prev is not None:
+            return prev["pay_id"], prev["balance_before"], prev["balance_after"], prev["created_at"]
+
         cust_ref = db.collection("customers").document(customer_id)
 
         cust_snap = cust_ref.get(transaction=transaction)
         if not cust_snap.exists:
             raise ValueError("العميل غير موجود.")
 
-        cur_bal = to_float((cust_snap.to_dict() or {}).get("balance", 0.0))
-        new_bal = cur_bal - float(amount)
+        cur_bal = read_fils(cust_snap.to_dict() or {}, "balance")
+        new_bal = cur_bal - to_fils(amount)
 
         if prevent_negative and new_bal < 0:
-            raise ValueError(f"المبلغ أكبر من الرصيد. الرصيد الحالي {cur_bal:.2f}")
+            raise ValueError(f"المبلغ أكبر من الرصيد. الرصيد الحالي {from_fils(cur_bal):.2f}")
 
-        transaction.update(cust_ref, {"balance": new_bal, "updated_at": created_at})
+        transaction.update(cust_ref, {**money_fields(balance=new_bal), "updated_at": created_at})
 
         pay_ref = db.collection("payments").document()
         transaction.set(pay_ref, {
@@ -162,12 +193,17 @@ def _commit_payment_transaction(customer_id, customer_name, amount, pay_date, no
             "customer_id": customer_id,
             "customer_name": customer_name,
             "date": pay_date,
-            "amount": float(amount),
+            **money_fields(amount=to_fils(amount), balance_before=cur_bal, balance_after=new_bal),
             "note": note,
-            "balance_before": float(cur_bal),
-            "balance_after": float(new_bal),
         })
 
-        return pay_ref.id, cur_bal, new_bal, created_at
+        idem_store(transaction, idem, idempotency_key, "payment", {
+            "pay_id": pay_ref.id,
+            "balance_before": from_fils(cur_bal),
+            "balance_after": from_fils(new_bal),
+            "created_at": created_at,
+        }, {"username": created_by}, fingerprint=fingerprint)
+
+        return pay_ref.id, from_fils(cur_bal), from_fils(new_bal), created_at
 
     return tx_do(db.transaction())
\ No newline at end of file
@@ -4,7 +4,12 @@ from firebase_config import db
 from firebase_admin import firestore
 
 from utils.helpers import now_iso, to_float
-from services.firestore_queries import col_to_list, doc_get, doc_set
+from utils.money import from_fils, money_fields, read_fils, to_fils
+from services.firestore_queries import doc_get, doc_set
+from services.cache_bus import publish
+from services.catalog import current_catalog, refresh_catalog, session_catalog, unpin_catalog
+from services.price_history_service import customer_prices_at
+from components.shared_ui import catalog_picker, customer_label
 
 
 # ---------------------------
@@ -24,23 +29,9 @@ def write_stock_move(move: dict):
 def _load_customer_prices_map(customer_id: str, limit=500):
     """
     يرجع dict:
-      product_id -> price
+      product_id -> price  (السعر الخاص الساري الآن حسب نسخ الأسعار)
     """
-    docs = db.collection("customer_prices") \
-        .where("customer_id", "==", customer_id) \
-        .limit(limit) \
-        .stream()
-
-    mp = {}
-    for d in docs:
-        x = d.to_dict() or {}
-        if x.get("active") is not True:
-            continue
-        pid = x.get("product_id")
-        if not pid:
-            continue
-        mp[pid] = float(to_float(x.get("price", 0.0)))
-    return mp
+    return customer_prices_at(customer_id)
 
 
 # ---------------------------
@@ -56,19 +47,18 @@ def sales_page(go, user):
         if st.button("⬅️ رجوع للوحة التحكم", key="back_to_dashboard_sales"):
             go("dashboard")
 
-    # تحميل العملاء
-    customers = col_to_list("customers", where_active=True)
-    if not customers:
+    # العملاء من الكتالوج المشترك (بدل قراءة كل العملاء في كل rerun)
+    customers_snap = current_catalog("customers")
+    if not customers_snap.items:
         st.warning("لا يوجد عملاء. أضف عميل أولًا من صفحة العملاء 👥.")
         return
 
-    cust_map = {c.get("name", c["id"]): c["id"] for c in customers}
-    cust_by_id = {c["id"]: c for c in customers}
+    cust_by_id = customers_snap.by_id
 
     st.subheader("👤 بيانات العميل")
     c1, c2, c3 = st.columns([2, 1, 1])
     with c1:
-        cust_name = st.selectbox("اختر العميل", options=[""] + list(cust_map.keys()), key="sale_customer_select")
+        customer_id = catalog_picker("اختر العميل", customers_snap, key="sale_customer_select", format_fn=customer_label)
     with c2:
         payment_type = st.selectbox("نوع الدفع", options=["cash", "credit"], index=0, key="sale_payment_type")
     with c3:
@@ -77,12 +67,12 @@ def sales_page(go, user):
             st.session_state.pop("customer_prices_for", None)
             st.rerun()
 
-    if not cust_name:
+    if not customer_id:
         st.info("اختر عميل للمتابعة.")
         return
 
-    customer_id = cust_map[cust_name]
     customer = cust_by_id.get(customer_id, {})
+    cust_name = customer.get("name", customer_id)
     st.caption(f"الرصيد الحالي: **{to_float(customer.get('balance',0)):.2f}**")
 
     # ✅ حمّل الأسعار الخاصة مرة واحدة لكل عميل
@@ -96,21 +86,20 @@ def sales_page(go, user):
 
     st.divider()
 
-    # تحميل المنتجات (مرة واحدة)
-    if "products_cache_for_sales" not in st.session_state:
-        st.session_state.products_cache_for_sales = col_to_list("products", where_active=True)
-
+    # المنتجات من الكتالوج المشترك (الجلسة تحفظ رقم النسخة فقط)
     if st.button("🔄 تحديث المنتجات", key="refresh_products_cache_for_sales"):
-        st.session_state.pop("products_cache_for_sales", None)
+        refresh_catalog("products")
+        unpin_catalog(st.session_state, "products")
         st.rerun()
 
-    products = st.session_state.get("products_cache_for_sales", [])
+    products_snap = session_catalog(st.session_state, "products")
+    products = products_snap.items
     if not products:
         st.info("لا يوجد منتجات. أضف منتجات أولًا من إدارة المستودع.")
         return
 
     prod_map = {p.get("name", p["id"]): p["id"] for p in products}
-    prod_by_id = {p["id"]: p for p in products}
+    prod_by_id = products_snap.by_id
 
     # session cart
     if "sale_cart" not in st.session_state:
@@ -281,6 +270,7 @@ def sales_page(go, user):
                         "customer_name": cust_name,
                     })
 
+                publish(customer_id=customer_id, product_ids=[l["product_id"] for l in st.session_state.sale_cart])
                 st.success(f"تم اعتماد البيع ✅ (ID: {sale_id}) | الإجمالي: {total:.2f}")
                 st.session_state.sale_cart = []
                 st.rerun()
@@ -336,8 +326,9 @@ def _commit_sale_transaction_wholesale(cart_lines, user, customer_id, customer_n
             cur = to_float((snap.to_dict() or {}).get("qty_on_hand", 0))
             transaction.update(ref, {"qty_on_hand": cur - float(line["qty"]), "updated_at": now_iso()})
 
-        # حساب الإجمالي
-        total = sum(float(l["qty"]) * float(l["price"]) for l in lines)
+        # حساب الإجمالي بالفلس: مجموع السطور المقرّبة نفسها (بدون فرق تقريب)
+        line_fils = [to_fils(float(l["qty"]) * float(l["price"])) for l in lines]
+        total = sum(line_fils)
 
         # إذا آجل: زِد رصيد العميل
         if payment_type == "credit":
@@ -345,8 +336,8 @@ def _commit_sale_transaction_wholesale(cart_lines, user, customer_id, customer_n
             cust_snap = cust_ref.get(transaction=transaction)
             if not cust_snap.exists:
                 raise ValueError("العميل غير موجود.")
-            cur_bal = to_float((cust_snap.to_dict() or {}).get("balance", 0))
-            transaction.update(cust_ref, {"balance": cur_bal + float(total), "updated_at": now_iso()})
+            cur_bal = read_fils(cust_snap.to_dict() or {}, "balance")
+            transaction.update(cust_ref, {**money_fields(balance=cur_bal + total), "updated_at": now_iso()})
 
         # إنشاء فاتورة
         sale_ref = db.collection("sales").document()
@@ -365,13 +356,13 @@ def _commit_sale_transaction_wholesale(cart_lines, user, customer_id, customer_n
                     "unit": l["unit"],
                     "qty": l["qty"],
                     "price": l["price"],
-                    "line_total": round(float(l["qty"]) * float(l["price"]), 3),
-                } for l in lines
+                    **money_fields(line_total=lf),
+                } for l, lf in zip(lines, line_fils)
             ],
-            "total": round(float(total), 3),
+            **money_fields(total=total),
         })
 
-        return sale_ref.id, float(total)
+        return sale_ref.id, from_fils(total)
 
     return tx_do(db.transaction())
 
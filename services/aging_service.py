@@ -0,0 +1,303 @@
+"""
+أعمار الذمم لكل العملاء: كم من رصيد العميل عمره 0–7 / 8–30 / 31–60 / أكثر من 60 يوم.
+
+لكل عميل رصيده موجب:
+- المدين (يزيد الذمم): الرصيد الافتتاحي، فاتورة ذمم (الصافي)، فاتورة نقدي (المتبقي).
+  تاريخ الفاتورة = delivered_at (وقت نشوء الدين) وإلا created_at.
+- الدائن (يخفّض الذمم): التحصيلات، المرتجعات (خصم دين)، customer_balance_moves
+  (تسديد ذمم: المبلغ + الخصم)، وزيادة الدفع في فاتورة نقدي.
+- FIFO: كل دائن يسدد أقدم فاتورة مفتوحة أولاً؛ الدائن الزائد يبقى رصيداً للعميل
+  ويُخصم من الفواتير التالية.
+- التسوية مع customers.balance (المصدر المعتمد): فرق لا يفسره السجل (بيانات قديمة
+  بلا حركات) يُضاف كبند مفتوح بتاريخ إنشاء العميل، أو يُخصم من الأقدم.
+
+النتيجة تُحفظ في receivables_aging/<customer_id> كبنود مفتوحة (تاريخ + فلس)، والتصنيف
+في الأعمار يُحسب عند العرض لأي تاريخ (مرور الأيام لا يحتاج إعادة حساب).
+
+تشغيل تزايدي: aging_runs/latest يحفظ watermark؛ التشغيل التالي يعيد حساب العملاء
+الذين تغيّر customers.updated_at لهم بعده فقط (كل كتابة تمس الرصيد تحدّثه)، والسجل
+يُحمّل باستعلامات "in" لكل 30 عميل بالتوازي.
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from firebase_config import db
+from utils.helpers import now_iso
+from utils.money import from_fils, money_fields, read_fils
+from services.cache_bus import keyed_cache, publish_tags
+from services.firestore_queries import doc_get, doc_set
+
+AGING = "receivables_aging"
+AGING_RUNS = "aging_runs"
+AGING_TAG = "receivables_aging"
+
+# (key, العنوان, من يوم, إلى يوم أو None)
+AGING_BUCKETS = (
+    ("d0_7", "0–7 أيام", 0, 7),
+    ("d8_30", "8–30 يوم", 8, 30),
+    ("d31_60", "31–60 يوم", 31, 60),
+    ("d60_plus", "أكثر من 60 يوم", 61, None),
+)
+AGING_WORKERS = 8
+AGING_BATCH_SIZE = 400
+# كتابة بدأت قبل بداية التشغيل وانتهت بعد استعلامه لا تضيع: هامش على الـ watermark
+WATERMARK_SLACK = timedelta(minutes=5)
+EPOCH = "1970-01-01T00:00:00+03:00"
+
+_IN_LIMIT = 30
+
+
+def _day(ts: str) -> date:
+    try:
+        return date.fromisoformat((ts or EPOCH)[:10])
+    except ValueError:
+        return date.fromisoformat(EPOCH[:10])
+
+
+def bucket_key(days: int) -> str:
+    for key, _, lo, hi in AGING_BUCKETS:
+        if days >= lo and (hi is None or days <= hi):
+            return key
+    return AGING_BUCKETS[0][0]
+
+
+def bucket_items(open_items: list, as_of: str = None) -> dict:
+    """
+    key -> فلس: البنود المفتوحة حسب عمرها في as_of (الافتراضي: الآن).
+    """
+    today = _day(as_of or now_iso())
+    out = {key: 0 for key, *_ in AGING_BUCKETS}
+    for it in open_items or []:
+        days = max(0, (today - _day(it.get("date"))).days)
+        out[bucket_key(days)] += int(it.get("fils") or 0)
+    return out
+
+
+# ---------------------------
+# FIFO
+# ---------------------------
+def fifo_open_items(moves: list, balance_fils: int, opened_at: str = "") -> list:
+    """
+    moves: [(التاريخ، فلس موجب = مدين / سالب = دائن، المرجع)].
+    يرجع البنود المفتوحة [{date, fils, ref}] الأقدم أولاً، ومجموعها = max(0, balance_fils).
+    """
+    open_items = []
+    head = 0  # أول بند مفتوح لم يُسدد بالكامل
+    credit = 0
+    for when, fils, ref in sorted(moves, key=lambda m: m[0] or ""):
+        if fils > 0:
+            use = min(credit, fils)
+            credit -= use
+            if fils - use > 0:
+                open_items.append({"date": when, "fils": fils - use, "ref": ref})
+        elif fils < 0:
+            pay = -fils
+            while pay > 0 and head < len(open_items):
+                it = open_items[head]
+                use = min(pay, it["fils"])
+                it["fils"] -= use
+                pay -= use
+                if it["fils"] == 0:
+                    head += 1
+            credit += pay
+    open_items = open_items[head:]
+
+    # التسوية مع الرصيد المعتمد
+    outstanding = sum(it["fils"] for it in open_items)
+    target = max(0, balance_fils)
+    if outstanding < target:
+        open_items.insert(0, {"date": opened_at or EPOCH, "fils": target - outstanding, "ref": "unmatched"})
+    elif outstanding > target:
+        extra = outstanding - target
+        while extra > 0 and open_items:
+            use = min(extra, open_items[0]["fils"])
+            open_items[0]["fils"] -= use
+            extra -= use
+            if open_items[0]["fils"] == 0:
+                open_items.pop(0)
+    return open_items
+
+
+# ---------------------------
+# Ledger
+# ---------------------------
+def _posted(x: dict) -> bool:
+    return x.get("active") is True and x.get("status") in ["posted", "done"]
+
+
+def _ledger_chunk(ids: list) -> dict:
+    """
+    customer_id -> [(التاريخ، فلس، مرجع)] لمجموعة ≤ 30 عميل (4 استعلامات "in").
+    """
+    out = {cid: [] for cid in ids}
+
+    for d in db.collection("sales").where("customer_id", "in", ids).stream():
+        x = d.to_dict() or {}
+        cid = x.get("customer_id")
+        if cid not in out or not _posted(x):
+            continue
+        when = x.get("delivered_at") or x.get("created_at") or ""
+        ref = x.get("invoice_no") or d.id
+        if x.get("payment_type") == "credit":
+            out[cid].append((when, read_fils(x, "net"), ref))
+        elif x.get("payment_type") == "cash":
+            effect = read_fils(x, "unpaid_debt") - read_fils(x, "extra_credit")
+            if effect:
+                out[cid].append((when, effect, ref))
+
+    for d in db.collection("collections").where("customer_id", "in", ids).stream():
+        x = d.to_dict() or {}
+        if x.get("customer_id") in out and _posted(x):
+            out[x["customer_id"]].append((x.get("created_at") or "", -read_fils(x, "amount"), f"COL:{d.id}"))
+
+    for d in db.collection("returns").where("customer_id", "in", ids).stream():
+        x = d.to_dict() or {}
+        if x.get("customer_id") in out and _posted(x) and x.get("settlement") == "credit_note":
+            out[x["customer_id"]].append((x.get("created_at") or "", -read_fils(x, "total"), f"RET:{d.id}"))
+
+    for d in db.collection("customer_balance_moves").where("customer_id", "in", ids).stream():
+        x = d.to_dict() or {}
+        if x.get("customer_id") in out and x.get("active") is True:
+            paid = read_fils(x, "amount") + read_fils(x, "discount_amount")
+            out[x["customer_id"]].append((x.get("created_at") or "", -paid, f"CBM:{d.id}"))
+    return out
+
+
+def load_ledgers(customer_ids, workers: int = AGING_WORKERS) -> dict:
+    """
+    سجل كل العملاء المطلوبين: مجموعات 30 عميل تُحمّل بالتوازي.
+    """
+    ids = [c for c in dict.fromkeys(customer_ids or []) if c]
+    chunks = [ids[i:i + _IN_LIMIT] for i in range(0, len(ids), _IN_LIMIT)]
+    out = {}
+    if not chunks:
+        return out
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chunks))), thread_name_prefix="aging") as ex:
+        # نسخة من السياق لكل مهمة: القراءات تُحسب على نفس rerun (firestore_metrics)
+        futures = [ex.submit(contextvars.copy_context().run, _ledger_chunk, chunk) for chunk in chunks]
+        for f in futures:
+            out.update(f.result())
+    return out
+
+
+def customer_aging(customer: dict, moves: list, as_of: str = None) -> dict:
+    """
+    مستند receivables_aging لعميل واحد من سجله.
+    """
+    balance = read_fils(customer, "balance")
+    opened_at = customer.get("created_at") or EPOCH
+    opening = read_fils(customer, "opening_balance")
+    ledger = list(moves or [])
+    if opening:
+        ledger.append((opened_at, opening, "opening_balance"))
+    open_items = fifo_open_items(ledger, balance, opened_at) if balance > 0 else []
+    buckets = bucket_items(open_items, as_of)
+    return {
+        "customer_id": customer["id"],
+        "customer_name": customer.get("name", ""),
+        "area": customer.get("area", ""),
+        "open_items": open_items,
+        "oldest": open_items[0]["date"] if open_items else "",
+        **money_fields(
+            balance=balance,
+            outstanding=sum(it["fils"] for it in open_items),
+            credit=max(0, -balance),
+            **buckets,
+        ),
+        "source_updated_at": customer.get("updated_at") or "",
+        "as_of": as_of or now_iso(),
+        "computed_at": now_iso(),
+    }
+
+
+# ---------------------------
+# Run
+# ---------------------------
+def _changed_customers(watermark: str) -> list:
+    ref = db.collection("customers")
+    if watermark:
+        ref = ref.where("updated_at", ">=", watermark)
+    return [{"id": d.id, **(d.to_dict() or {})} for d in ref.stream()]
+
+
+def run_aging(user: dict = None, full: bool = False, workers: int = AGING_WORKERS) -> dict:
+    """
+    يعيد حساب أعمار الذمم للعملاء الذين تغيّروا منذ آخر تشغيل (أو للكل مع full أو
+    في أول تشغيل) ويحفظ النتيجة. يرجع ملخص التشغيل.
+    """
+    started = now_iso()
+    last = doc_get(AGING_RUNS, "latest") or {}
+    watermark = "" if full else (last.get("watermark") or "")
+
+    customers = _changed_customers(watermark)
+    active = [c for c in customers if c.get("active") is True]
+    in_debt = [c["id"] for c in active if read_fils(c, "balance") > 0]
+    ledgers = load_ledgers(in_debt, workers=workers)
+
+    batch, ops = db.batch(), 0
+    col = db.collection(AGING)
+    for c in customers:
+        ref = col.document(c["id"])
+        if c.get("active") is True:
+            batch.set(ref, customer_aging(c, ledgers.get(c["id"]), started))
+        else:
+            batch.delete(ref)
+        ops += 1
+        if ops >= AGING_BATCH_SIZE:
+            batch.commit()
+            batch, ops = db.batch(), 0
+    if ops:
+        batch.commit()
+
+    start_dt = datetime.fromisoformat(started)
+    summary = {
+        "watermark": (start_dt - WATERMARK_SLACK).isoformat(),
+        "previous_watermark": watermark,
+        "full": not watermark,
+        "customers_processed": len(customers),
+        "customers_in_debt": len(in_debt),
+        "started_at": started,
+        "finished_at": now_iso(),
+        "run_by": (user or {}).get("username", ""),
+    }
+    doc_set(AGING_RUNS, "latest", summary, merge=False)
+    publish_tags({AGING_TAG})
+    return summary
+
+
+# ---------------------------
+# Report
+# ---------------------------
+@keyed_cache(ttl=300, tags=[AGING_TAG])
+def aging_report(as_of_day: str = "") -> dict:
+    """
+    {"rows": [...], "totals": {...}, "run": آخر تشغيل}؛ التصنيف يُعاد من البنود
+    المفتوحة ليوم as_of_day (الافتراضي: اليوم) فلا يحتاج تشغيلاً جديداً كل يوم.
+    """
+    as_of = f"{as_of_day}T23:59:59+03:00" if as_of_day else now_iso()
+    rows = []
+    totals = {key: 0 for key, *_ in AGING_BUCKETS}
+    totals["outstanding"] = 0
+    for d in db.collection(AGING).where("outstanding_fils", ">", 0).stream():
+        x = d.to_dict() or {}
+        buckets = bucket_items(x.get("open_items"), as_of)
+        outstanding = sum(buckets.values())
+        for k, v in buckets.items():
+            totals[k] += v
+        totals["outstanding"] += outstanding
+        rows.append({
+            "customer_id": x.get("customer_id") or d.id,
+            "customer_name": x.get("customer_name", ""),
+            "area": x.get("area", ""),
+            "oldest": (x.get("oldest") or "")[:10],
+            "outstanding": from_fils(outstanding),
+            **{k: from_fils(v) for k, v in buckets.items()},
+        })
+    rows.sort(key=lambda r: (-r[AGING_BUCKETS[-1][0]], -r["outstanding"]))
+    return {
+        "rows": rows,
+        "totals": {k: from_fils(v) for k, v in totals.items()},
+        "run": doc_get(AGING_RUNS, "latest") or {},
+        "as_of": as_of,
+    }
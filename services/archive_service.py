@@ -0,0 +1,72 @@
+"""
+إحصائيات أرشيف الطلبات المُسلّمة (مجاميع الفترة).
+"""
+from firebase_config import db
+from utils.money import fils_key, from_fils
+from services.models import Sale
+
+# الإحصائيات لا تحتاج items: نجلب الحقول الرقمية فقط
+_ARCHIVE_STATS_MONEY = ["total", "discount", "net", "amount_paid", "unpaid_debt", "extra_credit"]
+_ARCHIVE_STATS_FIELDS = [
+    "payment_type",
+    *_ARCHIVE_STATS_MONEY,
+    *(fils_key(f) for f in _ARCHIVE_STATS_MONEY),
+]
+
+
+def archive_stats(start_iso, end_iso, customer_id="", invoice_search="", seller_filter=""):
+    HARD_CAP = 1000
+
+    q = (
+        db.collection("sales")
+        .where("active", "==", True)
+        .where("status", "==", "done")
+    )
+
+    if invoice_search:
+        q = q.where("invoice_no", "==", invoice_search).limit(HARD_CAP)
+    else:
+        q = q.where("delivered_at", ">=", start_iso).where("delivered_at", "<", end_iso)
+
+        if customer_id:
+            q = q.where("customer_id", "==", customer_id)
+
+        if seller_filter:
+            q = q.where("seller_username", "==", seller_filter)
+
+        q = q.order_by("delivered_at", direction="DESCENDING").limit(HARD_CAP)
+
+    q = q.select(_ARCHIVE_STATS_FIELDS)
+
+    # المجاميع بالفلس (int): جمع دقيق وأسرع من float
+    cnt = 0
+    total = disc = net = paid = unpaid = extra = 0
+    cash_cnt = credit_cnt = 0
+
+    for d in q.stream():
+        cnt += 1
+        s = Sale.from_snapshot(d)
+
+        total += s.total_fils
+        disc += s.discount_fils
+        net += s.net_fils
+        paid += s.amount_paid_fils
+        unpaid += s.unpaid_debt_fils
+        extra += s.extra_credit_fils
+
+        if s.payment_type == "cash":
+            cash_cnt += 1
+        elif s.payment_type == "credit":
+            credit_cnt += 1
+
+    return {
+        "cnt": cnt,
+        "total": from_fils(total),
+        "disc": from_fils(disc),
+        "net": from_fils(net),
+        "paid": from_fils(paid),
+        "unpaid": from_fils(unpaid),
+        "extra": from_fils(extra),
+        "cash_cnt": cash_cnt,
+        "credit_cnt": credit_cnt,
+    }
@@ -0,0 +1,334 @@
+"""
+كاش مفتاحي + ناقل إبطال (invalidation bus).
+
+بدلاً من .clear() الذي يمسح الكاش لكل العملاء في كل الجلسات، كل مدخل في الكاش
+يحمل tags (مثل customer:<id> أو product:<id>)، وكل كتابة تنشر المفاتيح المتأثرة
+فقط عبر publish(...) فيُحذف ما يخصها فقط.
+
+    @keyed_cache(ttl=20, tags=lambda customer_id, **_: [customer_tag(customer_id)])
+    def load_orders(customer_id): ...
+
+    publish(customer_id="c1", product_ids=["p1", "p2"])
+
+Stale-while-revalidate: المدخل "الساخن" (استُخدم أكثر من مرة) يُعاد تحميله في
+الخلفية قبل انتهاء صلاحيته بقليل (لا يزيد عمر القيمة عن ttl). عرض المدخل المنتهي
+كما هو (stale) أثناء تحديثه اختياري لكل cache بـ stale_ttl صريح، لأنه يرفع أقصى
+عمر للقيمة إلى ttl + stale_ttl. المدخلات التي أُبطلت بـ publish لا تُعرض stale أبداً.
+
+كل cache محدود بـ max_entries مفتاح (مفاتيح لكل عميل / يوم لا تكبر بلا حد): عند
+التجاوز تُحذف المدخلات المنتهية أولاً ثم الأقدم استخداماً.
+"""
+import copy
+import inspect
+import itertools
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+_lock = threading.RLock()
+_registry = {}  # name -> KeyedCache
+
+# رقم تسلسلي لكل عملية نشر + آخر رقم نُشر لكل tag:
+# نتيجة تحميل بدأ قبل publish لنفس الـ tag لا تُخزّن (كانت ستعيد قيمة قديمة)
+_seq = itertools.count(1)
+_tag_published_at = {}
+
+
+def customer_tag(customer_id: str) -> str:
+    return f"customer:{customer_id}"
+
+
+def product_tag(product_id: str) -> str:
+    return f"product:{product_id}"
+
+
+# tags على مستوى المجموعة (قوائم كل العملاء / كل المنتجات / الموزعين)
+CUSTOMERS_TAG = "customers"
+PRODUCTS_TAG = "products"
+DISTRIBUTORS_TAG = "distributors"
+
+# التحديث المسبق يبدأ في آخر REFRESH_AHEAD من عمر المدخل (نسبة من ttl)
+REFRESH_AHEAD = 0.2
+# عدد مرات الاستخدام منذ آخر تحميل حتى يعتبر المدخل "ساخناً"
+HOT_HITS = 2
+REFRESH_WORKERS = 4
+# عرض القيمة المنتهية أثناء التحديث: معطّل افتراضياً (تفعيل صريح لكل cache)
+STALE_TTL = 0.0
+# أقصى عدد مفاتيح لكل cache
+MAX_ENTRIES = 512
+_LATENCY_SAMPLES = 200
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+        return _executor
+
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    xs = sorted(samples)
+    return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))]
+
+
+class _Entry:
+    __slots__ = ("expires_at", "value", "tags", "hot")
+
+    def __init__(self, expires_at, value, tags):
+        self.expires_at = expires_at
+        self.value = value
+        self.tags = tags
+        self.hot = 0
+
+
+class KeyedCache:
+    def __init__(self, fn, ttl: float, tags=None, copy_result: bool = True, stale_ttl: float = STALE_TTL,
+                 refresh_ahead: float = REFRESH_AHEAD, max_entries: int = MAX_ENTRIES):
+        self.fn = fn
+        self.ttl = float(ttl)
+        # مدة عرض القيمة المنتهية أثناء التحديث في الخلفية (0 = بدون stale)
+        self.stale_ttl = float(stale_ttl or 0.0)
+        self.max_entries = max(1, int(max_entries))
+        self.refresh_window = self.ttl * float(refresh_ahead or 0.0)
+        self.name = f"{fn.__module__}.{fn.__qualname__}"
+        self._tags = tags
+        # مثل st.cache_data: كل مستدعٍ يأخذ نسخة حتى لا يعدّل القيمة المشتركة
+        self._copy = copy_result
+        self._sig = inspect.signature(fn)
+        self._entries = OrderedDict()  # key -> _Entry، الأقدم استخداماً أولاً
+        self._by_tag = defaultdict(set)
+        self._inflight = set()
+        self._load_ms = deque(maxlen=_LATENCY_SAMPLES)
+        self._refresh_ms = deque(maxlen=_LATENCY_SAMPLES)
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_served = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._load_ms.clear()
+        self._refresh_ms.clear()
+
+    def _key_and_args(self, args, kwargs):
+        bound = self._sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return tuple(bound.arguments.items()), dict(bound.arguments)
+
+    def _entry_tags(self, arguments: dict) -> set:
+        if self._tags is None:
+            return set()
+        if callable(self._tags):
+            return set(self._tags(**arguments) or [])
+        return set(self._tags)
+
+    def _drop(self, key):
+        e = self._entries.pop(key, None)
+        if e is None:
+            return False
+        for t in e.tags:
+            keys = self._by_tag.get(t)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    self._by_tag.pop(t, None)
+        return True
+
+    def _store(self, key, value, tags, started: int):
+        # لا نخزّن نتيجة بدأ تحميلها قبل publish لأحد الـ tags (قيمة قديمة)
+        with _lock:
+            if any(_tag_published_at.get(t, 0) > started for t in tags):
+                return
+            self._drop(key)
+            self._entries[key] = _Entry(time.monotonic() + self.ttl, value, tags)
+            for t in tags:
+                self._by_tag[t].add(key)
+            if len(self._entries) > self.max_entries:
+                self._shrink()
+
+    def _shrink(self):
+        # يُستدعى داخل _lock: المنتهية (بعد فترة stale) أولاً، ثم الأقدم استخداماً
+        now = time.monotonic()
+        dead = [k for k, e in self._entries.items() if now >= e.expires_at + self.stale_ttl]
+        for k in dead:
+            self._drop(k)
+        self.expirations += len(dead)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _out(self, value):
+        return copy.deepcopy(value) if self._copy else value
+
+    def _schedule_refresh(self, key, args, kwargs, arguments):
+        # يُستدعى داخل _lock
+        if key in self._inflight:
+            return
+        self._inflight.add(key)
+        _get_executor().submit(self._refresh, key, args, kwargs, arguments, next(_seq))
+
+    def _refresh(self, key, args, kwargs, arguments, started: int):
+        t0 = time.perf_counter()
+        try:
+            value = self.fn(*args, **kwargs)
+        except Exception:
+            with _lock:
+                self.refresh_errors += 1
+            return
+        finally:
+            with _lock:
+                self._inflight.discard(key)
+
+        ms = (time.perf_counter() - t0) * 1000.0
+        with _lock:
+            self.refreshes += 1
+            self._refresh_ms.append(ms)
+        self._store(key, value, self._entry_tags(arguments), started)
+
+    def __call__(self, *args, **kwargs):
+        key, arguments = self._key_and_args(args, kwargs)
+        now = time.monotonic()
+
+        with _lock:
+            e = self._entries.get(key)
+            if e is not None and now < e.expires_at + self.stale_ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                if now >= e.expires_at:
+                    self.stale_served += 1
+                    self._schedule_refresh(key, args, kwargs, arguments)
+                else:
+                    e.hot += 1
+                    if self.refresh_window and e.hot >= HOT_HITS and now >= e.expires_at - self.refresh_window:
+                        self._schedule_refresh(key, args, kwargs, arguments)
+                cached = e.value
+            else:
+                if e is not None:
+                    self._drop(key)
+                    self.expirations += 1
+                self.misses += 1
+                started = next(_seq)
+                e = None
+
+        # النسخ خارج القفل حتى لا تنتظر الجلسات الأخرى
+        if e is not None:
+            return self._out(cached)
+
+        t0 = time.perf_counter()
+        value = self.fn(*args, **kwargs)
+        ms = (time.perf_counter() - t0) * 1000.0
+        with _lock:
+            self._load_ms.append(ms)
+
+        self._store(key, value, self._entry_tags(arguments), started)
+        return self._out(value)
+
+    def invalidate(self, tags) -> int:
+        n = 0
+        with _lock:
+            for t in tags:
+                for key in list(self._by_tag.get(t, ())):
+                    if self._drop(key):
+                        n += 1
+            self.evictions += n
+        return n
+
+    def clear(self):
+        with _lock:
+            self.evictions += len(self._entries)
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def stats(self) -> dict:
+        with _lock:
+            total = self.hits + self.misses
+            load_ms = list(self._load_ms)
+            refresh_ms = list(self._refresh_ms)
+            return {
+                "name": self.name,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale_served": self.stale_served,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "refresh_p50_ms": _percentile(refresh_ms, 0.50),
+                "refresh_p95_ms": _percentile(refresh_ms, 0.95),
+                "refresh_max_ms": max(refresh_ms) if refresh_ms else 0.0,
+                "load_p50_ms": _percentile(load_ms, 0.50),
+                "load_p95_ms": _percentile(load_ms, 0.95),
+            }
+
+
+def keyed_cache(ttl: float, tags=None, copy_result: bool = True, stale_ttl: float = STALE_TTL,
+                refresh_ahead: float = REFRESH_AHEAD, max_entries: int = MAX_ENTRIES):
+    def deco(fn):
+        cache = KeyedCache(fn, ttl=ttl, tags=tags, copy_result=copy_result, stale_ttl=stale_ttl,
+                           refresh_ahead=refresh_ahead, max_entries=max_entries)
+        with _lock:
+            _registry[cache.name] = cache
+        return cache
+    return deco
+
+
+def publish_tags(tags) -> int:
+    tags = set(t for t in (tags or []) if t)
+    if not tags:
+        return 0
+    with _lock:
+        seq = next(_seq)
+        for t in tags:
+            _tag_published_at[t] = seq
+        return sum(c.invalidate(tags) for c in _registry.values())
+
+
+def publish(customer_id: str = "", product_ids=None) -> int:
+    """
+    يُستدعى بعد كل كتابة ناجحة: يحذف فقط مدخلات الكاش المرتبطة بالعميل/المنتجات.
+    يرجع عدد المدخلات المحذوفة.
+    """
+    tags = set()
+    if customer_id:
+        tags.update((customer_tag(customer_id), CUSTOMERS_TAG))
+    pids = [p for p in (product_ids or []) if p]
+    if pids:
+        tags.update(product_tag(p) for p in pids)
+        tags.add(PRODUCTS_TAG)
+    return publish_tags(tags)
+
+
+def cache_stats() -> list[dict]:
+    with _lock:
+        caches = list(_registry.values())
+    return [c.stats() for c in caches]
+
+
+def reset_cache_stats():
+    with _lock:
+        for c in _registry.values():
+            c._reset_counters()
+
+
+def clear_all_caches():
+    """
+    تفريغ كل الـ caches (قياس تكلفة القراءة من حالة باردة).
+    """
+    with _lock:
+        caches = list(_registry.values())
+    for c in caches:
+        c.clear()
@@ -0,0 +1,132 @@
+"""
+كتالوج مشترك للقراءة فقط (منتجات / عملاء) بين كل الجلسات.
+
+بدلاً من أن تحتفظ كل جلسة بنسخة كاملة من قائمة المنتجات (وأحياناً عدة نسخ)،
+يُبنى snapshot واحد مرقّم (version) من سجلات __slots__ مضغوطة، والجلسة
+تحفظ رقم النسخة فقط في session_state.
+
+    snap = session_catalog(st.session_state, "products")
+    snap.items           # tuple[Product]
+    snap.by_id["p1"]     # Product
+
+الكتابات تبطل النسخة الحالية عبر cache_bus.publish(...) والجلسات تنتقل للنسخة
+الجديدة عند unpin_catalog(...) (نفس توقيت حذف orders_products_once سابقاً).
+"""
+import itertools
+import threading
+import time
+from types import MappingProxyType
+
+from services.cache_bus import CUSTOMERS_TAG, PRODUCTS_TAG, keyed_cache
+from services.firestore_queries import col_to_list
+from services.models import Customer, Product
+
+# عدد النسخ السابقة المحتفظ بها لكل نوع (لجلسات ما زالت مثبتة على نسخة قديمة)
+KEEP_VERSIONS = 3
+
+_KINDS = {
+    "products": ("products", Product),
+    "customers": ("customers", Customer),
+}
+
+_lock = threading.Lock()
+_versions = itertools.count(1)
+_retained = {kind: {} for kind in _KINDS}  # kind -> {version: snapshot}
+
+
+class CatalogSnapshot:
+    # search: فهرس البحث (services.search_index)، يُبنى عند أول بحث
+    __slots__ = ("kind", "version", "items", "by_id", "loaded_at", "search")
+
+    def __init__(self, kind: str, version: int, items: tuple):
+        put = object.__setattr__
+        put(self, "kind", kind)
+        put(self, "version", version)
+        put(self, "items", items)
+        put(self, "by_id", MappingProxyType({r.id: r for r in items}))
+        put(self, "loaded_at", time.time())
+        put(self, "search", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CatalogSnapshot is read-only")
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def _build(kind: str) -> CatalogSnapshot:
+    collection, model = _KINDS[kind]
+    items = tuple(col_to_list(collection, where_active=True, model=model))
+    snap = CatalogSnapshot(kind, next(_versions), items)
+
+    with _lock:
+        kept = _retained[kind]
+        kept[snap.version] = snap
+        for v in sorted(kept)[:-KEEP_VERSIONS]:
+            kept.pop(v, None)
+    return snap
+
+
+# copy_result=False: الـ snapshot غير قابل للتعديل فلا داعي لنسخه لكل جلسة.
+# stale_ttl: بعد الانتهاء تُعرض النسخة السابقة حتى 30s أثناء إعادة المسح في الخلفية
+# (كل كتابة تنشر tag المجموعة فتُبطل النسخة فوراً على أي حال)
+CATALOG_STALE_TTL = 30
+
+
+@keyed_cache(ttl=300, tags=[PRODUCTS_TAG], copy_result=False, stale_ttl=CATALOG_STALE_TTL)
+def _current_products() -> CatalogSnapshot:
+    return _build("products")
+
+
+@keyed_cache(ttl=300, tags=[CUSTOMERS_TAG], copy_result=False, stale_ttl=CATALOG_STALE_TTL)
+def _current_customers() -> CatalogSnapshot:
+    return _build("customers")
+
+
+_CURRENT = {
+    "products": _current_products,
+    "customers": _current_customers,
+}
+
+
+def current_catalog(kind: str) -> CatalogSnapshot:
+    return _CURRENT[kind]()
+
+
+def get_catalog(kind: str, version: int = None) -> CatalogSnapshot:
+    """
+    النسخة المطلوبة إن كانت ما زالت محفوظة، وإلا النسخة الحالية.
+    """
+    if version is not None:
+        with _lock:
+            snap = _retained[kind].get(version)
+        if snap is not None:
+            return snap
+    return current_catalog(kind)
+
+
+def _pin_key(kind: str) -> str:
+    return f"_catalog_v__{kind}"
+
+
+def session_catalog(state, kind: str) -> CatalogSnapshot:
+    """
+    الجلسة تبقى على نفس النسخة (قائمة ثابتة أثناء العمل) حتى unpin_catalog.
+    """
+    snap = get_catalog(kind, state.get(_pin_key(kind)))
+    state[_pin_key(kind)] = snap.version
+    return snap
+
+
+def unpin_catalog(state, kind: str):
+    state.pop(_pin_key(kind), None)
+
+
+def refresh_catalog(kind: str):
+    """
+    إعادة بناء فورية (زر "تحديث المنتجات").
+    """
+    _CURRENT[kind].clear()
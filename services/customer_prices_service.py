@@ -0,0 +1,324 @@
+"""
+الأسعار الخاصة للعملاء: تعديل جماعي بكتابات مجمّعة.
+
+    stats = save_customer_prices(customer, {"p1": "0.30", "p2": None}, user, products)
+    stats = copy_customer_prices("c1", [c["id"] for c in area_customers("الزرقاء")], user)
+    stats = adjust_area_prices("الزرقاء", -5, user, job_id=key)
+
+- الجدول المعدّل يُقارن بالأسعار الحالية (بالفلس): فقط ما تغيّر يُكتب، والسعر
+  الفارغ يلغي السعر الخاص إن كان موجوداً (لا مستندات active=False لمنتجات لم
+  يكن لها سعر أصلاً).
+- الكتابات في batches بحجم PRICE_BATCH_SIZE (أقل من حد 500) بدل doc_set لكل منتج.
+- أسعار عدة عملاء تُقرأ باستعلامات "in" (30 عميل لكل استعلام) بدل استعلام لكل عميل.
+- مهمة النسبة لمنطقة تختم كل مستند بـ price_job: إعادة نفس المهمة بعد انقطاع
+  في منتصفها تكمل الباقي ولا تضاعف النسبة على ما كُتب.
+- كل تغيير يُضاف كنسخة في price_versions (services.price_history_service) في نفس
+  الـ batch. effective_from في المستقبل = نسخة مجدولة فقط، والسعر الحالي لا يتغير.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from firebase_config import db
+from utils.helpers import now_iso
+from utils.money import money_fields, read_fils, to_fils
+from services.cache_bus import CUSTOMERS_TAG, customer_tag, publish_tags
+from services.price_history_service import version_writes
+
+PRICE_BATCH_SIZE = 400
+# حد Firestore لقيم المعامل "in"
+_IN_LIMIT = 30
+
+
+def price_doc_id(customer_id: str, product_id: str) -> str:
+    return f"{customer_id}__{product_id}"
+
+
+# ---------------------------
+# Reads
+# ---------------------------
+def _price_record(d) -> tuple:
+    x = d.to_dict() or {}
+    return x.get("customer_id") or "", x.get("product_id") or "", {"id": d.id, **x}
+
+
+def load_customer_prices(customer_id: str) -> dict:
+    """
+    product_id -> مستند السعر (مع id) للأسعار الفعّالة فقط؛ استعلام واحد.
+    """
+    out = {}
+    if not customer_id:
+        return out
+    for d in db.collection("customer_prices").where("customer_id", "==", customer_id).stream():
+        _, pid, rec = _price_record(d)
+        if pid and rec.get("active") is True:
+            out[pid] = rec
+    return out
+
+
+def load_prices_for_customers(customer_ids) -> dict:
+    """
+    customer_id -> {product_id -> مستند}؛ استعلام "in" لكل 30 عميل.
+    """
+    ids = [c for c in dict.fromkeys(customer_ids or []) if c]
+    out = {cid: {} for cid in ids}
+    for i in range(0, len(ids), _IN_LIMIT):
+        chunk = ids[i:i + _IN_LIMIT]
+        for d in db.collection("customer_prices").where("customer_id", "in", chunk).stream():
+            cid, pid, rec = _price_record(d)
+            if cid in out and pid and rec.get("active") is True:
+                out[cid][pid] = rec
+    return out
+
+
+def area_customers(area: str) -> list:
+    area = (area or "").strip()
+    if not area:
+        return []
+    docs = db.collection("customers").where("area", "==", area).where("active", "==", True).stream()
+    return [{"id": d.id, **(d.to_dict() or {})} for d in docs]
+
+
+# ---------------------------
+# Diff
+# ---------------------------
+def parse_price_fils(value):
+    """
+    قيمة خلية السعر -> فلس، أو None (فارغ = سعر عام). غير رقمي / سالب -> ValueError.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float) and value != value:  # NaN من data_editor
+        return None
+    txt = str(value).strip()
+    if txt == "":
+        return None
+    try:
+        price = float(txt.replace(",", "."))
+    except ValueError:
+        raise ValueError(f"سعر غير صالح: {txt}")
+    if price < 0:
+        raise ValueError(f"سعر سالب غير مسموح: {txt}")
+    return to_fils(price)
+
+
+def diff_prices(current: dict, edited: dict) -> dict:
+    """
+    current: product_id -> مستند السعر الحالي. edited: product_id -> قيمة الخلية.
+    يرجع {"set": {pid: fils}, "clear": [pid], "invalid": {pid: رسالة}} — المنتجات
+    غير الموجودة في edited لا تُلمس.
+    """
+    out = {"set": {}, "clear": [], "invalid": {}}
+    for pid, value in (edited or {}).items():
+        try:
+            fils = parse_price_fils(value)
+        except ValueError as e:
+            out["invalid"][pid] = str(e)
+            continue
+        cur = current.get(pid)
+        if fils is None:
+            if cur is not None:
+                out["clear"].append(pid)
+        elif cur is None or read_fils(cur, "price") != fils:
+            out["set"][pid] = fils
+    return out
+
+
+# ---------------------------
+# Writes (chunked batches)
+# ---------------------------
+class _ChunkedBatch:
+    """
+    batch يُرسل تلقائياً كل size عملية؛ close() يرسل الباقي.
+    """
+    __slots__ = ("size", "batch", "ops", "commits")
+
+    def __init__(self, size: int = PRICE_BATCH_SIZE):
+        self.size = max(1, int(size))
+        self.batch = db.batch()
+        self.ops = 0
+        self.commits = 0
+
+    def set(self, ref, data: dict):
+        self.batch.set(ref, data, merge=True)
+        self.ops += 1
+        if self.ops >= self.size:
+            self.batch.commit()
+            self.commits += 1
+            self.batch, self.ops = db.batch(), 0
+
+    def close(self):
+        if self.ops:
+            self.batch.commit()
+            self.commits += 1
+            self.batch, self.ops = db.batch(), 0
+
+
+def apply_price_changes(changes: dict, user: dict, products: dict = None, customer_names: dict = None,
+                        job_id: str = "", batch_size: int = PRICE_BATCH_SIZE, effective_from: str = None) -> dict:
+    """
+    changes: customer_id -> (الأسعار الحالية، ناتج diff_prices).
+    products: product_id -> اسم المنتج (للمستندات الجديدة). يرجع إحصائيات الكتابة.
+    effective_from: بداية سريان الأسعار (افتراضياً الآن).
+    """
+    products = products or {}
+    customer_names = customer_names or {}
+    username = (user or {}).get("username", "")
+    ts = now_iso()
+    effective_from = effective_from or ts
+    scheduled = effective_from > ts
+    col = db.collection("customer_prices")
+    out = _ChunkedBatch(batch_size)
+    stats = {"customers": 0, "set": 0, "cleared": 0}
+    touched = set()
+
+    for cid, (current, diff) in changes.items():
+        if not diff["set"] and not diff["clear"]:
+            continue
+        touched.add(cid)
+        for pid, fils in diff["set"].items():
+            cur = current.get(pid)
+            for ref, data in version_writes(cid, pid, fils, effective_from, cur, user, job_id):
+                out.set(ref, data)
+            stats["set"] += 1
+            if scheduled:
+                continue
+            data = {
+                "customer_id": cid,
+                "product_id": pid,
+                **money_fields(price=fils),
+                "active": True,
+                "updated_at": ts,
+                "updated_by": username,
+            }
+            if cur is None:
+                data["created_at"] = ts
+            if customer_names.get(cid):
+                data["customer_name"] = customer_names[cid]
+            name = products.get(pid) or (cur or {}).get("product_name")
+            if name:
+                data["product_name"] = name
+            if job_id:
+                data["price_job"] = job_id
+            out.set(col.document(cur["id"] if cur else price_doc_id(cid, pid)), data)
+        for pid in diff["clear"]:
+            for ref, data in version_writes(cid, pid, None, effective_from, current[pid], user, job_id):
+                out.set(ref, data)
+            stats["cleared"] += 1
+            if scheduled:
+                continue
+            data = {"active": False, "updated_at": ts, "updated_by": username}
+            if job_id:
+                data["price_job"] = job_id
+            out.set(col.document(current[pid]["id"]), data)
+
+    out.close()
+    stats["customers"] = len(touched)
+    stats["commits"] = out.commits
+    if touched:
+        publish_tags({CUSTOMERS_TAG, *(customer_tag(c) for c in touched)})
+    return stats
+
+
+# ---------------------------
+# Jobs
+# ---------------------------
+def save_customer_prices(customer: dict, edited: dict, user: dict, products: dict = None,
+                         current: dict = None, batch_size: int = PRICE_BATCH_SIZE, effective_from: str = None) -> dict:
+    """
+    جدول أسعار عميل واحد (product_id -> خلية السعر) -> كتابة الفروقات فقط.
+    current: الأسعار المقروءة مسبقاً لنفس العميل (لا تُقرأ مرة أخرى).
+    """
+    cid = customer["id"]
+    if current is None:
+        current = load_customer_prices(cid)
+    diff = diff_prices(current, edited)
+    stats = apply_price_changes({cid: (current, diff)}, user, products=products,
+                                customer_names={cid: customer.get("name", "")}, batch_size=batch_size,
+                                effective_from=effective_from)
+    stats["invalid"] = diff["invalid"]
+    return stats
+
+
+def copy_customer_prices(source_id: str, target_ids, user: dict, replace: bool = False,
+                         dry_run: bool = False, batch_size: int = PRICE_BATCH_SIZE) -> dict:
+    """
+    أسعار العميل المصدر -> كل العملاء الهدف. replace: إلغاء أسعار الهدف غير
+    الموجودة في المصدر (نسخة مطابقة) بدل الإبقاء عليها.
+    """
+    targets = [t for t in dict.fromkeys(target_ids or []) if t and t != source_id]
+    prices = load_prices_for_customers([source_id, *targets])
+    source = prices.get(source_id) or {}
+    edited = {pid: rec.get("price") for pid, rec in source.items()}
+    names = {pid: rec.get("product_name", "") for pid, rec in source.items()}
+
+    changes = {}
+    for cid in targets:
+        current = prices.get(cid) or {}
+        row = dict(edited)
+        if replace:
+            row.update({pid: None for pid in current if pid not in source})
+        changes[cid] = (current, diff_prices(current, row))
+    return _run(changes, user, names, "", dry_run, batch_size)
+
+
+def _scale_fils(fils: int, percent) -> int:
+    factor = (Decimal(100) + Decimal(str(percent))) / Decimal(100)
+    return int((Decimal(int(fils)) * factor).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def adjust_area_prices(area: str, percent: float, user: dict, job_id: str, base: str = "special",
+                       products: dict = None, base_prices: dict = None, dry_run: bool = False,
+                       batch_size: int = PRICE_BATCH_SIZE) -> dict:
+    """
+    نسبة (+/-%) على أسعار كل عملاء المنطقة في مهمة واحدة.
+
+    base="special": تعديل الأسعار الخاصة الموجودة فقط.
+    base="general": السعر الخاص = السعر العام (base_prices: product_id -> فلس) × النسبة
+                    لكل منتج في base_prices، لكل عميل في المنطقة.
+    job_id: مفتاح المهمة؛ المستندات المختومة به مسبقاً لا يُعاد تعديلها.
+    """
+    if not job_id:
+        raise ValueError("مفتاح المهمة مطلوب")
+    if base not in ("special", "general"):
+        raise ValueError(f"أساس غير معروف: {base}")
+    if base == "general" and not base_prices:
+        raise ValueError("لا توجد أسعار عامة للمنتجات")
+    if float(percent) <= -100:
+        raise ValueError("النسبة يجب أن تكون أكبر من -100%")
+
+    customers = area_customers(area)
+    prices = load_prices_for_customers([c["id"] for c in customers])
+    changes = {}
+    for c in customers:
+        current = prices.get(c["id"]) or {}
+        if base == "special":
+            source = {pid: read_fils(rec, "price") for pid, rec in current.items()}
+        else:
+            source = dict(base_prices)
+        diff = {"set": {}, "clear": [], "invalid": {}}
+        for pid, fils in source.items():
+            cur = current.get(pid)
+            if cur is not None and cur.get("price_job") == job_id:
+                continue
+            new = _scale_fils(fils, percent)
+            if cur is None or read_fils(cur, "price") != new:
+                diff["set"][pid] = new
+        changes[c["id"]] = (current, diff)
+
+    names = {c["id"]: c.get("name", "") for c in customers}
+    stats = _run(changes, user, products, job_id, dry_run, batch_size, customer_names=names)
+    stats["area_customers"] = len(customers)
+    return stats
+
+
+def _run(changes: dict, user: dict, products: dict, job_id: str, dry_run: bool, batch_size: int,
+         customer_names: dict = None) -> dict:
+    if dry_run:
+        touched = [cid for cid, (_, d) in changes.items() if d["set"] or d["clear"]]
+        return {
+            "customers": len(touched),
+            "set": sum(len(d["set"]) for _, d in changes.values()),
+            "cleared": sum(len(d["clear"]) for _, d in changes.values()),
+            "commits": 0,
+        }
+    return apply_price_changes(changes, user, products=products, customer_names=customer_names,
+                               job_id=job_id, batch_size=batch_size)
@@ -0,0 +1,159 @@
+"""
+معاملات الموزّعين: حركة صناديق (مع مخزون المنتج والرصيد المالي) وتحصيل نقدي.
+
+    new_boxes, new_money = apply_move(dist_id, move_doc_id, payload)
+
+نفس الـ transactional المستخدم في orders_service حتى تعمل على البديل المحلي
+(أدوات الحمل في benchmarks/) بنفس سلوك إعادة المحاولة.
+"""
+from firebase_config import db, transactional
+from utils.helpers import now_iso, to_float, to_int
+from utils.money import from_fils, money_fields, read_fils
+from services.cache_bus import DISTRIBUTORS_TAG, publish, publish_tags
+
+
+# ---------------------------
+# Transaction: apply move (crates + stock + money)
+# ---------------------------
+@transactional
+def tx_apply_move(transaction, dist_id: str, move_doc_id: str, move_data: dict):
+    """
+    ✅ يحدّث رصيد الصناديق داخل distributors
+    ✅ يخصم/يرجع من مخزون المنتج حسب total_units (عند out/in)
+    ✅ يحدّث الرصيد المالي money_balance حسب price * total_units (عند out/in)
+    ✅ يسجل الحركة داخل crate_moves atomically
+    """
+    dist_ref = db.collection("distributors").document(dist_id)
+    dist_snap = dist_ref.get(transaction=transaction)
+    if not dist_snap.exists:
+        raise ValueError("الموزّع غير موجود")
+
+    dist = dist_snap.to_dict() or {}
+    cur_boxes = to_int(dist.get("crates_balance", 0))
+    cur_money = read_fils(dist, "money_balance")
+
+    typ = move_data.get("type")  # out | in | adjust
+    boxes_qty = to_int(move_data.get("boxes_qty", 0))
+    delta_boxes = 0
+
+    # بيانات المخزن
+    product_id = (move_data.get("product_id") or "").strip()
+    units_per_box = to_int(move_data.get("units_per_box", 0))
+    total_units = to_int(move_data.get("total_units", 0))
+
+    # =========================
+    # 1) أثر الصناديق
+    # =========================
+    if typ == "out":
+        if boxes_qty <= 0:
+            raise ValueError("عدد الصناديق يجب أن يكون أكبر من صفر")
+        delta_boxes = +boxes_qty
+
+    elif typ == "in":
+        if boxes_qty <= 0:
+            raise ValueError("عدد الصناديق يجب أن يكون أكبر من صفر")
+        delta_boxes = -boxes_qty
+        if cur_boxes + delta_boxes < 0:
+            raise ValueError("لا يمكن أن يصبح رصيد الصناديق أقل من صفر")
+
+    else:  # adjust
+        delta_boxes = to_int(move_data.get("delta_boxes", 0))
+        if delta_boxes == 0:
+            raise ValueError("ضع قيمة تعديل للصناديق (موجب/سالب)")
+        if cur_boxes + delta_boxes < 0:
+            raise ValueError("لا يمكن أن يصبح رصيد الصناديق أقل من صفر")
+
+    new_boxes_balance = cur_boxes + delta_boxes
+
+    # =========================
+    # 2) تحديث مخزون المنتج + الرصيد المالي (out/in فقط)
+    # =========================
+    if typ in ["out", "in"]:
+        if not product_id:
+            raise ValueError("اختر المنتج المرتبط بالصناديق")
+        if units_per_box <= 0:
+            raise ValueError("محتوى الصندوق يجب أن يكون أكبر من صفر")
+        if total_units <= 0:
+            raise ValueError("الكمية الإجمالية غير صحيحة")
+
+        prod_ref = db.collection("products").document(product_id)
+        prod_snap = prod_ref.get(transaction=transaction)
+        if not prod_snap.exists:
+            raise ValueError("المنتج غير موجود في المخزن")
+
+        prod = prod_snap.to_dict() or {}
+        cur_stock = to_float(prod.get("qty_on_hand", 0))
+
+        unit_price = read_fils(prod, "price")
+        amount = int(total_units) * unit_price
+
+        # خزّنها داخل الحركة (مفيد للكشف)
+        move_data.update(money_fields(unit_price=unit_price, amount=amount))
+
+        if typ == "out":
+            if cur_stock < float(total_units):
+                raise ValueError(f"المخزون غير كافي. المتوفر {cur_stock} والمطلوب {total_units}")
+            transaction.update(prod_ref, {
+                "qty_on_hand": cur_stock - float(total_units),
+                "updated_at": now_iso()
+            })
+            cur_money += amount
+        else:  # in (مرتجع)
+            transaction.update(prod_ref, {
+                "qty_on_hand": cur_stock + float(total_units),
+                "updated_at": now_iso()
+            })
+            cur_money -= amount
+
+    # =========================
+    # 3) تحديث الموزّع + حفظ الحركة
+    # =========================
+    transaction.update(dist_ref, {
+        "crates_balance": new_boxes_balance,
+        **money_fields(money_balance=cur_money),
+        "updated_at": now_iso()
+    })
+
+    mv_ref = db.collection("crate_moves").document(move_doc_id)
+    transaction.set(mv_ref, move_data, merge=True)
+
+    return new_boxes_balance, from_fils(cur_money)
+
+
+def apply_move(dist_id: str, move_doc_id: str, move_data: dict):
+    """
+    tx_apply_move ثم النشر بعد نجاح الـ commit (وليس داخل الدالة التي قد يُعاد تنفيذها):
+    المنتج المتحرك (مخزونه في كتالوج المنتجات) + قائمة الموزّعين (الأرصدة).
+    """
+    result = tx_apply_move(db.transaction(), dist_id, move_doc_id, move_data)
+    product_id = (move_data.get("product_id") or "").strip()
+    if move_data.get("type") in ["out", "in"] and product_id:
+        publish(product_ids=[product_id])
+    publish_tags([DISTRIBUTORS_TAG])
+    return result
+
+
+# ---------------------------
+# Transaction: cash collection (money only)
+# ---------------------------
+@transactional
+def tx_apply_cash_collection(transaction, dist_id: str, move_doc_id: str, payload: dict):
+    dist_ref = db.collection("distributors").document(dist_id)
+    dist_snap = dist_ref.get(transaction=transaction)
+    if not dist_snap.exists:
+        raise ValueError("الموزّع غير موجود")
+
+    dist = dist_snap.to_dict() or {}
+    cur_money = read_fils(dist, "money_balance")
+
+    amount = read_fils(payload, "amount")
+    if amount <= 0:
+        raise ValueError("مبلغ التحصيل يجب أن يكون أكبر من صفر")
+
+    new_money = cur_money - amount
+
+    transaction.update(dist_ref, {**money_fields(money_balance=new_money), "updated_at": now_iso()})
+    mv_ref = db.collection("crate_moves").document(move_doc_id)
+    transaction.set(mv_ref, payload, merge=True)
+
+    return from_fils(new_money)
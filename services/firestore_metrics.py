@@ -0,0 +1,462 @@
+"""
+عدّاد قراءات / كتابات / زمن Firestore لكل موضع استعلام ولكل rerun.
+
+غلاف رفيع حول العميل (Firestore الحقيقي أو البديل المحلي) بنفس الواجهة:
+    db = instrument(client)
+
+كل استدعاء يُسجّل على "موضع" = الدالة التي طلبته + اسم المجموعة، مثل
+services.customer_prices_service.load_customer_prices [customer_prices].
+
+لكل rerun في الصفحة:
+    m = begin_rerun("customers")
+    ...                      # كل القراءات هنا تُحسب على m
+    record = end_rerun(m)    # + سطر في ملف JSONL إن فُعّل (BAWADI_METRICS_LOG)
+
+القراءات بنفس حساب الفاتورة: استعلام بدون نتائج = قراءة واحدة.
+الاستدعاءات خارج rerun (تحديث الكاش في الخلفية) تُجمع في background_metrics().
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+
+# ملف الـ JSONL اختياري (العدّ في الذاكرة يعمل دائماً):
+#   BAWADI_METRICS_LOG=1 -> logs/firestore_metrics.jsonl، أو مسار صريح؛ بدونه / off لا ملف
+DEFAULT_LOG_PATH = os.path.join("logs", "firestore_metrics.jsonl")
+_log_env = (os.environ.get("BAWADI_METRICS_LOG") or "").strip()
+if _log_env.lower() in ("", "0", "off", "false"):
+    LOG_PATH = ""
+elif _log_env.lower() in ("1", "on", "true"):
+    LOG_PATH = DEFAULT_LOG_PATH
+else:
+    LOG_PATH = _log_env
+# عند تجاوز الحجم يُنقل الملف إلى <path>.1 (نسخة سابقة واحدة) ويبدأ ملف جديد
+LOG_MAX_BYTES = int(float(os.environ.get("BAWADI_METRICS_LOG_MB") or 20) * 1024 * 1024)
+
+_current = contextvars.ContextVar("firestore_rerun_metrics", default=None)
+_log_lock = threading.Lock()
+
+# الغلاف نفسه + مغلّفات transactional (المحلي / firebase_config / مكتبة Firestore)
+# لا تُحسب كموضع استعلام: الموضع هو كود التطبيق الذي طلب العملية
+_SKIP_MODULES = ("services.firestore_metrics", "services.local_backend", "firebase_config", "google.")
+_HELPER_MODULES = ("services.firestore_queries",)
+
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    xs = sorted(samples)
+    return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))]
+
+
+class _Site:
+    __slots__ = ("calls", "reads", "writes", "ms")
+
+    def __init__(self):
+        self.calls = 0
+        self.reads = 0
+        self.writes = 0
+        self.ms = 0.0
+
+
+class RerunMetrics:
+    def __init__(self, page: str = ""):
+        self.page = page
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.wall_ms = 0.0
+        self.reads = 0
+        self.writes = 0
+        self.queries = 0
+        self.tx_attempts = 0
+        self.tx_retries = 0
+        self.firestore_ms = 0.0
+        self.sites = {}
+        self._lock = threading.Lock()
+
+    def add(self, site: str, reads: int = 0, writes: int = 0, ms: float = 0.0, query: bool = True):
+        with self._lock:
+            s = self.sites.get(site)
+            if s is None:
+                s = self.sites[site] = _Site()
+            s.calls += 1
+            s.reads += reads
+            s.writes += writes
+            s.ms += ms
+            self.reads += reads
+            self.writes += writes
+            self.firestore_ms += ms
+            if query:
+                self.queries += 1
+
+    def add_tx_attempt(self, first: bool):
+        with self._lock:
+            self.tx_attempts += 1
+            if not first:
+                self.tx_retries += 1
+
+    def finish(self):
+        self.wall_ms = (time.perf_counter() - self._t0) * 1000.0
+
+    def top_sites(self, n: int = 15) -> list[dict]:
+        with self._lock:
+            items = list(self.sites.items())
+        items.sort(key=lambda kv: (kv[1].reads + kv[1].writes, kv[1].ms), reverse=True)
+        return [
+            {"site": k, "calls": s.calls, "reads": s.reads, "writes": s.writes, "ms": round(s.ms, 2)}
+            for k, s in items[:n]
+        ]
+
+    def to_record(self) -> dict:
+        return {
+            "ts": round(self.started, 3),
+            "page": self.page,
+            "reads": self.reads,
+            "writes": self.writes,
+            "queries": self.queries,
+            "tx_attempts": self.tx_attempts,
+            "tx_retries": self.tx_retries,
+            "firestore_ms": round(self.firestore_ms, 2),
+            "wall_ms": round(self.wall_ms, 2),
+            "sites": {r["site"]: {k: r[k] for k in ("calls", "reads", "writes", "ms")} for r in self.top_sites(n=10_000)},
+        }
+
+
+_background = RerunMetrics("background")
+
+
+def background_metrics() -> RerunMetrics:
+    return _background
+
+
+def current_metrics() -> RerunMetrics:
+    return _current.get() or _background
+
+
+def begin_rerun(page: str) -> RerunMetrics:
+    m = RerunMetrics(page)
+    m._token = _current.set(m)
+    return m
+
+
+def end_rerun(m: RerunMetrics, log: bool = True) -> dict:
+    m.finish()
+    token = getattr(m, "_token", None)
+    if token is not None:
+        try:
+            _current.reset(token)
+        except ValueError:
+            _current.set(None)
+        m._token = None
+    record = m.to_record()
+    if log:
+        append_log(record)
+    return record
+
+
+def append_log(record: dict, path: str = None):
+    path = LOG_PATH if path is None else path
+    if not path or path.lower() == "off":
+        return
+    line = json.dumps(record, ensure_ascii=False)
+    try:
+        with _log_lock:
+            d = os.path.dirname(path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            if os.path.exists(path) and os.path.getsize(path) >= LOG_MAX_BYTES:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except OSError:
+        # السجل للتشخيص فقط: لا يوقف الصفحة
+        pass
+
+
+def _caller_site(collection: str) -> str:
+    f = sys._getframe(2)
+    while f is not None and f.f_globals.get("__name__", "").startswith(_SKIP_MODULES):
+        f = f.f_back
+    if f is None:
+        where = "?"
+    else:
+        where = f"{f.f_globals.get('__name__', '?')}.{f.f_code.co_name}"
+        # col_to_list / doc_get: نضيف من استدعاها حتى تظهر الصفحة
+        if f.f_globals.get("__name__") in _HELPER_MODULES and f.f_back is not None:
+            b = f.f_back
+            where = f"{b.f_globals.get('__name__', '?')}.{b.f_code.co_name} → {f.f_code.co_name}"
+    return f"{where} [{collection}]" if collection else where
+
+
+def _unwrap(x):
+    return getattr(x, "_inner", x)
+
+
+def _collection_of(ref) -> str:
+    path = getattr(ref, "path", "") or ""
+    parts = path.split("/")
+    return parts[-2] if len(parts) >= 2 else path
+
+
+# ---------------------------
+# Wrappers
+# ---------------------------
+class _Proxy:
+    __slots__ = ("_inner",)
+
+    def __init__(self, inner):
+        object.__setattr__(self, "_inner", inner)
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    def __eq__(self, other):
+        return self._inner == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._inner)
+
+
+class InstrumentedQuery(_Proxy):
+    __slots__ = ("_collection",)
+
+    def __init__(self, inner, collection: str):
+        super().__init__(inner)
+        object.__setattr__(self, "_collection", collection)
+
+    def _wrap(self, q):
+        return InstrumentedQuery(q, self._collection)
+
+    def where(self, *args, **kwargs):
+        return self._wrap(self._inner.where(*args, **kwargs))
+
+    def order_by(self, *args, **kwargs):
+        return self._wrap(self._inner.order_by(*args, **kwargs))
+
+    def limit(self, *args, **kwargs):
+        return self._wrap(self._inner.limit(*args, **kwargs))
+
+    def select(self, *args, **kwargs):
+        return self._wrap(self._inner.select(*args, **kwargs))
+
+    def offset(self, *args, **kwargs):
+        return self._wrap(self._inner.offset(*args, **kwargs))
+
+    def start_after(self, *args, **kwargs):
+        return self._wrap(self._inner.start_after(*args, **kwargs))
+
+    def start_at(self, *args, **kwargs):
+        return self._wrap(self._inner.start_at(*args, **kwargs))
+
+    def document(self, *args, **kwargs):
+        return InstrumentedDocumentRef(self._inner.document(*args, **kwargs))
+
+    def add(self, data, *args, **kwargs):
+        site = _caller_site(self._collection)
+        t0 = time.perf_counter()
+        out = self._inner.add(data, *args, **kwargs)
+        current_metrics().add(site, writes=1, ms=(time.perf_counter() - t0) * 1000.0, query=False)
+        return out
+
+    def stream(self, transaction=None, **kwargs):
+        site = _caller_site(self._collection)
+        if transaction is not None:
+            kwargs["transaction"] = _unwrap(transaction)
+        return self._stream(site, kwargs)
+
+    def _stream(self, site, kwargs):
+        metrics = current_metrics()
+        n = 0
+        ms = 0.0
+        t0 = time.perf_counter()
+        try:
+            for snap in self._inner.stream(**kwargs):
+                n += 1
+                ms += (time.perf_counter() - t0) * 1000.0
+                yield snap
+                t0 = time.perf_counter()
+            ms += (time.perf_counter() - t0) * 1000.0
+        finally:
+            metrics.add(site, reads=max(1, n), ms=ms)
+
+    def get(self, transaction=None, **kwargs):
+        site = _caller_site(self._collection)
+        if transaction is not None:
+            kwargs["transaction"] = _unwrap(transaction)
+        return list(self._stream(site, kwargs))
+
+
+class InstrumentedDocumentRef(_Proxy):
+    __slots__ = ()
+
+    def collection(self, name: str):
+        return InstrumentedQuery(self._inner.collection(name), name)
+
+    def get(self, *args, transaction=None, **kwargs):
+        site = _caller_site(_collection_of(self._inner))
+        if transaction is not None:
+            kwargs["transaction"] = _unwrap(transaction)
+        t0 = time.perf_counter()
+        out = self._inner.get(*args, **kwargs)
+        current_metrics().add(site, reads=1, ms=(time.perf_counter() - t0) * 1000.0)
+        return out
+
+    def _write(self, op, *args, **kwargs):
+        site = _caller_site(_collection_of(self._inner))
+        t0 = time.perf_counter()
+        out = getattr(self._inner, op)(*args, **kwargs)
+        current_metrics().add(site, writes=1, ms=(time.perf_counter() - t0) * 1000.0, query=False)
+        return out
+
+    def set(self, *args, **kwargs):
+        return self._write("set", *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._write("update", *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._write("delete", *args, **kwargs)
+
+
+class InstrumentedBatch(_Proxy):
+    """
+    الكتابات تُحسب عند commit على موضع الـ commit (كل المجموعات معاً).
+    """
+    __slots__ = ("_pending",)
+
+    def __init__(self, inner):
+        super().__init__(inner)
+        object.__setattr__(self, "_pending", 0)
+
+    def _buffer(self, op, ref, *args, **kwargs):
+        object.__setattr__(self, "_pending", self._pending + 1)
+        return getattr(self._inner, op)(_unwrap(ref), *args, **kwargs)
+
+    def set(self, ref, *args, **kwargs):
+        return self._buffer("set", ref, *args, **kwargs)
+
+    def update(self, ref, *args, **kwargs):
+        return self._buffer("update", ref, *args, **kwargs)
+
+    def delete(self, ref, *args, **kwargs):
+        return self._buffer("delete", ref, *args, **kwargs)
+
+    def create(self, ref, *args, **kwargs):
+        return self._buffer("create", ref, *args, **kwargs)
+
+    _label = "batch"
+
+    def _commit_via(self, method: str, *args, **kwargs):
+        site = _caller_site(self._label)
+        t0 = time.perf_counter()
+        out = getattr(self._inner, method)(*args, **kwargs)
+        current_metrics().add(site, writes=self._pending, ms=(time.perf_counter() - t0) * 1000.0, query=False)
+        object.__setattr__(self, "_pending", 0)
+        return out
+
+    def commit(self, *args, **kwargs):
+        return self._commit_via("commit", *args, **kwargs)
+
+
+class InstrumentedTransaction(InstrumentedBatch):
+    """
+    كل محاولة تبدأ بـ _begin (Firestore) أو _reset (المحلي): عدّ المحاولات
+    وإعادة تصفير الكتابات المعلّقة؛ الكتابات تُحسب فقط للمحاولة التي نجحت.
+    """
+    __slots__ = ("_attempts",)
+    _label = "transaction"
+
+    def __init__(self, inner):
+        super().__init__(inner)
+        object.__setattr__(self, "_attempts", 0)
+
+    def _new_attempt(self):
+        current_metrics().add_tx_attempt(first=self._attempts == 0)
+        object.__setattr__(self, "_attempts", self._attempts + 1)
+        object.__setattr__(self, "_pending", 0)
+
+    def _begin(self, *args, **kwargs):
+        self._new_attempt()
+        return self._inner._begin(*args, **kwargs)
+
+    def _reset(self, *args, **kwargs):
+        self._new_attempt()
+        return self._inner._reset(*args, **kwargs)
+
+    def _commit(self, *args, **kwargs):
+        # Firestore: _Transactional يستدعي _commit ؛ المحلي يستدعي commit
+        return self._commit_via("_commit", *args, **kwargs)
+
+    def get(self, ref_or_query, *args, **kwargs):
+        inner = _unwrap(ref_or_query)
+        collection = getattr(ref_or_query, "_collection", "") or _collection_of(inner)
+        site = _caller_site(collection)
+        t0 = time.perf_counter()
+        out = self._inner.get(inner, *args, **kwargs)
+        if hasattr(out, "exists"):
+            n = 1
+        else:
+            out = list(out)
+            n = max(1, len(out))
+        current_metrics().add(site, reads=n, ms=(time.perf_counter() - t0) * 1000.0)
+        return out
+
+
+class InstrumentedClient(_Proxy):
+    __slots__ = ()
+
+    def collection(self, name: str):
+        return InstrumentedQuery(self._inner.collection(name), name)
+
+    def document(self, path: str):
+        return InstrumentedDocumentRef(self._inner.document(path))
+
+    def batch(self):
+        return InstrumentedBatch(self._inner.batch())
+
+    def transaction(self, **kwargs):
+        return InstrumentedTransaction(self._inner.transaction(**kwargs))
+
+    def get_all(self, references, *args, transaction=None, **kwargs):
+        refs = [_unwrap(r) for r in references]
+        site = _caller_site(_collection_of(refs[0]) if refs else "")
+        if transaction is not None:
+            kwargs["transaction"] = _unwrap(transaction)
+        return self._get_all(site, refs, args, kwargs)
+
+    def _get_all(self, site, refs, args, kwargs):
+        metrics = current_metrics()
+        n = 0
+        t0 = time.perf_counter()
+        try:
+            for snap in self._inner.get_all(refs, *args, **kwargs):
+                n += 1
+                yield snap
+        finally:
+            metrics.add(site, reads=n, ms=(time.perf_counter() - t0) * 1000.0)
+
+
+def instrument(client):
+    if isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client)
+
+
+def metrics_summary(records: list[dict]) -> dict:
+    """
+    p50/p95 لكل صفحة من سجلات end_rerun (نفس حساب tools/firestore_metrics_report.py).
+    """
+    by_page = {}
+    for r in records:
+        by_page.setdefault(r.get("page") or "?", []).append(r)
+    out = {}
+    for page, rs in sorted(by_page.items()):
+        row = {"reruns": len(rs)}
+        for k in ("reads", "writes", "queries", "tx_retries", "firestore_ms", "wall_ms"):
+            xs = [float(r.get(k, 0) or 0) for r in rs]
+            row[f"{k}_p50"] = _percentile(xs, 0.50)
+            row[f"{k}_p95"] = _percentile(xs, 0.95)
+        out[page] = row
+    return out
@@ -1,13 +1,18 @@
 from firebase_config import db
 from utils.helpers import now_iso
 
-def col_to_list(collection_name: str, where_active=True, limit=None):
+def col_to_list(collection_name: str, where_active=True, limit=None, model=None):
+    """
+    model (من services.models): سجلات __slots__ محوّلة مرة واحدة بدل dict خام.
+    """
     ref = db.collection(collection_name)
     if where_active:
         ref = ref.where("active", "==", True)
     if limit:
         ref = ref.limit(int(limit))
     docs = ref.stream()
+    if model is not None:
+        return [model.from_snapshot(d) for d in docs]
     out = []
     for d in docs:
         item = d.to_dict() or {}
@@ -15,9 +20,11 @@ def col_to_list(collection_name: str, where_active=True, limit=None):
         out.append(item)
     return out
 
-def doc_get(collection: str, doc_id: str):
+def doc_get(collection: str, doc_id: str, model=None):
     d = db.collection(collection).document(doc_id).get()
-    return d.to_dict() if d.exists else None
+    if not d.exists:
+        return None
+    return model.from_snapshot(d) if model is not None else d.to_dict()
 
 def doc_set(collection: str, doc_id: str, data: dict, merge=True):
     db.collection(collection).document(doc_id).set(data, merge=merge)
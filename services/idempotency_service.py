@@ -0,0 +1,104 @@
+import hashlib
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from firebase_config import db
+from utils.helpers import now_iso
+
+TZ = timezone(timedelta(hours=3))
+
+# مدة الاحتفاظ بالمفتاح (لسياسة TTL في Firestore على الحقل expires_at)
+KEY_TTL_DAYS = 14
+
+
+def new_idempotency_key(op: str) -> str:
+    return f"{op}:{uuid.uuid4().hex}"
+
+
+def idem_fingerprint(*parts) -> str:
+    """
+    بصمة قصيرة لمحتوى العملية (العميل، الأصناف، المبلغ ...): تربط المفتاح بما نُفّذ به.
+    """
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def session_idempotency_key(state, action: str, fingerprint: str = "") -> str:
+    """
+    مفتاح ثابت لعملية معلّقة داخل الجلسة: نفس المفتاح يُعاد استخدامه
+    عند إعادة المحاولة بعد rerun / انقطاع شبكة، ويُحذف بعد النجاح.
+    fingerprint: تغيّر المحتوى (سلة / عميل / مبلغ) يعطي مفتاحاً جديداً.
+    """
+    skey = f"_idem__{action}"
+    fkey = f"{skey}__fp"
+    if fingerprint and state.get(fkey) != fingerprint:
+        state.pop(skey, None)
+        state[fkey] = fingerprint
+    if not state.get(skey):
+        state[skey] = new_idempotency_key(action)
+    return state[skey]
+
+
+def clear_session_idempotency_key(state, action: str):
+    state.pop(f"_idem__{action}", None)
+    state.pop(f"_idem__{action}__fp", None)
+
+
+def _idem_doc_id(key: str) -> str:
+    return "idem__" + hashlib.sha256((key or "").encode("utf-8")).hexdigest()[:40]
+
+
+def idem_ref(key: str):
+    return db.collection("idempotency").document(_idem_doc_id(key))
+
+
+def idem_lookup(transaction, key: str, op: str = "", fingerprint: str = ""):
+    """
+    يقرأ المفتاح داخل الـ transaction (يجب أن يكون قبل أي كتابة).
+    يرجع (ref, result) — result = None إذا لم تُنفّذ العملية سابقاً.
+    op / fingerprint: المفتاح المنفّذ لعملية أو محتوى مختلف يرفع ValueError بدل
+    إرجاع نتيجة تلك العملية بصمت (المستندات القديمة بدون بصمة تُعاد كما هي).
+    """
+    if not key:
+        return None, None
+    ref = idem_ref(key)
+    snap = ref.get(transaction=transaction)
+    if not snap.exists:
+        return ref, None
+    data = snap.to_dict() or {}
+    if "fingerprint" in data:
+        if (op and data.get("op") != op) or (fingerprint and data.get("fingerprint") != fingerprint):
+            raise ValueError("هذه العملية نُفّذت سابقاً بمحتوى مختلف — حدّث الصفحة وراجع النتيجة قبل إعادة المحاولة")
+    return ref, (data.get("result") or {})
+
+
+def idem_store(transaction, ref, key: str, op: str, result: dict, user: dict = None, fingerprint: str = ""):
+    if ref is None:
+        return
+    transaction.set(ref, {
+        "key": key,
+        "op": op,
+        "fingerprint": fingerprint,
+        "result": result or {},
+        "created_at": now_iso(),
+        "created_by": (user or {}).get("username", ""),
+        "expires_at": datetime.now(TZ) + timedelta(days=KEY_TTL_DAYS),
+    })
+
+
+def idem_results(keys: list[str]) -> dict:
+    """
+    قراءة مجمّعة (round trip واحد) لنتائج مفاتيح منفّذة سابقاً: key -> result.
+    المفاتيح غير الموجودة لا تظهر في الناتج.
+    """
+    keys = [k for k in dict.fromkeys(keys or []) if k]
+    if not keys:
+        return {}
+
+    by_doc = {_idem_doc_id(k): k for k in keys}
+    out = {}
+    for snap in db.get_all([idem_ref(k) for k in keys]):
+        if snap.exists:
+            out[by_doc[snap.id]] = (snap.to_dict() or {}).get("result") or {}
+    return out
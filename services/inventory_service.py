@@ -0,0 +1,276 @@
+"""
+المستودع: حركات المخزون، الجرد (مسودة → ترحيل) وتوقع الإنتاج من الوصفة.
+
+بدون streamlit حتى تُستدعى من الصفحة ومن أدوات القياس (benchmarks/).
+"""
+from firebase_config import db
+from utils.helpers import now_iso, to_float
+from services.firestore_queries import col_to_list
+from services.cache_bus import publish
+
+
+def write_stock_move(move: dict):
+    move["created_at"] = now_iso()
+    move["active"] = True
+    db.collection("stock_moves").add(move)
+
+
+# ---------------------------
+# Inventory count (الجرد)
+# ---------------------------
+def new_count_header(scope: str, user: dict, note: str):
+    ref = db.collection("inventory_counts").document()
+    ref.set({
+        "scope": scope,          # materials | products | both
+        "status": "draft",       # draft | posted
+        "note": note.strip(),
+        "created_by": user.get("username", ""),
+        "created_at": now_iso(),
+        "updated_at": now_iso(),
+        "active": True,
+    }, merge=True)
+    return ref.id
+
+
+def list_recent_counts(limit=20):
+    try:
+        q = db.collection("inventory_counts") \
+            .order_by("created_at", direction="DESCENDING") \
+            .limit(limit)
+        docs = q.stream()
+    except Exception:
+        docs = db.collection("inventory_counts").limit(limit).stream()
+
+    rows = []
+    for d in docs:
+        x = d.to_dict() or {}
+        if x.get("active") is not True:
+            continue
+        rows.append({
+            "id": d.id,
+            "scope": x.get("scope", ""),
+            "status": x.get("status", ""),
+            "created_at": x.get("created_at", ""),
+            "created_by": x.get("created_by", ""),
+            "note": x.get("note", ""),
+        })
+    return rows
+
+
+def _line_doc_id(count_id: str, item_type: str, item_id: str):
+    return f"{count_id}__{item_type}__{item_id}"
+
+
+def upsert_count_lines_from_system(count_id: str, scope: str):
+    mats = col_to_list("materials", where_active=True) if scope in ("materials", "both") else []
+    prods = col_to_list("products", where_active=True) if scope in ("products", "both") else []
+
+    batch = db.batch()
+    op = 0
+
+    def commit_if_needed():
+        nonlocal batch, op
+        if op >= 400:
+            batch.commit()
+            batch = db.batch()
+            op = 0
+
+    for m in mats:
+        doc_id = _line_doc_id(count_id, "material", m["id"])
+        ref = db.collection("inventory_count_lines").document(doc_id)
+        batch.set(ref, {
+            "count_id": count_id,
+            "item_type": "material",
+            "item_id": m["id"],
+            "item_name": m.get("name", ""),
+            "unit": m.get("unit", ""),
+            "system_qty": to_float(m.get("qty_on_hand", 0)),
+            "counted_qty": None,
+            "created_at": now_iso(),
+            "updated_at": now_iso(),
+            "active": True,
+        }, merge=True)
+        op += 1
+        commit_if_needed()
+
+    for p in prods:
+        doc_id = _line_doc_id(count_id, "product", p["id"])
+        ref = db.collection("inventory_count_lines").document(doc_id)
+        batch.set(ref, {
+            "count_id": count_id,
+            "item_type": "product",
+            "item_id": p["id"],
+            "item_name": p.get("name", ""),
+            "unit": p.get("sale_unit", "pcs"),
+            "system_qty": to_float(p.get("qty_on_hand", 0)),
+            "counted_qty": None,
+            "created_at": now_iso(),
+            "updated_at": now_iso(),
+            "active": True,
+        }, merge=True)
+        op += 1
+        commit_if_needed()
+
+    if op > 0:
+        batch.commit()
+
+
+def get_count_lines(count_id: str):
+    docs = db.collection("inventory_count_lines").where("count_id", "==", count_id).stream()
+
+    rows = []
+    for d in docs:
+        x = d.to_dict() or {}
+        if x.get("active") is not True:
+            continue
+        rows.append({
+            "doc_id": d.id,
+            "item_type": x.get("item_type", ""),
+            "item_id": x.get("item_id", ""),
+            "item_name": x.get("item_name", ""),
+            "unit": x.get("unit", ""),
+            "system_qty": to_float(x.get("system_qty", 0)),
+            "counted_qty": x.get("counted_qty", None),
+        })
+
+    rows.sort(key=lambda r: (r["item_type"], r["item_name"]))
+    return rows
+
+
+def save_counted_lines(edited_rows):
+    batch = db.batch()
+    op = 0
+
+    def commit_if_needed():
+        nonlocal batch, op
+        if op >= 400:
+            batch.commit()
+            batch = db.batch()
+            op = 0
+
+    for r in edited_rows:
+        ref = db.collection("inventory_count_lines").document(r["doc_id"])
+        cq = r.get("counted_qty", None)
+        if cq is None or cq == "":
+            cq_val = None
+        else:
+            cq_val = float(cq)
+
+        batch.update(ref, {"counted_qty": cq_val, "updated_at": now_iso()})
+        op += 1
+        commit_if_needed()
+
+    if op > 0:
+        batch.commit()
+
+
+def post_inventory_count(count_id: str, user: dict):
+    header_ref = db.collection("inventory_counts").document(count_id)
+    header = header_ref.get().to_dict() or {}
+    if header.get("status") != "draft":
+        raise ValueError("لا يمكن ترحيل جرد غير مسودة.")
+
+    lines = get_count_lines(count_id)
+    lines_to_post = [l for l in lines if l.get("counted_qty") is not None]
+
+    if not lines_to_post:
+        raise ValueError("لا يوجد كميات معدودة لترحيلها. أدخل counted_qty أولاً.")
+
+    batch = db.batch()
+    op = 0
+
+    def commit_if_needed():
+        nonlocal batch, op
+        if op >= 350:
+            batch.commit()
+            batch = db.batch()
+            op = 0
+
+    for l in lines_to_post:
+        counted = float(l["counted_qty"])
+        if counted < 0:
+            raise ValueError(f"لا يمكن إدخال كمية سالبة: {l['item_name']}")
+
+        system_qty = float(l["system_qty"])
+        delta = counted - system_qty
+        if abs(delta) < 1e-12:
+            continue
+
+        if l["item_type"] == "material":
+            ref = db.collection("materials").document(l["item_id"])
+            batch.update(ref, {"qty_on_hand": counted, "updated_at": now_iso()})
+        else:
+            ref = db.collection("products").document(l["item_id"])
+            batch.update(ref, {"qty_on_hand": counted, "updated_at": now_iso()})
+
+        op += 1
+        commit_if_needed()
+
+        write_stock_move({
+            "type": "count",
+            "ref_type": "inventory_count",
+            "ref_id": count_id,
+            "item_type": l["item_type"],
+            "item_id": l["item_id"],
+            "item_name": l["item_name"],
+            "qty_delta": float(delta),
+            "unit": l.get("unit", ""),
+            "note": "ترحيل جرد",
+            "created_by": user.get("username", ""),
+        })
+
+    header_ref.set({
+        "status": "posted",
+        "posted_at": now_iso(),
+        "posted_by": user.get("username", ""),
+        "updated_at": now_iso(),
+    }, merge=True)
+
+    if op > 0:
+        batch.commit()
+
+    publish(product_ids=[l["item_id"] for l in lines_to_post if l["item_type"] != "material"])
+
+
+
+# ---------------------------
+# Projection
+# ---------------------------
+def production_projection(bom_items: list, mat_by_id: dict, target: float = 0.0):
+    """
+    أقصى إنتاج ممكن من مخزون المواد الحالي + المادة المُقيّدة + النقص لهدف (اختياري).
+    يرجع (rows, max_qty, bottleneck)؛ كل row لمادة واحدة من الوصفة.
+    """
+    target = float(target or 0.0)
+    rows = []
+    bottleneck = None
+    bottleneck_value = None
+
+    for it in bom_items or []:
+        m = mat_by_id.get(it.get("material_id"))
+        if not m:
+            continue
+
+        stock = to_float(m.get("qty_on_hand"))
+        per = to_float(it.get("qty_per_unit"))
+        if per <= 0:
+            continue
+
+        possible = stock / per
+        if bottleneck_value is None or possible < bottleneck_value:
+            bottleneck_value = possible
+            bottleneck = it.get("material_name", "")
+
+        needed = per * target if target > 0 else 0.0
+        rows.append({
+            "material_name": it.get("material_name", ""),
+            "stock": stock,
+            "unit": m.get("unit", ""),
+            "per_unit": per,
+            "possible": possible,
+            "needed": needed,
+            "shortage": max(0.0, needed - stock) if target > 0 else 0.0,
+        })
+
+    max_qty = bottleneck_value if bottleneck_value is not None else 0.0
+    return rows, max_qty, bottleneck
@@ -0,0 +1,178 @@
+from datetime import datetime, timedelta, timezone, date
+
+from firebase_config import db
+from utils.helpers import to_float, to_int
+
+TZ = timezone(timedelta(hours=3))
+
+# حد Firestore لعدد القيم داخل where(... "in" ...)
+_IN_LIMIT = 30
+
+
+def _day_range_iso(d: date):
+    start = datetime(d.year, d.month, d.day, 0, 0, 0, tzinfo=TZ)
+    return start.isoformat(), (start + timedelta(days=1)).isoformat()
+
+
+def _distributor_usernames(dist_id: str) -> list[str]:
+    """
+    الطلبات تُسجّل distributor_id = اسم مستخدم الموزّع (admin_users)،
+    بينما crate_moves تستخدم معرف مستند الموزّع — نربط بينهما هنا.
+    """
+    docs = db.collection("admin_users").where("distributor_id", "==", dist_id).stream()
+    out = [d.id for d in docs]
+    if dist_id not in out:
+        out.append(dist_id)
+    return out[:_IN_LIMIT]
+
+
+# ---------------------------
+# Aggregation (pure)
+# ---------------------------
+def aggregate_prepared_items(sales: list[dict]) -> dict:
+    """
+    product_id -> {"product_name", "qty", "orders"}
+    """
+    out = {}
+    for s in sales:
+        seen = set()
+        for it in (s.get("items", []) or []):
+            pid = it.get("product_id")
+            qty = float(to_float(it.get("qty", 0)))
+            if not pid or qty <= 0:
+                continue
+            row = out.get(pid)
+            if row is None:
+                row = out[pid] = {"product_name": it.get("product_name") or pid, "qty": 0.0, "orders": 0}
+            row["qty"] += qty
+            if pid not in seen:
+                row["orders"] += 1
+                seen.add(pid)
+    return out
+
+
+def aggregate_crate_units(moves: list[dict]) -> dict:
+    """
+    product_id -> {"product_name", "units", "boxes"}  (out موجب / in سالب)
+    """
+    out = {}
+    for m in moves:
+        typ = m.get("type")
+        if typ not in ("out", "in"):
+            continue
+        pid = (m.get("product_id") or "").strip()
+        if not pid:
+            continue
+        sign = 1 if typ == "out" else -1
+        row = out.get(pid)
+        if row is None:
+            row = out[pid] = {"product_name": m.get("product_name") or pid, "units": 0, "boxes": 0}
+        row["units"] += sign * to_int(m.get("total_units", 0))
+        row["boxes"] += sign * to_int(m.get("boxes_qty", 0))
+    return out
+
+
+def cross_check(ordered: dict, loaded: dict) -> list[dict]:
+    rows = []
+    for pid in set(ordered) | set(loaded):
+        o = ordered.get(pid, {})
+        l = loaded.get(pid, {})
+        qty = float(o.get("qty", 0.0))
+        units = float(l.get("units", 0))
+        diff = units - qty
+
+        if pid not in loaded:
+            status = "بدون صناديق"
+        elif abs(diff) < 1e-9:
+            status = "مطابق"
+        elif diff < 0:
+            status = "نقص"
+        else:
+            status = "زيادة"
+
+        rows.append({
+            "product_id": pid,
+            "product_name": o.get("product_name") or l.get("product_name") or pid,
+            "qty": qty,
+            "orders": int(o.get("orders", 0)),
+            "crate_units": units,
+            "crate_boxes": int(l.get("boxes", 0)),
+            "diff": diff,
+            "status": status,
+        })
+
+    rows.sort(key=lambda r: (r["product_name"] or ""))
+    return rows
+
+
+# ---------------------------
+# Loading sheet
+# ---------------------------
+def load_prepared_sales_for_distributor(dist_id: str, d: date) -> list[dict]:
+    start_iso, end_iso = _day_range_iso(d)
+    usernames = _distributor_usernames(dist_id)
+
+    docs = (
+        db.collection("sales")
+        .where("active", "==", True)
+        .where("status", "==", "prepared")
+        .where("distributor_id", "in", usernames)
+        .where("created_at", ">=", start_iso)
+        .where("created_at", "<", end_iso)
+        .select(["items", "customer_name", "invoice_no", "net"])
+        .stream()
+    )
+
+    out = []
+    for doc in docs:
+        x = doc.to_dict() or {}
+        x["id"] = doc.id
+        out.append(x)
+    return out
+
+
+def load_crate_moves_for_distributor(dist_id: str, d: date) -> list[dict]:
+    start_iso, end_iso = _day_range_iso(d)
+
+    docs = (
+        db.collection("crate_moves")
+        .where("distributor_id", "==", dist_id)
+        .where("created_at", ">=", start_iso)
+        .where("created_at", "<", end_iso)
+        .stream()
+    )
+
+    out = []
+    for doc in docs:
+        x = doc.to_dict() or {}
+        if x.get("active") is not True:
+            continue
+        out.append(x)
+    return out
+
+
+def build_loading_sheet(dist: dict, d: date) -> dict:
+    """
+    ورقة تحميل موحّدة لموزّع في يوم معيّن:
+      - مجموع كميات كل منتج عبر كل الطلبات المُحضّرة (استعلام واحد)
+      - مقارنة مع وحدات الصناديق المسلّمة (crate_moves)
+    """
+    dist_id = dist.get("id") or ""
+    sales = load_prepared_sales_for_distributor(dist_id, d)
+    moves = load_crate_moves_for_distributor(dist_id, d)
+
+    rows = cross_check(aggregate_prepared_items(sales), aggregate_crate_units(moves))
+
+    return {
+        "distributor_id": dist_id,
+        "distributor_name": dist.get("name") or dist_id,
+        "date": str(d),
+        "orders_count": len(sales),
+        "orders": [
+            {"id": s["id"], "invoice_no": s.get("invoice_no") or s["id"], "customer_name": s.get("customer_name") or "—"}
+            for s in sales
+        ],
+        "rows": rows,
+        "total_qty": sum(r["qty"] for r in rows),
+        "mismatch_count": sum(1 for r in rows if r["status"] != "مطابق"),
+    }
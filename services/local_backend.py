@@ -0,0 +1,432 @@
+"""
+بديل محلي (في الذاكرة) لـ Firestore — للاختبار وأدوات المحاكاة بدون اتصال.
+
+يغطي فقط ما يستخدمه المشروع:
+  collection / document / where / order_by / limit / select / stream / get
+  set / update / delete / add / batch / transaction / get_all
+
+الـ transaction متفائلة (optimistic) مثل Firestore: تُسجّل نسخة كل مستند تمت
+قراءته، وعند الـ commit إذا تغيّر أي منها تُرفض ويُعاد تنفيذ الدالة.
+
+حقن الأعطال: db.fail_next(n, stage) حيث stage:
+  - "read"          : فشل القراءة
+  - "before_commit" : فشل قبل تطبيق الكتابات (لا شيء يُحفظ)
+  - "after_commit"  : الكتابات تُحفظ لكن الرد يضيع (أصعب حالة لإعادة المحاولة)
+
+زمن الشبكة: db.set_latency(ms) يضيف تأخيراً لكل قراءة ولكل commit (خارج القفل)
+حتى تتداخل الـ transactions المتزامنة كما على Firestore الحقيقي.
+"""
+import copy
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+MAX_WRITES_PER_COMMIT = 500
+MAX_TX_ATTEMPTS = 5
+
+_STAGES = ("read", "before_commit", "after_commit")
+
+
+class LocalUnavailable(ConnectionError):
+    """انقطاع اتصال مُحاكى (يقابل ServiceUnavailable في Firestore)."""
+
+
+class LocalContention(Exception):
+    """تعارض transaction (يقابل Aborted) — يُعاد التنفيذ تلقائياً."""
+
+
+class LocalNotFound(Exception):
+    """update على مستند غير موجود."""
+
+
+def _auto_id() -> str:
+    return uuid.uuid4().hex[:20]
+
+
+def _field(data: dict, path: str):
+    cur = data
+    for part in (path or "").split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return _MISSING
+        cur = cur[part]
+    return cur
+
+
+class _Missing:
+    pass
+
+
+_MISSING = _Missing()
+
+
+def _match(value, op: str, target) -> bool:
+    if value is _MISSING:
+        return False
+    try:
+        if op == "==":
+            return value == target
+        if op == "!=":
+            return value != target
+        if op == "<":
+            return value < target
+        if op == "<=":
+            return value <= target
+        if op == ">":
+            return value > target
+        if op == ">=":
+            return value >= target
+        if op == "in":
+            return value in (target or [])
+        if op == "not-in":
+            return value not in (target or [])
+        if op == "array_contains":
+            return isinstance(value, list) and target in value
+        if op == "array_contains_any":
+            return isinstance(value, list) and any(t in value for t in (target or []))
+    except TypeError:
+        return False
+    raise ValueError(f"unsupported operator: {op}")
+
+
+# ---------------------------
+# Snapshots / references
+# ---------------------------
+class LocalSnapshot:
+    def __init__(self, reference, data, fields=None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self._fields = fields
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self):
+        if self._data is None:
+            return None
+        if self._fields is not None:
+            return {k: copy.deepcopy(v) for k, v in self._data.items() if k in self._fields}
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path: str):
+        if self._data is None:
+            return None
+        v = _field(self._data, field_path)
+        return None if v is _MISSING else copy.deepcopy(v)
+
+
+class LocalDocumentRef:
+    def __init__(self, client, col_path: str, doc_id: str):
+        self._client = client
+        self._col_path = col_path
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._col_path}/{self.id}"
+
+    def collection(self, name: str):
+        return LocalCollection(self._client, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, transaction=None):
+        if transaction is not None:
+            return transaction._read(self)
+        self._client._maybe_fail("read")
+        data, _ = self._client._load(self)
+        return LocalSnapshot(self, data, set(field_paths) if field_paths else None)
+
+    def set(self, data: dict, merge: bool = False):
+        self._client._commit({}, [("set", self, data, merge)])
+
+    def update(self, data: dict):
+        self._client._commit({}, [("update", self, data, False)])
+
+    def delete(self):
+        self._client._commit({}, [("delete", self, None, False)])
+
+    def __eq__(self, other):
+        return isinstance(other, LocalDocumentRef) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+
+class LocalQuery:
+    def __init__(self, client, col_path: str, filters=None, orders=None, limit_n=None, fields=None):
+        self._client = client
+        self._col_path = col_path
+        self._filters = list(filters or [])
+        self._orders = list(orders or [])
+        self._limit = limit_n
+        self._fields = fields
+
+    def _copy(self, **kw):
+        q = LocalQuery(self._client, self._col_path, self._filters, self._orders, self._limit, self._fields)
+        for k, v in kw.items():
+            setattr(q, k, v)
+        return q
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(_filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING"):
+        return self._copy(_orders=self._orders + [(field_path, str(direction).upper() == "DESCENDING")])
+
+    def limit(self, count: int):
+        return self._copy(_limit=int(count))
+
+    def select(self, field_paths):
+        return self._copy(_fields=set(field_paths))
+
+    def _run(self):
+        self._client._maybe_fail("read")
+        rows = []
+        # الفلترة على المستندات المخزّنة مباشرة؛ النسخ فقط لما يُرجع (بعد limit)
+        for doc_id, data in self._client._scan(self._col_path, copy_data=False):
+            if all(_match(_field(data, f), op, v) for f, op, v in self._filters):
+                rows.append((doc_id, data))
+
+        # مثل Firestore: المستندات التي لا تحتوي حقل الترتيب تُستبعد
+        for f, desc in reversed(self._orders):
+            rows = [r for r in rows if _field(r[1], f) is not _MISSING]
+            rows.sort(key=lambda r, f=f: _field(r[1], f), reverse=desc)
+
+        if self._limit is not None:
+            rows = rows[: self._limit]
+        return [(doc_id, copy.deepcopy(data)) for doc_id, data in rows]
+
+    def stream(self, transaction=None):
+        rows = self._run()
+        self._client._count("reads", len(rows))
+        for doc_id, data in rows:
+            ref = LocalDocumentRef(self._client, self._col_path, doc_id)
+            if transaction is not None:
+                transaction._track(ref)
+            yield LocalSnapshot(ref, data, self._fields)
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+
+class LocalCollection(LocalQuery):
+    def __init__(self, client, col_path: str):
+        super().__init__(client, col_path)
+        self.id = col_path.rsplit("/", 1)[-1]
+
+    def document(self, doc_id: str = None):
+        return LocalDocumentRef(self._client, self._col_path, doc_id or _auto_id())
+
+    def add(self, data: dict, document_id: str = None):
+        ref = self.document(document_id)
+        ref.set(data)
+        return datetime.now(timezone.utc), ref
+
+
+# ---------------------------
+# Writes
+# ---------------------------
+class LocalBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, ref, data: dict, merge: bool = False):
+        self._writes.append(("set", ref, data, merge))
+
+    def update(self, ref, data: dict):
+        self._writes.append(("update", ref, data, False))
+
+    def delete(self, ref):
+        self._writes.append(("delete", ref, None, False))
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        self._client._commit({}, writes)
+        return writes
+
+
+class LocalTransaction(LocalBatch):
+    def __init__(self, client):
+        super().__init__(client)
+        self._read_versions = {}
+
+    def _reset(self):
+        self._writes = []
+        self._read_versions = {}
+
+    def _track(self, ref):
+        _, ver = self._client._load(ref, count=False)
+        self._read_versions.setdefault(ref.path, ver)
+
+    def _read(self, ref):
+        if self._writes:
+            # نفس قيد Firestore: كل القراءات قبل أي كتابة
+            raise ValueError("Attempted read after write in a transaction.")
+        self._client._maybe_fail("read")
+        data, ver = self._client._load(ref)
+        self._read_versions.setdefault(ref.path, ver)
+        return LocalSnapshot(ref, data)
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, LocalDocumentRef):
+            return self._read(ref_or_query)
+        return ref_or_query.stream(transaction=self)
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        self._client._commit(self._read_versions, writes)
+        return writes
+
+
+def transactional(fn):
+    """
+    بديل @firestore.transactional للـ backend المحلي:
+    fn(transaction, *args) ثم commit، مع إعادة المحاولة عند التعارض.
+    """
+    def wrapper(transaction, *args, **kwargs):
+        for _ in range(MAX_TX_ATTEMPTS):
+            transaction._reset()
+            result = fn(transaction, *args, **kwargs)
+            try:
+                transaction.commit()
+                return result
+            except LocalContention:
+                transaction._client._count("aborts")
+                continue
+        raise LocalContention("transaction aborted: too much contention")
+
+    wrapper.__name__ = getattr(fn, "__name__", "transactional")
+    return wrapper
+
+
+# ---------------------------
+# Client
+# ---------------------------
+class LocalClient:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._store = {}  # col_path -> {doc_id: (data, version)}
+        self._version = 0
+        self._faults = []
+        self._latency = 0.0
+        self.stats = {"reads": 0, "writes": 0, "commits": 0, "aborts": 0, "faults": 0}
+
+    # ---- public API (subset of firestore.Client) ----
+    def collection(self, name: str):
+        return LocalCollection(self, name)
+
+    def document(self, path: str):
+        col_path, doc_id = path.rsplit("/", 1)
+        return LocalDocumentRef(self, col_path, doc_id)
+
+    def batch(self):
+        return LocalBatch(self)
+
+    def transaction(self, **kwargs):
+        return LocalTransaction(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        refs = list(references)
+        self._maybe_fail("read")
+        for ref in refs:
+            if transaction is not None:
+                yield transaction._read(ref)
+            else:
+                data, _ = self._load(ref)
+                yield LocalSnapshot(ref, data, set(field_paths) if field_paths else None)
+
+    # ---- test helpers ----
+    def fail_next(self, count: int = 1, stage: str = "before_commit"):
+        if stage not in _STAGES:
+            raise ValueError(f"stage must be one of {_STAGES}")
+        with self._lock:
+            self._faults.extend([stage] * int(count))
+
+    def set_latency(self, ms: float = 0.0):
+        self._latency = max(0.0, float(ms)) / 1000.0
+
+    def clear_faults(self):
+        with self._lock:
+            self._faults = []
+
+    def reset(self):
+        with self._lock:
+            self._store = {}
+            self._faults = []
+            for k in self.stats:
+                self.stats[k] = 0
+
+    def dump(self, col_path: str) -> dict:
+        return {doc_id: data for doc_id, data in self._scan(col_path)}
+
+    # ---- internals ----
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+
+    def _maybe_fail(self, stage: str):
+        with self._lock:
+            if self._faults and self._faults[0] == stage:
+                self._faults.pop(0)
+                self.stats["faults"] += 1
+                raise LocalUnavailable(f"simulated network failure ({stage})")
+        if self._latency and stage != "after_commit":
+            time.sleep(self._latency)
+
+    def _load(self, ref, count: bool = True):
+        with self._lock:
+            data, ver = self._store.get(ref._col_path, {}).get(ref.id, (None, 0))
+            if count:
+                self.stats["reads"] += 1
+            return copy.deepcopy(data), ver
+
+    def _scan(self, col_path: str, copy_data: bool = True):
+        # المستندات المخزّنة لا تُعدّل في مكانها (_commit يستبدلها) فالقراءة بدون نسخ آمنة
+        with self._lock:
+            items = list(self._store.get(col_path, {}).items())
+        if not copy_data:
+            return [(doc_id, data) for doc_id, (data, _) in items]
+        return [(doc_id, copy.deepcopy(data)) for doc_id, (data, _) in items]
+
+    def _commit(self, read_versions: dict, writes: list):
+        if len(writes) > MAX_WRITES_PER_COMMIT:
+            raise ValueError(f"maximum {MAX_WRITES_PER_COMMIT} writes allowed per request")
+
+        self._maybe_fail("before_commit")
+
+        with self._lock:
+            for path, ver in read_versions.items():
+                col_path, doc_id = path.rsplit("/", 1)
+                if self._store.get(col_path, {}).get(doc_id, (None, 0))[1] != ver:
+                    raise LocalContention(f"document changed since read: {path}")
+
+            # تحقق قبل التطبيق: إما كل الكتابات أو لا شيء
+            pending = {}
+            for kind, ref, _, _ in writes:
+                exists = pending.get(ref.path, ref.id in self._store.get(ref._col_path, {}))
+                if kind == "update" and not exists:
+                    raise LocalNotFound(f"No document to update: {ref.path}")
+                pending[ref.path] = kind != "delete"
+
+            for kind, ref, data, merge in writes:
+                col = self._store.setdefault(ref._col_path, {})
+                self._version += 1
+                if kind == "delete":
+                    col.pop(ref.id, None)
+                    continue
+                cur = col.get(ref.id, (None, 0))[0]
+                new = copy.deepcopy(data or {})
+                if kind == "update" or merge:
+                    merged = dict(cur or {})
+                    merged.update(new)
+                    new = merged
+                col[ref.id] = (new, self._version)
+
+            self.stats["writes"] += len(writes)
+            self.stats["commits"] += 1
+
+        self._maybe_fail("after_commit")
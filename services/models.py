@@ -0,0 +1,326 @@
+"""
+سجلات مضغوطة (__slots__) للقراءة فقط لمستندات Firestore.
+
+التحويل (to_float / to_int) يتم مرة واحدة عند التحميل، وبعدها القراءة
+attribute عادية: p.price بدلاً من float(to_float(p.get("price", 0))).
+
+الحقول المالية (_money) لها نسخة عدد صحيح بالفلس: s.net_fils. إن كان
+المستند يحمل net_fils (ويطابق net) فهو المرجع و s.net = net_fils / 1000،
+وإلا تُحسب من net.
+الجمع والأرصدة التراكمية تستخدم _fils (بدون انحراف float).
+
+للتوافق مع الكود القديم كل سجل يدعم أيضاً p["id"] و p.get("name", default)
+بنفس سلوك dict: الحقل غير الموجود في المستند يرجع default.
+"""
+from utils.helpers import to_float, to_int
+from utils.money import fils_consistent, fils_key, from_fils, to_fils
+
+
+def _str(x) -> str:
+    return "" if x is None else str(x)
+
+
+def _float(x) -> float:
+    return float(to_float(x, 0.0))
+
+
+def _int(x) -> int:
+    return int(to_int(x, 0))
+
+
+# المستندات من نفس الشكل تتشارك نفس مجموعة الحقول الناقصة (بدل frozenset لكل سجل)
+_MISSING_SETS = {}
+
+
+def _shared_missing(missing: list) -> frozenset:
+    key = tuple(missing)
+    fs = _MISSING_SETS.get(key)
+    if fs is None:
+        fs = _MISSING_SETS.setdefault(key, frozenset(missing))
+    return fs
+
+
+def _money_slots(fields: tuple, money: tuple) -> tuple:
+    return tuple(f[0] for f in fields) + tuple(fils_key(m) for m in money)
+
+
+class Record:
+    # (اسم الحقل, دالة التحويل أو None, القيمة الافتراضية للـ attribute)
+    _fields = ()
+    # أسماء الحقول المالية (من _fields) التي لها <name>_fils
+    _money = ()
+    __slots__ = ("id", "_missing", "_extra")
+
+    def __init__(self, doc_id: str = "", **data):
+        self._fill(doc_id, data)
+
+    def _fill(self, doc_id: str, data: dict):
+        put = object.__setattr__
+        put(self, "id", doc_id or _str(data.get("id")))
+        missing = []
+        for name, coerce, default in self._fields:
+            if name in data:
+                v = data[name]
+                put(self, name, coerce(v) if coerce is not None else v)
+            else:
+                missing.append(name)
+                put(self, name, default)
+        for name in self._money:
+            fk = fils_key(name)
+            if data.get(fk) is not None and fils_consistent(int(data[fk]), data.get(name)):
+                fils = int(data[fk])
+                put(self, name, from_fils(fils))
+                if name in missing:
+                    missing.remove(name)
+            else:
+                fils = to_fils(getattr(self, name))
+                if name in missing:
+                    missing.append(fk)
+            put(self, fk, fils)
+        known = self._known()
+        extra = {k: v for k, v in data.items() if k not in known and k != "id"}
+        put(self, "_missing", _shared_missing(missing) if missing else None)
+        put(self, "_extra", extra or None)
+        self._post_fill(data)
+
+    def _post_fill(self, data: dict):
+        pass
+
+    @classmethod
+    def _known(cls):
+        k = cls.__dict__.get("_known_cache")
+        if k is None:
+            k = frozenset(f[0] for f in cls._fields) | frozenset(fils_key(m) for m in cls._money)
+            type.__setattr__(cls, "_known_cache", k)
+        return k
+
+    @classmethod
+    def from_dict(cls, data: dict, doc_id: str = ""):
+        obj = cls.__new__(cls)
+        obj._fill(doc_id, data or {})
+        return obj
+
+    @classmethod
+    def from_snapshot(cls, snap):
+        """
+        المسار السريع من DocumentSnapshot: بدون نسخة dict وسيطة {"id": ..., **x}.
+        """
+        obj = cls.__new__(cls)
+        obj._fill(snap.id, snap.to_dict() or {})
+        return obj
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    # السجل غير قابل للتعديل: النسخ يرجع نفس الكائن (st.cache_data / deepcopy)
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (type(self).from_dict, (self.to_dict(), self.id))
+
+    # ---- dict compatibility ----
+    def __contains__(self, key) -> bool:
+        if key == "id":
+            return True
+        if key in self._known():
+            return not (self._missing and key in self._missing)
+        return bool(self._extra) and key in self._extra
+
+    def get(self, key, default=None):
+        if key == "id":
+            return self.id
+        if key in self._known():
+            if self._missing and key in self._missing:
+                return default
+            return getattr(self, key)
+        if self._extra:
+            return self._extra.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return self.get(key)
+
+    def keys(self):
+        names = ["id", *(f[0] for f in self._fields), *(fils_key(m) for m in self._money), *(self._extra or ())]
+        return [k for k in names if k in self]
+
+    def to_dict(self) -> dict:
+        return {k: self.get(k) for k in self.keys()}
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={self.id!r})"
+
+
+class Product(Record):
+    _fields = (
+        ("name", _str, ""),
+        ("price", _float, 0.0),
+        ("qty_on_hand", _float, 0.0),
+        ("sale_unit", _str, "pcs"),
+        ("consume_stock", bool, True),
+        ("active", None, True),
+    )
+    _money = ("price",)
+    __slots__ = _money_slots(_fields, _money)
+
+
+class Customer(Record):
+    _fields = (
+        ("name", _str, ""),
+        ("phone", _str, ""),
+        ("area", _str, ""),
+        ("balance", _float, 0.0),
+        ("opening_balance", _float, 0.0),
+        ("active", None, True),
+        ("created_at", _str, ""),
+    )
+    _money = ("balance", "opening_balance")
+    __slots__ = _money_slots(_fields, _money)
+
+
+class Material(Record):
+    _fields = (
+        ("name", _str, ""),
+        ("unit", _str, ""),
+        ("qty_on_hand", _float, 0.0),
+        ("min_qty", _float, 0.0),
+        ("last_cost", _float, 0.0),
+        ("active", None, True),
+    )
+    __slots__ = tuple(f[0] for f in _fields)
+
+
+class SaleItem(Record):
+    _fields = (
+        ("product_id", _str, ""),
+        ("product_name", _str, ""),
+        ("qty", _float, 0.0),
+        ("price", _float, 0.0),
+        ("total", _float, 0.0),
+        ("unit", _str, "pcs"),
+        ("consume_stock", bool, True),
+    )
+    _money = ("price", "total")
+    __slots__ = _money_slots(_fields, _money)
+
+
+class Sale(Record):
+    _fields = (
+        ("invoice_no", _str, ""),
+        ("customer_id", _str, ""),
+        ("customer_name", _str, ""),
+        ("status", _str, ""),
+        ("payment_type", _str, ""),
+        ("active", None, True),
+        ("total", _float, 0.0),
+        ("discount", _float, 0.0),
+        ("net", _float, 0.0),
+        ("amount_paid", _float, 0.0),
+        ("unpaid_debt", _float, 0.0),
+        ("extra_credit", _float, 0.0),
+        ("old_debt_paid", _float, 0.0),
+        ("old_debt_remaining", _float, 0.0),
+        ("final_due", _float, 0.0),
+        ("distributor_id", _str, ""),
+        ("distributor_name", _str, ""),
+        ("seller_username", _str, ""),
+        ("created_at", _str, ""),
+        ("updated_at", _str, ""),
+        ("delivered_at", _str, ""),
+        # القائمة الخام كما هي (بدون نسخ)؛ line_items تحوّلها عند الحاجة فقط
+        ("items", None, ()),
+    )
+    _money = (
+        "total", "discount", "net", "amount_paid", "unpaid_debt", "extra_credit",
+        "old_debt_paid", "old_debt_remaining", "final_due",
+    )
+    __slots__ = _money_slots(_fields, _money)
+
+    def _post_fill(self, data: dict):
+        # الفواتير القديمة بدون net: الصافي = الإجمالي (نفس s.get("net", s.get("total", 0)))
+        if "net" not in data and "net_fils" not in data and ("total" in data or "total_fils" in data):
+            put = object.__setattr__
+            put(self, "net", self.total)
+            put(self, "net_fils", self.total_fils)
+            rest = [k for k in (self._missing or ()) if k not in ("net", "net_fils")]
+            put(self, "_missing", _shared_missing(rest) if rest else None)
+
+    @property
+    def balance_delta_fils(self) -> int:
+        """
+        أثر الفاتورة على رصيد العميل: ذمم = +net ، نقدي = unpaid - extra.
+        """
+        if self.payment_type == "credit":
+            return self.net_fils
+        if self.payment_type == "cash":
+            return self.unpaid_debt_fils - self.extra_credit_fils
+        return 0
+
+    @property
+    def balance_delta(self) -> float:
+        return from_fils(self.balance_delta_fils)
+
+    @property
+    def sort_at(self) -> str:
+        return self.delivered_at or self.updated_at or self.created_at
+
+    @property
+    def line_items(self) -> tuple:
+        return tuple(SaleItem.from_dict(it) for it in (self.items or ()) if isinstance(it, dict))
+
+
+class CrateMove(Record):
+    _fields = (
+        ("distributor_id", _str, ""),
+        ("distributor_name", _str, ""),
+        ("type", _str, ""),
+        ("boxes_qty", _int, 0),
+        ("delta_boxes", _int, 0),
+        ("product_id", _str, ""),
+        ("product_name", _str, ""),
+        ("units_per_box", _int, 0),
+        ("total_units", _int, 0),
+        ("amount", _float, 0.0),
+        ("note", _str, ""),
+        ("status", _str, ""),
+        ("active", None, True),
+        ("created_at", _str, ""),
+        ("created_by", _str, ""),
+    )
+    _money = ("amount",)
+    __slots__ = _money_slots(_fields, _money)
+
+
+class StockMove(Record):
+    _fields = (
+        ("type", _str, ""),
+        ("ref_type", _str, ""),
+        ("ref_id", _str, ""),
+        ("item_type", _str, ""),
+        ("item_id", _str, ""),
+        ("item_name", _str, ""),
+        ("qty_delta", _float, 0.0),
+        ("unit", _str, ""),
+        ("note", _str, ""),
+        ("active", None, True),
+        ("created_at", _str, ""),
+        ("created_by", _str, ""),
+    )
+    __slots__ = tuple(f[0] for f in _fields)
+
+
+# collection -> model (للـ loaders العامة)
+MODELS = {
+    "products": Product,
+    "customers": Customer,
+    "materials": Material,
+    "sales": Sale,
+    "crate_moves": CrateMove,
+    "stock_moves": StockMove,
+}
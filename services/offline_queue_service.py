@@ -0,0 +1,176 @@
+from utils.helpers import now_iso, to_float
+from services.idempotency_service import idem_results
+from services.orders_service import deliver_sale
+from services.payments_service import pay_customer_debt
+
+# عدد العمليات التي تُعاد في كل دفعة (الباقي يبقى في الطابور للدفعة التالية)
+REPLAY_BATCH_SIZE = 20
+
+# أسماء أخطاء الشبكة في google.api_core / grpc (بدون استيرادها)
+_CONNECTIVITY_ERRORS = {
+    "ServiceUnavailable",
+    "DeadlineExceeded",
+    "RetryError",
+    "GatewayTimeout",
+    "TransportError",
+    "_InactiveRpcError",
+}
+
+
+def is_connectivity_error(e: BaseException) -> bool:
+    """
+    True إذا كان الخطأ انقطاع اتصال (يستحق الحفظ في الطابور وإعادة المحاولة)،
+    False لأخطاء المنطق (مثل: الفاتورة غير موجودة) التي لن تنجح بالإعادة.
+    """
+    seen = set()
+    while e is not None and id(e) not in seen:
+        seen.add(id(e))
+        if isinstance(e, (ConnectionError, TimeoutError)):
+            return True
+        if type(e).__name__ in _CONNECTIVITY_ERRORS:
+            return True
+        e = e.__cause__ or e.__context__
+    return False
+
+
+# ---------------------------
+# Operations (JSON-serializable)
+# ---------------------------
+# ملاحظة: العملية تُضاف للطابور فقط عندما يفشل اتصال السيرفر بـ Firestore أثناء
+# تنفيذ الطلب. إذا انقطع اتصال الجهاز نفسه بالسيرفر فلا يصل الضغط على الزر أصلاً
+# ولا يُحفظ شيء — هذا الطابور لا يغطي تلك الحالة.
+# كل عملية تحمل created_by (المستخدم الذي أضافها) ولا تُعاد إلا باسمه.
+def _username(user) -> str:
+    return str((user or {}).get("username") or "")
+
+
+def make_deliver_op(sid: str, pay: str, paid_amount: float, old_debt_paid: float, label: str = "", user=None) -> dict:
+    return {
+        "op": "deliver",
+        "key": f"deliver:{sid}",
+        "label": label or sid,
+        "queued_at": now_iso(),
+        "created_by": _username(user),
+        "args": {
+            "sid": sid,
+            "pay": pay,
+            "paid_amount": float(to_float(paid_amount, 0.0)),
+            "old_debt_paid": float(to_float(old_debt_paid, 0.0)),
+        },
+    }
+
+
+def make_debt_payment_op(
+    cid: str, amount: float, discount_amount: float, idempotency_key: str, label: str = "", user=None
+) -> dict:
+    return {
+        "op": "debt_payment",
+        "key": idempotency_key,
+        "label": label or cid,
+        "queued_at": now_iso(),
+        "created_by": _username(user),
+        "args": {
+            "cid": cid,
+            "amount": float(to_float(amount, 0.0)),
+            "discount_amount": float(to_float(discount_amount, 0.0)),
+        },
+    }
+
+
+def _apply_op(op: dict, user: dict, resolve_distributor_name=None) -> dict:
+    a = op.get("args") or {}
+    kind = op.get("op")
+
+    if kind == "deliver":
+        return deliver_sale(
+            a["sid"],
+            pay=a.get("pay") or "cash",
+            paid_amount=a.get("paid_amount", 0.0),
+            old_debt_paid=a.get("old_debt_paid", 0.0),
+            user=user,
+            idempotency_key=op["key"],
+            resolve_distributor_name=resolve_distributor_name,
+        )
+
+    if kind == "debt_payment":
+        return pay_customer_debt(
+            a["cid"],
+            amount=a.get("amount", 0.0),
+            discount_amount=a.get("discount_amount", 0.0),
+            user=user,
+            idempotency_key=op["key"],
+        )
+
+    raise ValueError(f"نوع عملية غير معروف: {kind}")
+
+
+# ---------------------------
+# Replay
+# ---------------------------
+def replay_operations(
+    ops: list[dict],
+    user: dict,
+    resolve_distributor_name=None,
+    batch_size: int = REPLAY_BATCH_SIZE,
+) -> list[dict]:
+    """
+    إعادة تنفيذ عمليات الطابور بالترتيب. كل عملية تحمل مفتاح idempotency
+    فإعادة إرسالها أكثر من مرة آمنة.
+
+    لكل عملية: {"key", "op", "status", "result", "error"} حيث status:
+      - "done"    : نُفّذت (أو كانت منفّذة سابقاً — replayed=True)
+      - "failed"  : خطأ منطقي لن ينجح بالإعادة — تُحذف من الطابور
+      - "pending" : لم تُنفّذ (انقطاع اتصال أو خارج حجم الدفعة) — تبقى في الطابور
+      - "foreign" : أضافها مستخدم آخر (أو بدون created_by) — لا تُنفّذ باسم
+                    المستخدم الحالي وتبقى في الطابور حتى يدخل صاحبها
+    """
+    ops = [o for o in (ops or []) if o.get("key")]
+    me = _username(user)
+
+    def _row(op, status, result=None, error=""):
+        return {"key": op["key"], "op": op.get("op"), "status": status, "result": result or {}, "error": error}
+
+    foreign = [o for o in ops if not me or o.get("created_by") != me]
+    ops = [o for o in ops if me and o.get("created_by") == me]
+    foreign_rows = [
+        _row(o, "foreign", error=f"أضافها المستخدم {o.get('created_by') or 'غير معروف'}")
+        for o in foreign
+    ]
+
+    if not ops:
+        return foreign_rows
+
+    batch = ops[: max(1, int(batch_size))]
+    out = []
+
+    try:
+        # قراءة واحدة لكل مفاتيح الدفعة: العمليات التي وصلت سابقاً لا تحتاج transaction
+        applied = idem_results([o["key"] for o in batch])
+    except Exception as e:
+        if not is_connectivity_error(e):
+            raise
+        return [_row(o, "pending", error=str(e)) for o in ops] + foreign_rows
+
+    offline = False
+    for op in batch:
+        if offline:
+            out.append(_row(op, "pending"))
+            continue
+
+        prev = applied.get(op["key"])
+        if prev is not None:
+            out.append(_row(op, "done", dict(prev, replayed=True)))
+            continue
+
+        try:
+            out.append(_row(op, "done", _apply_op(op, user, resolve_distributor_name)))
+        except Exception as e:
+            if is_connectivity_error(e):
+                # الاتصال ما زال مقطوعاً: لا فائدة من متابعة باقي الدفعة
+                offline = True
+                out.append(_row(op, "pending", error=str(e)))
+            else:
+                out.append(_row(op, "failed", error=str(e)))
+
+    out.extend(_row(o, "pending") for o in ops[len(batch):])
+    return out + foreign_rows
@@ -1,7 +1,9 @@
-from firebase_config import db
-from firebase_admin import firestore
+from firebase_config import db, transactional
 
 from utils.helpers import now_iso, to_float
+from utils.money import from_fils, money_fields, read_fils, to_fils
+from services.idempotency_service import idem_fingerprint, idem_lookup, idem_store
+from services.cache_bus import publish
 
 
 def _safe_str(x):
@@ -42,10 +44,11 @@ def write_stock_moves_batch(moves: list[dict]):
 
 def cancel_prepared_sale(sid: str, user: dict):
     sale_items_for_moves = []
+    sale_customer_id = ""
 
-    @firestore.transactional
+    @transactional
     def tx_cancel(transaction):
-        nonlocal sale_items_for_moves
+        nonlocal sale_items_for_moves, sale_customer_id
 
         ts = now_iso()
 
@@ -56,6 +59,7 @@ def cancel_prepared_sale(sid: str, user: dict):
             raise ValueError("الفاتورة غير موجودة")
 
         sale = sale_snap.to_dict() or {}
+        sale_customer_id = sale.get("customer_id") or ""
 
         if sale.get("active") is not True:
             raise ValueError("الفاتورة غير فعالة")
@@ -113,6 +117,10 @@ def cancel_prepared_sale(sid: str, user: dict):
         })
 
     tx_cancel(db.transaction())
+    publish(
+        customer_id=sale_customer_id,
+        product_ids=[it.get("product_id") for it in (sale_items_for_moves or [])],
+    )
 
     moves = []
 
@@ -136,4 +144,436 @@ def cancel_prepared_sale(sid: str, user: dict):
             "created_by": user.get("username", ""),
         })
 
-    write_stock_moves_batch(moves)
\ No newline at end of file
+    write_stock_moves_batch(moves)
+
+# ---------------------------
+# Prepare orders (single + batch)
+# ---------------------------
+# حد آمن لعدد الكتابات داخل commit واحد (حد Firestore = 500)
+MAX_WRITES_PER_COMMIT = 450
+
+
+def _order_totals_fils(order: dict):
+    items = order.get("items", []) or []
+    total = sum(read_fils(it, "total") for it in items)
+    discount = read_fils(order, "discount")
+    return total, discount, total - discount
+
+
+def _order_stock_need(order: dict) -> dict:
+    """
+    مجموع الكميات المطلوبة لكل منتج داخل الطلب (فقط الأصناف التي تستهلك مخزون).
+    """
+    need = {}
+    for it in (order.get("items", []) or []):
+        if not bool(it.get("consume_stock", True)):
+            continue
+        pid = it.get("product_id")
+        qty = float(to_float(it.get("qty", 0)))
+        if not pid or qty <= 0:
+            continue
+        need[pid] = need.get(pid, 0.0) + qty
+    return need
+
+
+def order_fingerprint(order: dict) -> str:
+    """
+    بصمة محتوى الطلب (العميل + الأصناف + الخصم) لمفتاح idempotency: سلة أو عميل
+    مختلف = عملية مختلفة وليس إعادة محاولة.
+    """
+    items = sorted(
+        (it.get("product_id") or "", float(to_float(it.get("qty", 0))), read_fils(it, "price"),
+         bool(it.get("consume_stock", True)))
+        for it in (order.get("items", []) or [])
+    )
+    return idem_fingerprint(order.get("customer_id") or "", order.get("customer_name") or "",
+                            read_fils(order, "discount"), items)
+
+
+def _order_write_count(order: dict) -> int:
+    # sale + idempotency + stock move لكل صنف + تحديث المنتج (أسوأ حالة: منتج لكل صنف)
+    return 2 + 2 * len(_order_stock_need(order))
+
+
+def _prepared_sale_payload(order: dict, user: dict, ts: str) -> dict:
+    total, discount, net = _order_totals_fils(order)
+    inv = order["invoice_no"]
+    return {
+        "invoice_no": inv,
+        "ref": inv,
+        "customer_id": (order.get("customer_id") or ""),
+        "customer_name": order.get("customer_name", ""),
+        "seller_username": user.get("username"),
+        "distributor_id": (order.get("distributor_id") or user.get("username") or ""),
+        "distributor_name": order.get("distributor_name", ""),
+        "payment_type": None,
+        **money_fields(discount=discount, total=total, net=net),
+        "items": order.get("items", []) or [],
+        "status": "prepared",
+        "stock_deducted": True,
+        "balance_applied": False,
+        **money_fields(amount_paid=0, extra_credit=0, unpaid_debt=0),
+        "active": True,
+        "created_at": ts,
+        "updated_at": ts,
+        "created_by": user.get("username", ""),
+    }
+
+
+def _prepared_sale_moves(order: dict, user: dict, ref_type: str, note: str) -> list[dict]:
+    units = order.get("units", {}) or {}
+    moves = []
+    for it in (order.get("items", []) or []):
+        if not bool(it.get("consume_stock", True)):
+            continue
+        moves.append({
+            "type": "sale",
+            "ref_type": ref_type,
+            "ref_id": order["sale_id"],
+            "item_type": "product",
+            "item_id": it["product_id"],
+            "item_name": it.get("product_name", ""),
+            "qty_delta": -float(to_float(it.get("qty", 0))),
+            "unit": units.get(it["product_id"], "pcs"),
+            "note": note,
+            "created_by": user.get("username", ""),
+        })
+    return moves
+
+
+def _group_orders_for_commits(orders: list[dict]) -> list[list[dict]]:
+    groups = []
+    cur = []
+    cur_writes = 0
+    for order in orders:
+        w = _order_write_count(order)
+        if cur and cur_writes + w > MAX_WRITES_PER_COMMIT:
+            groups.append(cur)
+            cur = []
+            cur_writes = 0
+        cur.append(order)
+        cur_writes += w
+    if cur:
+        groups.append(cur)
+    return groups
+
+
+def _prepare_orders_group(orders: list[dict], user: dict, ref_type: str, note: str) -> list[dict]:
+    results = []
+    # "حفظ كمُحضّر" و"تسليم مباشر" عمليتان مختلفتان لنفس المفتاح
+    op = f"prepare:{ref_type}"
+    fingerprints = {o["sale_id"]: order_fingerprint(o) for o in orders}
+
+    @transactional
+    def tx_prepare_group(transaction):
+        nonlocal results
+        results = []
+        ts = now_iso()
+
+        # 0) مفاتيح idempotency: الطلبات المنفّذة سابقاً ترجع نتيجتها الأصلية
+        #    (نفس المفتاح لعملية أخرى أو سلة مختلفة يفشل بدل إرجاع فاتورة أخرى)
+        idem_refs = {}
+        replayed = {}
+        for order in orders:
+            key = order.get("idempotency_key") or ""
+            ref, prev = idem_lookup(transaction, key, op=op, fingerprint=fingerprints[order["sale_id"]])
+            idem_refs[order["sale_id"]] = ref
+            if prev is not None:
+                replayed[order["sale_id"]] = prev
+
+        pending = [o for o in orders if o["sale_id"] not in replayed]
+
+        # الفاتورة تُنشأ ولا يُكتب فوقها: رقم مكرر (عدّاد أُعيد ضبطه / lease سُلّم مرتين)
+        # يُفشل طلبه بدل الدمج بصمت في فاتورة موجودة
+        sale_refs = {}
+        taken = set()
+        for order in pending:
+            sid = order["sale_id"]
+            if sid in sale_refs:
+                taken.add(sid)
+                continue
+            sale_refs[sid] = db.collection("sales").document(sid)
+            if sale_refs[sid].get(transaction=transaction).exists:
+                taken.add(sid)
+
+        # 1) قراءة كل منتج مرة واحدة فقط (مجموع احتياج الدفعة)
+        pids = []
+        for order in pending:
+            for pid in _order_stock_need(order):
+                if pid not in pids:
+                    pids.append(pid)
+
+        prod_refs = {}
+        available = {}
+        for pid in pids:
+            ref = db.collection("products").document(pid)
+            snap = ref.get(transaction=transaction)
+            prod_refs[pid] = ref
+            if snap.exists:
+                available[pid] = float(to_float((snap.to_dict() or {}).get("qty_on_hand", 0)))
+
+        # 2) توزيع المخزون على الطلبات بالترتيب (الطلب إما يمر كاملاً أو يفشل كاملاً)
+        remaining = dict(available)
+        accepted = []
+        for order in orders:
+            prev = replayed.get(order["sale_id"])
+            if prev is not None:
+                results.append({
+                    "key": order.get("key"),
+                    "sale_id": prev.get("sale_id") or order["sale_id"],
+                    "ok": True,
+                    "error": "",
+                    "replayed": True,
+                })
+                continue
+
+            if order["sale_id"] in taken:
+                error = f"رقم الفاتورة مستخدم مسبقاً: {order.get('invoice_no') or order['sale_id']}"
+                results.append({"key": order.get("key"), "sale_id": order["sale_id"], "ok": False, "error": error})
+                continue
+
+            need = _order_stock_need(order)
+            error = ""
+            for pid, req in need.items():
+                if pid not in remaining:
+                    error = f"منتج غير موجود: {pid}"
+                    break
+                if remaining[pid] < req:
+                    pname = next(
+                        (it.get("product_name", "") for it in order.get("items", []) if it.get("product_id") == pid),
+                        pid,
+                    )
+                    error = f"المخزون غير كافي للمنتج: {pname} (المطلوب {req}, المتوفر {remaining[pid]})"
+                    break
+
+            if error:
+                results.append({"key": order.get("key"), "sale_id": order["sale_id"], "ok": False, "error": error})
+                continue
+
+            for pid, req in need.items():
+                remaining[pid] -= req
+            accepted.append(order)
+            results.append({"key": order.get("key"), "sale_id": order["sale_id"], "ok": True, "error": ""})
+
+        if not accepted:
+            return
+
+        # 3) الكتابات: تحديث واحد لكل منتج + الفواتير + حركات المخزون
+        for pid in pids:
+            if pid in available and remaining[pid] != available[pid]:
+                transaction.update(prod_refs[pid], {"qty_on_hand": remaining[pid], "updated_at": ts})
+
+        for order in accepted:
+            transaction.set(sale_refs[order["sale_id"]], _prepared_sale_payload(order, user, ts))
+
+            for idx, move in enumerate(_prepared_sale_moves(order, user, ref_type, note)):
+                move["created_at"] = ts
+                move["active"] = True
+                mv_ref = db.collection("stock_moves").document(_stock_move_doc_id(move, idx))
+                transaction.set(mv_ref, move, merge=True)
+
+            idem_store(
+                transaction,
+                idem_refs.get(order["sale_id"]),
+                order.get("idempotency_key") or "",
+                op,
+                {"sale_id": order["sale_id"], "invoice_no": order["invoice_no"]},
+                user,
+                fingerprint=fingerprints[order["sale_id"]],
+            )
+
+    tx_prepare_group(db.transaction())
+
+    ok_ids = {r["sale_id"] for r in results if r.get("ok")}
+    for order in orders:
+        if order["sale_id"] in ok_ids:
+            publish(
+                customer_id=order.get("customer_id") or "",
+                product_ids=[it.get("product_id") for it in (order.get("items", []) or [])],
+            )
+    return results
+
+
+def prepare_orders_batch(
+    orders: list[dict],
+    user: dict,
+    ref_type: str = "sale_prepared",
+    note: str = "خصم أثناء تحضير الطلب (قبل التسليم)",
+) -> list[dict]:
+    """
+    تحضير مجموعة طلبات (خط توزيع كامل) بأقل عدد من الـ commits:
+      - قراءة كل منتج مرة واحدة والتحقق من مجموع المخزون للدفعة
+      - خصم المخزون + إنشاء الفواتير + حركات المخزون داخل نفس الـ transaction
+      - نتيجة لكل طلب: {"key", "sale_id", "ok", "error"}
+
+    كل order: {key, sale_id, invoice_no, customer_id, customer_name,
+               distributor_id, distributor_name, discount, items, units,
+               idempotency_key (اختياري)}
+    """
+    results = []
+    for group in _group_orders_for_commits(orders or []):
+        try:
+            results.extend(_prepare_orders_group(group, user, ref_type, note))
+        except Exception as e:
+            results.extend(
+                {"key": o.get("key"), "sale_id": o["sale_id"], "ok": False, "error": str(e)}
+                for o in group
+            )
+    return results
+
+
+def prepare_order(order: dict, user: dict, ref_type: str = "sale_prepared", note: str = "خصم أثناء تحضير الطلب (قبل التسليم)"):
+    """
+    تحضير طلب واحد (نفس مسار الدفعة) — يرفع خطأ إذا فشل.
+    """
+    res = _prepare_orders_group([order], user, ref_type, note)
+    if not res or not res[0]["ok"]:
+        raise ValueError((res[0]["error"] if res else "") or "فشل تحضير الطلب")
+    return res[0]["sale_id"]
+
+
+# ---------------------------
+# Deliver prepared order
+# ---------------------------
+def deliver_sale(
+    sid: str,
+    pay: str,
+    paid_amount: float,
+    old_debt_paid: float,
+    user: dict,
+    idempotency_key: str = "",
+    resolve_distributor_name=None,
+) -> dict:
+    """
+    تسليم طلب مُحضّر وتحديد الدفع + تسديد ذمم سابقة (اختياري) داخل transaction واحدة.
+    مع idempotency_key: إعادة المحاولة ترجع نفس النتيجة بدون تنفيذ الكتابات مرة ثانية.
+    """
+    result = {}
+
+    @transactional
+    def tx_deliver(transaction):
+        nonlocal result
+        ts = now_iso()
+
+        idem, prev = idem_lookup(transaction, idempotency_key)
+        if prev is not None:
+            result = dict(prev, replayed=True)
+            return
+
+        sale_ref = db.collection("sales").document(sid)
+        sale_snap = sale_ref.get(transaction=transaction)
+        if not sale_snap.exists:
+            raise ValueError("الفاتورة غير موجودة")
+
+        sd = sale_snap.to_dict() or {}
+        if sd.get("status") == "done":
+            result = {"sale_id": sid, "status": "done", "already_done": True}
+            return
+
+        # كل الحساب بالفلس (int)
+        net_local = read_fils(sd, "net")
+        cust_id_local = sd.get("customer_id") or ""
+
+        paid = 0
+        extra = 0
+        unpaid = 0
+        old_debt_paid_local = to_fils(old_debt_paid)
+
+        cust_ref = None
+        cur_bal_local = 0
+
+        if cust_id_local:
+            cust_ref = db.collection("customers").document(cust_id_local)
+            cust_snap = cust_ref.get(transaction=transaction)
+
+            if not cust_snap.exists:
+                raise ValueError("العميل غير موجود")
+
+            cust_data = cust_snap.to_dict() or {}
+            cur_bal_local = read_fils(cust_data, "balance")
+
+        if old_debt_paid_local < 0:
+            raise ValueError("مبلغ تسديد الذمم السابقة غير صالح")
+
+        if old_debt_paid_local > max(0, cur_bal_local):
+            raise ValueError("مبلغ تسديد الذمم السابقة أكبر من الذمم المستحقة على العميل")
+
+        if pay == "cash":
+            paid = to_fils(paid_amount)
+            extra = max(0, paid - net_local)
+            unpaid = max(0, net_local - paid)
+
+        invoice_effect = 0
+        if pay == "credit":
+            invoice_effect = +net_local
+        else:
+            if unpaid > 0:
+                invoice_effect += unpaid
+            if extra > 0:
+                invoice_effect -= extra
+
+        balance_delta = invoice_effect - old_debt_paid_local
+        old_debt_remaining_local = max(0, cur_bal_local - old_debt_paid_local)
+        final_due_local = max(0, cur_bal_local + balance_delta)
+
+        dist_key = sd.get("distributor_id") or sd.get("seller_username") or user.get("username", "")
+        dist_name = sd.get("distributor_name") or (resolve_distributor_name(dist_key) if resolve_distributor_name else "")
+
+        updates = {
+            "status": "done",
+            "payment_type": pay,
+            "delivered_at": ts,
+            "delivered_by": user.get("username", ""),
+            "updated_at": ts,
+            **money_fields(
+                amount_paid=paid if pay == "cash" else 0,
+                extra_credit=extra if pay == "cash" else 0,
+                unpaid_debt=unpaid if pay == "cash" else 0,
+                old_debt_paid=old_debt_paid_local,
+                old_debt_remaining=old_debt_remaining_local,
+                final_due=final_due_local,
+            ),
+            "balance_applied": False,
+            "distributor_id": dist_key,
+            "distributor_name": dist_name,
+        }
+
+        if balance_delta != 0 and cust_ref is not None:
+            transaction.update(cust_ref, {
+                **money_fields(balance=cur_bal_local + balance_delta),
+                "updated_at": ts
+            })
+            updates["balance_applied"] = True
+
+        transaction.update(sale_ref, updates)
+
+        if old_debt_paid_local > 0:
+            # معرّف ثابت: حركة تسديد واحدة فقط لكل فاتورة
+            move_ref = db.collection("customer_balance_moves").document(f"cbm__{sid}__debt_payment")
+            transaction.set(move_ref, {
+                "customer_id": cust_id_local,
+                "customer_name": sd.get("customer_name") or "",
+                "sale_id": sid,
+                "invoice_no": sd.get("invoice_no") or sid,
+                "type": "debt_payment",
+                **money_fields(amount=old_debt_paid_local),
+                "active": True,
+                "created_at": ts,
+                "created_by": user.get("username", ""),
+                "note": "تسديد ذمم سابقة أثناء تسليم فاتورة"
+            })
+
+        result = {
+            "sale_id": sid,
+            "status": "done",
+            "customer_id": cust_id_local,
+            "payment_type": pay,
+            "amount_paid": updates["amount_paid"],
+            "old_debt_paid": updates["old_debt_paid"],
+            "final_due": from_fils(final_due_local),
+        }
+        idem_store(transaction, idem, idempotency_key, "deliver", result, user)
+
+    tx_deliver(db.transaction())
+    publish(customer_id=result.get("customer_id") or "")
+    return result
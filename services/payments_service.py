@@ -0,0 +1,91 @@
+from firebase_config import db, transactional
+
+from utils.helpers import now_iso
+from utils.money import from_fils, money_fields, read_fils, to_fils
+from services.idempotency_service import idem_lookup, idem_store
+from services.cache_bus import publish
+
+
+# ---------------------------
+# Debt payment (تسديد ذمم بدون فاتورة)
+# ---------------------------
+def pay_customer_debt(
+    cid: str,
+    amount: float,
+    discount_amount: float,
+    user: dict,
+    note: str = "تسديد ذمم من شاشة تحضير الطلبات",
+    idempotency_key: str = "",
+) -> dict:
+    """
+    يخفّض ذمم العميل بمبلغ التسديد + الخصم، ويسجّل حركة customer_balance_moves
+    داخل نفس الـ transaction. إعادة المحاولة بنفس المفتاح ترجع النتيجة الأصلية.
+    """
+    amount = to_fils(amount)
+    discount_amount = to_fils(discount_amount)
+    total_effect = amount + discount_amount
+
+    if total_effect <= 0:
+        raise ValueError("أدخل مبلغ تسديد أو خصم أكبر من صفر")
+
+    result = {}
+
+    @transactional
+    def tx_pay_debt(transaction):
+        nonlocal result
+        ts = now_iso()
+
+        idem, prev = idem_lookup(transaction, idempotency_key)
+        if prev is not None:
+            result = dict(prev, replayed=True)
+            return
+
+        cust_ref = db.collection("customers").document(cid)
+        cust_snap = cust_ref.get(transaction=transaction)
+
+        if not cust_snap.exists:
+            raise ValueError("العميل غير موجود")
+
+        cust_data = cust_snap.to_dict() or {}
+        bal = read_fils(cust_data, "balance")
+
+        if bal <= 0:
+            raise ValueError("لا يوجد ذمم مستحقة على هذا العميل")
+
+        if total_effect > bal:
+            raise ValueError("مجموع التسديد والخصم أكبر من الذمم المستحقة")
+
+        new_bal = bal - total_effect
+
+        transaction.update(cust_ref, {
+            **money_fields(balance=new_bal),
+            "updated_at": ts,
+        })
+
+        move_ref = db.collection("customer_balance_moves").document()
+        transaction.set(move_ref, {
+            "customer_id": cid,
+            "customer_name": cust_data.get("name") or "",
+            "sale_id": "",
+            "invoice_no": "",
+            "type": "debt_payment_only",
+            **money_fields(amount=amount, discount_amount=discount_amount),
+            "active": True,
+            "created_at": ts,
+            "created_by": user.get("username", ""),
+            "note": note,
+        })
+
+        result = {
+            "customer_id": cid,
+            "move_id": move_ref.id,
+            "amount": from_fils(amount),
+            "discount_amount": from_fils(discount_amount),
+            "balance_before": from_fils(bal),
+            "balance_after": from_fils(new_bal),
+        }
+        idem_store(transaction, idem, idempotency_key, "debt_payment", result, user)
+
+    tx_pay_debt(db.transaction())
+    publish(customer_id=cid)
+    return result
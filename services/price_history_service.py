@@ -0,0 +1,241 @@
+"""
+نسخ الأسعار بتاريخ سريان: "سعر المنتج P للعميل C في الوقت T".
+
+products.price و customer_prices.price يبقيان السعر الحالي (للشاشات القديمة)،
+وكل تغيير يضيف نسخة في price_versions بدل الاكتفاء بالكتابة فوق القيمة:
+
+    {"customer_id": "" | cid, "product_id": pid, "price": 0.35, "price_fils": 350,
+     "effective_from": "2026-03-01T06:00:00+03:00", ...}
+
+- customer_id == "" = السعر العام للمنتج؛ price_fils = None = إلغاء السعر الخاص
+  (يرجع للسعر العام) من effective_from.
+- أول تغيير بعد هذه الميزة يكتب أيضاً السعر السابق كنسخة بتاريخ آخر تعديل له
+  (معرّف المستند حتمي فلا تتكرر)، فالطباعة المعادة لفاتورة قديمة تجد سعر وقتها.
+- PriceIndex: لكل (عميل، منتج) قائمة تواريخ مرتبة + أسعارها، والبحث bisect:
+  O(log n) لكل سعر.
+- الفهرس يُحمّل لكل يوم ويُخزّن (keyed_cache) بنسخ اليوم فقط (آخر نسخة قبل بدايته
+  + نسخ داخله)، ويُبطل بنشر customer/product tags عند أي نسخة جديدة.
+- استعلامات بحقل واحد (customer_id) بدون فهرس مركّب.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from firebase_config import db
+from utils.helpers import now_iso
+from utils.money import from_fils, money_fields, read_fils
+from services.cache_bus import (
+    PRODUCTS_TAG,
+    customer_tag,
+    keyed_cache,
+    product_tag,
+    publish_tags,
+)
+
+VERSIONS = "price_versions"
+# أقدم من أي تاريخ فعلي: نسخة أساس لمستند قديم بدون تاريخ تعديل
+EPOCH = "1970-01-01T00:00:00+03:00"
+
+
+def _compact(ts: str) -> str:
+    return "".join(ch for ch in (ts or "") if ch.isalnum())
+
+
+def version_doc_id(customer_id: str, product_id: str, effective_from: str) -> str:
+    return f"{customer_id or '_base'}__{product_id}__{_compact(effective_from)}"
+
+
+def version_data(customer_id: str, product_id: str, fils, effective_from: str, user: dict = None, job_id: str = "") -> dict:
+    data = {
+        "customer_id": customer_id or "",
+        "product_id": product_id,
+        "effective_from": effective_from,
+        "created_at": now_iso(),
+        "created_by": (user or {}).get("username", ""),
+    }
+    if fils is None:
+        data.update({"price": None, "price_fils": None})
+    else:
+        data.update(money_fields(price=fils))
+    if job_id:
+        data["price_job"] = job_id
+    return data
+
+
+def version_writes(customer_id: str, product_id: str, fils, effective_from: str, previous: dict = None,
+                   user: dict = None, job_id: str = "") -> list:
+    """
+    [(ref، data)] لتغيير سعر واحد: النسخة الجديدة، وقبلها السعر السابق كنسخة
+    بتاريخ آخر تعديل له (previous = المستند الحالي قبل الكتابة، إن وُجد).
+    """
+    col = db.collection(VERSIONS)
+    out = []
+    if previous is not None and previous.get("price") is not None:
+        since = previous.get("updated_at") or previous.get("created_at") or EPOCH
+        if since < effective_from:
+            prev_fils = read_fils(previous, "price") if previous.get("active", True) is not False else None
+            out.append((col.document(version_doc_id(customer_id, product_id, since)),
+                        version_data(customer_id, product_id, prev_fils, since, user)))
+    out.append((col.document(version_doc_id(customer_id, product_id, effective_from)),
+                version_data(customer_id, product_id, fils, effective_from, user, job_id)))
+    return out
+
+
+def record_base_prices(changes: dict, previous: dict, user: dict, effective_from: str = None) -> int:
+    """
+    تغييرات السعر العام (product_id -> فلس) كنسخ في batch واحد.
+    previous: product_id -> مستند المنتج قبل التعديل.
+    """
+    effective_from = effective_from or now_iso()
+    batch, ops = db.batch(), 0
+    for pid, fils in changes.items():
+        for ref, data in version_writes("", pid, fils, effective_from, (previous or {}).get(pid), user):
+            batch.set(ref, data, merge=True)
+            ops += 1
+            if ops >= 400:
+                batch.commit()
+                batch, ops = db.batch(), 0
+    if ops:
+        batch.commit()
+    if changes:
+        publish_tags({PRODUCTS_TAG, *(product_tag(p) for p in changes)})
+    return len(changes)
+
+
+# ---------------------------
+# Index
+# ---------------------------
+class PriceIndex:
+    """
+    (customer_id, product_id) -> (تواريخ السريان مرتبة، فلس أو None).
+    """
+    __slots__ = ("_series",)
+
+    def __init__(self, versions):
+        grouped = {}
+        for v in versions:
+            key = (v.get("customer_id") or "", v.get("product_id") or "")
+            if not key[1] or not v.get("effective_from"):
+                continue
+            fils = None if v.get("price") is None else read_fils(v, "price")
+            grouped.setdefault(key, []).append((v["effective_from"], fils))
+        self._series = {}
+        for key, rows in grouped.items():
+            rows.sort(key=lambda r: r[0])
+            self._series[key] = (tuple(r[0] for r in rows), tuple(r[1] for r in rows))
+
+    def __len__(self):
+        return len(self._series)
+
+    def has(self, customer_id: str, product_id: str) -> bool:
+        return (customer_id or "", product_id) in self._series
+
+    def at(self, customer_id: str, product_id: str, when: str, default=None):
+        """
+        الفلس الساري في when، أو default إن لم تكن نسخة قبله. None = سعر خاص ملغى.
+        """
+        series = self._series.get((customer_id or "", product_id))
+        if series is None:
+            return default
+        i = bisect_right(series[0], when) - 1
+        return series[1][i] if i >= 0 else default
+
+    def products(self, customer_id: str):
+        cid = customer_id or ""
+        return [pid for (c, pid) in self._series if c == cid]
+
+    def trimmed(self, start: str, end: str) -> "PriceIndex":
+        """
+        نسخ اليوم [start, end) فقط: آخر نسخة قبل start + ما داخله. منتج كل نسخه
+        بعد اليوم يبقى بسلسلة فارغة: له تاريخ، لكن لا سعر خاص ساري في هذا اليوم.
+        """
+        out = PriceIndex(())
+        for key, (times, values) in self._series.items():
+            lo = max(0, bisect_right(times, start) - 1)
+            hi = bisect_left(times, end)
+            out._series[key] = (times[lo:hi], values[lo:hi])
+        return out
+
+
+def _day_bounds(day: str) -> tuple:
+    d = datetime.strptime(day, "%Y-%m-%d")
+    nxt = (d + timedelta(days=1)).strftime("%Y-%m-%d")
+    return f"{day}T00:00:00+03:00", f"{nxt}T00:00:00+03:00"
+
+
+def _load_versions(customer_id: str) -> list:
+    docs = db.collection(VERSIONS).where("customer_id", "==", customer_id or "").stream()
+    return [d.to_dict() or {} for d in docs]
+
+
+def _day_tags(customer_id: str = "", **_):
+    return [customer_tag(customer_id)] if customer_id else [PRODUCTS_TAG]
+
+
+@keyed_cache(ttl=600, tags=_day_tags, copy_result=False)
+def day_index(customer_id: str, day: str) -> PriceIndex:
+    """
+    فهرس يوم واحد لعميل (أو "" للأسعار العامة)؛ يُخزّن حتى أول نسخة جديدة تُنشر.
+    """
+    start, end = _day_bounds(day)
+    return PriceIndex(_load_versions(customer_id)).trimmed(start, end)
+
+
+@keyed_cache(ttl=300, tags=lambda customer_id, **_: [customer_tag(customer_id)])
+def _current_customer_prices(customer_id: str) -> dict:
+    # الأسعار الحالية: أساس للمنتجات التي لم تُكتب لها نسخ بعد
+    docs = db.collection("customer_prices").where("customer_id", "==", customer_id).stream()
+    out = {}
+    for d in docs:
+        x = d.to_dict() or {}
+        pid = x.get("product_id")
+        if pid and x.get("active") is True:
+            out[pid] = read_fils(x, "price")
+    return out
+
+
+# ---------------------------
+# Resolve
+# ---------------------------
+def customer_prices_at(customer_id: str, when: str = None) -> dict:
+    """
+    product_id -> السعر الخاص الساري في when (float) للعميل؛ الأسعار الملغاة لا تظهر.
+    """
+    if not customer_id:
+        return {}
+    when = when or now_iso()
+    idx = day_index(customer_id, when[:10])
+    out = {}
+    for pid, fils in _current_customer_prices(customer_id).items():
+        if not idx.has(customer_id, pid):
+            out[pid] = from_fils(fils)
+    for pid in idx.products(customer_id):
+        fils = idx.at(customer_id, pid, when)
+        if fils is not None:
+            out[pid] = from_fils(fils)
+    return out
+
+
+def base_prices_at(when: str = None) -> dict:
+    """
+    product_id -> السعر العام الساري في when للمنتجات التي لها نسخ؛ غيرها من المنتج نفسه.
+    """
+    when = when or now_iso()
+    idx = day_index("", when[:10])
+    out = {}
+    for pid in idx.products(""):
+        fils = idx.at("", pid, when)
+        if fils is not None:
+            out[pid] = from_fils(fils)
+    return out
+
+
+def price_at(customer_id: str, product_id: str, when: str = None, base_price: float = 0.0) -> float:
+    """
+    السعر الساري لعميل على منتج في when: الخاص، وإلا العام، وإلا base_price (سعر المنتج الحالي).
+    """
+    when = when or now_iso()
+    if customer_id:
+        special = customer_prices_at(customer_id, when).get(product_id)
+        if special is not None:
+            return special
+    return base_prices_at(when).get(product_id, float(base_price or 0.0))
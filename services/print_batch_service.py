@@ -0,0 +1,37 @@
+"""
+تجهيز طباعة دفعة فواتير (خط توزيع كامل / نهاية اليوم) بقراءات مجمّعة.
+
+الفواتير كلها في get_all واحد، ثم العملاء المميزون في get_all ثانٍ:
+100 فاتورة = round trip اثنان بدل doc_get("sales") + doc_get("customers") لكل فاتورة.
+العرض نفسه في components.printing.build_batch_print_html (مستند واحد).
+"""
+from firebase_config import db
+
+
+def _get_many(collection: str, ids) -> dict:
+    ids = [i for i in dict.fromkeys(ids or []) if i]
+    if not ids:
+        return {}
+    col = db.collection(collection)
+    out = {}
+    for snap in db.get_all([col.document(i) for i in ids]):
+        if snap.exists:
+            x = snap.to_dict() or {}
+            x["id"] = snap.id
+            out[snap.id] = x
+    return out
+
+
+def load_print_jobs(sale_ids: list, sales: dict = None) -> list:
+    """
+    sale_ids بترتيب الطباعة -> [(sale, customer)]. الفواتير غير الموجودة تُتخطّى.
+    sales: فواتير مقروءة مسبقاً (id -> dict، مثل نتائج الأرشيف) فلا تُقرأ مرة أخرى.
+    """
+    sale_ids = [sid for sid in dict.fromkeys(sale_ids or []) if sid]
+    sales = sales or {}
+    known = {sid: {**sales[sid], "id": sid} for sid in sale_ids if sid in sales}
+    known.update(_get_many("sales", [sid for sid in sale_ids if sid not in known]))
+
+    ordered = [known[sid] for sid in sale_ids if sid in known]
+    customers = _get_many("customers", [s.get("customer_id") for s in ordered])
+    return [(s, customers.get(s.get("customer_id") or "", {})) for s in ordered]
@@ -0,0 +1,241 @@
+"""
+بحث سريع في العملاء/المنتجات بتطبيع عربي، يُبنى مرة واحدة لكل نسخة كتالوج.
+
+    idx = catalog_index(session_catalog(st.session_state, "customers"))
+    idx.search("اسامه 0791")   # -> [customer_id, ...] مرتبة حسب الأفضلية
+
+- التطبيع: حذف التشكيل والتطويل، أ/إ/آ/ٱ -> ا، ة -> ه، ى/ئ -> ي، ؤ -> و،
+  الأرقام العربية/الفارسية -> 0-9، وأحرف صغيرة.
+- الهاتف يُفهرس أرقاماً فقط ("+962 79..." و"0079..." -> "079...").
+- كل كلمة في الاستعلام يجب أن تطابق (AND):
+  * 3 أحرف فأكثر: تقاطع قوائم trigram (الأصغر أولاً) ثم تحقق substring.
+  * حرف أو حرفان: بداية كلمة (فهرس prefix).
+- الترتيب: الاسم يبدأ بالاستعلام، ثم كلمة في الاسم تبدأ به، ثم أي تطابق؛
+  وبترتيب الكتالوج داخل كل مجموعة.
+- الفهرس يُعلّق على الـ CatalogSnapshot نفسه فيعيش ويموت معه (KEEP_VERSIONS)،
+  ويُعاد استخدامه لنسخة جديدة لم تتغيّر فيها حقول البحث.
+"""
+import re
+import threading
+
+# حقول البحث لكل نوع كتالوج؛ "phone" يُطبّع كأرقام
+KIND_FIELDS = {
+    "customers": ("name", "phone", "area"),
+    "products": ("name", "id"),
+}
+DEFAULT_LIMIT = 50
+# فاصل بين الحقول في النص المطبّع: لا يدخل في أي trigram
+_SEP = "\x1f"
+_PREFIX_LEN = 2
+# أكبر عدد نتائج يُرتّب بـ "كلمة في الاسم تبدأ بالاستعلام"؛ الأكثر بترتيب الكتالوج
+_RANK_SCAN = 2000
+_EMPTY = frozenset()
+
+_DIACRITICS = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+_PHONE_QUERY = re.compile(r"\+?[0-9][0-9 ]{5,}")
+_SPACES = re.compile(r"[\s\u061c\u200c-\u200f\-_/.,،؛:()]+")
+_TRANSLATE = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ة": "ه", "ى": "ي", "ئ": "ي", "ؤ": "و",
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06F0 + d): str(d) for d in range(10)},
+})
+
+_lock = threading.Lock()
+# (kind, بصمة الحقول) -> فهرس، لآخر النسخ المبنية (LRU صغير)
+_reuse = {}
+_REUSE_KEEP = 4
+
+
+def normalize_ar(text) -> str:
+    """
+    نص موحّد للبحث: بدون تشكيل، بحروف موحّدة ومسافات مفردة.
+    """
+    s = _DIACRITICS.sub("", str(text or "")).translate(_TRANSLATE).lower()
+    return _SPACES.sub(" ", s).strip()
+
+
+def normalize_phone(text) -> str:
+    digits = "".join(ch for ch in normalize_ar(text) if ch.isdigit())
+    for intl in ("00962", "962"):
+        if digits.startswith(intl) and len(digits) > len(intl) + 6:
+            return "0" + digits[len(intl):]
+    return digits
+
+
+def _grams(term: str):
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+class SearchIndex:
+    """
+    فهرس ثابت فوق صفوف (dict أو Record): ids + نص مطبّع + postings (frozenset)
+    لكل trigram ولكل بداية كلمة، فتقاطع الكلمات يتم داخل C وليس بحلقة بايثون.
+    """
+    __slots__ = ("ids", "_blobs", "_names", "_words", "_grams", "_prefixes", "_heads")
+
+    def __init__(self, rows, fields=("name",)):
+        ids, blobs, names, words = [], [], [], []
+        grams, prefixes, heads = {}, {}, {}
+        for row in rows:
+            rid = row.get("id") if hasattr(row, "get") else None
+            if not rid:
+                continue
+            parts = []
+            for f in fields:
+                v = row.get(f)
+                v = normalize_phone(v) if f == "phone" else normalize_ar(v)
+                if v:
+                    parts.append(v)
+            i = len(ids)
+            name = normalize_ar(row.get("name"))
+            ids.append(rid)
+            blobs.append(_SEP.join(parts))
+            names.append(name)
+            toks = tuple(t for p in parts for t in p.split(" ") if t)
+            words.append(toks)
+            for part in parts:
+                for g in _grams(part):
+                    if " " not in g:
+                        grams.setdefault(g, set()).add(i)
+            for t in toks:
+                for n in range(1, min(len(t), _PREFIX_LEN) + 1):
+                    prefixes.setdefault(t[:n], set()).add(i)
+            for n in range(1, min(len(name), _PREFIX_LEN) + 1):
+                heads.setdefault(name[:n], set()).add(i)
+        self.ids = tuple(ids)
+        self._blobs = tuple(blobs)
+        self._names = tuple(names)
+        self._words = tuple(words)
+        self._grams = {g: frozenset(v) for g, v in grams.items()}
+        self._prefixes = {p: frozenset(v) for p, v in prefixes.items()}
+        # أول حرفين من الاسم: مرشحو "الاسم يبدأ بالاستعلام" بدون المرور على كل النتائج
+        self._heads = {p: frozenset(v) for p, v in heads.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _postings(self, term: str) -> list:
+        if len(term) <= _PREFIX_LEN:
+            return [self._prefixes.get(term, _EMPTY)]
+        return [self._grams.get(g, _EMPTY) for g in _grams(term)]
+
+    def _matches(self, i: int, term: str) -> bool:
+        if len(term) <= _PREFIX_LEN:
+            return any(w.startswith(term) for w in self._words[i])
+        return term in self._blobs[i]
+
+    def _candidates(self, terms: list) -> frozenset:
+        """
+        تقاطع postings كل الكلمات (الأصغر أولاً). قد يحوي trigram غير متصلة، فالتحقق في search.
+        """
+        posts = sorted((p for t in terms for p in self._postings(t)), key=len)
+        out = posts[0] if posts else _EMPTY
+        for p in posts[1:]:
+            if not out:
+                break
+            out = out & p
+        return out
+
+    def _in_order(self, rows, within=_EMPTY):
+        """
+        أرقام صفوف rows (وفي within إن أُعطيت) بترتيب الكتالوج، بكسل وبدون بناء
+        مجموعة جديدة: المجموعة الكبيرة تُمسح بـ range (توقف مبكر بعد limit) بدل
+        ترتيب آلاف الأرقام.
+        """
+        small, big = rows, within
+        if within and len(within) < len(rows):
+            small, big = within, rows
+        n = len(self.ids)
+        if len(small) * 8 > n:
+            it = (i for i in range(n) if i in small)
+        else:
+            it = iter(sorted(small))
+        return (i for i in it if i in big) if within else it
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> list:
+        """
+        ids المطابقة لكل كلمات الاستعلام، الأفضل أولاً (حتى limit).
+        """
+        q = normalize_ar(query)
+        if _PHONE_QUERY.fullmatch(q):
+            # "+962 79 123 4567" رقم واحد وليس أربع كلمات
+            terms = [normalize_phone(q)]
+        else:
+            terms = [normalize_phone(t) if t.isdigit() else t for t in q.split(" ") if t]
+        terms = [t for t in terms if t]
+        if not terms or limit <= 0:
+            return []
+        cands = self._candidates(terms)
+        if not cands:
+            return []
+
+        blobs, names = self._blobs, self._names
+        long_terms = [t for t in terms if len(t) > _PREFIX_LEN]
+
+        def ok(i):
+            return all(t in blobs[i] for t in long_terms)
+
+        # 1) الاسم يبدأ بالاستعلام
+        out = []
+        heads = self._heads.get(q[:_PREFIX_LEN], _EMPTY)
+        if heads:
+            for i in self._in_order(heads, cands):
+                if names[i].startswith(q) and ok(i):
+                    out.append(i)
+                    if len(out) >= limit:
+                        return [self.ids[i] for i in out]
+
+        # 2) كلمة في الاسم تبدأ بأول كلمة، 3) أي تطابق — بترتيب الكتالوج
+        taken = set(out)
+        word = " " + terms[0]
+        words, others, scanned = [], [], 0
+        for i in self._in_order(cands):
+            if i in taken or not ok(i):
+                continue
+            if word in " " + names[i]:
+                words.append(i)
+                if len(out) + len(words) >= limit:
+                    break
+            elif len(others) < limit:
+                others.append(i)
+            scanned += 1
+            if scanned >= _RANK_SCAN and len(out) + len(words) + len(others) >= limit:
+                break
+        out += words
+        out += others
+        return [self.ids[i] for i in out[:limit]]
+
+
+def _fingerprint(items, fields) -> int:
+    return hash(tuple((r.id, *(r.get(f) for f in fields)) for r in items))
+
+
+def catalog_index(snap) -> SearchIndex:
+    """
+    فهرس نسخة الكتالوج (يُبنى مرة ويُحفظ على الـ snapshot). نسخة جديدة بنفس
+    الأسماء/الهواتف/المناطق (تغيّر الرصيد فقط بعد بيع أو تحصيل) تأخذ الفهرس السابق.
+    """
+    idx = snap.search
+    if idx is not None:
+        return idx
+    fields = KIND_FIELDS.get(snap.kind, ("name",))
+    with _lock:
+        if snap.search is None:
+            key = (snap.kind, _fingerprint(snap.items, fields))
+            idx = _reuse.pop(key, None) or SearchIndex(snap.items, fields)
+            _reuse[key] = idx
+            while len(_reuse) > _REUSE_KEEP:
+                _reuse.pop(next(iter(_reuse)))
+            object.__setattr__(snap, "search", idx)
+        return snap.search
+
+
+def search_rows(rows, query: str, fields=("name",), limit: int = None) -> list:
+    """
+    بحث لمرة واحدة في قائمة صغيرة غير مخزّنة (مثل المواد الخام): الصفوف المطابقة بترتيب الأفضلية.
+    """
+    rows = list(rows)
+    idx = SearchIndex(rows, fields)
+    by_id = {r.get("id"): r for r in rows}
+    return [by_id[i] for i in idx.search(query, limit=limit or len(rows) or 1)]
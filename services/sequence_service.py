@@ -0,0 +1,96 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+from firebase_config import db, transactional
+
+from utils.helpers import now_iso, to_int
+
+TZ = timezone(timedelta(hours=3))
+
+# كل عملية (process) تحجز مجال أرقام مرة واحدة ثم توزعه محلياً بدون أي قراءة إضافية.
+# الأرقام غير المستخدمة من المجال تضيع عند إعادة التشغيل (فجوات مقبولة).
+BLOCK_SIZE = 50
+
+_lock = threading.Lock()
+_blocks = {}  # counter name -> [next, end)
+
+
+@transactional
+def _tx_lease_block(transaction, name: str, size: int):
+    ref = db.collection("counters").document(name)
+    snap = ref.get(transaction=transaction)
+    data = (snap.to_dict() or {}) if snap.exists else {}
+
+    start = max(1, to_int(data.get("next", 1), 1))
+    end = start + int(size)
+
+    transaction.set(ref, {
+        "name": name,
+        "next": end,
+        "block_size": int(size),
+        "updated_at": now_iso(),
+    }, merge=True)
+    return start, end
+
+
+def _lease_block(name: str, size: int):
+    return _tx_lease_block(db.transaction(), name, size)
+
+
+def next_numbers(name: str, count: int = 1, block_size: int = BLOCK_SIZE) -> list[int]:
+    """
+    يرجع count أرقام متزايدة من العدّاد name.
+    Round trip واحد فقط عند انتهاء المجال المحجوز محلياً.
+    """
+    out = []
+    with _lock:
+        while len(out) < int(count):
+            cur = _blocks.get(name)
+            if not cur or cur[0] >= cur[1]:
+                need = int(count) - len(out)
+                start, end = _lease_block(name, max(int(block_size), need))
+                cur = _blocks[name] = [start, end]
+
+            take = min(cur[1] - cur[0], int(count) - len(out))
+            out.extend(range(cur[0], cur[0] + take))
+            cur[0] += take
+    return out
+
+
+def _invoice_counter_name(year: int) -> str:
+    return f"invoice_{int(year)}"
+
+
+def format_invoice_no(year: int, n: int) -> str:
+    return f"INV-{int(year)}-{int(n):06d}"
+
+
+def next_invoice_nos(count: int = 1, when: datetime = None) -> list[str]:
+    """
+    أرقام فواتير تسلسلية لكل سنة: INV-2026-000123
+    """
+    year = (when or datetime.now(TZ)).year
+    return [format_invoice_no(year, n) for n in next_numbers(_invoice_counter_name(year), count)]
+
+
+def next_invoice_no(when: datetime = None) -> str:
+    return next_invoice_nos(1, when=when)[0]
+
+
+def normalize_invoice_query(q: str, when: datetime = None) -> str:
+    """
+    يسمح بالبحث برقم قصير: "123" -> INV-<السنة الحالية>-000123
+    و "2025-123" -> INV-2025-000123 ، وغير ذلك يرجع كما هو.
+    """
+    q = (q or "").strip()
+    if not q:
+        return ""
+
+    if q.isdigit():
+        return format_invoice_no((when or datetime.now(TZ)).year, int(q))
+
+    parts = q.upper().replace("INV-", "").split("-")
+    if len(parts) == 2 and all(p.isdigit() for p in parts) and len(parts[0]) == 4:
+        return format_invoice_no(int(parts[0]), int(parts[1]))
+
+    return q
@@ -0,0 +1,359 @@
+"""
+كشف حساب العميل: الاستعلامات + بناء الحركات والرصيد التراكمي.
+
+الفواتير تُحمّل كسجلات Sale (services.models) فالتحويل الرقمي يتم مرة واحدة
+عند التحميل، وحلقة البناء تقرأ attributes فقط.
+
+load_statement(customer) يحفظ الكشف لكل عميل حتى أول publish لنفس العميل
+(= نسخة الدفتر)، ومعه إطار عمودي تتم عليه الفلترة/البحث/المجاميع vectorized.
+"""
+import threading
+
+from firebase_config import db
+from utils.money import FILS_PER_JOD, fils_key, from_fils, read_fils
+from services.cache_bus import customer_tag, keyed_cache
+from services.models import Sale
+
+
+def _safe_created_at(x: dict):
+    return x.get("created_at") or ""
+
+
+# ---------------------------
+# Statement queries (no composite index)
+# ---------------------------
+# الكشف لا يحتاج items (أكبر جزء في مستند الفاتورة)
+_STATEMENT_SALE_MONEY = ["total", "net", "amount_paid", "unpaid_debt", "extra_credit"]
+_STATEMENT_SALE_FIELDS = [
+    "active", "status", "payment_type", "invoice_no", "created_at",
+    *_STATEMENT_SALE_MONEY,
+    *(fils_key(f) for f in _STATEMENT_SALE_MONEY),
+]
+
+
+def _get_customer_sales(customer_id: str, limit=300):
+    """
+    استعلام واحد للفواتير ثم تقسيمها (ذمم / نقدي) بدل قراءة نفس المستندات مرتين.
+    """
+    docs = (
+        db.collection("sales")
+        .where("customer_id", "==", customer_id)
+        .select(_STATEMENT_SALE_FIELDS)
+        .limit(limit)
+        .stream()
+    )
+    credit, cash = [], []
+    for d in docs:
+        x = d.to_dict() or {}
+        if x.get("active") is not True:
+            continue
+        if x.get("status") not in ["posted", "done"]:
+            continue
+        ptype = x.get("payment_type")
+        if ptype == "credit":
+            credit.append(Sale.from_dict(x, d.id))
+        elif ptype == "cash":
+            cash.append(Sale.from_dict(x, d.id))
+    return credit, cash
+
+
+def _get_customer_collections(customer_id: str, limit=300):
+    docs = db.collection("collections").where("customer_id", "==", customer_id).limit(limit).stream()
+    out = []
+    for d in docs:
+        x = d.to_dict() or {}
+        if x.get("active") is not True:
+            continue
+        if x.get("status") not in ["posted", "done"]:
+            continue
+        out.append({"id": d.id, **x})
+    return out
+
+def _get_customer_credit_returns(customer_id: str, limit=300):
+    docs = db.collection("returns").where("customer_id", "==", customer_id).limit(limit).stream()
+    out = []
+    for d in docs:
+        x = d.to_dict() or {}
+        if x.get("active") is not True:
+            continue
+        if x.get("status") not in ["posted", "done"]:
+            continue
+        if x.get("settlement") != "credit_note":
+            continue
+        out.append({"id": d.id, **x})
+    return out
+
+def _opening_fils(customer: dict) -> int:
+    if "opening_balance" not in customer and "balance" in customer:
+        return read_fils(customer, "balance")
+    return read_fils(customer, "opening_balance")
+
+
+def _statement_moves(customer: dict):
+    """
+    الحركات مرتبة زمنياً (كل المبالغ فلس) + مصادرها.
+    """
+    cid = customer["id"]
+    opening = _opening_fils(customer)
+
+    sales_credit, sales_cash = _get_customer_sales(cid)
+    cols = _get_customer_collections(cid)
+    rets = _get_customer_credit_returns(cid)
+
+    # كل المبالغ في moves أعداد صحيحة بالفلس
+    moves = []
+    moves.append({
+        "created_at": customer.get("created_at", ""),
+        "type": "opening",
+        "ref": "opening_balance",
+        "delta": opening,     # أثر على الرصيد
+        "net": opening,
+        "paid": 0,
+        "unpaid": 0,
+        "extra": 0,
+        "note": "دين سابق / رصيد افتتاحي",
+    })
+
+    # ✅ مبيعات ذمم (آجل): أثر الرصيد = +net
+    for s in sales_credit:
+        net = s.net_fils
+        moves.append({
+            "created_at": s.created_at,
+            "type": "sale_credit",
+            "ref": f"SALE:{s.id}",
+            "delta": +net,
+            "net": net,
+            "paid": 0,
+            "unpaid": net,
+            "extra": 0,
+            "note": "فاتورة ذمم (آجل)",
+        })
+
+    # ✅ مبيعات نقدي: تظهر بالحركات + أثر الرصيد = unpaid_debt - extra_credit
+    for s in sales_cash:
+        unpaid = s.unpaid_debt_fils
+        extra = s.extra_credit_fils
+
+        note = "فاتورة نقدي"
+        if unpaid > 0:
+            note = "فاتورة نقدي (دفع جزئي + ذمم متبقي)"
+        elif extra > 0:
+            note = "فاتورة نقدي (زيادة كرصد للعميل)"
+
+        moves.append({
+            "created_at": s.created_at,
+            "type": "sale_cash",
+            "ref": f"SALE:{s.id}",
+            "delta": s.balance_delta_fils,  # unpaid - extra: هذا اللي يأثر على الرصيد
+            "net": s.net_fils,
+            "paid": s.amount_paid_fils,
+            "unpaid": unpaid,
+            "extra": extra,
+            "note": note,
+        })
+
+    # ✅ التحصيلات: تقلل الرصيد (سداد)
+    for c in cols:
+        amt = read_fils(c, "amount")
+        moves.append({
+            "created_at": _safe_created_at(c),
+            "type": "collection",
+            "ref": f"COL:{c.get('id','')}",
+            "delta": -amt,
+            "net": 0,
+            "paid": amt,
+            "unpaid": 0,
+            "extra": 0,
+            "note": "تحصيل / سند قبض",
+        })
+
+    # ✅ المرتجعات (خصم دين)
+    for r in rets:
+        tot = read_fils(r, "total")
+        moves.append({
+            "created_at": _safe_created_at(r),
+            "type": "return_credit",
+            "ref": f"RET:{r.get('id','')}",
+            "delta": -tot,
+            "net": 0,
+            "paid": 0,
+            "unpaid": 0,
+            "extra": 0,
+            "note": "مرتجع (خصم دين)",
+        })
+
+    moves.sort(key=lambda m: m.get("created_at") or "")
+    return moves, sales_credit, sales_cash, cols, rets
+
+
+def _statement_rows(moves: list):
+    # الرصيد التراكمي جمع أعداد صحيحة: لا انحراف مهما طال الكشف
+    running = 0
+    rows = []
+    for m in moves:
+        delta = m["delta"]
+        running += delta
+        m["balance"] = running
+
+        rows.append({
+            "التاريخ": (m["created_at"] or "")[:19].replace("T", " "),
+            "النوع": m["note"],
+            "المرجع": m["ref"],
+            "الصافي": from_fils(m["net"]),
+            "المدفوع": from_fils(m["paid"]),
+            "متبقي ذمم": from_fils(m["unpaid"]),
+            "زيادة كرصد": from_fils(m["extra"]),
+            "أثر على الرصيد": from_fils(delta),
+            "الرصيد بعد العملية": from_fils(running),
+        })
+    return rows, running
+
+
+def build_statement(customer: dict):
+    moves, sales_credit, sales_cash, cols, rets = _statement_moves(customer)
+    rows, running = _statement_rows(moves)
+
+    # نرجع نفس المخرجات + نضيف cash_sales بدون ما نكسر شيء
+    # sales_credit / sales_cash: قوائم Sale (s.net ، s.net_fils ...)
+    return rows, from_fils(running), sales_credit, sales_cash, cols, rets
+
+
+# ---------------------------
+# Statement frame (memoized per customer + ledger version)
+# ---------------------------
+# رمز النوع -> اسم الفلتر في الواجهة
+STATEMENT_KINDS = {
+    "sale_credit": "ذمم",
+    "sale_cash": "نقدي",
+    "collection": "تحصيل",
+    "return_credit": "مرتجع",
+    "opening": "افتتاحي",
+}
+# أعمدة الفلس في الإطار -> عنوان العرض (نفس أعمدة rows)
+_FRAME_MONEY = (
+    ("net", "الصافي"),
+    ("paid", "المدفوع"),
+    ("unpaid", "متبقي ذمم"),
+    ("extra", "زيادة كرصد"),
+    ("delta", "أثر على الرصيد"),
+    ("balance", "الرصيد بعد العملية"),
+)
+_SUM_COLS = [col for col, _ in _FRAME_MONEY if col != "balance"]
+STATEMENT_COLUMNS = ("التاريخ", "النوع", "المرجع", *(label for _, label in _FRAME_MONEY))
+# نتائج فلترة محفوظة لكل كشف (تبديل ذهاباً وإياباً بين الفلاتر بدون إعادة حساب)
+_VIEW_CACHE = 32
+
+
+class Statement:
+    """
+    كشف عميل واحد لنسخة دفتر واحدة: rows للطباعة/PDF كما كانت، و frame عمودي
+    (pandas، يُبنى عند أول فلترة) بعمود type حقيقي بدل مطابقة نص "النوع".
+    لا يُعدّل بعد البناء: يُشارك بين الجلسات عبر الكاش.
+    """
+    __slots__ = ("customer_id", "rows", "final_balance", "sales_credit", "sales_cash", "cols", "rets",
+                 "_moves", "_frame", "_views", "_lock")
+
+    def __init__(self, customer_id: str, moves: list, rows: list, running: int, sales_credit, sales_cash, cols, rets):
+        self.customer_id = customer_id
+        self.rows = rows
+        self.final_balance = from_fils(running)
+        self.sales_credit = sales_credit
+        self.sales_cash = sales_cash
+        self.cols = cols
+        self.rets = rets
+        self._moves = moves
+        self._frame = None
+        self._views = {}
+        self._lock = threading.Lock()
+
+    @property
+    def frame(self):
+        """
+        DataFrame مرتب زمنياً: type (category)، أعمدة فلس int64، أعمدة العرض،
+        و _text (تاريخ + نوع + مرجع بأحرف صغيرة) للبحث.
+        """
+        with self._lock:
+            if self._frame is None:
+                self._frame = _build_frame(self._moves, self.rows)
+            return self._frame
+
+    def view(self, kind: str = "", query: str = "", newest_first: bool = True, limit: int = None):
+        """
+        (الصفوف المعروضة بأعمدة العرض، عدد المطابق قبل الحد، مجاميع كل نوع في المطابق).
+        kind: رمز من STATEMENT_KINDS أو "" للكل.
+        """
+        key = (kind or "", (query or "").strip().lower(), bool(newest_first), limit)
+        cached = self._views.get(key)
+        if cached is not None:
+            return cached
+
+        df = self.frame
+        mask = None
+        if key[0]:
+            mask = df["type"] == key[0]
+        if key[1]:
+            hit = df["_text"].str.contains(key[1], regex=False)
+            mask = hit if mask is None else (mask & hit)
+        sel = df if mask is None else df[mask]
+        matched = len(sel)
+
+        # الإطار مرتب تصاعدياً مسبقاً: الأحدث أولاً = عكس الترتيب، بدون sort
+        shown = sel.iloc[::-1] if newest_first else sel
+        if limit:
+            shown = shown.iloc[:int(limit)]
+
+        # مجاميع كل نوع (بالفلس ثم تحويل): الرصيد التراكمي لا يُجمع
+        sums = sel.groupby("type", observed=True)[_SUM_COLS].sum()
+        counts = sel["type"].value_counts(sort=False)
+        subtotals = {}
+        for code, row in sums.iterrows():
+            sub = {label: from_fils(int(row[col])) for col, label in _FRAME_MONEY if col in _SUM_COLS}
+            sub["عدد"] = int(counts.get(code, 0))
+            subtotals[code] = sub
+
+        out = (shown.loc[:, list(STATEMENT_COLUMNS)], matched, subtotals)
+        with self._lock:
+            if len(self._views) >= _VIEW_CACHE:
+                self._views.pop(next(iter(self._views)))
+            self._views[key] = out
+        return out
+
+
+def _build_frame(moves: list, rows: list):
+    import pandas as pd
+
+    data = {
+        "type": pd.Categorical([m["type"] for m in moves], categories=list(STATEMENT_KINDS)),
+        "created_at": [m["created_at"] or "" for m in moves],
+    }
+    for col, _ in _FRAME_MONEY:
+        data[col] = pd.array([m[col] for m in moves], dtype="int64")
+    df = pd.DataFrame(data)
+    for col, label in _FRAME_MONEY:
+        df[label] = df[col] / FILS_PER_JOD
+    df["التاريخ"] = [r["التاريخ"] for r in rows]
+    df["النوع"] = [r["النوع"] for r in rows]
+    df["المرجع"] = [r["المرجع"] for r in rows]
+    df["_text"] = (df["التاريخ"] + " " + df["النوع"] + " " + df["المرجع"]).str.lower()
+    return df
+
+
+def _statement_tags(customer_id: str, **_):
+    return [customer_tag(customer_id)]
+
+
+@keyed_cache(ttl=120, tags=_statement_tags, copy_result=False)
+def _cached_statement(customer_id: str, opening_fils: int, created_at: str) -> Statement:
+    customer = {"id": customer_id, "opening_balance_fils": opening_fils, "opening_balance": from_fils(opening_fils),
+                "created_at": created_at}
+    moves, sales_credit, sales_cash, cols, rets = _statement_moves(customer)
+    rows, running = _statement_rows(moves)
+    return Statement(customer_id, moves, rows, running, sales_credit, sales_cash, cols, rets)
+
+
+def load_statement(customer: dict) -> Statement:
+    """
+    الكشف المحفوظ للعميل حتى أول publish(customer_id=...) (فاتورة/تحصيل/مرتجع/تعديل)،
+    فتغيير الفلاتر والبحث لا يعيد القراءة من Firestore ولا البناء.
+    """
+    return _cached_statement(customer["id"], _opening_fils(customer), customer.get("created_at", "") or "")
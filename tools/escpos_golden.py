@@ -0,0 +1,101 @@
+"""
+مقارنة ناتج الطباعة الحرارية (components/escpos) مع ملفات golden محفوظة.
+
+    python tools/escpos_golden.py            # مقارنة (exit 1 عند أي اختلاف)
+    python tools/escpos_golden.py --update   # إعادة توليد الملفات بعد تغيير مقصود
+
+وضع text فقط وبدون شعار: الناتج لا يعتمد على Pillow أو الخطوط المثبتة، فأي
+اختلاف في البايتات = تغيير فعلي في التشكيل/الترتيب/الأوامر. الملفات في
+tools/golden/escpos/*.bin ويمكن إرسالها لطابعة حقيقية للمعاينة:
+    nc PRINTER_IP 9100 < tools/golden/escpos/invoice_80mm.bin
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.escpos import (  # noqa: E402
+    render_invoice_escpos,
+    render_receipt_escpos,
+    render_statement_escpos,
+)
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden", "escpos")
+
+CUSTOMER = {"id": "c1", "name": "بقالة الأمل (فرع ٢)", "phone": "0790000000", "balance": 42.5}
+
+SALE = {
+    "id": "s1", "invoice_no": "INV-2026-000123", "customer_id": "c1", "customer_name": "بقالة الأمل (فرع ٢)",
+    "distributor_name": "أبو خالد", "payment_type": "cash", "status": "done",
+    "total": 27.5, "discount": 0.5, "amount_paid": 20.0, "unpaid_debt": 7.0, "old_debt_paid": 5.0,
+    "final_due": 44.5, "created_at": "2026-03-01T08:00:00+03:00", "delivered_at": "2026-03-01T09:15:00+03:00",
+    "items": [
+        {"product_name": "خبز عربي كبير", "qty": 20, "price": 0.35, "total": 7.0},
+        {"product_name": "كعك بالسمسم", "qty": 15, "price": 0.5, "total": 7.5},
+        {"product_name": "صمون لبناني طويل جداً للاختبار", "qty": 40, "price": 0.25, "total": 10.0},
+        {"product_name": "Croissant 50g", "qty": 10, "price": 0.3, "total": 3.0},
+    ],
+}
+
+STATEMENT_SALES = [
+    {**SALE, "id": f"s{i}", "invoice_no": f"INV-2026-{100 + i:06d}", "payment_type": ("cash", "credit")[i % 2],
+     "net": 10.0 + i, "delivered_at": f"2026-03-{1 + i:02d}T09:00:00+03:00"}
+    for i in range(6)
+]
+
+CASES = {
+    "invoice_80mm": lambda: render_invoice_escpos(SALE, CUSTOMER, paper="80mm", logo=False),
+    "invoice_58mm": lambda: render_invoice_escpos(SALE, CUSTOMER, paper="58mm", logo=False),
+    "receipt_80mm": lambda: render_receipt_escpos(SALE, CUSTOMER, paper="80mm", logo=False),
+    "statement_80mm": lambda: render_statement_escpos(CUSTOMER, STATEMENT_SALES, paper="80mm",
+                                                      printed_at="2026-03-07 18:00:00", logo=False),
+}
+
+
+def _first_diff(a: bytes, b: bytes) -> int:
+    for i, (x, y) in enumerate(zip(a, b)):
+        if x != y:
+            return i
+    return min(len(a), len(b))
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--update", action="store_true")
+    args = ap.parse_args(argv)
+
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    failures = 0
+    for name, render in CASES.items():
+        data = render()
+        path = os.path.join(GOLDEN_DIR, f"{name}.bin")
+        if args.update:
+            with open(path, "wb") as f:
+                f.write(data)
+            print(f"  wrote {name} ({len(data)} bytes)")
+            continue
+        try:
+            with open(path, "rb") as f:
+                expected = f.read()
+        except OSError:
+            print(f"  FAIL {name}: لا يوجد ملف golden (شغّل --update)")
+            failures += 1
+            continue
+        if data == expected:
+            print(f"  ok   {name} ({len(data)} bytes)")
+            continue
+        at = _first_diff(data, expected)
+        line = expected[:at].count(b"\n") + 1
+        print(f"  FAIL {name}: أول اختلاف عند البايت {at} (السطر {line}); "
+              f"{len(data)} bytes مقابل {len(expected)}")
+        failures += 1
+
+    if not args.update:
+        print()
+        print("all golden files match" if not failures else f"{failures} mismatch(es)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
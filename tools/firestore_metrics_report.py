@@ -0,0 +1,121 @@
+"""
+تقرير تكلفة Firestore لكل صفحة من سجل logs/firestore_metrics.jsonl
+(يُكتب فقط مع BAWADI_METRICS_LOG=1 أو مسار صريح؛ النسخة المدوّرة <path>.1 تُقرأ أيضاً).
+
+    python tools/firestore_metrics_report.py
+    python tools/firestore_metrics_report.py --page customers --sites 10
+    python tools/firestore_metrics_report.py --since-hours 24 --json
+
+لكل صفحة: عدد الـ reruns و p50/p95 للقراءات والكتابات والاستعلامات وإعادة
+المحاولة وزمن Firestore وزمن الصفحة، ثم أكثر مواضع الاستعلام قراءةً.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.firestore_metrics import DEFAULT_LOG_PATH, LOG_PATH, metrics_summary  # noqa: E402
+
+
+def load_records(path: str, since_hours: float = 0.0, page: str = "") -> list[dict]:
+    cutoff = time.time() - since_hours * 3600.0 if since_hours else 0.0
+    out = []
+    paths = [p for p in (path + ".1", path) if os.path.exists(p)] or [path]
+    for p in paths:
+        with open(p, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    continue
+                if cutoff and float(r.get("ts", 0) or 0) < cutoff:
+                    continue
+                if page and r.get("page") != page:
+                    continue
+                out.append(r)
+    return out
+
+
+def top_sites(records: list[dict], n: int) -> dict:
+    """
+    لكل صفحة: المواضع الأعلى قراءةً (متوسط لكل rerun).
+    """
+    by_page = {}
+    for r in records:
+        p = by_page.setdefault(r.get("page") or "?", {"reruns": 0, "sites": {}})
+        p["reruns"] += 1
+        for site, x in (r.get("sites") or {}).items():
+            s = p["sites"].setdefault(site, {"calls": 0, "reads": 0, "writes": 0, "ms": 0.0})
+            for k in s:
+                s[k] += x.get(k, 0) or 0
+
+    out = {}
+    for page, p in sorted(by_page.items()):
+        k = max(1, p["reruns"])
+        rows = [
+            {
+                "site": site,
+                "reads_per_rerun": s["reads"] / k,
+                "writes_per_rerun": s["writes"] / k,
+                "calls_per_rerun": s["calls"] / k,
+                "ms_per_rerun": s["ms"] / k,
+            }
+            for site, s in p["sites"].items()
+        ]
+        rows.sort(key=lambda x: (x["reads_per_rerun"] + x["writes_per_rerun"], x["ms_per_rerun"]), reverse=True)
+        out[page] = rows[:n]
+    return out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("log", nargs="?", default=LOG_PATH or DEFAULT_LOG_PATH)
+    ap.add_argument("--page", default="")
+    ap.add_argument("--since-hours", type=float, default=0.0)
+    ap.add_argument("--sites", type=int, default=5, help="عدد المواضع لكل صفحة (0 = بدون)")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    if not os.path.exists(args.log):
+        print(f"no metrics log at {args.log}", file=sys.stderr)
+        return 1
+
+    records = load_records(args.log, args.since_hours, args.page)
+    summary = metrics_summary(records)
+    sites = top_sites(records, args.sites) if args.sites else {}
+
+    if args.json:
+        print(json.dumps({"pages": summary, "sites": sites}, ensure_ascii=False, indent=2))
+        return 0
+
+    if not summary:
+        print("no reruns recorded")
+        return 0
+
+    print(f"{'page':<16}{'reruns':>7}{'reads p50':>11}{'p95':>7}{'writes p50':>12}{'p95':>7}"
+          f"{'retries p95':>13}{'fs ms p50':>11}{'p95':>8}{'wall p50':>10}{'p95':>8}")
+    for page, r in summary.items():
+        print(f"{page:<16}{r['reruns']:>7}{r['reads_p50']:>11.0f}{r['reads_p95']:>7.0f}"
+              f"{r['writes_p50']:>12.0f}{r['writes_p95']:>7.0f}{r['tx_retries_p95']:>13.0f}"
+              f"{r['firestore_ms_p50']:>11.1f}{r['firestore_ms_p95']:>8.1f}"
+              f"{r['wall_ms_p50']:>10.1f}{r['wall_ms_p95']:>8.1f}")
+
+    for page, rows in sites.items():
+        if not rows:
+            continue
+        print()
+        print(f"[{page}] top sites (per rerun)")
+        for x in rows:
+            print(f"  {x['reads_per_rerun']:>8.1f} reads {x['writes_per_rerun']:>6.1f} writes "
+                  f"{x['ms_per_rerun']:>8.1f} ms  {x['site']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
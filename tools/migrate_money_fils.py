@@ -0,0 +1,135 @@
+"""
+تعبئة حقول المبالغ بالفلس (<field>_fils) بجانب الحقول القديمة float.
+
+لا يغيّر الحقول القديمة؛ يكتب فقط _fils الناقصة أو التي لا تطابق الـ float
+(كاتب قديم حدّث الـ float فقط). آمن للتشغيل أكثر من مرة.
+
+    python tools/migrate_money_fils.py --dry-run
+    python tools/migrate_money_fils.py
+    python tools/migrate_money_fils.py --collections customers sales --batch-size 300
+
+على البديل المحلي: BAWADI_BACKEND=local python tools/migrate_money_fils.py
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firebase_config import db  # noqa: E402
+from utils.money import MONEY_FIELDS, fils_consistent, fils_key, to_fils  # noqa: E402
+
+# أقل من حد 500 كتابة لكل batch
+DEFAULT_BATCH_SIZE = 400
+
+# أصناف الفاتورة (items[]) لها مبالغ أيضاً
+SALE_ITEM_MONEY = ("price", "total")
+
+
+def _needs(data: dict, name: str):
+    """
+    يرجع قيمة _fils المطلوبة أو None إن كان الحقل سليماً / غير موجود.
+    """
+    value = data.get(name)
+    if value is None or value == "" or isinstance(value, bool):
+        return None
+    want = to_fils(value)
+    cur = data.get(fils_key(name))
+    if cur is not None:
+        try:
+            if int(cur) == want or fils_consistent(int(cur), value):
+                return None
+        except Exception:
+            pass
+    return want
+
+
+def doc_updates(collection: str, data: dict) -> tuple[dict, int]:
+    """
+    (الحقول المطلوب كتابتها، عدد الحقول التي كانت موجودة لكن لا تطابق).
+    """
+    updates = {}
+    mismatched = 0
+    for name in MONEY_FIELDS.get(collection, ()):
+        want = _needs(data, name)
+        if want is None:
+            continue
+        if data.get(fils_key(name)) is not None:
+            mismatched += 1
+        updates[fils_key(name)] = want
+
+    if collection == "sales" and isinstance(data.get("items"), list):
+        items = data["items"]
+        new_items = []
+        changed = False
+        for it in items:
+            if not isinstance(it, dict):
+                new_items.append(it)
+                continue
+            extra = {}
+            for name in SALE_ITEM_MONEY:
+                want = _needs(it, name)
+                if want is not None:
+                    extra[fils_key(name)] = want
+            if extra:
+                changed = True
+                it = {**it, **extra}
+            new_items.append(it)
+        if changed:
+            updates["items"] = new_items
+    return updates, mismatched
+
+
+def migrate_collection(collection: str, batch_size: int, dry_run: bool) -> dict:
+    stats = {"scanned": 0, "updated": 0, "fields": 0, "mismatched": 0, "commits": 0}
+    batch, ops = db.batch(), 0
+
+    for d in db.collection(collection).stream():
+        stats["scanned"] += 1
+        updates, mismatched = doc_updates(collection, d.to_dict() or {})
+        if not updates:
+            continue
+        stats["updated"] += 1
+        stats["fields"] += len(updates)
+        stats["mismatched"] += mismatched
+        if dry_run:
+            continue
+
+        batch.update(d.reference, updates)
+        ops += 1
+        if ops >= batch_size:
+            batch.commit()
+            stats["commits"] += 1
+            batch, ops = db.batch(), 0
+
+    if ops and not dry_run:
+        batch.commit()
+        stats["commits"] += 1
+    return stats
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--collections", nargs="*", default=list(MONEY_FIELDS), choices=list(MONEY_FIELDS))
+    ap.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    ap.add_argument("--dry-run", action="store_true", help="عدّ فقط بدون كتابة")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    batch_size = max(1, min(int(args.batch_size), 450))
+    result = {c: migrate_collection(c, batch_size, args.dry_run) for c in args.collections}
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        mode = "dry-run" if args.dry_run else "write"
+        print(f"money fils backfill ({mode})")
+        for c, st in result.items():
+            print(f"  {c:<24} scanned {st['scanned']:>7}  updated {st['updated']:>7}  "
+                  f"fields {st['fields']:>7}  mismatched {st['mismatched']:>5}  commits {st['commits']:>4}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+محاكاة انقطاع الشبكة أثناء التسليم / تسديد الذمم ثم إعادة الإرسال من الطابور.
+
+يعمل على البديل المحلي (BAWADI_BACKEND=local) بدون Firebase:
+    python tools/offline_replay_harness.py
+
+يتحقق أن كل عملية تُطبّق مرة واحدة بالضبط مهما تكررت الإعادة، بما فيها
+أسوأ حالة: الكتابة وصلت للسيرفر لكن الرد ضاع (after_commit).
+"""
+import os
+import sys
+
+os.environ["BAWADI_BACKEND"] = "local"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firebase_config import db  # noqa: E402
+from services.orders_service import deliver_sale  # noqa: E402
+from services.payments_service import pay_customer_debt  # noqa: E402
+from services.offline_queue_service import (  # noqa: E402
+    is_connectivity_error,
+    make_debt_payment_op,
+    make_deliver_op,
+    replay_operations,
+)
+from services.idempotency_service import new_idempotency_key  # noqa: E402
+
+USER = {"username": "driver1", "role": "distributor"}
+OTHER = {"username": "driver2", "role": "distributor"}
+
+_failures = []
+
+
+def check(cond: bool, msg: str):
+    print(("  ok   " if cond else "  FAIL ") + msg)
+    if not cond:
+        _failures.append(msg)
+
+
+def seed():
+    db.reset()
+    db.collection("customers").document("c1").set({"name": "بقالة الأمل", "balance": 100.0, "active": True})
+    db.collection("customers").document("c2").set({"name": "سوبرماركت النور", "balance": 0.0, "active": True})
+    for i in range(1, 31):
+        cid = "c1" if i % 2 else "c2"
+        db.collection("sales").document(f"s{i}").set({
+            "invoice_no": f"INV-2026-{i:06d}",
+            "customer_id": cid,
+            "customer_name": cid,
+            "status": "prepared",
+            "net": 10.0,
+            "active": True,
+            "distributor_id": "driver1",
+            "distributor_name": "driver1",
+        })
+
+
+def balance(cid: str) -> float:
+    return float(db.collection("customers").document(cid).get().to_dict()["balance"])
+
+
+def moves_for(cid: str) -> int:
+    return sum(1 for m in db.dump("customer_balance_moves").values() if m.get("customer_id") == cid)
+
+
+def submit(fn, op):
+    """
+    نفس سلوك الصفحة: التنفيذ المباشر، وعند خطأ اتصال تُضاف العملية للطابور.
+    """
+    try:
+        fn()
+        return None
+    except Exception as e:
+        if not is_connectivity_error(e):
+            raise
+        return op
+
+
+def scenario_drop_before_commit():
+    print("1) انقطاع قبل الحفظ → إعادة من الطابور")
+    seed()
+    db.fail_next(1, "before_commit")
+    op = submit(
+        lambda: deliver_sale("s1", "credit", 0, 0, USER, idempotency_key="deliver:s1"),
+        make_deliver_op("s1", "credit", 0, 0, user=USER),
+    )
+    check(op is not None, "العملية حُفظت في الطابور")
+    check(db.dump("sales")["s1"]["status"] == "prepared", "لم يُطبّق شيء قبل الإعادة")
+
+    res = replay_operations([op], USER)
+    check(res[0]["status"] == "done", "الإعادة نجحت")
+    check(db.dump("sales")["s1"]["status"] == "done", "الفاتورة أصبحت مُسلّمة")
+    check(abs(balance("c1") - 110.0) < 1e-9, "الرصيد زاد مرة واحدة (100 → 110)")
+
+
+def scenario_lost_response():
+    print("2) الكتابة وصلت لكن الرد ضاع → الإعادة لا تكرر الأثر")
+    seed()
+    db.fail_next(1, "after_commit")
+    op = submit(
+        lambda: deliver_sale("s1", "cash", 10.0, 40.0, USER, idempotency_key="deliver:s1"),
+        make_deliver_op("s1", "cash", 10.0, 40.0, user=USER),
+    )
+    check(op is not None, "العملية حُفظت في الطابور رغم أنها طُبّقت")
+    check(abs(balance("c1") - 60.0) < 1e-9, "الأثر طُبّق مرة (100 - 40 = 60)")
+
+    for _ in range(3):
+        res = replay_operations([op], USER)
+        check(res[0]["status"] == "done" and res[0]["result"].get("replayed"), "الإعادة رجعت النتيجة المخزّنة")
+    check(abs(balance("c1") - 60.0) < 1e-9, "الرصيد لم يتغير بعد 3 إعادات")
+    check(moves_for("c1") == 1, "حركة تسديد واحدة فقط")
+
+
+def scenario_debt_payment():
+    print("3) تسديد ذمم مع انقطاع بعد الحفظ + إعادات متعددة")
+    seed()
+    key = new_idempotency_key("debt_payment_c1")
+    db.fail_next(1, "after_commit")
+    op = submit(
+        lambda: pay_customer_debt("c1", 30.0, 5.0, USER, idempotency_key=key),
+        make_debt_payment_op("c1", 30.0, 5.0, key, user=USER),
+    )
+    check(op is not None, "العملية حُفظت في الطابور")
+    replay_operations([op], USER)
+    replay_operations([op], USER)
+    check(abs(balance("c1") - 65.0) < 1e-9, "الرصيد خُفّض مرة واحدة (100 - 35 = 65)")
+    check(moves_for("c1") == 1, "حركة رصيد واحدة فقط")
+
+
+def scenario_still_offline():
+    print("4) الإعادة والاتصال ما زال مقطوعاً → كل العمليات تبقى معلّقة")
+    seed()
+    ops = [make_deliver_op(f"s{i}", "credit", 0, 0, user=USER) for i in range(1, 6)]
+    db.fail_next(1, "read")
+    res = replay_operations(ops, USER)
+    check(all(r["status"] == "pending" for r in res), "كل العمليات pending")
+
+    db.fail_next(1, "before_commit")
+    res = replay_operations(ops, USER)
+    check(res[0]["status"] == "pending", "أول عملية فشلت بالاتصال")
+    check(all(r["status"] == "pending" for r in res[1:]), "التوقف عن باقي الدفعة بعد انقطاع الاتصال")
+
+    res = replay_operations(ops, USER)
+    check(all(r["status"] == "done" for r in res), "كل العمليات نجحت بعد عودة الاتصال")
+
+
+def scenario_batches_and_failures():
+    print("5) دفعات + أخطاء منطقية")
+    seed()
+    ops = [make_deliver_op(f"s{i}", "credit", 0, 0, user=USER) for i in range(1, 26)]
+    ops.insert(3, make_deliver_op("missing", "credit", 0, 0, user=USER))
+
+    res = replay_operations(ops, USER, batch_size=20)
+    statuses = [r["status"] for r in res]
+    check(statuses.count("failed") == 1 and res[3]["status"] == "failed", "الفاتورة غير الموجودة → failed")
+    check(statuses.count("done") == 19, "19 عملية نُفّذت في الدفعة الأولى")
+    check(statuses.count("pending") == 6, "الباقي pending للدفعة التالية")
+
+    remaining = [o for o, r in zip(ops, res) if r["status"] == "pending"]
+    res = replay_operations(remaining, USER, batch_size=20)
+    check(all(r["status"] == "done" for r in res), "الدفعة الثانية اكتملت")
+
+    sales = db.dump("sales")
+    check(all(sales[f"s{i}"]["status"] == "done" for i in range(1, 26)), "25 فاتورة مُسلّمة")
+    check(abs(balance("c1") - (100.0 + 13 * 10.0)) < 1e-9, "رصيد c1 = 100 + 13×10")
+    check(abs(balance("c2") - (12 * 10.0)) < 1e-9, "رصيد c2 = 12×10")
+
+
+def scenario_foreign_user():
+    print("6) عمليات مستخدم آخر على نفس الجهاز → لا تُعاد باسم المستخدم الحالي")
+    seed()
+    mine = make_deliver_op("s1", "credit", 0, 0, user=USER)
+    theirs = make_deliver_op("s2", "credit", 0, 0, user=OTHER)
+    legacy = dict(make_deliver_op("s3", "credit", 0, 0, user=USER))
+    legacy.pop("created_by")
+
+    res = {r["key"]: r for r in replay_operations([mine, theirs, legacy], USER)}
+    check(res["deliver:s1"]["status"] == "done", "عملية المستخدم الحالي نُفّذت")
+    check(res["deliver:s2"]["status"] == "foreign", "عملية المستخدم الآخر بقيت foreign")
+    check(res["deliver:s3"]["status"] == "foreign", "عملية بدون created_by لا تُنفّذ")
+    sales = db.dump("sales")
+    check(sales["s2"]["status"] == "prepared" and sales["s3"]["status"] == "prepared", "لم يُطبّق شيء باسم المستخدم الخطأ")
+
+    res = replay_operations([theirs], OTHER)
+    check(res[0]["status"] == "done", "صاحب العملية أعادها بنجاح")
+    check(db.dump("sales")["s2"].get("delivered_by") == "driver2", "التسليم مسجّل باسم صاحبه")
+
+
+def main():
+    scenario_drop_before_commit()
+    scenario_lost_response()
+    scenario_debt_payment()
+    scenario_still_offline()
+    scenario_batches_and_failures()
+    scenario_foreign_user()
+
+    print()
+    print(f"backend stats: {db.stats}")
+    if _failures:
+        print(f"{len(_failures)} check(s) failed")
+        return 1
+    print("all checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,503 @@
+"""
+سقف قراءات / كتابات Firestore لكل تفاعل، على البديل المحلي ببيانات بحجم واقعي.
+
+    python tools/read_budget_check.py
+    python tools/read_budget_check.py --json
+    python tools/read_budget_check.py --only services
+
+يفشل (exit 1) إذا تجاوز أي تفاعل سقفه، أو إذا قرأ موضع استعلام واحد من
+مجموعة متنامية (sales / stock_moves / crate_moves ...) أكثر من SITE_CAP مستند
+— وهذا شكل المسح الكامل غير المقصود قبل أن يظهر في فاتورة Firestore.
+
+جزآن:
+  services: الخدمات مباشرة (كشف حساب، تحضير طلب/دفعة، تسليم، تسديد، إحصائيات الأرشيف،
+            طباعة دفعة فواتير).
+  pages:    الصفحات الخمس عبر streamlit.testing (AppTest)، بما فيها حفظ طلب محضّر وتأكيد
+            تسليم من صفحة التحضير. بدون streamlit يفشل هذا الجزء (وليس تخطّياً صامتاً)؛
+            --only services لتشغيل الخدمات وحدها عن قصد.
+
+كل تفاعل يبدأ من caches باردة (clear_all_caches) فالرقم هو أسوأ حالة للـ rerun؛
+تفاعل في صفحة يُحسب بمجموع كل الـ reruns التي سببها (بما فيها ما بعد st.rerun).
+
+كيف اختيرت الأرقام: max_reads / max_writes بجانب كل تفاعل هي التكلفة المتوقعة
+محسوبة من SIZES وحدود الكود (استعلامات × limit، مستند لكل صنف، ...) — وليست
+الأرقام المقاسة اليوم. المجموعات المرجعية (العملاء / المنتجات / المواد / الموزعين)
+تُقرأ كاملة عن قصد؛ سقفها = عدد مرات قراءتها في ذلك الـ rerun بالذات × حجمها.
+تفاعل لا يعيد تحميل الكتالوج (اختيار عميل مثلاً) لا يُحسب له الكتالوج، فإعادة
+تحميله بالخطأ تُفشل الفحص. استعلام بلا نتائج يُحسب قراءة واحدة.
+السقف الفعلي = المتوقع + HEADROOM (25%، ولا يقل عن MIN_SLACK) لقراءات عرضية
+(مفتاح idempotency، إعداد، عدّاد) — فالفحص يلتقط مسحاً جديداً أو N+1 وليس قراءة
+زائدة واحدة. تفاعل متوقع أن لا يكتب (0) يبقى سقفه 0.
+"""
+import math
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+
+os.environ["BAWADI_BACKEND"] = "local"
+os.environ.setdefault("BAWADI_METRICS", "1")
+_LOG = os.path.join(tempfile.mkdtemp(prefix="bawadi_budget_"), "metrics.jsonl")
+os.environ["BAWADI_METRICS_LOG"] = _LOG
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firebase_config import db  # noqa: E402
+from services.cache_bus import clear_all_caches  # noqa: E402
+from services.firestore_metrics import begin_rerun, end_rerun  # noqa: E402
+from services.archive_service import archive_stats  # noqa: E402
+from services.orders_service import deliver_sale, prepare_order, prepare_orders_batch  # noqa: E402
+from services.payments_service import pay_customer_debt  # noqa: E402
+from services.statement_service import build_statement  # noqa: E402
+from services.idempotency_service import new_idempotency_key  # noqa: E402
+from services.print_batch_service import load_print_jobs  # noqa: E402
+from services.customer_prices_service import adjust_area_prices, save_customer_prices  # noqa: E402
+from services.aging_service import run_aging  # noqa: E402
+from components.printing import build_batch_print_html  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER = {"username": "admin", "role": "admin"}
+
+# حجم البيانات (قريب من مخبز متوسط بعد سنة)
+SIZES = {
+    "products": 300,
+    "customers": 1200,
+    "materials": 60,
+    "distributors": 12,
+    "sales": 8000,
+    "collections": 2000,
+    "customer_prices": 3000,
+    "stock_moves": 5000,
+    "crate_moves": 3000,
+}
+
+# مجموعات تكبر مع الزمن: لا يُسمح لموضع واحد بقراءة أكثر من SITE_CAP منها
+GROWING = (
+    "sales", "collections", "returns", "payments", "customer_balance_moves",
+    "customer_prices", "stock_moves", "crate_moves", "production_orders",
+    "inventory_counts", "inventory_count_lines",
+)
+# أكبر limit مقصود في الكود (archive HARD_CAP)
+SITE_CAP = 1000
+
+# هامش فوق التكلفة المتوقعة (انظر أعلى الملف)
+HEADROOM = 0.25
+MIN_SLACK = 2
+
+BIG_CUSTOMER = "c00001"   # فواتير أكثر من limit كشف الحساب
+BIG_CUSTOMER_SALES = 400
+BIG_CUSTOMER_COLLECTIONS = 150
+STATEMENT_LIMIT = 300     # limit كل استعلام في statement_service
+BIG_DIST = "d01"          # أغلب حركات الصناديق
+DAY = "2026-03-15"
+AREAS = 8                 # مناطق العملاء (مهمة أسعار المنطقة)
+
+_failures = []
+_results = []
+
+
+def check(cond: bool, msg: str):
+    print(("  ok   " if cond else "  FAIL ") + msg)
+    if not cond:
+        _failures.append(msg)
+
+
+def budget(expected: int) -> int:
+    """
+    السقف الفعلي لتكلفة متوقعة: + HEADROOM (ولا يقل عن MIN_SLACK)؛ 0 يبقى 0.
+    """
+    if expected <= 0:
+        return 0
+    return expected + max(MIN_SLACK, math.ceil(expected * HEADROOM))
+
+
+def catalog(extra: int = 0, **passes) -> int:
+    """
+    catalog(customers=3, products=1) = 3 × العملاء + المنتجات + extra
+    """
+    return extra + sum(n * SIZES[kind] for kind, n in passes.items())
+
+
+# ---------------------------
+# Fixtures
+# ---------------------------
+def seed():
+    db.reset()
+    batch, ops = db.batch(), 0
+
+    def put(col, doc_id, data):
+        nonlocal batch, ops
+        batch.set(db.collection(col).document(doc_id), data)
+        ops += 1
+        if ops >= 450:
+            batch.commit()
+            batch, ops = db.batch(), 0
+
+    for i in range(SIZES["products"]):
+        put("products", f"p{i:04d}", {
+            "name": f"منتج {i}", "price": 0.25 + (i % 20) * 0.05, "price_fils": 250 + (i % 20) * 50,
+            "qty_on_hand": 100000.0, "sale_unit": "pcs", "active": True,
+        })
+    for i in range(SIZES["materials"]):
+        put("materials", f"m{i:03d}", {"name": f"مادة {i}", "unit": "kg", "qty_on_hand": 500.0, "min_qty": 20.0, "active": True})
+    for i in range(100):
+        put("boms", f"p{i:04d}", {"product_id": f"p{i:04d}", "items": [
+            {"material_id": f"m{(i + k) % SIZES['materials']:03d}", "qty": 0.1} for k in range(4)
+        ]})
+    for i in range(1, SIZES["distributors"] + 1):
+        put("distributors", f"d{i:02d}", {"name": f"موزع {i}", "username": f"d{i:02d}", "money_balance": 0.0,
+                                          "money_balance_fils": 0, "crate_balance": 0, "active": True})
+    for i in range(1, SIZES["customers"] + 1):
+        put("customers", f"c{i:05d}", {
+            "name": f"عميل {i}", "phone": f"07{i:08d}", "balance": 50.0, "balance_fils": 50000,
+            "opening_balance": 0.0, "opening_balance_fils": 0, "active": True,
+            "area": f"منطقة {i % AREAS}", "created_at": "2026-01-01T08:00:00+03:00",
+        })
+
+    n_sales = SIZES["sales"]
+    for i in range(n_sales):
+        cid = BIG_CUSTOMER if i < BIG_CUSTOMER_SALES else f"c{1 + i % SIZES['customers']:05d}"
+        day = 1 + i % 28
+        prepared = i >= n_sales - 300
+        total_fils = 5000 + (i % 37) * 750
+        cash = i % 3 != 0
+        sale = {
+            "invoice_no": f"INV-2026-{i:06d}",
+            "customer_id": cid,
+            "customer_name": "عميل",
+            "status": "prepared" if prepared else "done",
+            "active": True,
+            "payment_type": None if prepared else ("cash" if cash else "credit"),
+            "total": total_fils / 1000, "total_fils": total_fils,
+            "discount": 0.0, "discount_fils": 0,
+            "net": total_fils / 1000, "net_fils": total_fils,
+            "amount_paid": total_fils / 1000 if cash and not prepared else 0.0,
+            "unpaid_debt": 0.0, "extra_credit": 0.0,
+            "seller_username": "admin",
+            "distributor_id": f"d{1 + i % SIZES['distributors']:02d}",
+            "created_at": f"2026-03-{day:02d}T09:{i % 60:02d}:00+03:00",
+            "items": [
+                {"product_id": f"p{(i + k) % SIZES['products']:04d}", "product_name": f"منتج {k}",
+                 "qty": 2, "price": 0.5, "total": 1.0, "consume_stock": True}
+                for k in range(6)
+            ],
+        }
+        if not prepared:
+            sale["delivered_at"] = f"2026-03-{day:02d}T10:{i % 60:02d}:00+03:00"
+        put("sales", f"s{i:06d}", sale)
+
+    for i in range(SIZES["collections"]):
+        cid = BIG_CUSTOMER if i < BIG_CUSTOMER_COLLECTIONS else f"c{1 + i % SIZES['customers']:05d}"
+        put("collections", f"col{i:05d}", {
+            "customer_id": cid, "amount": 3.0, "amount_fils": 3000, "status": "posted", "active": True,
+            "created_at": f"2026-03-{1 + i % 28:02d}T12:00:00+03:00",
+        })
+    for i in range(SIZES["customer_prices"]):
+        cid = f"c{1 + i % SIZES['customers']:05d}"
+        pid = f"p{i % SIZES['products']:04d}"
+        put("customer_prices", f"{cid}_{pid}", {"customer_id": cid, "product_id": pid, "price": 0.3,
+                                                "price_fils": 300, "active": True})
+    for i in range(SIZES["stock_moves"]):
+        put("stock_moves", f"sm{i:06d}", {
+            "type": "sale", "item_type": "product", "item_id": f"p{i % SIZES['products']:04d}",
+            "qty_delta": -2.0, "created_at": f"2026-03-{1 + i % 28:02d}T09:{i % 60:02d}:00+03:00",
+        })
+    for i in range(SIZES["crate_moves"]):
+        dist = BIG_DIST if i < 900 else f"d{1 + i % SIZES['distributors']:02d}"
+        put("crate_moves", f"cm{i:06d}", {
+            "distributor_id": dist, "type": "out", "boxes": 5, "delta_boxes": 5,
+            "created_at": f"2026-03-{1 + i % 28:02d}T07:{i % 60:02d}:00+03:00",
+        })
+    batch.commit()
+
+
+# ---------------------------
+# Measurement
+# ---------------------------
+def _evaluate(name: str, record: dict, max_reads: int, max_writes: int):
+    reads, writes = record.get("reads", 0), record.get("writes", 0)
+    scans = []
+    for site, s in (record.get("sites") or {}).items():
+        col = site.rsplit("[", 1)[-1].rstrip("]") if site.endswith("]") else ""
+        if col in GROWING and (s.get("reads", 0) or 0) > SITE_CAP:
+            scans.append((site, s["reads"]))
+
+    read_cap, write_cap = budget(max_reads), budget(max_writes)
+    check(reads <= read_cap, f"{name}: reads {reads} <= {read_cap} (expected {max_reads})")
+    check(writes <= write_cap, f"{name}: writes {writes} <= {write_cap} (expected {max_writes})")
+    for site, n in scans:
+        check(False, f"{name}: {site} قرأ {n} مستند (> {SITE_CAP}) — مسح كامل؟")
+
+    _results.append({
+        "interaction": name, "reads": reads, "writes": writes,
+        "max_reads": max_reads, "max_writes": max_writes,
+        "read_cap": budget(max_reads), "write_cap": budget(max_writes),
+        "top_sites": sorted(
+            ({"site": k, **v} for k, v in (record.get("sites") or {}).items()),
+            key=lambda x: x.get("reads", 0) + x.get("writes", 0), reverse=True,
+        )[:5],
+    })
+
+
+def measure(name: str, fn, max_reads: int, max_writes: int):
+    clear_all_caches()
+    m = begin_rerun(name)
+    try:
+        fn()
+    finally:
+        record = end_rerun(m, log=False)
+    _evaluate(name, record, max_reads, max_writes)
+    return record
+
+
+def _order(key: str, customer_id: str, n_items: int, offset: int = 0) -> dict:
+    items = []
+    for k in range(n_items):
+        pid = f"p{(offset + k) % SIZES['products']:04d}"
+        items.append({"product_id": pid, "product_name": pid, "qty": 3, "price": 0.5, "price_fils": 500,
+                      "total": 1.5, "total_fils": 1500, "consume_stock": True})
+    return {
+        "key": key, "sale_id": f"new_{key}", "invoice_no": f"INV-NEW-{key}",
+        "customer_id": customer_id, "customer_name": "عميل", "distributor_id": "d02", "distributor_name": "موزع 2",
+        "discount": 0.0, "items": items, "units": {}, "idempotency_key": new_idempotency_key("prepare"),
+    }
+
+
+def run_services():
+    print("services")
+    customer = db.collection("customers").document(BIG_CUSTOMER).get().to_dict()
+    customer["id"] = BIG_CUSTOMER
+
+    # 3 استعلامات بـ limit=300 (فواتير / تحصيلات / مرتجعات)
+    measure("statement: open (400 invoices)", lambda: build_statement(customer),
+            max_reads=3 * STATEMENT_LIMIT, max_writes=0)
+
+    # يوم واحد: ~ SIZES["sales"] / 28 فاتورة
+    per_day = SIZES["sales"] // 28 + 1
+    measure("archive: stats for one day",
+            lambda: archive_stats(f"{DAY}T00:00:00+03:00", f"{DAY}T23:59:59+03:00"),
+            max_reads=per_day, max_writes=0)
+
+    # منتج لكل صنف + مفتاح idempotency + الفاتورة (إنشاء فقط)؛ sale + حركة ومنتج لكل صنف + idempotency
+    measure("prepare: one order, 8 items",
+            lambda: prepare_order(_order("one", "c00002", 8), USER),
+            max_reads=8 + 2, max_writes=2 + 2 * 8)
+
+    orders = [_order(f"b{i:02d}", f"c{3 + i:05d}", 6, offset=i * 3) for i in range(20)]
+    distinct = len({it["product_id"] for o in orders for it in o["items"]})
+    measure("prepare: batch of 20 orders",
+            lambda: prepare_orders_batch(orders, USER),
+            max_reads=distinct + 2 * len(orders), max_writes=sum(2 + 6 for _ in orders) + distinct)
+
+    # idempotency + فاتورة + عميل؛ فاتورة + عميل + حركة رصيد + idempotency
+    sid = f"s{SIZES['sales'] - 1:06d}"
+    measure("deliver: cash + old debt",
+            lambda: deliver_sale(sid, "cash", 1.0, 2.0, USER, idempotency_key=new_idempotency_key("deliver")),
+            max_reads=4, max_writes=6)
+
+    measure("payments: pay old debt",
+            lambda: pay_customer_debt("c00010", 5.0, 0.0, USER, idempotency_key=new_idempotency_key("debt")),
+            max_reads=4, max_writes=5)
+
+    # فاتورة + عميلها لكل فاتورة، لكن بـ round trip اثنين فقط (get_all للفواتير ثم للعملاء)
+    route = [f"s{i:06d}" for i in range(400, 500)]
+    n_customers = len({f"c{1 + i % SIZES['customers']:05d}" for i in range(400, 500)})
+    record = measure("print: batch of 100 invoices",
+                     lambda: build_batch_print_html(load_print_jobs(route), paper="a4"),
+                     max_reads=len(route) + n_customers, max_writes=0)
+    calls = sum(s.get("calls", 0) for s in (record.get("sites") or {}).values())
+    check(calls <= 2, f"print: batch of 100 invoices: round trips {calls} <= 2")
+
+    # شبكة أسعار 150 منتج لعميل: استعلام واحد للأسعار الحالية، وكتابة الفروقات فقط
+    # (مستند السعر + نسخته في price_versions + نسخة أساس للسعر السابق إن وُجد)
+    grid = {f"p{k:04d}": f"{0.2 + k * 0.001:.3f}" for k in range(150)}
+    existing = SIZES["customer_prices"] // SIZES["customers"] + 1
+    record = measure("prices: save grid of 150 for one customer",
+                     lambda: save_customer_prices({"id": "c00020", "name": "عميل 20"}, grid, USER),
+                     max_reads=existing, max_writes=150 + 150 + existing)
+    check(sum(s.get("calls", 0) for s in (record.get("sites") or {}).values()) <= 2,
+          "prices: save grid of 150 for one customer: round trips <= 2")
+
+    # منطقة = customers / AREAS عميل؛ أسعارهم باستعلام "in" لكل 30 عميل
+    in_area = SIZES["customers"] // AREAS
+    measure("prices: +5% for one area",
+            lambda: adjust_area_prices("منطقة 1", 5, USER, job_id=new_idempotency_key("area_prices")),
+            max_reads=in_area + in_area * existing, max_writes=3 * in_area * existing)
+
+    # أعمار الذمم: التشغيل الكامل مهمة دفعية (يقرأ سجل كل المدينين) فلا يُقاس هنا؛ إعادة
+    # التشغيل بعد تسديد واحد تمس فقط العملاء الذين تغيّروا ضمن هامش الـ watermark
+    # (التسليم والتسديد أعلاه + هذا التسديد): سجل كل منهم بـ 4 استعلامات "in"
+    run_aging(USER, full=True)
+    pay_customer_debt("c00030", 5.0, 0.0, USER, idempotency_key=new_idempotency_key("debt"))
+    touched = 3
+    per_customer = (SIZES["sales"] + SIZES["collections"]) // SIZES["customers"] + 4 + 2
+    measure("aging: re-run after one payment", lambda: run_aging(USER),
+            max_reads=2 + touched * (1 + per_customer), max_writes=touched + 1)
+
+
+# ---------------------------
+# Pages (streamlit.testing)
+# ---------------------------
+def _records() -> list:
+    try:
+        with open(_LOG, encoding="utf-8") as f:
+            return [json.loads(ln) for ln in f if ln.strip()]
+    except OSError:
+        return []
+
+
+def _combined(records: list) -> dict:
+    """
+    مجموع عدة reruns (الضغطة + ما بعد st.rerun) كسجل واحد.
+    """
+    out = {"reads": 0, "writes": 0, "sites": {}}
+    for r in records:
+        out["reads"] += r.get("reads", 0)
+        out["writes"] += r.get("writes", 0)
+        for site, v in (r.get("sites") or {}).items():
+            s = out["sites"].setdefault(site, {"calls": 0, "reads": 0, "writes": 0})
+            for k in s:
+                s[k] += v.get(k, 0) or 0
+    return out
+
+
+def _page_app(page: str, state: dict = None):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    at.session_state["user"] = dict(USER)
+    at.session_state["page"] = page
+    for k, v in (state or {}).items():
+        at.session_state[k] = v
+    return at
+
+
+def measure_page(name: str, page: str, max_reads: int, max_writes: int = 0, interact=None, state=None):
+    """
+    rerun أول للصفحة، ثم (اختياري) تفاعل واحد يُقاس rerun الخاص به — كلاهما من cache بارد.
+    state: قيم session_state قبل أول rerun (تاريخ الأرشيف، سلة، dialog مفتوح ...).
+    """
+    clear_all_caches()
+    seen = len(_records())
+    at = _page_app(page, state).run()
+    if at.exception:
+        check(False, f"{name}: {at.exception[0].value}")
+        return
+    if interact is not None:
+        clear_all_caches()
+        seen = len(_records())
+        interact(at)
+        if at.exception:
+            check(False, f"{name}: {at.exception[0].value}")
+            return
+    _evaluate(name, _combined(_records()[seen:]), max_reads, max_writes)
+    return at
+
+
+def run_pages():
+    print("pages")
+    try:
+        import streamlit.testing.v1  # noqa: F401
+    except ImportError:
+        check(False, "pages: streamlit غير مثبت — لم تُقَس أي صفحة (pip install -r requirements.txt، "
+                     "أو --only services لتخطيها عن قصد)")
+        return
+
+    # العملاء: قائمة العملاء في 3 أقسام + كتالوج المنتجات + تقرير أعمار الذمم (مستندان)
+    measure_page("customers: open", "customers", catalog(customers=3, products=1, extra=2))
+    # الكشف (BIG_CUSTOMER): الكتالوج باقٍ في الجلسة؛ فواتيره وتحصيلاته حتى STATEMENT_LIMIT
+    # + مرتجعات (لا شيء)
+    statement = min(BIG_CUSTOMER_SALES, STATEMENT_LIMIT) + min(BIG_CUSTOMER_COLLECTIONS, STATEMENT_LIMIT) + 1
+    measure_page("customers: open statement", "customers",
+                 catalog(customers=3, extra=2 + statement),
+                 interact=lambda at: at.selectbox(key="stmt_customer_select").select_index(1).run())
+
+    # التحضير: كتالوج العملاء والمنتجات مرة واحدة
+    measure_page("orders_prep: open", "orders_prep", catalog(customers=1, products=1))
+    # اختيار عميل لا يعيد الكتالوج: آخر 3 مُسلّمة + محضّرة (لا شيء) + أسعاره + نسخ أسعاره
+    prices_per_customer = SIZES["customer_prices"] // SIZES["customers"] + 1
+    measure_page("orders_prep: pick customer", "orders_prep", 3 + 1 + prices_per_customer + 1,
+                 interact=lambda at: at.selectbox(key="prep_customer_select").select(BIG_CUSTOMER).run())
+
+    # حفظ طلب محضّر (8 أصناف): منتج لكل صنف + فاتورة + idempotency + عدّاد الفواتير +
+    # اسم الموزع + طلبات العميل؛ التحضير يُبطل كتالوج المنتجات فيُعاد تحميله.
+    # الكتابة: فاتورة + (منتج + حركة) لكل صنف + idempotency + عدّاد
+    cart = {
+        f"p{k:04d}": {"qty": 3, "price": 0.5, "product_name": f"منتج {k}", "consume_stock": True}
+        for k in range(8)
+    }
+    prepared_before = _prepared_count(BIG_CUSTOMER)
+    at = measure_page("orders_prep: save prepared order", "orders_prep",
+                      catalog(products=1, extra=8 + 1 + 1 + 1 + 1 + 3 + 1), max_writes=1 + 2 * 8 + 1 + 1,
+                      state={"prep_customer_select": BIG_CUSTOMER, "prep_cart": cart},
+                      interact=lambda at: at.button(key="prep_save").click().run())
+    if at is not None:
+        check(_prepared_count(BIG_CUSTOMER) == prepared_before + 1, "orders_prep: save prepared order: طلب واحد جديد")
+
+    # تأكيد تسليم من الـ dialog: الفاتورة والعميل مرتين (الصفحة + الـ dialog) + الـ transaction
+    # (فاتورة + عميل + idempotency) + اسم الموزع؛ التسليم يُبطل كتالوج العملاء.
+    # الكتابة: الفاتورة + idempotency (المدفوع = الصافي فلا حركة رصيد)
+    sid = f"s{SIZES['sales'] - 1:06d}"
+    at = measure_page("orders_prep: confirm delivery", "orders_prep",
+                      catalog(customers=1, extra=2 * 2 + 3 + 1), max_writes=2,
+                      state={"deliver_target_id": sid, "active_dialog": "deliver"},
+                      interact=lambda at: at.button(key=f"confirm_deliver_{sid}").click().run())
+    if at is not None:
+        check(db.collection("sales").document(sid).get().to_dict()["status"] == "done",
+              "orders_prep: confirm delivery: الفاتورة أصبحت مُسلّمة")
+
+    # الأرشيف على يوم البيانات (الافتراضي اليوم = فارغ): صفحة فواتير + الموزعين؛
+    # الإحصائيات: كل فواتير اليوم المُسلّمة (أقل من HARD_CAP)
+    day = datetime.date.fromisoformat(DAY)
+    arch_state = {"arch_from": day, "arch_to": day}
+    per_day = SIZES["sales"] // 28 + 1
+    measure_page("orders_archive: open", "orders_archive", catalog(distributors=1, extra=30),
+                 state=arch_state)
+    measure_page("orders_archive: calc stats", "orders_archive", catalog(distributors=1, extra=30 + per_day),
+                 state=arch_state,
+                 interact=lambda at: at.button(key="arch_calc_stats").click().run())
+
+    # المستودع: المنتجات في 4 تبويبات والمواد في 3 + آخر 50 حركة؛ أوامر الإنتاج والجرد فارغة
+    measure_page("inventory: open", "inventory", catalog(products=4, materials=3, extra=50 + 1 + 1))
+
+    # الموزعون: قائمة الموزعين في 4 مواضع؛ الكشف حتى 800 حركة صناديق
+    measure_page("distributors: open", "distributors", catalog(distributors=4))
+    measure_page("distributors: open statement", "distributors",
+                 catalog(distributors=4, extra=800),
+                 interact=lambda at: at.selectbox(key="stmt_dist_select").select_index(1).run())
+
+
+def _prepared_count(customer_id: str) -> int:
+    return sum(
+        1 for s in db.dump("sales").values()
+        if s.get("customer_id") == customer_id and s.get("status") == "prepared"
+    )
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--only", choices=["services", "pages"], default="")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    seed()
+    if args.only in ("", "services"):
+        run_services()
+    if args.only in ("", "pages"):
+        seed()
+        run_pages()
+
+    if args.json:
+        print(json.dumps({"results": _results, "failures": _failures}, ensure_ascii=False, indent=2))
+
+    print()
+    if _failures:
+        print(f"{len(_failures)} budget check(s) failed")
+        return 1
+    print("all budgets respected")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
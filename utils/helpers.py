@@ -14,4 +14,11 @@ def to_int(x, default=0):
     try:
         return int(x)
     except Exception:
-        return default
\ No newline at end of file
+        return default
+
+def fmt_qty(x) -> str:
+    """
+    كمية للعرض: 12 -> "12"، 2.5 -> "2.5"، 0.125 -> "0.125" (حتى 3 خانات بدون أصفار زائدة).
+    """
+    s = f"{to_float(x):.3f}".rstrip("0").rstrip(".")
+    return "0" if s in ("", "-0") else s
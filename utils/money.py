@@ -0,0 +1,113 @@
+"""
+المبالغ كأعداد صحيحة بالفلس (1 دينار = 1000 فلس).
+
+كل حقل مالي يُخزّن بصيغتين: القيمة القديمة float (للتوافق مع الشاشات والتقارير)
+و <field>_fils عدد صحيح هو المرجع في الحساب والجمع:
+
+    cur = read_fils(cust_data, "balance")
+    transaction.update(cust_ref, money_fields(balance=cur - to_fils(amount)))
+    # {"balance": 12.345, "balance_fils": 12345}
+
+المستندات القديمة بدون _fils تُقرأ من الـ float (مقرّبة لأقرب فلس) إلى أن
+يملأها tools/migrate_money_fils.py. وإن حدّث كاتب قديم الـ float فقط فالـ _fils
+لا يطابقه ويُتجاهل (الـ float هو الأحدث).
+"""
+import math
+from decimal import Decimal, ROUND_HALF_UP
+
+FILS_PER_JOD = 1000
+FILS_SUFFIX = "_fils"
+
+# الحقول المالية في كل مجموعة (للـ migration والتحقق)
+MONEY_FIELDS = {
+    "customers": ("balance", "opening_balance"),
+    "sales": (
+        "total", "discount", "net", "amount_paid", "unpaid_debt", "extra_credit",
+        "old_debt_paid", "old_debt_remaining", "final_due",
+    ),
+    "collections": ("amount",),
+    "payments": ("amount",),
+    "returns": ("total",),
+    "customer_balance_moves": ("amount", "discount_amount"),
+    "distributors": ("money_balance",),
+    "products": ("price",),
+    "customer_prices": ("price",),
+}
+
+
+def fils_key(name: str) -> str:
+    return name + FILS_SUFFIX
+
+
+def to_fils(x, default: int = 0) -> int:
+    """
+    دينار (float / str / Decimal) -> فلس، تقريب نصف لأعلى مثل round(x, 3) المعروض.
+    """
+    if x is None or x == "":
+        return default
+    if isinstance(x, bool):
+        return default
+    if isinstance(x, int):
+        return x * FILS_PER_JOD
+    if isinstance(x, float):
+        # المسار السريع: بعيداً عن منتصف الفلس التقريب العادي صحيح
+        n = x * FILS_PER_JOD
+        if abs(n - math.floor(n) - 0.5) > 1e-6:
+            return int(math.floor(n + 0.5))
+    try:
+        # str(float) يعطي أقصر تمثيل: 0.1 -> "0.1" وليس 0.1000000000000000055...
+        d = Decimal(str(x)) if not isinstance(x, Decimal) else x
+        return int((d * FILS_PER_JOD).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except Exception:
+        return default
+
+
+def from_fils(fils: int) -> float:
+    return int(fils) / FILS_PER_JOD
+
+
+def fils_consistent(fils: int, value) -> bool:
+    """
+    هل الـ float المخزّن ما زال يطابق _fils؟ (كاتب قديم قد يحدّث الـ float فقط)
+    """
+    if value is None or value == "":
+        return True
+    try:
+        return abs(fils / FILS_PER_JOD - float(value)) < 0.0005
+    except Exception:
+        return True
+
+
+def read_fils(data: dict, name: str, default: int = 0) -> int:
+    """
+    الحقل <name>_fils إن وُجد ويطابق الـ float، وإلا تحويل الـ float.
+    """
+    data = data or {}
+    v = data.get(fils_key(name))
+    value = data.get(name)
+    if v is not None:
+        try:
+            fils = int(v)
+        except Exception:
+            fils = None
+        if fils is not None and fils_consistent(fils, value):
+            return fils
+    return to_fils(value, default)
+
+
+def money_fields(**fils_values) -> dict:
+    """
+    money_fields(balance=12345) -> {"balance": 12.345, "balance_fils": 12345}
+    """
+    out = {}
+    for name, fils in fils_values.items():
+        fils = int(fils)
+        out[name] = from_fils(fils)
+        out[fils_key(name)] = fils
+    return out
+
+
+def fmt_fils(fils: int) -> str:
+    sign = "-" if fils < 0 else ""
+    q, r = divmod(abs(int(fils)), FILS_PER_JOD)
+    return f"{sign}{q}.{r:03d}"
@@ -0,0 +1,79 @@
+import json
+import streamlit as st
+from streamlit.components.v1 import html
+
+# طابور العمليات المعلّقة (تسليم / تسديد ذمم) عند انقطاع اتصال السيرفر بـ Firestore.
+# نسخة في session_state + نسخة دائمة في localStorage على جهاز الموزّع
+# حتى لا تضيع إذا أُعيد تحميل الصفحة أو انتهت الجلسة قبل نجاح الإعادة.
+# لا يغطي انقطاع الجهاز نفسه عن السيرفر: العملية تُلتقط على السيرفر فقط.
+# الطابور مشترك بين كل من يدخل من نفس المتصفح؛ كل عملية تحمل created_by
+# و replay_operations لا تُعيد إلا عمليات المستخدم الحالي.
+QUEUE_KEY = "offline_ops"
+_STORAGE_KEY = "bawadi_offline_ops"
+_RESTORED_KEY = "offline_ops_restored"
+_DIRTY_KEY = "_offline_ops_dirty"
+
+
+def get_queue() -> list[dict]:
+    return st.session_state.setdefault(QUEUE_KEY, [])
+
+
+def enqueue_op(op: dict):
+    q = [o for o in get_queue() if o.get("key") != op.get("key")]
+    q.append(op)
+    st.session_state[QUEUE_KEY] = q
+    st.session_state[_DIRTY_KEY] = True
+
+
+def remove_ops(keys):
+    keys = set(keys or [])
+    if not keys:
+        return
+    q = [o for o in get_queue() if o.get("key") not in keys]
+    st.session_state[QUEUE_KEY] = q
+    st.session_state[_DIRTY_KEY] = True
+
+
+def sync_queue_to_browser():
+    """
+    يكتب الطابور في localStorage إذا تغيّر. يُستدعى من جسم الصفحة (وليس
+    داخل dialog قبل st.rerun) حتى يصل الـ script للمتصفح فعلاً.
+    """
+    if st.session_state.pop(_DIRTY_KEY, False):
+        save_queue_to_browser(get_queue())
+
+
+def save_queue_to_browser(ops: list[dict]):
+    html(f"""
+    <script>
+    localStorage.setItem("{_STORAGE_KEY}", {json.dumps(json.dumps(ops, ensure_ascii=False))});
+    </script>
+    """, height=0)
+
+
+def load_queue_from_browser():
+    """
+    يرسل الطابور المحفوظ في المتصفح إلى session_state (مرة واحدة لكل تحميل صفحة)
+    بنفس أسلوب استرجاع المستخدم في login.
+    """
+    html(f"""
+    <script>
+    const ops = localStorage.getItem("{_STORAGE_KEY}");
+    if (ops && ops !== "[]" && !window.__offlineOpsRestoredOnce) {{
+        window.__offlineOpsRestoredOnce = true;
+        window.parent.postMessage({{
+            type: "streamlit:setSessionState",
+            key: "{_RESTORED_KEY}",
+            value: JSON.parse(ops)
+        }}, "*");
+    }}
+    </script>
+    """, height=0)
+
+    restored = st.session_state.pop(_RESTORED_KEY, None)
+    # تُسترجع كل العمليات (حتى عمليات مستخدم آخر) حتى لا تُمسح من localStorage
+    # عند الحفظ التالي؛ الفصل بين المستخدمين يتم عند الإعادة.
+    if isinstance(restored, list) and restored:
+        known = {o.get("key") for o in get_queue()}
+        merged = get_queue() + [o for o in restored if isinstance(o, dict) and o.get("key") not in known]
+        st.session_state[QUEUE_KEY] = merged